@@ -7,7 +7,7 @@ from time import time
 import numpy as np
 
 from prody import LOGGER, PY2K
-from prody.kdtree import KDTree
+from prody.kdtree import KDTree, CellGrid
 from prody.utilities import checkCoords, rangeString
 
 from .atomic import Atomic
@@ -119,7 +119,8 @@ class AtomGroup(Atomic):
     which is a copy of of active coordinate sets of *A* and *B*."""
 
     __slots__ = ['_title', '_n_atoms', '_coords', '_hv', '_sn2i',
-                 '_timestamps', '_kdtrees', '_bmap', '_bonds', '_cslabels',
+                 '_timestamps', '_kdtrees', '_cellgrids', '_bmap', '_bonds',
+                 '_angles', '_dihedrals', '_impropers', '_cslabels',
                  '_acsi', '_n_csets', '_data', '_fragments',
                  '_flags', '_flagsts', '_subsets', '_msa', 
                  '_sequenceMap']
@@ -133,8 +134,12 @@ class AtomGroup(Atomic):
         self._sn2i = None
         self._timestamps = None
         self._kdtrees = None
+        self._cellgrids = None
         self._bmap = None
         self._bonds = None
+        self._angles = None
+        self._dihedrals = None
+        self._impropers = None
         self._fragments = None
 
         self._cslabels = []
@@ -248,6 +253,17 @@ class AtomGroup(Atomic):
         elif other._bonds is not None:
             new.setBonds(other._bonds + self._n_atoms)
 
+        for label in ('_angles', '_dihedrals', '_impropers'):
+            this = getattr(self, label)
+            that = getattr(other, label)
+            if that is not None:
+                that = that + self._n_atoms
+                if this is not None:
+                    that = np.concatenate([this, that])
+                setattr(new, label, that)
+            elif this is not None:
+                setattr(new, label, this.copy())
+
         return new
 
     def __contains__(self, item):
@@ -310,9 +326,11 @@ class AtomGroup(Atomic):
             self._timestamps = np.zeros(self._n_csets)
             self._timestamps.fill(time())
             self._kdtrees = [None] * self._n_csets
+            self._cellgrids = [None] * self._n_csets
         else:
             self._timestamps[index] = time()
             self._kdtrees[index] = None
+            self._cellgrids[index] = None
 
     def _getKDTree(self, index=None):
         """Returns KDTree for coordinate set at given index."""
@@ -328,6 +346,21 @@ class AtomGroup(Atomic):
         else:
             return None
 
+    def _getCellGrid(self, cellsize, index=None):
+        """Returns :class:`.CellGrid` with *cellsize* for coordinate set at
+        given index.  Grid is rebuilt when coordinates or *cellsize* change."""
+
+        if self._n_csets:
+            if index is None:
+                index = self._acsi
+            grid = self._cellgrids[index]
+            if grid is None or grid.getCellsize() != cellsize:
+                grid = CellGrid(self._coords[index], cellsize)
+                self._cellgrids[index] = grid
+            return grid
+        else:
+            return None
+
     def _getSN2I(self):
         """Returns a mapping of serial numbers to indices."""
 
@@ -493,6 +526,7 @@ class AtomGroup(Atomic):
         self._timestamps[:len(timestamps)] = timestamps
         self._timestamps[len(timestamps):] = time()
         self._kdtrees.extend([None] * diff)
+        self._cellgrids.extend([None] * diff)
         if label is None or isinstance(label, str):
             self._cslabels.extend([label] * diff)
         elif isinstance(label, (list, tuple)):
@@ -520,12 +554,14 @@ class AtomGroup(Atomic):
             self._acsi = None
             self._cslabels = None
             self._kdtrees = None
+            self._cellgrids = None
         else:
             self._coords = self._coords[which]
             self._n_csets = self._coords.shape[0]
             self._acsi = 0
             self._cslabels = [self._cslabels[i] for i in which]
             self._kdtrees = [self._kdtrees[i] for i in which]
+            self._cellgrids = [self._cellgrids[i] for i in which]
         self._timestamps = self._timestamps[which]
 
     def getCoordsets(self, indices=None):
@@ -1024,6 +1060,89 @@ class AtomGroup(Atomic):
             for a, b in self._bonds:
                 yield a, b
 
+    def _checkIndices(self, indices, width, name):
+        """Returns *indices* of atoms forming *name*, e.g. angles, as an
+        array with *width* columns."""
+
+        if isinstance(indices, list):
+            indices = np.array(indices, int)
+        if indices.ndim != 2:
+            raise ValueError('{0}.ndim must be 2'.format(name))
+        if indices.shape[1] != width:
+            raise ValueError('{0}.shape must be (n_{0}, {1})'
+                             .format(name, width))
+        if len(indices):
+            if indices.min() < 0:
+                raise ValueError('negative atom indices are not valid')
+            if indices.max() >= self._n_atoms:
+                raise ValueError('atom indices are out of range')
+        return indices
+
+    def setAngles(self, angles):
+        """Set angles between bonded atoms.  *angles* must be a list or an
+        array of triplets of indices, with the central atom in the middle.
+        Angles are stored as they are, e.g. for writing PSF files, and are
+        not used in atom selections."""
+
+        self._angles = self._checkIndices(angles, 3, 'angles')
+
+    def getAngles(self):
+        """Returns a copy of angles array, or **None** if angles are not set.
+        Use :meth:`setAngles` for setting angles."""
+
+        if self._angles is not None:
+            return self._angles.copy()
+
+    def numAngles(self):
+        """Returns number of angles.  Use :meth:`setAngles` for setting
+        angles."""
+
+        if self._angles is not None:
+            return self._angles.shape[0]
+        return 0
+
+    def setDihedrals(self, dihedrals):
+        """Set dihedral angles.  *dihedrals* must be a list or an array of
+        quadruplets of indices of atoms in the order they are bonded."""
+
+        self._dihedrals = self._checkIndices(dihedrals, 4, 'dihedrals')
+
+    def getDihedrals(self):
+        """Returns a copy of dihedrals array, or **None** if dihedrals are not
+        set.  Use :meth:`setDihedrals` for setting dihedrals."""
+
+        if self._dihedrals is not None:
+            return self._dihedrals.copy()
+
+    def numDihedrals(self):
+        """Returns number of dihedrals.  Use :meth:`setDihedrals` for setting
+        dihedrals."""
+
+        if self._dihedrals is not None:
+            return self._dihedrals.shape[0]
+        return 0
+
+    def setImpropers(self, impropers):
+        """Set improper dihedral angles.  *impropers* must be a list or an
+        array of quadruplets of atom indices."""
+
+        self._impropers = self._checkIndices(impropers, 4, 'impropers')
+
+    def getImpropers(self):
+        """Returns a copy of impropers array, or **None** if impropers are not
+        set.  Use :meth:`setImpropers` for setting impropers."""
+
+        if self._impropers is not None:
+            return self._impropers.copy()
+
+    def numImpropers(self):
+        """Returns number of impropers.  Use :meth:`setImpropers` for setting
+        impropers."""
+
+        if self._impropers is not None:
+            return self._impropers.shape[0]
+        return 0
+
     def numFragments(self):
         """Returns number of connected atom subsets."""
 
@@ -222,6 +222,15 @@ class Atomic(object):
                 bonds = trimBonds(bonds, indices)
                 if bonds is not None:
                     new.setBonds(bonds)
+
+        for label in ('_angles', '_dihedrals', '_impropers'):
+            atoms = getattr(ag, label)
+            if atoms is None:
+                continue
+            if indices is None:
+                setattr(new, label, atoms.copy())
+            elif not dummies:
+                setattr(new, label, trimBonds(atoms, indices))
         return new
 
     __copy__ = copy
@@ -121,21 +121,27 @@ def evalBonds(bonds, n_atoms):
     numbonds = np.bincount(bonds.reshape((bonds.shape[0] * 2)))
     bmap = np.zeros((n_atoms, numbonds.max()), int)
     bmap.fill(-1)
-    index = np.zeros(n_atoms, int)
-    for bond in bonds:
-        a, b = bond
-        bmap[a, index[a]] = b
-        bmap[b, index[b]] = a
-        index[bond] += 1
+    # neighbors of an atom are listed in the order its bonds are given
+    atoms = bonds.ravel()
+    order = atoms.argsort(kind='mergesort')
+    atoms = atoms[order]
+    starts = np.concatenate(([0], numbonds.cumsum()[:-1]))
+    bmap[atoms, np.arange(len(atoms)) - starts[atoms]] = \
+        bonds[:, ::-1].ravel()[order]
     return bmap, numbonds
 
 
 def trimBonds(bonds, indices):
-    """Returns bonds between atoms at given indices."""
-
-    iset = set(indices)
-    bonds = [bond for bond in bonds if bond[0] in iset and bond[1] in iset]
-    if bonds:
-        newindices = np.zeros(indices.max()+1, int)
-        newindices[indices] = np.arange(len(indices))
-        return newindices[np.array(bonds)]
+    """Returns bonds between atoms at given indices, renumbered by positions
+    of atoms in *indices*, or **None** if there is none.  Rows of other atom
+    index arrays, such as angles, can be trimmed the same way."""
+
+    bonds = np.asarray(bonds)
+    if not len(bonds) or not len(indices):
+        return None
+    newindices = -np.ones(max(bonds.max(), indices.max()) + 1, int)
+    newindices[indices] = np.arange(len(indices))
+    bonds = newindices[bonds]
+    bonds = bonds[(bonds > -1).all(1)]
+    if len(bonds):
+        return bonds
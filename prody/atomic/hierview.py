@@ -2,7 +2,8 @@
 """This module defines :class:`HierView` class that builds a hierarchical
 views of atom groups."""
 
-from numpy import unique, zeros, arange, concatenate
+from numpy import unique, zeros, ones, arange, concatenate, where, repeat
+from numpy import bincount, diff, flatnonzero, lexsort
 from prody.utilities.misctools import count
 
 from .atomgroup import AtomGroup
@@ -180,31 +181,21 @@ class HierView(object):
         indices = atoms._getIndices()
         self._selstr = atoms.getSelstr()
 
-        self._dict = ag.getHierView()._dict
+        hv = ag.getHierView()
+        self._dict = hv._dict
 
-        self._segments = _segments = [None] * ag.numSegments()
-        self._residues = _residues = [None] * ag.numResidues()
-        self._chains = _chains = [None] * ag.numChains()
+        self._segments = _segments = [None] * len(hv._segments)
+        self._residues = _residues = [None] * len(hv._residues)
+        self._chains = _chains = [None] * len(hv._chains)
 
         for hvidx, _list in [(atoms._getSegindices(), _segments),
                              (atoms._getChindices(), _chains),
                              (atoms._getResindices(), _residues),]:
             if not _list: continue
-            pidx = hvidx[0]
-            pi = 0
-            for i, idx in enumerate(hvidx):
-                if pidx == idx: continue
-                subset = _list[pidx]
-                if subset is None:
-                    _list[pidx] = indices[pi:i]
-                else:
-                    _list[pidx] = concatenate((subset, indices[pi:i]))
-                pidx, pi = idx, i
-            subset = _list[pidx]
-            if subset is None:
-                _list[pidx] = indices[pi:]
-            else:
-                _list[pidx] = concatenate((subset, indices[pi:]))
+            which = bincount(hvidx, minlength=len(_list)) > 0
+            for i, subset in zip(flatnonzero(which),
+                                 _splitGroups(hvidx, len(_list), which)):
+                _list[i] = indices[subset]
 
     def _update(self, **kwargs):
         """Build hierarchical view for :class:`.AtomGroup` instances."""
@@ -218,14 +209,9 @@ class HierView(object):
         self._segments = _segments = []
         self._chains = _chains = []
 
-        nones = None
-        getnones = lambda: [None] * n_atoms if nones is None else nones
         termini = ag.getFlags('pdbter')
-        if termini is None:
-            termini = getnones()
 
         # identify segments
-        segindex = -1
         segindices = zeros(n_atoms, int)
 
         sgnms = ag._getSegnames()
@@ -241,152 +227,102 @@ class HierView(object):
                 else:
                     _segments = None
             else:
-                ps = None       # previous segment name
-                for i, s in enumerate(sgnms):
-                    if s == ps or s in _dict:
-                        continue
-                    ps = s
-                    idx = _indices[i:][sgnms[i:] == s]
-                    segindex += 1
-                    segindices[idx] = segindex
+                segindices, firsts = _groupKeys(sgnms)
+                _segments.extend(_splitGroups(segindices, len(firsts)))
+                for segindex, s in enumerate(sgnms[firsts]):
                     _dict[s] = segindex
-                    _segments.append(idx)
 
         ag._data['segindex'] = segindices
 
-        # identify chains
-        chindex = -1
+        # identify chains, atoms of a chain need not be contiguous
         chindices = zeros(n_atoms, int)
 
         chids = ag._getChids()
         if chids is None:
             _chains = None
-        else:
-            if _segments is None:
-                if len(unique(chids)) == 1:
-                    _dict[(None, chids[0] or None)] = 0
-                    _chains.append(_indices)
-                else:
-                    pc = None
-                    for i, c in enumerate(chids):
-                        if c == pc or (None, c) in _dict:
-                            continue
-                        pc = c
-                        idx = _indices[i:][chids[i:] == c]
-                        chindex += 1
-                        chindices[idx] = chindex
-                        _dict[(None, c)] = chindex
-                        _chains.append(idx)
+        elif _segments is None:
+            if len(unique(chids)) == 1:
+                _dict[(None, chids[0] or None)] = 0
+                _chains.append(_indices)
             else:
-                pc = chids[0]
-                ps = sgnms[0]
-                _i = 0
-                for i, c in enumerate(chids):
-                    s = sgnms[i]
-                    if c == pc and s == ps:
-                        continue
-                    s_c = (ps, pc or None)
-                    cid = _dict.get(s_c)
-                    idx = _indices[_i:i]
-                    if cid is None:
-                        #segment = _dict[ps]
-                        chindex += 1
-                        chindices[idx] = chindex
-                        _dict[s_c] = chindex
-                        _chains.append(idx)
-                    else:
-                        chain = _chains[cid]
-                        chindices[idx] = cid
-                        _chains[cid] = concatenate((chain, idx))
-                    pc = c
-                    ps = s
-                    _i = i
-                s_c = (ps, pc or None)
-                cid = _dict.get(s_c)
-                idx = _indices[_i:]
-                if cid is None:
-                    #segment = _dict[ps]
-                    chindex += 1
-                    chindices[idx] = chindex
-                    _dict[s_c] = chindex
-                    _chains.append(idx)
-                else:
-                    chain = _chains[cid]
-                    chindices[idx] = cid
-                    _chains[cid] = concatenate((chain, idx))
+                chindices, firsts = _groupKeys(chids)
+                _chains.extend(_splitGroups(chindices, len(firsts)))
+                for chindex, c in enumerate(chids[firsts]):
+                    _dict[(None, c)] = chindex
+        else:
+            chindices, firsts = _groupKeys(sgnms, chids)
+            _chains.extend(_splitGroups(chindices, len(firsts)))
+            for chindex, (s, c) in enumerate(zip(sgnms[firsts],
+                                                 chids[firsts])):
+                _dict[(s, c or None)] = chindex
 
         ag._data['chindex'] = chindices
 
         if kwargs.get('chain') == True:
             return
 
-        # identify residues
-        resindex = -1
-        resindices = zeros(n_atoms, int)
-
+        # identify residues, first find runs of atoms with the same segment
+        # name, chain identifier, residue number and insertion code that
+        # are not separated by a terminal atom
         rnums = ag._getResnums()
         if rnums is None:
             raise ValueError('resnums are not set')
-        if _segments is None:
-            sgnms = nones = getnones()
-        if _chains is None:
-            chids = nones = getnones()
         icods = ag._getIcodes()
-        if icods is None:
-            icods = nones = getnones()
-        pr = rnums[0]
-        pi = icods[0] or None
-        pc = chids[0]
-        ps = sgnms[0]
-        _j = 0
-        _append = _residues.append
-        _get = _dict.get
-        _set = _dict.__setitem__
-        for j, r in enumerate(rnums):
-            i = icods[j] or None
-            c = chids[j]
-            s = sgnms[j]
-            if r != pr or i != pi or c != pc or s != ps or (j and termini[j-1]):
-                s_c_r_i = (ps, pc, pr, pi)
-                rid = _get(s_c_r_i)
-                idx = _indices[_j:j]
-                if (rid is None or isinstance(rid, list) or
-                    termini[_residues[rid][-1]]):
-                    resindex += 1
-                    resindices[idx] = resindex
-                    _append(idx)
-                    if rid is None:
-                        _set(s_c_r_i, resindex)
-                    elif isinstance(rid, list):
-                        rid.append(resindex)
-                    else:
-                        _set(s_c_r_i, [rid, resindex])
-                else:
-                    residue = _residues[rid]
-                    resindices[idx] = rid
-                    _residues[rid] = concatenate((residue, idx))
-                ps = s
-                pc = c
-                pr = r
-                pi = i
-                _j = j
-        s_c_r_i = (ps, pc, pr, pi)
-        rid = _get(s_c_r_i)
-        idx = _indices[_j:]
-        if rid is None or isinstance(rid, list) or termini[_residues[rid][-1]]:
-            resindex += 1
-            resindices[idx] = resindex
-            _append(idx)
-            if rid is None:
-                _set(s_c_r_i, resindex)
-            elif isinstance(rid, list):
-                rid.append(resindex)
-            else:
-                _set(s_c_r_i, [rid, resindex])
-        else:
-            residue = _residues[rid]
-            resindices[idx] = rid
-            _residues[rid] = concatenate((residue, idx))
+        keys = [rnums]
+        if _segments is not None:
+            keys.append(sgnms)
+        if _chains is not None:
+            keys.append(chids)
+        if icods is not None:
+            keys.append(icods)
+
+        change = ones(n_atoms, bool)
+        change[1:] = termini[:-1] if termini is not None else False
+        for key in keys:
+            change[1:] |= key[1:] != key[:-1]
+        starts = flatnonzero(change)
+        ends = concatenate((starts[1:], [n_atoms])) - 1
+
+        # runs with the same keys are merged into one residue, unless a run
+        # of the residue ends with a terminal atom, in which case that run
+        # and all following runs with the same keys are separate residues
+        groups, firsts = _groupKeys(*[key[starts] for key in keys])
+        n_runs = len(starts)
+        order = groups.argsort(kind='mergesort')
+        first = ones(n_runs, bool)
+        first[1:] = groups[order[1:]] != groups[order[:-1]]
+        separate = first.copy()
+        if termini is not None:
+            after = zeros(n_runs, bool)
+            after[1:] = termini[ends[order[:-1]]]
+            after[first] = False
+            after = after.cumsum()
+            separate |= after > after[first][first.cumsum() - 1]
+        new = zeros(n_runs, bool)
+        new[order] = separate
+
+        runindices = new.cumsum() - 1
+        runindices = where(new, runindices, runindices[firsts[groups]])
+        resindices = repeat(runindices, ends - starts + 1)
+        _residues.extend(_splitGroups(resindices, new.sum()))
+
+        # residues of keys that appear in separate residues are listed
+        n_keys = len(firsts)
+        firsts = starts[firsts]
+        sgnms = (sgnms[firsts].tolist() if _segments is not None else
+                 [None] * n_keys)
+        chids = (chids[firsts].tolist() if _chains is not None else
+                 [None] * n_keys)
+        icods = ([i or None for i in icods[firsts].tolist()]
+                 if icods is not None else [None] * n_keys)
+        keys = list(zip(sgnms, chids, rnums[firsts].tolist(), icods))
+        _dict.update(zip(keys, resindices[firsts].tolist()))
+        groups = groups[new]
+        counts = bincount(groups, minlength=n_keys)
+        if len(groups) > n_keys:
+            for group, subset in zip(flatnonzero(counts > 1),
+                                     _splitGroups(groups, n_keys, counts > 1)):
+                _dict[keys[group]] = subset.tolist()
 
         ag._data['resindex'] = resindices
 
@@ -504,3 +440,39 @@ class HierView(object):
                 item = alist[i] = Segment(ag, item, self, acsi, selstr=selstr,
                                           unique=True)
             yield item
+
+
+
+def _groupKeys(*keys):
+    """Returns group indices of elements of *keys* arrays and positions of
+    first elements of groups.  Elements with equal values for all *keys* are
+    in the same group and groups are numbered in the order they appear."""
+
+    order = lexsort(keys[::-1])
+    change = zeros(len(order), bool)
+    change[:1] = True
+    for key in keys:
+        key = key[order]
+        change[1:] |= key[1:] != key[:-1]
+    starts = flatnonzero(change)
+    firsts = order[starts]
+    ranks = zeros(len(firsts), int)
+    ranks[firsts.argsort()] = arange(len(firsts))
+    groups = zeros(len(order), int)
+    groups[order] = repeat(ranks, diff(concatenate((starts, [len(order)]))))
+    firsts.sort()
+    return groups, firsts
+
+
+def _splitGroups(groups, number, which=None):
+    """Returns a list of *number* arrays containing positions of elements
+    of *groups* array with group indices from 0 to *number* - 1.  When
+    *which* is given, only arrays for groups where it is **True** are
+    returned."""
+
+    order = groups.argsort(kind='mergesort')
+    stops = bincount(groups, minlength=number).cumsum()
+    starts = concatenate(([0], stops[:-1]))
+    if which is not None:
+        starts, stops = starts[which], stops[which]
+    return [order[start:stop] for start, stop in zip(starts, stops)]
@@ -174,6 +174,12 @@ class AtomPointer(Atomic):
 
         return self._ag._getKDTree(self.getACSIndex())
 
+    def _getCellGrid(self, cellsize):
+        """Returns :class:`.CellGrid` for the active coordinate set from the
+        atom group."""
+
+        return self._ag._getCellGrid(cellsize, self.getACSIndex())
+
     def getAtomGroup(self):
         """Returns associated atom group."""
 
@@ -441,11 +441,11 @@ all alphanumeric characters."""
 
 import sys
 from re import compile as re_compile
-from collections import Iterable
+from collections import Iterable, OrderedDict
 
 import numpy as np
 from numpy import array, ndarray, ones, zeros, arange
-from numpy import invert, unique, concatenate, all, any
+from numpy import invert, concatenate, all, any
 from numpy import logical_and, logical_or, floor, ceil, where
 
 try:
@@ -471,7 +471,7 @@ from .segment import Segment
 from .atommap import AtomMap
 
 from prody.utilities import rangeString
-from prody.kdtree import KDTree
+from prody.kdtree import CellGrid
 
 if PY2K:
     range = xrange
@@ -803,12 +803,60 @@ PP_NRANGE.setParseAction(rangeParseAction)
 
 UNARY = set(['not', 'bonded', 'exbonded', 'within', 'exwithin', 'same'])
 
+PLANCACHE = 512
+"""Number of selection plans kept by a :class:`.Select` instance."""
+
+
+class Plan(object):
+
+    """A step of a selection plan, i.e. a call to a :class:`.Select` method
+    named *action* with the tokens parsed at *loc*.  Tokens are strings,
+    values parsed from ranges, special characters and regular expressions,
+    lists of tokens, or plans evaluated before *action* is called.  Plans
+    contain no data of the atoms they are evaluated for."""
+
+    __slots__ = ['action', 'loc', 'tokens']
+
+    def __init__(self, action, loc, tokens):
+
+        self.action = action
+        self.loc = loc
+        self.tokens = tokens
+
+    def __repr__(self):
+
+        return 'Plan({0}, {1}, {2})'.format(repr(self.action), self.loc,
+                                           repr(self.tokens))
+
+
+def planTokens(tokens):
+    """Returns parsed *tokens* as nested lists."""
+
+    return [planTokens(token) if isinstance(token, pp.ParseResults) else token
+            for token in tokens]
+
+
+def planAction(action):
+    """Returns a parse action that records a call to :class:`.Select` method
+    named *action* in a :class:`Plan`."""
+
+    def record(sel, loc, tokens):
+
+        return Plan(action, loc, planTokens(tokens))
+
+    return record
+
 
 class Select(object):
 
     """Select subsets of atoms based on a selection string.
     See :mod:`~.atomic.select` module documentation for selection grammar
-    and examples.  This class makes use of pyparsing_ module."""
+    and examples.  This class makes use of pyparsing_ module.
+
+    Selection strings are parsed into plans of method calls, which do not
+    depend on atoms.  Recently used plans are cached, so that repeated
+    selections, e.g. for frames of a trajectory or for many structures, are
+    evaluated without parsing.  See :meth:`getCacheInfo`."""
 
     def __init__(self):
 
@@ -826,6 +874,9 @@ class Select(object):
         self._replace = False
 
         self._parsers = {}
+        self._plans = OrderedDict()
+        self._hits = 0
+        self._misses = 0
 
 
         self._evalmap = {'resnum': self._resnum, 'resid': self._resnum,
@@ -996,6 +1047,49 @@ class Select(object):
                                      'user data label')
 
         selstr = replaceMacros(selstr)
+        torf = self._evalPlan(selstr, self._getPlan(selstr))
+
+        if not isinstance(torf, ndarray):
+            if DEBUG: print(torf)
+            raise SelectionError(selstr)
+        elif torf.dtype != bool:
+            if DEBUG:
+                print('_select torf.dtype', torf.dtype, isinstance(torf.dtype,
+                                                                   bool))
+            raise SelectionError(selstr)
+        if DEBUG:
+            print('_select', torf)
+        return torf
+
+    def getCacheInfo(self):
+        """Returns a dictionary with number of selection strings whose plans
+        were found in the cache (*hits*) or parsed (*misses*), and number of
+        plans in the cache (*size*) out of *maxsize*."""
+
+        return {'hits': self._hits, 'misses': self._misses,
+                'size': len(self._plans), 'maxsize': PLANCACHE}
+
+    def clearCache(self):
+        """Remove all selection plans from the cache and reset counters."""
+
+        self._plans.clear()
+        self._hits = self._misses = 0
+
+    def _getPlan(self, selstr):
+        """Returns :class:`Plan` for evaluating *selstr*.  Selection strings
+        are parsed only when their plans are not found in the cache, which
+        keeps recently used plans."""
+
+        plans = self._plans
+        try:
+            plan = plans.pop(selstr)
+        except KeyError:
+            self._misses += 1
+        else:
+            self._hits += 1
+            plans[selstr] = plan
+            return plan
+
         try:
             parser = self._getParser(selstr)
             tokens = parser(selstr, parseAll=True)
@@ -1018,19 +1112,36 @@ class Select(object):
             raise SelectionError(selstr, err.column, msg + '\n' + str(err))
         else:
             if DEBUG: print('_evalSelstr', tokens)
-            torf = tokens[0]
+            plan = tokens[0]
 
-        if not isinstance(torf, ndarray):
-            if DEBUG: print(torf)
-            raise SelectionError(selstr)
-        elif torf.dtype != bool:
-            if DEBUG:
-                print('_select torf.dtype', torf.dtype, isinstance(torf.dtype,
-                                                                   bool))
-            raise SelectionError(selstr)
-        if DEBUG:
-            print('_select', torf)
-        return torf
+        plans[selstr] = plan
+        if len(plans) > PLANCACHE:
+            plans.popitem(last=False)
+        return plan
+
+    def _evalPlan(self, sel, plan):
+        """Returns the result of calling the method of *plan* with its tokens,
+        after evaluating plans among them.  Errors other than
+        :exc:`SelectionError` are raised as :exc:`SelectionError` at the
+        location of *plan*."""
+
+        try:
+            return getattr(self, plan.action)(sel, plan.loc,
+                                              self._evalTokens(sel,
+                                                               plan.tokens))
+        except SelectionError:
+            raise
+        except Exception as err:
+            raise SelectionError(sel, plan.loc, '{0}: {1}'
+                                 .format(type(err).__name__, err))
+
+    def _evalTokens(self, sel, tokens):
+
+        return pp.ParseResults([self._evalPlan(sel, token)
+                                if isinstance(token, Plan) else
+                                self._evalTokens(sel, token)
+                                if isinstance(token, list) else token
+                                for token in tokens])
 
     def _getParser(self, selstr):
         """Returns an efficient parser that can handle *selstr*."""
@@ -1069,22 +1180,23 @@ class Select(object):
 
         oplist = []
         if funcs:
-            oplist.append((FUNCNAMES_OPLIST, 1, pp.opAssoc.RIGHT, self._func))
+            oplist.append((FUNCNAMES_OPLIST, 1, pp.opAssoc.RIGHT,
+                           planAction('_func')))
             # following causes 20% slow down
             #word += FUNCNAMES_EXPR
 
         if funcs or opers:
             oplist.extend([
-                (pp.oneOf('+ -'), 1, pp.opAssoc.RIGHT, self._sign),
-                (pp.oneOf('** ^'), 2, pp.opAssoc.LEFT, self._pow),
-                (pp.oneOf('* / %'), 2, pp.opAssoc.LEFT, self._binop),
-                (pp.oneOf('+ -'), 2, pp.opAssoc.LEFT, self._binop),
+                (pp.oneOf('+ -'), 1, pp.opAssoc.RIGHT, planAction('_sign')),
+                (pp.oneOf('** ^'), 2, pp.opAssoc.LEFT, planAction('_pow')),
+                (pp.oneOf('* / %'), 2, pp.opAssoc.LEFT, planAction('_binop')),
+                (pp.oneOf('+ -'), 2, pp.opAssoc.LEFT, planAction('_binop')),
                 (pp.oneOf('< > <= >= == = !='), 2, pp.opAssoc.LEFT,
-                 self._comp)])
+                 planAction('_comp'))])
 
         oplist.extend([
-          (pp.Optional(AND), 2, pp.opAssoc.LEFT, self._and),
-          (OR, 2, pp.opAssoc.LEFT, self._or)])
+          (pp.Optional(AND), 2, pp.opAssoc.LEFT, planAction('_and')),
+          (OR, 2, pp.opAssoc.LEFT, planAction('_or'))])
 
         word += WORD
 
@@ -1094,7 +1206,7 @@ class Select(object):
         if nrange: expr = PP_NRANGE | expr
 
         parser = pp.operatorPrecedence(expr, oplist)
-        parser.setParseAction(self._default)
+        parser.setParseAction(planAction('_default'))
         parser.leaveWhitespace()
         parser.enablePackrat()
         self._parsers[key] = parser, expr, oplist
@@ -1103,7 +1215,7 @@ class Select(object):
     def _noParser(self, selstr, parseAll=True):
 
         debug(selstr, 0, ['_noParser'])
-        return [self._default(selstr, 0, selstr.split())]
+        return [Plan('_default', 0, selstr.split())]
 
     def _getZeros(self, subset=None):
         """Returns a bool array with zero elements."""
@@ -1631,40 +1743,26 @@ class Select(object):
             else:
                 return None, SelectionError(sel, loc, 'not understood')
 
-        if other or len(which) < 20:
-            kdtree = self._atoms._getKDTree()
-            get_indices = kdtree.getIndices
-            search = kdtree.search
-            get_count = kdtree.getCount
-            torf = zeros(self._ag.numAtoms(), bool)
-            for index in which:
-                search(within, coords[index])
-                if get_count():
-                    torf[get_indices()] = True
+        # atoms near points are found using a grid of all atoms that is
+        # cached for the coordinate set, unless selected atoms outnumber
+        # others, which are then looked up in a grid of selected atoms
+        cellsize = max(within, 1.)
+        if other or 2 * len(which) <= len(coords):
+            grid = self._atoms._getCellGrid(cellsize)
+            torf = grid.getWithin(within, coords[which])
             if self._indices is not None:
                 torf = torf[self._indices]
             if exclude:
                 torf[which] = False
 
         else:
-            n_atoms = self._ag.numAtoms()
-            torf = ones(n_atoms, bool)
+            torf = ones(len(coords), bool)
             torf[which] = False
             check = torf.nonzero()[0]
-            torf = zeros(n_atoms, bool)
-
-            cxyz = coords[check]
-            kdtree = KDTree(coords[which])
-            search = kdtree.search
-            get_count = kdtree.getCount
-            select = []
-            append = select.append
-            for i, xyz in enumerate(cxyz):
-                search(within, xyz)
-                if get_count():
-                    append(i)
-
-            torf[check[select]] = True
+            torf = zeros(len(coords), bool)
+
+            grid = CellGrid(coords[which], cellsize)
+            torf[check[grid.getNear(within, coords[check])]] = True
             if not exclude:
                 torf[which] = True
 
@@ -1684,10 +1782,13 @@ class Select(object):
                 ' not {0}'.format(repr(what)), [label])
 
         indices, err = self._getData(sel, loc, index)
-        iset = set(indices[which])
-        torf = array([i in iset for i in indices], bool)
-
-        return torf, False
+        if err:
+            return None, err
+        # entity indices are non-negative, so marking indices of selected
+        # entities and looking them up for all atoms avoids sorting
+        marked = zeros(indices.max() + 1, bool)
+        marked[indices[which]] = True
+        return marked[indices], False
 
     def _bondedto(self, sel, loc, tokens):
         """Expand selection to immediately bonded atoms."""
@@ -1727,21 +1828,26 @@ class Select(object):
         if indices is not None:
             bmap = bmap[indices]
         n_atoms = self._ag.numAtoms()
+        exclude = label.startswith('ex')
         for i in range(repeat):
-            torf = zeros(n_atoms, bool)
-            bonded = unique(bmap[which])
-            if bonded[0] == -1:
-                torf[bonded[1:]] = True
-            else:
-                torf[bonded] = True
-            if indices is not None:
-                torf = torf[indices]
-            if label.startswith('ex'):
-                torf[which] = False
+            # rows of bond map are padded with -1, which marks the last item
+            bonded = zeros(n_atoms + 1, bool)
+            bonded[bmap[which]] = True
+            if indices is None:
+                bonded = bonded[:n_atoms]
             else:
-                torf[which] = True
-            if i + 1 < repeat:
+                bonded = bonded[indices]
+            if exclude:
+                bonded[which] = False
+                torf = bonded
                 which = torf.nonzero()[0]
+            else:
+                # atoms bonded to those selected in earlier steps are
+                # already selected, so only newly selected atoms are expanded
+                which = (bonded > torf).nonzero()[0]
+                torf = torf | bonded
+                if not len(which):
+                    break
 
         return torf, False
 
@@ -37,6 +37,9 @@ calculations:
   * :class:`.GammaStructureBased` - secondary structure based force constants
   * :class:`.GammaVariableCutoff` - atom type based variable cutoff function
 
+Eigenvalue solvers used by :meth:`.ANM.calcModes` and :meth:`.GNM.calcModes`
+can be selected using *solver* argument, see :func:`.solveEigh`.
+
 Function library
 ================
 
@@ -237,6 +240,10 @@ __all__.extend(modeset.__all__)
 
 nma.ModeSet = ModeSet
 
+from . import eigtools
+from .eigtools import *
+__all__.extend(eigtools.__all__)
+
 from . import gamma
 from .gamma import *
 __all__.extend(gamma.__all__)
@@ -7,11 +7,12 @@ import numpy as np
 from prody import LOGGER
 from prody.atomic import Atomic, AtomGroup
 from prody.proteins import parsePDB
-from prody.utilities import importLA, checkCoords
+from prody.utilities import checkCoords
 from prody.kdtree import KDTree
 
 from .nma import NMA
-from .gnm import GNMBase, ZERO, checkENMParameters
+from .gnm import GNMBase, ZERO, checkENMParameters, getContacts, getGammas
+from .eigtools import solveEigh, calcRigidBodyVectors
 
 __all__ = ['ANM', 'calcANM']
 
@@ -25,14 +26,24 @@ class ANMBase(NMA):
         self._gamma = None
         self._hessian = None
         self._stiffness = None 
+        self._coords = None
 
     def _reset(self):
 
         GNMBase._reset(self)
         self._hessian = None
         self._stiffness = None
+        self._coords = None
         self._is3d = True
 
+    def _getZeroVectors(self):
+        """Returns rigid body motions of the coordinates used for building
+        the Hessian matrix, or **None** when they are not available."""
+
+        if self._coords is None:
+            return None
+        return calcRigidBodyVectors(self._coords)
+
     def getHessian(self):
         """Returns a copy of the Hessian matrix."""
 
@@ -188,15 +199,23 @@ class ANMBase(NMA):
             Scipy is not found, :class:`ImportError` is raised.
         :type sparse: bool
 
-        :arg kdtree: elect to use KDTree for building Hessian matrix,
-            default is **False** since KDTree method is slower
+        :arg kdtree: elect to use KDTree for building Hessian matrix when
+            *engine* is ``'loop'``, default is **False** since KDTree method
+            is slower
         :type kdtree: bool
 
+        :arg engine: method for building the Hessian, ``'vectorized'``
+            (default) finds all contacts in a single KDTree search and
+            assembles the matrices from arrays of super elements, ``'loop'``
+            fills in the matrices one contact at a time
+        :type engine: str
+
         Instances of :class:`Gamma` classes and custom functions are
         accepted as *gamma* argument.
 
         When Scipy is available, user can select to use sparse matrices for
-        efficient usage of memory at the cost of computation speed."""
+        efficient usage of memory at the cost of computation speed.  Sparse
+        matrices built by the vectorized engine are in CSR format."""
 
         try:
             coords = (coords._getCoords() if hasattr(coords, '_getCoords') else
@@ -208,6 +227,10 @@ class ANMBase(NMA):
                 raise TypeError('coords must be a Numpy array or an object '
                                 'with `getCoords` method')
 
+        engine = kwargs.get('engine', 'vectorized')
+        if engine not in ('vectorized', 'loop'):
+            raise ValueError("engine must be 'vectorized' or 'loop'")
+
         cutoff, g, gamma = checkENMParameters(cutoff, gamma)
         self._reset()
         self._cutoff = cutoff
@@ -217,7 +240,10 @@ class ANMBase(NMA):
         dof = n_atoms * 3
         LOGGER.timeit('_anm_hessian')
 
-        if kwargs.get('sparse', False):
+        if engine == 'vectorized':
+            kirchhoff, hessian = buildHessianArrays(
+                coords, cutoff, g, gamma, kwargs.get('sparse', False))
+        elif kwargs.get('sparse', False):
             try:
                 from scipy import sparse as scipy_sparse
             except ImportError:
@@ -229,7 +255,7 @@ class ANMBase(NMA):
             kirchhoff = np.zeros((n_atoms, n_atoms), 'd')
             hessian = np.zeros((dof, dof), float)
 
-        if kwargs.get('kdtree', False):
+        if engine == 'loop' and kwargs.get('kdtree', False):
             LOGGER.info('Using KDTree for building the Hessian.')
             kdtree = KDTree(coords)
             kdtree.search(cutoff)
@@ -252,7 +278,7 @@ class ANMBase(NMA):
                 kirchhoff[j, i] = -g
                 kirchhoff[i, i] = kirchhoff[i, i] - g
                 kirchhoff[j, j] = kirchhoff[j, j] - g
-        else:
+        elif engine == 'loop':
             cutoff2 = cutoff * cutoff
             for i in range(n_atoms):
                 res_i3 = i*3
@@ -281,13 +307,14 @@ class ANMBase(NMA):
         LOGGER.report('Hessian was built in %.2fs.', label='_anm_hessian')
         self._kirchhoff = kirchhoff
         self._hessian = hessian
+        self._coords = coords.copy()
         self._n_atoms = n_atoms
         self._dof = dof
 
-    def calcModes(self, n_modes=20, zeros=False, turbo=True):
-        """Calculate normal modes.  This method uses :func:`scipy.linalg.eigh`
-        function to diagonalize the Hessian matrix. When Scipy is not found,
-        :func:`numpy.linalg.eigh` is used.
+    def calcModes(self, n_modes=20, zeros=False, turbo=True, **kwargs):
+        """Calculate normal modes.  By default, this method uses
+        :func:`scipy.linalg.eigh` function to diagonalize the Hessian matrix.
+        When Scipy is not found, :func:`numpy.linalg.eigh` is used.
 
         :arg n_modes: number of non-zero eigenvalues/vectors to calculate.
             If ``None`` or 'all' is given, all modes will be calculated.
@@ -298,7 +325,17 @@ class ANMBase(NMA):
 
         :arg turbo: Use a memory intensive, but faster way to calculate modes.
         :type turbo: bool, default is ``True``
-        """
+
+        :arg solver: eigenvalue solver, one of ``'dense'``,
+            ``'shiftinvert'``, ``'lobpcg'``, or ``'auto'`` (default) for
+            selecting one based on size and sparsity of the Hessian and
+            *n_modes*, see :mod:`~prody.dynamics.eigtools`
+        :type solver: str
+
+        Other keyword arguments are passed to the solver.  When the Hessian
+        is built using :meth:`buildHessian`, iterative solvers search for
+        non-zero modes orthogonal to rigid body motions, which are returned
+        as the zero modes."""
 
         if self._hessian is None:
             raise ValueError('Hessian matrix is not built or set')
@@ -308,45 +345,11 @@ class ANMBase(NMA):
             'n_modes must be a positive integer'
         assert isinstance(zeros, bool), 'zeros must be a boolean'
         assert isinstance(turbo, bool), 'turbo must be a boolean'
-        linalg = importLA()
         LOGGER.timeit('_anm_calc_modes')
         shift = 5
-        if linalg.__package__.startswith('scipy'):
-            if n_modes is None:
-                eigvals = None
-                n_modes = self._dof
-            else:
-                if n_modes >= self._dof:
-                    eigvals = None
-                    n_modes = self._dof
-                else:
-                    eigvals = (0, n_modes + shift)
-            if eigvals:
-                turbo = False
-            if isinstance(self._hessian, np.ndarray):
-                values, vectors = linalg.eigh(self._hessian, turbo=turbo,
-                                              eigvals=eigvals)
-            else:
-                try:
-                    from scipy.sparse import linalg as scipy_sparse_la
-                except ImportError:
-                    raise ImportError('failed to import scipy.sparse.linalg, '
-                                      'which is required for sparse matrix '
-                                      'decomposition')
-                try:
-                    values, vectors = (
-                        scipy_sparse_la.eigsh(self._hessian, k=n_modes+6,
-                                              which='SA'))
-                except:
-                    values, vectors = (
-                        scipy_sparse_la.eigen_symmetric(self._hessian,
-                                                        k=n_modes+6,
-                                                        which='SA'))
-
-        else:
-            if n_modes is not None:
-                LOGGER.info('Scipy is not found, all modes are calculated.')
-            values, vectors = np.linalg.eigh(self._hessian)
+        values, vectors, _ = solveEigh(self._hessian, n_modes, 6,
+                                       zero_vectors=self._getZeroVectors(),
+                                       turbo=turbo, **kwargs)
         n_zeros = sum(values < ZERO)
 
         if n_zeros < 6:
@@ -357,10 +360,7 @@ class ANMBase(NMA):
             shift = n_zeros - 1
         if zeros:
             shift = -1
-        if n_zeros > n_modes:
-            self._eigvals = values[1+shift:]
-        else:
-            self._eigvals = values[1+shift:]
+        self._eigvals = values[1+shift:]
         self._vars = 1 / self._eigvals
         self._trace = self._vars.sum()
         
@@ -424,6 +424,66 @@ class ANMBase(NMA):
                                    .format(np.min(sm[np.nonzero(sm)]), np.amax(sm)))
         
 
+def buildHessianArrays(coords, cutoff, g, gamma, sparse=False):
+    """Returns Kirchhoff and Hessian matrices for *coords*.  All contacts
+    within *cutoff* are found at once, their 3x3 super elements are
+    calculated in a single vectorized step, and matrices are assembled from
+    arrays of super elements.  *g* and *gamma* are as returned by
+    :func:`.checkENMParameters`.  When *sparse* is **True**, matrices are
+    returned in :class:`scipy.sparse.csr_matrix` format."""
+
+    n_atoms = coords.shape[0]
+    dof = n_atoms * 3
+    i, j, i2j, dist2 = getContacts(coords, cutoff)
+    gammas = getGammas(g, gamma, dist2, i, j)
+
+    super_elements = ((i2j[:, :, None] * i2j[:, None, :]) *
+                      (- gammas / dist2)[:, None, None])
+    diagonal = np.zeros((n_atoms, 9))
+    for k, elements in enumerate(super_elements.reshape((-1, 9)).T):
+        diagonal[:, k] = -(np.bincount(i, elements, n_atoms) +
+                           np.bincount(j, elements, n_atoms))
+    diagonal = diagonal.reshape((n_atoms, 3, 3))
+    kdiagonal = -(np.bincount(i, gammas, n_atoms) +
+                  np.bincount(j, gammas, n_atoms))
+    index = np.arange(n_atoms)
+
+    if sparse:
+        try:
+            from scipy import sparse as scipy_sparse
+        except ImportError:
+            raise ImportError('failed to import scipy.sparse, which  is '
+                              'required for sparse matrix calculations')
+        rows = np.concatenate([i, j, index])
+        cols = np.concatenate([j, i, index])
+        kirchhoff = scipy_sparse.coo_matrix(
+            (np.concatenate([-gammas, -gammas, kdiagonal]), (rows, cols)),
+            shape=(n_atoms, n_atoms)).tocsr()
+
+        blocks = np.concatenate([super_elements, super_elements, diagonal])
+        offset = np.arange(3)
+        rows = np.broadcast_to(rows[:, None, None] * 3 + offset[:, None],
+                               blocks.shape)
+        cols = np.broadcast_to(cols[:, None, None] * 3 + offset,
+                               blocks.shape)
+        hessian = scipy_sparse.coo_matrix(
+            (blocks.ravel(), (rows.ravel(), cols.ravel())),
+            shape=(dof, dof)).tocsr()
+    else:
+        kirchhoff = np.zeros((n_atoms, n_atoms), 'd')
+        kirchhoff[i, j] = -gammas
+        kirchhoff[j, i] = -gammas
+        kirchhoff[index, index] = kdiagonal
+
+        hessian = np.zeros((n_atoms, 3, n_atoms, 3), float)
+        hessian[i, :, j, :] = super_elements
+        hessian[j, :, i, :] = super_elements
+        hessian[index, :, index, :] = diagonal
+        hessian = hessian.reshape((dof, dof))
+
+    return kirchhoff, hessian
+
+
 class ANM(ANMBase, GNMBase):
 
     """Class for Anisotropic Network Model (ANM) analysis of proteins
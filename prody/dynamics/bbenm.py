@@ -2,14 +2,12 @@
 """This module defines a class and a function for rotating translating blocks
 (RTB) calculations."""
 
-import numpy as np
-
 from prody import LOGGER
 from prody.atomic import Atomic, AtomGroup
 from prody.proteins import parsePDB
 from prody.utilities import importLA, checkCoords
 
-from .anm import ANMBase
+from .anm import ANMBase, buildHessianArrays
 from .gnm import GNMBase, ZERO, checkENMParameters
 from numpy import eye, arccos, zeros, linalg, dot, tan, sqrt, pi
 
@@ -77,32 +75,12 @@ class bbENM(ANMBase):
         LOGGER.timeit('_bbenm')
         self._n_atoms = natoms = int(coords.shape[0])
 
-        self._hessian = hessian = np.zeros((3*natoms, 3*natoms), float)
         self._dof = 3*natoms - 6
-        
+
         # anm hessian calculation 
         cutoff, gamma, gamma_func = checkENMParameters(cutoff, gamma)
-        cutoff2 = cutoff * cutoff
-        for i in range(natoms):
-            res_i3 = i*3
-            res_i33 = res_i3+3
-            i_p1 = i+1
-            i2j_all = coords[i_p1:, :] - coords[i]
-            for j, dist2 in enumerate((i2j_all ** 2).sum(1)):
-                if dist2 > cutoff2:
-                    continue
-                i2j = i2j_all[j]
-                j += i_p1
-                g = gamma_func(dist2, i, j)
-                res_j3 = j*3
-                res_j33 = res_j3+3
-                super_element = np.outer(i2j, i2j) * (- g / dist2)
-                hessian[res_i3:res_i33, res_j3:res_j33] = super_element
-                hessian[res_j3:res_j33, res_i3:res_i33] = super_element
-                hessian[res_i3:res_i33, res_i3:res_i33] = \
-                    hessian[res_i3:res_i33, res_i3:res_i33] - super_element
-                hessian[res_j3:res_j33, res_j3:res_j33] = \
-                    hessian[res_j3:res_j33, res_j3:res_j33] - super_element
+        self._hessian = hessian = buildHessianArrays(coords, cutoff, gamma,
+                                                     gamma_func)[1]
 
         # hessian updates
         from .bbenmtools import buildhessian
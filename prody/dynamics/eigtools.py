@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""This module defines functions for solving the eigenvalue problems of
+elastic network models.  Solvers are registered in :data:`SOLVERS` and are
+selected by name, or automatically based on matrix size, sparsity, and the
+number of requested modes.
+
+  * ``'dense'`` - LAPACK eigenvalue decomposition of dense matrices
+  * ``'shiftinvert'`` - ARPACK in shift-invert mode with a shift slightly
+    below zero, using a sparse LU or a dense Cholesky factorization
+  * ``'lobpcg'`` - locally optimal block preconditioned conjugate gradient
+    method with a Jacobi preconditioner
+
+When a basis for the null space of the matrix is known, e.g. rigid body
+motions for ANM or the uniform vector for GNM, iterative solvers search for
+the non-zero modes in its orthogonal complement and the basis vectors are
+returned as zero modes, instead of asking the solver for extra eigenpairs."""
+
+import time
+
+import numpy as np
+
+from prody import LOGGER
+from prody.utilities import importLA
+
+__all__ = ['solveEigh', 'calcRigidBodyVectors']
+
+DENSE_MAX = 3000
+"""Matrices of size up to this are always diagonalized using dense solver."""
+
+SPLU_MAX = 30000
+"""Sparse matrices larger than this are diagonalized using LOBPCG, since
+fill-in makes factorization of larger matrices memory intensive."""
+
+SPARSITY = 0.1
+"""Dense matrices with a smaller fraction of non-zero elements than this
+are converted to sparse format when an iterative solver is selected."""
+
+
+def calcRigidBodyVectors(coords):
+    """Returns an orthonormal basis for translations and rotations of *coords*
+    as an array with shape ``(3 * n_atoms, n)``, where *n* is 6, or 5 for
+    linear systems."""
+
+    n_atoms = coords.shape[0]
+    centered = coords - coords.mean(0)
+    basis = np.zeros((6, n_atoms, 3))
+    for axis in range(3):
+        basis[axis, :, axis] = 1
+        unit = np.zeros(3)
+        unit[axis] = 1
+        basis[axis + 3] = np.cross(unit, centered)
+    basis = basis.reshape((6, n_atoms * 3)).T
+    left, values, _ = np.linalg.svd(basis, full_matrices=False)
+    return left[:, values > values.max() * 1e-8]
+
+
+def selectSolver(matrix, n_modes, n_zeros):
+    """Returns name of the solver suitable for calculating *n_modes* non-zero
+    modes of *matrix* that has *n_zeros* zero modes.  *n_modes* is **None**
+    when all modes are requested."""
+
+    dof = matrix.shape[0]
+    if (n_modes is None or dof <= DENSE_MAX or
+            (n_modes + n_zeros) * 5 > dof):
+        return 'dense'
+    if isinstance(matrix, np.ndarray):
+        if np.count_nonzero(matrix) > SPARSITY * matrix.size:
+            return 'dense'
+    if dof > SPLU_MAX:
+        return 'lobpcg'
+    return 'shiftinvert'
+
+
+def solveEigh(matrix, n_modes=None, n_zeros=0, solver='auto',
+              zero_vectors=None, turbo=True, **kwargs):
+    """Returns eigenvalues and eigenvectors of symmetric *matrix* in ascending
+    order, and a dictionary with *solver* name, solution *time*, and number
+    of *iterations*.
+
+    :arg matrix: a symmetric matrix
+    :type matrix: :class:`numpy.ndarray`, :mod:`scipy.sparse` matrix
+
+    :arg n_modes: number of non-zero modes, **None** for all modes
+    :type n_modes: int
+
+    :arg n_zeros: expected number of zero modes
+    :type n_zeros: int
+
+    :arg solver: one of solvers in :data:`SOLVERS` or ``'auto'``
+    :type solver: str
+
+    :arg zero_vectors: orthonormal basis for the null space of *matrix*
+    :type zero_vectors: :class:`numpy.ndarray`
+
+    :arg turbo: use a memory intensive, but faster way in dense solver
+    :type turbo: bool
+
+    Solvers return *n_zeros* + *n_modes* eigenpairs.  Other keyword arguments
+    are passed to the solver, e.g. *sigma* for shift-invert mode, or *tol*
+    and *maxiter* for LOBPCG."""
+
+    dof = matrix.shape[0]
+    if n_modes is not None and n_modes + n_zeros >= dof:
+        n_modes = None
+    if solver == 'auto':
+        solver = selectSolver(matrix, n_modes, n_zeros)
+    elif solver not in SOLVERS:
+        raise ValueError('solver must be one of {0} or auto'
+                         .format(', '.join(repr(key) for key in SOLVERS)))
+    if n_modes is None and solver != 'dense':
+        LOGGER.info('All modes are requested, dense solver will be used.')
+        solver = 'dense'
+    if solver != 'dense' and isinstance(matrix, np.ndarray):
+        if np.count_nonzero(matrix) <= SPARSITY * matrix.size:
+            from scipy import sparse
+            matrix = sparse.csr_matrix(matrix)
+
+    if zero_vectors is not None and solver != 'dense':
+        if zero_vectors.shape[0] != dof:
+            raise ValueError('zero_vectors must have {0} rows'.format(dof))
+        n_zeros = zero_vectors.shape[1]
+    else:
+        zero_vectors = None
+
+    start = time.time()
+    values, vectors, iterations = SOLVERS[solver](
+        matrix, n_modes, n_zeros, zero_vectors, turbo=turbo, **kwargs)
+    if zero_vectors is not None:
+        values = np.concatenate([(matrix.dot(zero_vectors) *
+                                  zero_vectors).sum(0), values])
+        vectors = np.concatenate([zero_vectors, vectors], 1)
+    info = {'solver': solver, 'time': time.time() - start,
+            'iterations': iterations}
+    LOGGER.debug('Eigenvalue problem was solved using {0} solver in '
+                 '{1:.2f}s ({2} iterations).'
+                 .format(solver, info['time'], iterations))
+    return values, vectors, info
+
+
+def _solveDense(matrix, n_modes, n_zeros, zero_vectors, turbo=True,
+                **kwargs):
+
+    if not isinstance(matrix, np.ndarray):
+        matrix = matrix.toarray()
+    linalg = importLA()
+    if linalg.__package__.startswith('scipy'):
+        if n_modes is None:
+            eigvals = None
+        else:
+            eigvals = (0, n_modes + n_zeros - 1)
+            turbo = False
+        values, vectors = linalg.eigh(matrix, turbo=turbo, eigvals=eigvals)
+    else:
+        if n_modes is not None:
+            LOGGER.info('Scipy is not found, all modes are calculated.')
+        values, vectors = linalg.eigh(matrix)
+    return values, vectors, 0
+
+
+def _project(vectors, zero_vectors):
+
+    if zero_vectors is None:
+        return vectors
+    return vectors - zero_vectors.dot(zero_vectors.T.dot(vectors))
+
+
+def _solveShiftInvert(matrix, n_modes, n_zeros, zero_vectors, **kwargs):
+
+    try:
+        from scipy import sparse
+        from scipy.sparse import linalg as scipy_sparse_la
+    except ImportError:
+        raise ImportError('failed to import scipy.sparse.linalg, '
+                          'which is required for sparse matrix '
+                          'decomposition')
+    dof = matrix.shape[0]
+    sigma = kwargs.get('sigma')
+    if sigma is None:
+        sigma = -1e-3 * np.abs(matrix.diagonal()).mean()
+    if isinstance(matrix, np.ndarray):
+        from scipy.linalg import cho_factor, cho_solve
+        factor = cho_factor(matrix - sigma * np.eye(dof))
+        solve = lambda x: cho_solve(factor, x)
+    else:
+        shifted = sparse.csc_matrix(matrix - sigma * sparse.identity(dof))
+        solve = scipy_sparse_la.splu(shifted).solve
+
+    n_calls = [0]
+    def matvec(x):
+        n_calls[0] += 1
+        return _project(solve(_project(x, zero_vectors)), zero_vectors)
+
+    k = n_modes if zero_vectors is not None else n_modes + n_zeros
+    operator = scipy_sparse_la.LinearOperator((dof, dof), matvec=matvec,
+                                              dtype=float)
+    values, vectors = scipy_sparse_la.eigsh(
+        matrix, k=k, sigma=sigma, which='LM', OPinv=operator,
+        tol=kwargs.get('tol', 0), maxiter=kwargs.get('maxiter'))
+    order = values.argsort()
+    return values[order], vectors[:, order], n_calls[0]
+
+
+def _solveLOBPCG(matrix, n_modes, n_zeros, zero_vectors, **kwargs):
+
+    try:
+        from scipy.sparse import linalg as scipy_sparse_la
+    except ImportError:
+        raise ImportError('failed to import scipy.sparse.linalg, '
+                          'which is required for sparse matrix '
+                          'decomposition')
+    dof = matrix.shape[0]
+    k = n_modes if zero_vectors is not None else n_modes + n_zeros
+    diagonal = np.abs(matrix.diagonal())
+    diagonal[diagonal == 0] = 1
+    diagonal = 1 / diagonal
+    precond = scipy_sparse_la.LinearOperator(
+        (dof, dof), matvec=lambda x: (diagonal * x.T).T, dtype=float)
+    random = np.random.RandomState(kwargs.get('seed', 0))
+    vectors = _project(random.rand(dof, k) - 0.5, zero_vectors)
+    values, vectors, history = scipy_sparse_la.lobpcg(
+        matrix, vectors, M=precond, Y=zero_vectors, largest=False,
+        tol=kwargs.get('tol'), maxiter=kwargs.get('maxiter', 1000),
+        retResidualNormsHistory=True)
+    order = values.argsort()
+    return values[order], vectors[:, order], len(history)
+
+
+SOLVERS = {
+    'dense': _solveDense,
+    'shiftinvert': _solveShiftInvert,
+    'lobpcg': _solveLOBPCG,
+}
@@ -11,7 +11,6 @@ from prody.proteins import parsePDB
 from prody.atomic import AtomGroup, Selection
 from prody.ensemble import Ensemble, Conformation
 from prody.trajectory import TrajBase
-from prody.utilities import importLA
 from numpy import sqrt, arange, log, polyfit, array
 
 from .nma import NMA
@@ -19,6 +18,8 @@ from .nma import NMA
 
 __all__ = ['calcEntropyTransfer', 'calcOverallNetEntropyTransfer']
 
+TAU_0 = 1
+
 def calcEntropyTransfer(model, ind1, ind2, tau):
     """This function calculates the entropy transfer from residue indice 
     ind1 to ind2 for a given time constant tau based on GNM.  
@@ -28,130 +29,99 @@ def calcEntropyTransfer(model, ind1, ind2, tau):
     elif model.is3d():
         raise TypeError('model must be a 1-dimensional NMA instance')
 
-    linalg = importLA()
-    n_atoms = model.numAtoms()
-    n_modes = model.numModes()
-
-    eigvecs = model.getEigvecs().T
+    eigvecs = model._getArray()[[ind1, ind2]]
     eigvals = model.getEigvals()
 
-    tau_0 = 1
-    T = 0
-    dummy1 = 0
-    dummy2 = 0
-    for k in range(n_modes):
-        dummy1 += 1.0 / eigvals[k] * eigvecs[k,ind2] * eigvecs[k,ind2]
-        dummy2 += 1.0 / eigvals[k] * eigvecs[k,ind2] * eigvecs[k,ind2] * np.exp(-eigvals[k]*tau/tau_0)
-    T += 0.5 * np.log(dummy1**2 - dummy2**2)
-
-    dummy1 = 0
-    dummy2 = 0
-    dummy3 = 0 
-    dummy4 = 0 
-    dummy5 = 0 
-    dummy6 = 0 
-    dummy7 = 0 
-    dummy8 = 0 
-    dummy9 = 0 
-    dummy10 = 0 
-    for k in range(n_modes):
-        dummy1 += 1.0 / eigvals[k] * eigvecs[k,ind1] * eigvecs[k,ind1]
-        dummy2 += 1.0 / eigvals[k] * eigvecs[k,ind2] * eigvecs[k,ind2]
-        dummy3 += 1.0 / eigvals[k] * eigvecs[k,ind1] * eigvecs[k,ind2]
-        dummy4 += 1.0 / eigvals[k] * eigvecs[k,ind2] * eigvecs[k,ind2] * np.exp(-eigvals[k]*tau/tau_0)
-        dummy5 += 1.0 / eigvals[k] * eigvecs[k,ind1] * eigvecs[k,ind2] * np.exp(-eigvals[k]*tau/tau_0)  
-        dummy9 += 1.0 / eigvals[k] * eigvecs[k,ind2] * eigvecs[k,ind2] * np.exp(-eigvals[k]*tau/tau_0)       
-        
-    dummy6 = dummy5
-    dummy7 = dummy3 
-    dummy8 = dummy2
-    dummy10 = dummy1
-
-    T -= 0.5 * np.log(dummy1*dummy2**2+2*dummy3*dummy4*dummy5-(dummy6**2+dummy7**2)*dummy8-dummy9**2*dummy10)
-    T -= 0.5 * np.log(dummy2)
-    T += 0.5 * np.log(dummy1*dummy2-dummy3**2)
-    return T
+    A = np.dot(eigvecs / eigvals, eigvecs.T)
+    B = np.dot(eigvecs * (np.exp(-eigvals * tau / TAU_0) / eigvals),
+               eigvecs.T)
+    return _calcEntropyTransfer(A[0, 0], A[1, 1], A[0, 1],
+                                B[1, 1], B[0, 1])
+
+
+def _calcEntropyTransfer(a1, a2, a12, b2, b12):
+    """Returns entropy transfer calculated from auto- and cross-correlations
+    of fluctuations of source (1) and target (2) residues at time zero (*a*)
+    and after time delay (*b*).  Arguments may be arrays that broadcast."""
+
+    return 0.5 * (np.log(a2 ** 2 - b2 ** 2) -
+                  np.log(a1 * a2 ** 2 + 2 * a12 * b2 * b12 -
+                         (b12 ** 2 + a12 ** 2) * a2 - b2 ** 2 * a1) -
+                  np.log(a2) + np.log(a1 * a2 - a12 ** 2))
+
 
 def calcAllEntropyTransfer(model, tau):
     """This function calculates the net entropy transfer for a whole structure 
-    with a given time constant tau based on GNM.  
+    with a given time constant tau based on GNM.  When *tau* is an array of
+    time constants, an array with shape (n_taus, n_atoms, n_atoms) is
+    returned.  Element [i, j] is the entropy transfer from residue i to j.
     """
     if not isinstance(model, NMA):
         raise TypeError('model must be a NMA instance')
     elif model.is3d():
         raise TypeError('model must be a 1-dimensional NMA instance')
 
-    linalg = importLA()
-    n_atoms = model.numAtoms()
-    n_modes = model.numModes()
-
-    entropyTransfer = np.zeros((n_atoms,n_atoms))
-    for i in range(n_atoms):
-        for j in range(n_atoms):
-            if i != j:
-                entropyTransfer[i,j]=calcEntropyTransfer(model,i,j,tau)
-
+    eigvecs = model._getArray()
+    eigvals = model.getEigvals()
+    taus = np.atleast_1d(tau)
+
+    A = np.dot(eigvecs / eigvals, eigvecs.T)
+    a = A.diagonal()
+    # correlations after time delay for all taus as a stack of weighted
+    # outer products of eigenvectors
+    decays = np.exp(-np.outer(taus, eigvals) / TAU_0) / eigvals
+    B = np.matmul(eigvecs * decays[:, np.newaxis, :], eigvecs.T)
+    b = B.diagonal(0, 1, 2)[:, np.newaxis, :]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entropyTransfer = _calcEntropyTransfer(a[:, np.newaxis], a, A, b, B)
+    n_atoms = len(a)
+    entropyTransfer[:, np.arange(n_atoms), np.arange(n_atoms)] = 0
+
+    if np.ndim(tau) == 0:
+        return entropyTransfer[0]
     return entropyTransfer
 
 def calcNetEntropyTransfer(entropyTransfer):
-    n_atoms = entropyTransfer.shape[0]
 
-    netEntropyTransfer = np.zeros((n_atoms,n_atoms))
-    for i in range(n_atoms):
-        for j in range(n_atoms):
-            netEntropyTransfer[i,j]=entropyTransfer[i,j]-entropyTransfer[j,i]
+    return entropyTransfer - entropyTransfer.T
 
-    return netEntropyTransfer
-
-def calcOverallNetEntropyTransfer(model, turbo=False):
+def calcOverallNetEntropyTransfer(model, turbo=False, **kwargs):
     """This function calculates the net entropy transfer for a whole structure 
-    with a given time constant tau based on GNM.  
+    with a given time constant tau based on GNM.  Entropy transfer is
+    calculated for time constants in chunks of *chunk* (default is 8) and
+    integrated numerically using the trapezoidal rule.  When *turbo* is
+    **True**, all time constants are processed at once, which is faster but
+    requires more memory.
     """
     if not isinstance(model, NMA):
         raise TypeError('model must be a NMA instance')
     elif model.is3d():
         raise TypeError('model must be a 1-dimensional NMA instance')
 
-    linalg = importLA()
     n_atoms = model.numAtoms()
-    n_modes = model.numModes()
 
     tau_max = 5.0 
     tau_step = 0.1
     taus = np.arange(start=tau_step, stop=tau_max+1e-6, step=tau_step)
     taus = np.insert(taus,0,0.000001)
     numTaus = len(taus)
-    netEntropyTransfer = np.zeros((numTaus,n_atoms,n_atoms))
-    if turbo:
-        try:
-            from joblib import Parallel, delayed
-            import multiprocessing as mp
-        except: 
-            LOGGER.report('joblib and multiprocessing is not imported. Running' + 
-                'with sequential execution.')
-        LOGGER.timeit('_ent_trans')
-        n_cpu = mp.cpu_count()
-        netEntropyTransfer = Parallel(n_jobs=n_cpu)(delayed(calcAllEntropyTransfer)(model,taus[i]) \
-            for i in range(numTaus))
-        netEntropyTransfer = np.asarray(netEntropyTransfer)
-    
-    else:
-        LOGGER.timeit('_ent_trans')
-        for i in range(len(taus)):
-            netEntropyTransfer[i,:,:] = calcAllEntropyTransfer(model,taus[i])
+    chunk = numTaus if turbo else int(kwargs.get('chunk', 8))
 
-    LOGGER.report('Net Entropy Transfer calculation is completed in %.1fs.',
-                  '_ent_trans')
+    # trapezoidal rule coefficients
+    steps = np.diff(taus)
+    coefs = np.zeros(numTaus)
+    coefs[:-1] += steps / 2
+    coefs[1:] += steps / 2
 
     overallNetEntropyTransfer = np.zeros((n_atoms,n_atoms))
-
-    LOGGER.timeit('_num_int')
-    for i in range(n_atoms):
-        for j in range(n_atoms):
-            if i != j:
-                overallNetEntropyTransfer[i,j] = np.trapz(netEntropyTransfer[:,i,j],taus)
-    LOGGER.report('Numerical integration is completed in %.1fs.',
-                  '_num_int')
+    LOGGER.timeit('_ent_trans')
+    for i in range(0, numTaus, chunk):
+        entropyTransfer = calcAllEntropyTransfer(model, taus[i:i + chunk])
+        overallNetEntropyTransfer += np.tensordot(coefs[i:i + chunk],
+                                                  entropyTransfer, 1)
+    LOGGER.report('Net Entropy Transfer calculation is completed in %.1fs.',
+                  '_ent_trans')
 
     return overallNetEntropyTransfer
 
@@ -10,7 +10,7 @@ from prody.utilities import importLA, checkCoords
 from prody.kdtree import KDTree
 from numpy import sqrt, zeros, linalg, min, max, mean
 
-from .anm import ANMBase, calcANM
+from .anm import ANMBase, calcANM, buildHessianArrays
 from .gnm import checkENMParameters
 from .editing import reduceModel
 
@@ -193,29 +193,8 @@ class exANM(ANMBase):
         LOGGER.timeit('_exanm')
         coords = np.concatenate((coords,self._membrane.getCoords()),axis=0)
         self._combined_coords = coords
-        total_natoms = int(coords.shape[0])
-        self._hessian = np.zeros((natoms*3, natoms*3), float)
-        total_hessian = np.zeros((total_natoms*3, total_natoms*3), float)
         cutoff, g, gamma = checkENMParameters(cutoff, gamma)
-        cutoff2 = cutoff * cutoff
-        for i in range(total_natoms):
-            res_i3 = i*3
-            res_i33 = res_i3+3
-            i_p1 = i+1
-            i2j_all = coords[i_p1:, :] - coords[i]
-            for j, dist2 in enumerate((i2j_all ** 2).sum(1)):
-                if dist2 > cutoff2:
-                    continue
-                i2j = i2j_all[j]
-                j += i_p1
-                g = gamma(dist2, i, j)
-                res_j3 = j*3
-                res_j33 = res_j3+3
-                super_element = np.outer(i2j, i2j) * (- g / dist2)
-                total_hessian[res_i3:res_i33, res_j3:res_j33] = super_element
-                total_hessian[res_j3:res_j33, res_i3:res_i33] = super_element
-                total_hessian[res_i3:res_i33, res_i3:res_i33] = total_hessian[res_i3:res_i33, res_i3:res_i33] - super_element
-                total_hessian[res_j3:res_j33, res_j3:res_j33] = total_hessian[res_j3:res_j33, res_j3:res_j33] - super_element
+        total_hessian = buildHessianArrays(coords, cutoff, g, gamma)[1]
 
         ss = total_hessian[:natoms*3, :natoms*3]
         so = total_hessian[:natoms*3, natoms*3+1:]
@@ -31,6 +31,18 @@ class Gamma(object):
 
         pass
 
+    def gammaArray(self, dist2, i, j):
+        """Returns an array of force constants for node pairs.
+
+        *dist2* is the array of squared distances between interacting nodes,
+        and *i* and *j* are the arrays of node indices.  The default
+        implementation calls :meth:`gamma` for each pair; derived classes may
+        override it to evaluate all pairs at once."""
+
+        gamma = self.gamma
+        return np.array([gamma(d2, i_, j_) for d2, i_, j_ in zip(dist2, i, j)],
+                        float)
+
 
 class GammaStructureBased(Gamma):
 
@@ -147,16 +159,20 @@ class GammaStructureBased(Gamma):
         assert connected > 0, 'connected must be greater than 0'
 
         ssid = np.zeros(n_atoms)
-        for i in range(1, n_atoms):
-            if (sstr[i-1] == sstr[i] and chid[i-1] == chid[i] and
-               rnum[i]-rnum[i-1] == 1):
-                ssid[i] = ssid[i-1]
-            else:
-                ssid[i] = ssid[i-1] + 1
+        ssid[1:] = np.cumsum((sstr[1:] != sstr[:-1]) |
+                             (chid[1:] != chid[:-1]) |
+                             (np.diff(rnum) != 1))
+        # maximum sequence separation of hydrogen bonded helical residues
+        hsep = np.zeros(n_atoms, int) - 1
+        hsep[sstr == 'H'] = 4
+        hsep[sstr == 'G'] = 3
+        hsep[sstr == 'I'] = 5
         self._sstr = sstr
         self._chid = chid
         self._rnum = rnum
         self._ssid = ssid
+        self._hsep = hsep
+        self._strand = sstr == 'E'
         self._gamma = gamma
         self._helix = gamma * helix
         self._sheet = gamma * sheet
@@ -170,7 +186,7 @@ class GammaStructureBased(Gamma):
     def getChids(self):
         """Returns a copy of chain identifiers."""
 
-        return self._chid.socopypy()
+        return self._chid.copy()
 
     def getResnums(self):
         """Returns a copy of residue numbers."""
@@ -197,6 +213,23 @@ class GammaStructureBased(Gamma):
 
         return self._gamma
 
+    def gammaArray(self, dist2, i, j):
+        """Returns an array of force constants."""
+
+        dist2 = np.asarray(dist2)
+        ssid = self._ssid
+        rnum = self._rnum
+        strand = self._strand
+        gamma = np.repeat(self._gamma, len(dist2))
+        same = ssid[i] == ssid[j]
+        helix = (same & (abs(rnum[j] - rnum[i]) <= self._hsep[i]) &
+                 (dist2 <= 49))
+        sheet = ~same & strand[i] & strand[j] & (dist2 <= 36)
+        gamma[helix] = self._helix
+        gamma[sheet] = self._sheet
+        gamma[dist2 <= 16] = self._connected
+        return gamma
+
 
 class GammaVariableCutoff(Gamma):
 
@@ -265,10 +298,8 @@ class GammaVariableCutoff(Gamma):
         Values of keyword arguments must be :class:`float`."""
 
         self._identifiers = identifiers
-        radii = np.ones(len(identifiers)) * default_radius
-
-        for i, identifier in enumerate(identifiers):
-            radii[i] = kwargs.get(identifier, default_radius)
+        radii = np.array([kwargs.get(identifier, default_radius)
+                          for identifier in identifiers], float)
         self._radii = radii
         self._gamma = float(gamma)
         self._debug = bool(kwargs.get('debug', False))
@@ -299,3 +330,12 @@ class GammaVariableCutoff(Gamma):
                   'effective cutoff:', str(cutoff), 'distance:',
                   str(dist2**0.5), 'gamma:', str(gamma)]))  # PY3K: OK
         return gamma
+
+    def gammaArray(self, dist2, i, j):
+        """Returns an array of force constants."""
+
+        if self._debug:
+            return super(GammaVariableCutoff, self).gammaArray(dist2, i, j)
+        radii = self._radii
+        cutoff2 = (radii[i] + radii[j]) ** 2
+        return np.where(np.asarray(dist2) < cutoff2, self._gamma, 0.)
@@ -15,6 +15,7 @@ from prody.utilities import importLA, checkCoords
 
 from .nma import NMA
 from .gamma import Gamma
+from .eigtools import solveEigh
 
 __all__ = ['GNM', 'calcGNM', 'TrimedGNM']
 
@@ -98,6 +99,44 @@ def checkENMParameters(cutoff, gamma):
     return cutoff, gamma, gamma_func
 
 
+def getContacts(coords, cutoff):
+    """Returns node index arrays *i* and *j* (``i < j``), distance vectors
+    from *i* to *j*, and squared distances for all node pairs that are at
+    most *cutoff* apart.  Pairs are found in a single :class:`.KDTree` search
+    and are sorted by *i* and then by *j*."""
+
+    kdtree = KDTree(coords)
+    kdtree.search(cutoff)
+    if kdtree.getCount():
+        pairs = kdtree.getIndices()
+        i = pairs.min(1)
+        j = pairs.max(1)
+        order = np.lexsort((j, i))
+        i = i[order]
+        j = j[order]
+    else:
+        i = j = np.zeros(0, int)
+    i2j = coords[j] - coords[i]
+    dist2 = (i2j ** 2).sum(1)
+    which = dist2 <= cutoff * cutoff
+    if not which.all():
+        i, j, i2j, dist2 = i[which], j[which], i2j[which], dist2[which]
+    return i, j, i2j, dist2
+
+
+def getGammas(gamma, gamma_func, dist2, i, j):
+    """Returns force constants for node pairs *i* and *j* at squared
+    distances *dist2*.  *gamma* and *gamma_func* are as returned by
+    :func:`checkENMParameters`."""
+
+    if isinstance(gamma, Gamma):
+        return np.asarray(gamma.gammaArray(dist2, i, j), float)
+    elif isinstance(gamma, float):
+        return np.repeat(gamma, len(dist2))
+    return np.array([gamma_func(d2, i_, j_)
+                     for d2, i_, j_ in zip(dist2, i, j)], float)
+
+
 class GNM(GNMBase):
 
     """A class for Gaussian Network Model (GNM) analysis of proteins
@@ -161,10 +200,13 @@ class GNM(GNMBase):
 
 
         Instances of :class:`Gamma` classes and custom functions are
-        accepted as *gamma* argument.
+        accepted as *gamma* argument.  When KDTree is used, force constants
+        for all contacts are obtained in a single :meth:`.Gamma.gammaArray`
+        call.
 
         When Scipy is available, user can select to use sparse matrices for
-        efficient usage of memory at the cost of computation speed."""
+        efficient usage of memory at the cost of computation speed.  Sparse
+        matrices built using KDTree are in CSR format."""
 
         try:
             coords = (coords._getCoords() if hasattr(coords, '_getCoords') else
@@ -194,17 +236,21 @@ class GNM(GNMBase):
             kirchhoff = np.zeros((n_atoms, n_atoms), 'd')
 
         if kwargs.get('kdtree', True):
-            kdtree = KDTree(coords)
-            kdtree.search(cutoff)
-            dist2 = kdtree.getDistances() ** 2
-            r = 0
-            for i, j in kdtree.getIndices():
-                g = gamma(dist2[r], i, j)
-                kirchhoff[i, j] = -g
-                kirchhoff[j, i] = -g
-                kirchhoff[i, i] = kirchhoff[i, i] + g
-                kirchhoff[j, j] = kirchhoff[j, j] + g
-                r += 1
+            i, j, _, dist2 = getContacts(coords, cutoff)
+            gammas = getGammas(g, gamma, dist2, i, j)
+            diagonal = (np.bincount(i, gammas, n_atoms) +
+                        np.bincount(j, gammas, n_atoms))
+            index = np.arange(n_atoms)
+            if kwargs.get('sparse', False):
+                kirchhoff = scipy_sparse.coo_matrix(
+                    (np.concatenate([-gammas, -gammas, diagonal]),
+                     (np.concatenate([i, j, index]),
+                      np.concatenate([j, i, index]))),
+                    shape=(n_atoms, n_atoms)).tocsr()
+            else:
+                kirchhoff[i, j] = -gammas
+                kirchhoff[j, i] = -gammas
+                kirchhoff[index, index] = diagonal
         else:
             LOGGER.info('Using slower method for building the Kirchhoff.')
             cutoff2 = cutoff * cutoff
@@ -230,6 +276,14 @@ class GNM(GNMBase):
         self._n_atoms = n_atoms
         self._dof = n_atoms
 
+    def _getZeroVectors(self):
+        """Returns the normalized uniform vector when Kirchhoff matrix is
+        built from coordinates, otherwise **None**."""
+
+        if self._cutoff is None or self._kirchhoff is None:
+            return None
+        return np.ones((self._n_atoms, 1)) / self._n_atoms ** 0.5
+
     def _buildAffinity(self):
 
         if self._kirchhoff is None:
@@ -348,10 +402,11 @@ class GNM(GNMBase):
         return self._commuteTime    
 
 
-    def calcModes(self, n_modes=20, zeros=False, turbo=True, hinges=True):
-        """Calculate normal modes.  This method uses :func:`scipy.linalg.eigh`
-        function to diagonalize the Kirchhoff matrix. When Scipy is not found,
-        :func:`numpy.linalg.eigh` is used.
+    def calcModes(self, n_modes=20, zeros=False, turbo=True, hinges=True,
+                  **kwargs):
+        """Calculate normal modes.  By default, this method uses
+        :func:`scipy.linalg.eigh` function to diagonalize the Kirchhoff
+        matrix. When Scipy is not found, :func:`numpy.linalg.eigh` is used.
 
         :arg n_modes: number of non-zero eigenvalues/vectors to calculate.
               If ``None`` or 'all' is given, all modes will be calculated.
@@ -365,6 +420,17 @@ class GNM(GNMBase):
 
         :arg hinges: Identify hinge sites after modes are computed.
         :type hinges: bool, default is ``True``
+
+        :arg solver: eigenvalue solver, one of ``'dense'``,
+            ``'shiftinvert'``, ``'lobpcg'``, or ``'auto'`` (default) for
+            selecting one based on size and sparsity of the Kirchhoff matrix
+            and *n_modes*, see :mod:`~prody.dynamics.eigtools`
+        :type solver: str
+
+        Other keyword arguments are passed to the solver.  When the Kirchhoff
+        matrix is built using :meth:`buildKirchhoff`, iterative solvers search
+        for non-zero modes orthogonal to the uniform vector, which is
+        returned as the zero mode.
         """
 
         if self._kirchhoff is None:
@@ -375,44 +441,11 @@ class GNM(GNMBase):
             'n_modes must be a positive integer'
         assert isinstance(zeros, bool), 'zeros must be a boolean'
         assert isinstance(turbo, bool), 'turbo must be a boolean'
-        linalg = importLA()
         start = time.time()
         shift = 0
-        if linalg.__package__.startswith('scipy'):
-            if n_modes is None:
-                eigvals = None
-                n_modes = self._dof
-            else:
-                if n_modes >= self._dof:
-                    eigvals = None
-                    n_modes = self._dof
-                else:
-                    eigvals = (0, n_modes + shift)
-            if eigvals:
-                turbo = False
-            if isinstance(self._kirchhoff, np.ndarray):
-                values, vectors = linalg.eigh(self._kirchhoff, turbo=turbo,
-                                              eigvals=eigvals)
-            else:
-                try:
-                    from scipy.sparse import linalg as scipy_sparse_la
-                except ImportError:
-                    raise ImportError('failed to import scipy.sparse.linalg, '
-                                      'which is required for sparse matrix '
-                                      'decomposition')
-                try:
-                    values, vectors = (
-                        scipy_sparse_la.eigsh(self._kirchhoff,
-                                              k=n_modes + 1, which='SA'))
-                except:
-                    values, vectors = (
-                        scipy_sparse_la.eigen_symmetric(self._kirchhoff,
-                                                        k=n_modes + 1,
-                                                        which='SA'))
-        else:
-            if n_modes is not None:
-                LOGGER.info('Scipy is not found, all modes are calculated.')
-            values, vectors = linalg.eigh(self._kirchhoff)
+        values, vectors, _ = solveEigh(self._kirchhoff, n_modes, 1,
+                                       zero_vectors=self._getZeroVectors(),
+                                       turbo=turbo, **kwargs)
         n_zeros = sum(values < ZERO)
         if n_zeros < 1:
             LOGGER.warning('Less than 1 zero eigenvalues are calculated.')
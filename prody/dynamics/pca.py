@@ -9,6 +9,7 @@ import numpy as np
 from prody import LOGGER, PY2K
 from prody.atomic import Atomic
 from prody.ensemble import Ensemble, PDBEnsemble
+from prody.measure import superposeCoordsets
 from prody.trajectory import TrajBase
 from prody.utilities import importLA
 
@@ -17,7 +18,134 @@ from .nma import NMA
 if PY2K:
     range = xrange
 
-__all__ = ['PCA', 'EDA']
+__all__ = ['PCA', 'EDA', 'CovarianceAccumulator']
+
+
+def _iterBlocks(coordsets, blocksize, aligned=False):
+    """Yield blocks of *coordsets* as arrays with shape (n_csets, dof).
+    Trajectory frames are superposed onto the reference coordinates, unless
+    they are already *aligned*."""
+
+    if isinstance(coordsets, TrajBase):
+        nfi = coordsets.nextIndex()
+        coordsets.reset()
+        target = coordsets._getCoords()
+        weights = coordsets._getWeights()
+        for block in coordsets.iterChunks(blocksize):
+            if not aligned:
+                block = superposeCoordsets(np.array(block, float), target,
+                                           weights)[0]
+            yield np.asarray(block, float).reshape((len(block), -1))
+        coordsets.goto(nfi)
+    else:
+        if not isinstance(coordsets, np.ndarray):
+            coordsets = coordsets._getCoordsets()
+        for i in range(0, len(coordsets), blocksize):
+            block = coordsets[i:i + blocksize]
+            yield np.asarray(block, float).reshape((len(block), -1))
+
+
+class CovarianceAccumulator(object):
+
+    """A class for accumulating mean and covariance of coordinate sets that
+    are streamed in blocks.  Each block contributes with a single rank-k
+    update, and blocks are combined with the pairwise algorithm of Chan et
+    al. which is numerically stable.  Accumulators built for different
+    trajectory files, e.g. in parallel processes, can be combined using
+    :meth:`merge`."""
+
+    def __init__(self):
+
+        self._n_csets = 0
+        self._mean = None
+        self._m2 = None
+
+    def __repr__(self):
+
+        return '<CovarianceAccumulator: {0} coordinate sets>'.format(
+            self._n_csets)
+
+    def numCoordsets(self):
+        """Returns number of accumulated coordinate sets."""
+
+        return self._n_csets
+
+    def getMean(self):
+        """Returns mean of accumulated coordinate sets."""
+
+        if self._mean is not None:
+            return self._mean.reshape((len(self._mean) // 3, 3))
+
+    def getCovariance(self):
+        """Returns covariance matrix of accumulated coordinate sets."""
+
+        if self._m2 is not None:
+            return self._m2 / self._n_csets
+
+    def _combine(self, n_csets, mean, m2):
+
+        if self._n_csets == 0:
+            self._n_csets, self._mean, self._m2 = n_csets, mean, m2
+            return
+        if mean.shape != self._mean.shape:
+            raise ValueError('coordinate sets must have {0} atoms'
+                             .format(len(self._mean) // 3))
+        total = self._n_csets + n_csets
+        delta = mean - self._mean
+        self._m2 += m2
+        self._m2 += np.outer(delta, delta) * (self._n_csets * n_csets /
+                                              float(total))
+        self._mean += delta * (n_csets / float(total))
+        self._n_csets = total
+
+    def update(self, coordsets):
+        """Add *coordsets*, an array with shape (n_csets, n_atoms, 3), to the
+        accumulated mean and covariance."""
+
+        coordsets = np.asarray(coordsets)
+        if coordsets.ndim != 3 or coordsets.shape[2] != 3:
+            raise ValueError('coordsets must be an array with shape '
+                             '(n_csets, n_atoms, 3)')
+        n_csets = coordsets.shape[0]
+        if n_csets == 0:
+            return
+        coordsets = coordsets.reshape((n_csets, -1)).astype(float)
+        mean = coordsets.mean(0)
+        coordsets -= mean
+        # transposed product of an array with itself is calculated using
+        # BLAS syrk routine
+        self._combine(n_csets, mean, np.dot(coordsets.T, coordsets))
+
+    def updateTrajectory(self, trajectory, aligned=False, blocksize=100):
+        """Add frames of *trajectory*, starting from the next frame in line,
+        to the accumulated mean and covariance.  Frames are read in blocks of
+        *blocksize* and superposed onto the reference coordinates of the
+        trajectory, unless they are already *aligned*.  Selected atoms and
+        atom weights set for the *trajectory* are considered in superposition,
+        see :meth:`.Frame.superpose`."""
+
+        if not isinstance(trajectory, TrajBase):
+            raise TypeError('trajectory must be a trajectory instance')
+        target = weights = None
+        if not aligned:
+            target = trajectory._getCoords()
+            weights = trajectory._getWeights()
+        for block in trajectory.iterChunks(blocksize):
+            if not aligned:
+                block = superposeCoordsets(np.array(block, float), target,
+                                           weights)[0]
+            self.update(block)
+            LOGGER.update(trajectory.nextIndex(), label='_prody_pca')
+
+    def merge(self, other):
+        """Add coordinate sets accumulated in *other*, another
+        :class:`CovarianceAccumulator` instance."""
+
+        if not isinstance(other, CovarianceAccumulator):
+            raise TypeError('other must be a CovarianceAccumulator instance')
+        if other._n_csets:
+            self._combine(other._n_csets, other._mean.copy(),
+                          other._m2.copy())
 
 
 class PCA(NMA):
@@ -40,7 +168,7 @@ class PCA(NMA):
         self._reset()
         self._cov = covariance
         self._dof = covariance.shape[0]
-        self._n_atoms = self._dof / 3
+        self._n_atoms = self._dof // 3
         self._trace = self._cov.trace()
 
     def buildCovariance(self, coordsets, **kwargs):
@@ -59,7 +187,11 @@ class PCA(NMA):
         When *coordsets* is a trajectory object, such as :class:`.DCDFile`,
         covariance will be built by superposing frames onto the reference
         coordinate set (see :meth:`.Frame.superpose`).  If frames are already
-        aligned, use ``aligned=True`` argument to skip this step.
+        aligned, use ``aligned=True`` argument to skip this step.  Frames of
+        trajectories and 32-bit coordinate arrays are processed in blocks,
+        whose size can be set using *blocksize* argument, default is 100.
+        To combine results for multiple files processed separately, see
+        :class:`.CovarianceAccumulator`.
 
 
         .. note::
@@ -89,38 +221,26 @@ class PCA(NMA):
             coordsets = coordsets._getCoordsets()
 
         update_coords = bool(kwargs.get('update_coords', False))
+        blocksize = int(kwargs.get('blocksize', 100))
 
         if isinstance(coordsets, TrajBase):
             nfi = coordsets.nextIndex()
             coordsets.reset()
             n_atoms = coordsets.numSelected()
             dof = n_atoms * 3
-            cov = np.zeros((dof, dof))
-            #mean = coordsets._getCoords().flatten()
-            n_confs = 0
             n_frames = len(coordsets)
             LOGGER.info('Covariance will be calculated using {0} frames.'
                         .format(n_frames))
-            coordsum = np.zeros(dof)
             LOGGER.progress('Building covariance', n_frames, '_prody_pca')
-            align = not kwargs.get('aligned', False)
-            for frame in coordsets:
-                if align:
-                    frame.superpose()
-                coords = frame._getCoords().flatten()
-                coordsum += coords
-                cov += np.outer(coords, coords)
-                n_confs += 1
-                LOGGER.update(n_confs, '_prody_pca')
+            accumulator = CovarianceAccumulator()
+            accumulator.updateTrajectory(coordsets,
+                                         aligned=kwargs.get('aligned', False),
+                                         blocksize=blocksize)
             LOGGER.clear()
-            cov /= n_confs
-            coordsum /= n_confs
-            mean = coordsum
-            cov -= np.outer(coordsum, coordsum)
             coordsets.goto(nfi)
-            self._cov = cov
+            self._cov = accumulator.getCovariance()
             if update_coords:
-                coordsets.setCoords(mean.reshape((n_atoms, 3)))
+                coordsets.setCoords(accumulator.getMean())
         else:
             n_confs = coordsets.shape[0]
             if n_confs < 3:
@@ -138,18 +258,15 @@ class PCA(NMA):
                     self._cov = np.cov(coordsets.reshape((n_confs, dof)).T,
                                        bias=1)
                 else:
-                    cov = np.zeros((dof, dof))
-                    coordsets = coordsets.reshape((n_confs, dof))
-                    mean = coordsets.mean(0)
+                    accumulator = CovarianceAccumulator()
                     LOGGER.progress('Building covariance', n_confs,
                                     '_prody_pca')
-                    for i, coords in enumerate(coordsets.reshape(s)):
-                        deviations = coords - mean
-                        cov += np.outer(deviations, deviations)
-                        LOGGER.update(n_confs, '_prody_pca')
+                    for i in range(0, n_confs, blocksize):
+                        accumulator.update(coordsets[i:i + blocksize])
+                        LOGGER.update(i, label='_prody_pca')
                     LOGGER.clear()
-                    cov /= n_confs
-                    self._cov = cov
+                    mean = accumulator.getMean()
+                    self._cov = accumulator.getCovariance()
             else:
                 # PDB ensemble case
                 mean = np.zeros((n_atoms, 3))
@@ -276,6 +393,188 @@ class PCA(NMA):
         LOGGER.debug('{0} modes were calculated in {1:.2f}s.'
                      .format(self._n_modes, time.time()-start))
 
+    def _checkStreamed(self, coordsets):
+
+        if not isinstance(coordsets, (Ensemble, Atomic, TrajBase,
+                                      np.ndarray)):
+            raise TypeError('coordsets must be an Ensemble, Atomic, '
+                            'trajectory, or Numpy array instance')
+        if isinstance(coordsets, np.ndarray):
+            if (coordsets.ndim != 3 or coordsets.shape[2] != 3 or
+                    coordsets.dtype not in (np.float32, float)):
+                raise ValueError('coordsets is not a valid coordinate array')
+        if isinstance(coordsets, TrajBase):
+            n_confs, n_atoms = coordsets.numFrames(), coordsets.numSelected()
+        elif isinstance(coordsets, Ensemble):
+            n_confs = coordsets.numConfs()
+            n_atoms = coordsets.numSelected()
+        elif isinstance(coordsets, np.ndarray):
+            n_confs, n_atoms = coordsets.shape[:2]
+        else:
+            n_confs, n_atoms = coordsets.numCoordsets(), coordsets.numAtoms()
+        if n_confs < 3:
+            raise ValueError('coordsets must have more than 3 coordinate sets')
+        if n_atoms < 3:
+            raise ValueError('coordsets must have more than 3 atoms')
+        return n_confs, n_atoms
+
+    def _setStreamed(self, values, vectors, n_atoms, variance, start):
+
+        which = values > 1e-18
+        self._cov = None
+        self._dof = n_atoms * 3
+        self._n_atoms = n_atoms
+        self._eigvals = values[which]
+        self._array = vectors[:, which]
+        self._vars = self._eigvals
+        self._trace = variance
+        self._n_modes = len(self._eigvals)
+        LOGGER.debug('{0} modes were calculated in {1:.2f}s.'
+                     .format(self._n_modes, time.time()-start))
+        explained = min(self._vars.sum() / variance, 1.)
+        LOGGER.info('{0} modes explain {1:.2f}% of the total variance, '
+                    '{2:.2f}% is not explained.'.format(self._n_modes,
+                    100 * explained, 100 * (1 - explained)))
+
+    def performRandomizedSVD(self, coordsets, n_modes=20, **kwargs):
+        """Calculate *n_modes* principal modes using randomized truncated
+        singular value decomposition [NH11]_.  Coordinate sets are streamed in
+        blocks and neither the covariance matrix nor the full matrix of
+        deviations is built, so this method is suitable for large systems.
+        *coordsets* may be a :class:`.Atomic`, :class:`.Ensemble`,
+        :class:`.TrajBase`, or :class:`numpy.ndarray` instance.  Trajectory
+        frames are superposed onto the reference coordinates of the
+        trajectory, unless ``aligned=True`` is passed.  Other coordinate sets
+        must be aligned prior to calculations.
+
+        :arg n_modes: number of modes to calculate, default is 20
+        :type n_modes: int
+
+        :arg n_oversamples: number of additional random vectors used for
+            improving accuracy, default is 10
+        :type n_oversamples: int
+
+        :arg n_iter: number of power iterations, each requires two passes
+            over coordinate sets, default is 2
+        :type n_iter: int
+
+        :arg blocksize: number of coordinate sets processed at once, default
+            is 100
+        :type blocksize: int
+
+        :arg seed: seed for random number generator, default is 0
+        :type seed: int
+
+        Fraction of the total variance that is not explained by calculated
+        modes is reported.
+
+        .. [NH11] Halko N, Martinsson PG, Tropp JA. Finding structure with
+           randomness: probabilistic algorithms for constructing approximate
+           matrix decompositions. *SIAM Rev* **2011** 53(2):217-288."""
+
+        linalg = importLA()
+        start = time.time()
+        n_confs, n_atoms = self._checkStreamed(coordsets)
+        dof = n_atoms * 3
+        n_modes = min(int(n_modes), n_confs, dof)
+        n_vectors = min(n_modes + int(kwargs.get('n_oversamples', 10)),
+                        n_confs, dof)
+        blocksize = int(kwargs.get('blocksize', 100))
+        aligned = kwargs.get('aligned', False)
+        random = np.random.RandomState(kwargs.get('seed', 0))
+        blocks = lambda: _iterBlocks(coordsets, blocksize, aligned)
+
+        # first pass calculates the mean and the total variance along with
+        # the sample of the range of deviations
+        probe = random.normal(size=(dof, n_vectors))
+        sample = []
+        n_confs = 0
+        mean = np.zeros(dof)
+        sumsq = 0
+        for block in blocks():
+            n_block = len(block)
+            block_mean = block.mean(0)
+            delta = block_mean - mean
+            total = n_confs + n_block
+            sumsq += (((block - block_mean) ** 2).sum() +
+                      (delta ** 2).sum() * n_confs * n_block / float(total))
+            mean += delta * (n_block / float(total))
+            n_confs = total
+            sample.append(np.dot(block, probe))
+        sample = np.concatenate(sample) - np.dot(mean, probe)
+
+        for i in range(int(kwargs.get('n_iter', 2))):
+            sample = linalg.qr(sample, mode='economic')[0]
+            probe = np.zeros((dof, n_vectors))
+            first = 0
+            for block in blocks():
+                probe += np.dot((block - mean).T,
+                                sample[first:first + len(block)])
+                first += len(block)
+            probe = linalg.qr(probe, mode='economic')[0]
+            sample = np.concatenate([np.dot(block - mean, probe)
+                                     for block in blocks()])
+
+        basis = linalg.qr(sample, mode='economic')[0]
+        projection = np.zeros((n_vectors, dof))
+        first = 0
+        for block in blocks():
+            projection += np.dot(basis[first:first + len(block)].T,
+                                 block - mean)
+            first += len(block)
+        values, vectors = linalg.svd(projection, full_matrices=False)[1:]
+        values = values[:n_modes] ** 2 / n_confs
+        self._setStreamed(values, vectors[:n_modes].T, n_atoms,
+                          sumsq / n_confs, start)
+
+    def performIncrementalPCA(self, coordsets, n_modes=20, **kwargs):
+        """Calculate *n_modes* principal modes using incremental PCA [DR08]_.
+        Coordinate sets are read only once, in blocks of *blocksize* (default
+        is 100), and principal modes are updated after each block, so this
+        method is suitable for trajectories that do not fit in memory.
+        Results are approximate, and get better with larger blocks.
+        *coordsets* may be a :class:`.Atomic`, :class:`.Ensemble`,
+        :class:`.TrajBase`, or :class:`numpy.ndarray` instance.  Trajectory
+        frames are superposed onto the reference coordinates of the
+        trajectory, unless ``aligned=True`` is passed.  Other coordinate sets
+        must be aligned prior to calculations.
+
+        Fraction of the total variance that is not explained by calculated
+        modes is reported.
+
+        .. [DR08] Ross DA, Lim J, Lin RS, Yang MH. Incremental learning for
+           robust visual tracking. *Int J Comput Vis* **2008** 77:125-141."""
+
+        linalg = importLA()
+        start = time.time()
+        n_confs, n_atoms = self._checkStreamed(coordsets)
+        n_modes = int(n_modes)
+        blocksize = max(int(kwargs.get('blocksize', 100)), n_modes)
+
+        n_confs = 0
+        mean = 0
+        sumsq = 0
+        matrix = None
+        for block in _iterBlocks(coordsets, blocksize,
+                                 kwargs.get('aligned', False)):
+            n_block = len(block)
+            block_mean = block.mean(0)
+            block = block - block_mean
+            delta = block_mean - mean
+            total = n_confs + n_block
+            factor = n_confs * n_block / float(total)
+            sumsq += (block ** 2).sum() + (delta ** 2).sum() * factor
+            if matrix is not None:
+                block = np.concatenate([matrix, block,
+                                        [delta * factor ** 0.5]])
+            mean = mean + delta * (n_block / float(total))
+            n_confs = total
+            values, vectors = linalg.svd(block, full_matrices=False)[1:]
+            matrix = vectors[:n_modes] * values[:n_modes, np.newaxis]
+            values = values[:n_modes]
+        self._setStreamed(values ** 2 / n_confs, vectors[:n_modes].T,
+                          n_atoms, sumsq / n_confs, start)
+
     def addEigenpair(self, eigenvector, eigenvalue=None):
         """Add eigen *vector* and eigen *value* pair(s) to the instance.
         If eigen *value* is omitted, it will be set to 1.  Eigenvalues
@@ -18,7 +18,6 @@ from .nma import NMA
 from .modeset import ModeSet
 from .mode import VectorBase, Mode, Vector
 from .gnm import GNMBase
-from .analysis import calcCovariance
 
 __all__ = ['calcPerturbResponse', 'parsePerturbResponseMatrix',
            'calcPerturbResponseProfiles', 'writePerturbResponsePDB']
@@ -41,6 +40,11 @@ def calcPerturbResponse(model, **kwargs):
     When an *atoms* instance is given, the PRS matrix will be added as data, 
     which can be retrieved with ``atoms.getData('prs_matrix')``.  
 
+    Rows of the PRS matrix are calculated in blocks of *blocksize* atoms
+    directly from modes, so the full covariance matrix is not built unless
+    it is already available.  Blocks can be distributed to multiple
+    processes by passing ``n_cpu=2`` or more.
+
     *model* and *atoms* must have the same number of atoms. *atoms* must be an
     :class:`.AtomGroup` instance. 
 
@@ -82,39 +86,46 @@ def calcPerturbResponse(model, **kwargs):
 
     n_atoms = model.numAtoms()
     LOGGER.timeit('_prody_prs_all')
-    LOGGER.info('Calculating covariance matrix')
-    LOGGER.timeit('_prody_cov')
-
-    cov = calcCovariance(model)
-    if cov is None:
-        raise ValueError('model did not return a covariance matrix')
-
-    LOGGER.clear()
-    LOGGER.report('Covariance matrix calculated in %.1fs.',
-                  '_prody_cov')
 
-    LOGGER.progress('Calculating perturbation response', n_atoms, '_prody_prs_mat')
-
-    if not model.is3d():
-        prs_matrix = cov**2
+    n_cpu = kwargs.get('n_cpu', 1)
+    if not isinstance(n_cpu, int):
+        raise TypeError('n_cpu must be an integer')
+    elif n_cpu < 1:
+        raise ValueError('n_cpu must be equal to or greater than 1')
+    dim = 3 if model.is3d() else 1
+    blocksize = kwargs.get('blocksize', max(1, 2 ** 22 // (dim * dim *
+                                                          n_atoms)))
+    blocks = [slice(i, i + blocksize) for i in range(0, n_atoms, blocksize)]
+
+    LOGGER.timeit('_prody_prs_mat')
+    LOGGER.progress('Calculating perturbation response', len(blocks),
+                    '_prody_prs_mat')
+    if isinstance(model, NMA) and model._cov is not None:
+        data = (dim, model._cov)
+    elif isinstance(model, Mode):
+        data = (dim, model._getArray()[:, np.newaxis],
+                np.array([model.getVariance()]))
+    elif isinstance(model, ModeSet):
+        data = (dim, model._getArray(), model.getVariances())
+    else:
+        data = (dim, model._getArray(), model._vars)
 
+    prs_matrix = np.zeros((n_atoms, n_atoms))
+    if n_cpu == 1:
+        _initPerturbResponse(*data)
+        results = (_calcPerturbResponseBlock(rows) for rows in blocks)
     else:
-        cov_squared = cov**2
-        n_by_3n_cov_squared = np.zeros((n_atoms, 3 * n_atoms))
-        prs_matrix = np.zeros((n_atoms, n_atoms))
-        i3 = -3
-        i3p3 = 0
-        for i in range(n_atoms):
-            i3 += 3
-            i3p3 += 3
-            n_by_3n_cov_squared[i,:] = (cov_squared[i3:i3p3,:]).sum(0)
-
-        j3 = -3
-        j3p3 = 0
-        for j in range(n_atoms):
-            j3 += 3
-            j3p3 += 3                
-            prs_matrix[:,j] = (n_by_3n_cov_squared[:,j3:j3p3]).sum(1)
+        import multiprocessing
+        pool = multiprocessing.Pool(min(multiprocessing.cpu_count(), n_cpu),
+                                    _initPerturbResponse, data)
+        results = pool.imap_unordered(_calcPerturbResponseBlock, blocks)
+    for i, (rows, block) in enumerate(results):
+        prs_matrix[rows] = block
+        LOGGER.update(i, label='_prody_prs_mat')
+    if n_cpu > 1:
+        pool.close()
+        pool.join()
+    _initPerturbResponse()
 
     LOGGER.clear()
     LOGGER.report('Perturbation response matrix calculated in %.1fs.',
@@ -146,6 +157,34 @@ def calcPerturbResponse(model, **kwargs):
     else:
         return norm_prs_matrix
 
+_PRS = ()
+
+
+def _initPerturbResponse(*data):
+
+    global _PRS
+    _PRS = data
+
+
+def _calcPerturbResponseBlock(rows):
+    """Returns *rows*, a slice of atom indices, and corresponding rows of
+    perturbation response matrix.  Rows of covariance matrix are calculated
+    from modes, unless covariance matrix is available, and squared super
+    elements are summed without building the (n_atoms, dim, n_atoms, dim)
+    covariance matrix."""
+
+    dim = _PRS[0]
+    dofs = slice(rows.start * dim, rows.stop * dim)
+    if len(_PRS) == 2:
+        cov = _PRS[1][dofs] ** 2
+    else:
+        array, variances = _PRS[1:]
+        cov = np.dot(array[dofs] * variances, array.T)
+        cov **= 2
+    n_atoms = cov.shape[1] // dim
+    return rows, cov.reshape((-1, dim, n_atoms, dim)).sum(3).sum(1)
+
+
 def parsePerturbResponseMatrix(prs_matrix_file, normMatrix=False):
     """Parses a perturbation response matrix from a file into a numpy ndarray.
 
@@ -1,14 +1,14 @@
 # -*- coding: utf-8 -*-
 """This module defines a class for handling ensembles of conformations."""
 
-from numpy import dot, add, subtract, array, ndarray, sign, concatenate
+from numpy import array, ndarray, concatenate
 from numpy import zeros, ones, arange, isscalar, max
 from numpy import newaxis, unique, repeat
 
 from prody import LOGGER
 from prody.atomic import Atomic, sliceAtoms
-from prody.measure import getRMSD
-from prody.utilities import importLA, checkCoords, checkWeights, copy
+from prody.measure import getRMSD, calcRMSDMatrix, superposeCoordsets
+from prody.utilities import checkCoords, checkWeights, copy
 
 from .conformation import *
 
@@ -502,61 +502,8 @@ class Ensemble(object):
     def _superpose(self, **kwargs):
         """Superpose conformations and update coordinates."""
 
-        indices = self._indices
-        weights = self._weights
-        mobs = self._confs
-        if indices is None:
-            idx = False
-            tar = self._coords
-            movs = None
-        else:
-            idx = True
-            if self._weights is not None:
-                weights = weights[indices]
-            tar = self._coords[indices]
-            movs = self._confs
-
-        linalg = importLA()
-        svd = linalg.svd
-        det = linalg.det
-
-        if weights is None:
-            tar_com = tar.mean(0)
-            tar_org = (tar - tar_com)
-            mob_org = zeros(tar_org.shape, dtype=mobs.dtype)
-            tar_org = tar_org.T
-        else:
-            weights_sum = weights.sum()
-            weights_dot = dot(weights.T, weights)
-            tar_com = (tar * weights).sum(axis=0) / weights_sum
-            tar_org = (tar - tar_com)
-            mob_org = zeros(tar_org.shape, dtype=mobs.dtype)
-
-        LOGGER.progress('Superposing ', len(mobs), '_prody_ensemble')
-        for i, mob in enumerate(mobs):
-            if idx:
-                mob = mob[indices]
-            if weights is None:
-                mob_com = mob.mean(0)
-                matrix = dot(tar_org, subtract(mob, mob_com, mob_org))
-            else:
-                mob_com = (mob * weights).sum(axis=0) / weights_sum
-                subtract(mob, mob_com, mob_org)
-                matrix = dot((tar_org * weights).T,
-                             (mob_org * weights)) / weights_dot
-
-            U, s, Vh = svd(matrix)
-            Id = array([[1, 0, 0], [0, 1, 0], [0, 0, sign(det(matrix))]])
-            rotation = dot(Vh.T, dot(Id, U.T))
-
-            if movs is None:
-                mobs[i] = dot(mob_org, rotation)
-                add(mobs[i], tar_com, mobs[i])
-            else:
-                add(dot(movs[i], rotation),
-                    (tar_com - dot(mob_com, rotation)), movs[i])
-            LOGGER.update(i, '_prody_ensemble')
-        LOGGER.clear()
+        superposeCoordsets(self._confs, self._coords, self._weights,
+                           self._indices)
 
     def iterpose(self, rmsd=0.0001):
         """Iteratively superpose the ensemble until convergence.  Initially,
@@ -587,7 +534,7 @@ class Ensemble(object):
         length = len(self)
         while rmsdif > rmsd:
             self._superpose()
-            if weights is None:
+            if weights is None or weights.ndim != 3:
                 newxyz = self._confs.sum(0) / length
             else:
                 newxyz = (self._confs * weights).sum(0) / weightsum
@@ -640,7 +587,7 @@ class Ensemble(object):
 
         return self._getCoordsets() - self._getCoords()
 
-    def getRMSDs(self, pairwise=False):
+    def getRMSDs(self, pairwise=False, **kwargs):
         """Returns root mean square deviations (RMSDs) for selected atoms.
         Conformations can be aligned using one of :meth:`superpose` or
         :meth:`iterpose` methods prior to RMSD calculation.
@@ -648,6 +595,10 @@ class Ensemble(object):
         :arg pairwise: if ``True`` then it will return pairwise RMSDs 
         as an n-by-n matrix. n is the number of conformations.
         :type pairwise: bool
+
+        Pairwise RMSDs are calculated using :func:`.calcRMSDMatrix`, and
+        keyword arguments, such as *superpose*, *condensed*, *out*, or
+        *n_cpu*, are passed to it.
         """
 
         if self._confs is None or self._coords is None:
@@ -660,11 +611,7 @@ class Ensemble(object):
         weights = self._weights[indices] if self._weights is not None else None
 
         if pairwise:
-            n_confs = self.numConfs()
-            RMSDs = zeros((n_confs, n_confs))
-            for i in range(n_confs):
-                for j in range(n_confs):
-                    RMSDs[i, j] = getRMSD(self._confs[i, indices], self._confs[j, indices], weights)
+            RMSDs = calcRMSDMatrix(self._confs[:, indices], weights, **kwargs)
         else:
             RMSDs = getRMSD(self._coords[indices], self._confs[:, indices], weights)
 
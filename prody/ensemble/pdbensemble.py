@@ -4,7 +4,7 @@ import numpy as np
 
 from prody.sequence import MSA, Sequence
 from prody.atomic import Atomic, AtomGroup
-from prody.measure import getRMSD, getTransformation
+from prody.measure import getRMSD, calcRMSDMatrix, superposeCoordsets
 from prody.utilities import checkCoords, checkWeights, copy
 from prody import LOGGER
 
@@ -122,32 +122,12 @@ class PDBEnsemble(Ensemble):
     def _superpose(self, **kwargs):
         """Superpose conformations and update coordinates."""
 
-        calcT = getTransformation
-        if kwargs.get('trans', False):
-            if self._trans is not None:
-                LOGGER.info('Existing transformations will be overwritten.')
-            trans = np.zeros((self._n_csets, 4, 4))
-        else:
-            trans = None
-        indices = self._indices
-        if indices is None:
-            weights = self._weights
-            coords = self._coords
-            confs = self._confs
-            confs_selected = self._confs
-        else:
-            weights = self._weights[:, indices]
-            coords = self._coords[indices]
-            confs = self._confs
-            confs_selected = self._confs[:, indices]
-
-        for i, conf in enumerate(confs_selected):
-            rmat, tvec = calcT(conf, coords, weights[i])
-            if trans is not None:
-                trans[i][:3, :3] = rmat
-                trans[i][:3, 3] = tvec
-            confs[i] = tvec + np.dot(confs[i], rmat.T)
-        self._trans = trans
+        trans = kwargs.get('trans', False)
+        if trans and self._trans is not None:
+            LOGGER.info('Existing transformations will be overwritten.')
+        matrices = superposeCoordsets(self._confs, self._coords,
+                                      self._weights, self._indices)[1]
+        self._trans = matrices if trans else None
 
     def iterpose(self, rmsd=0.0001):
 
@@ -449,7 +429,7 @@ class PDBEnsemble(Ensemble):
             ssqf += ((conf - mean) * weights[i]) ** 2
         return ssqf.sum(1) / weightsum.flatten()
 
-    def getRMSDs(self, pairwise=False):
+    def getRMSDs(self, pairwise=False, **kwargs):
         """Calculate and return root mean square deviations (RMSDs). Note that
         you might need to align the conformations using :meth:`superpose` or
         :meth:`iterpose` before calculating RMSDs.
@@ -457,6 +437,10 @@ class PDBEnsemble(Ensemble):
         :arg pairwise: if ``True`` then it will return pairwise RMSDs 
         as an n-by-n matrix. n is the number of conformations.
         :type pairwise: bool
+
+        Pairwise RMSDs are calculated using :func:`.calcRMSDMatrix` and
+        atoms that are present in both conformations of a pair, and keyword
+        arguments, such as *condensed*, *out*, or *n_cpu*, are passed to it.
         """
 
         if self._confs is None or self._coords is None:
@@ -468,16 +452,7 @@ class PDBEnsemble(Ensemble):
 
         weights = self._weights[:, indices] if self._weights is not None else None
         if pairwise:
-            n_confs = self.numConfs()
-            RMSDs = np.zeros((n_confs, n_confs))
-            for i in range(n_confs):
-                for j in range(i+1, n_confs):
-                    if weights is None:
-                        w = None
-                    else:
-                        wi = weights[i]; wj = weights[j]
-                        w = wi * wj
-                    RMSDs[i, j] = RMSDs[j, i] = getRMSD(self._confs[i, indices], self._confs[j, indices], w)
+            RMSDs = calcRMSDMatrix(self._confs[:, indices], weights, **kwargs)
         else:
             RMSDs = getRMSD(self._coords[indices], self._confs[:, indices], weights)
 
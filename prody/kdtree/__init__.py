@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 """This module provides :class:`.KDTree` class as an interface to Thomas
-Hamelryck's KDTree C module distributed with Biopython."""
+Hamelryck's KDTree C module distributed with Biopython, and :class:`.CellGrid`
+class for finding atoms near many points at once."""
 
 from .kdtree import KDTree
+from .cellgrid import CellGrid
 
-__all__ = ['KDTree']
+__all__ = ['KDTree', 'CellGrid']
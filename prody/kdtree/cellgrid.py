@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""This module defines :class:`CellGrid` class for finding atoms that are
+within a distance of many points at once."""
+
+from itertools import product
+
+from numpy import array, ndarray, zeros, arange, unique, concatenate
+from numpy import ceil, floor, around, repeat, searchsorted, sqrt
+from numpy import minimum, maximum
+
+__all__ = ['CellGrid']
+
+BLOCKSIZE = 2 ** 16
+"""Maximum number of candidate pairs whose distances are calculated at once."""
+
+
+class CellGrid(object):
+
+    """A cell list, i.e. a grid of cubic cells each containing the atoms whose
+    coordinates fall into it, for finding all pairs of atoms and query points
+    within a radius using vectorized operations.  Atoms are sorted by their
+    cells and only occupied cells are stored, so memory usage does not depend
+    on the size of the system.  Pairs are found by looking up cells around all
+    query points for each cell offset at once, and distances of candidate
+    pairs are calculated in blocks.
+
+    **Periodic Boundary Conditions**
+
+    When orthorhombic *unitcell* dimensions are given, coordinates are
+    wrapped into the unitcell, neighbor cells are taken across its walls, and
+    minimum image distances are returned.  Unlike :class:`.KDTree`, the system
+    is not replicated, and atoms need not be in or near the original
+    unitcell.  Search *radius* should be less than half of the smallest
+    unitcell dimension for pairs to be found at most once."""
+
+    def __init__(self, coords, cellsize, unitcell=None):
+        """
+        :arg coords: coordinate array with shape ``(N, 3)``, where N is number
+            of atoms
+        :type coords: :class:`numpy.ndarray`
+
+        :arg cellsize: length of cell edges, searches within this distance
+            look up only immediately neighboring cells
+        :type cellsize: float
+
+        :arg unitcell: orthorhombic unitcell dimension array with shape
+            ``(3,)``
+        :type unitcell: :class:`numpy.ndarray`"""
+
+        if not isinstance(coords, ndarray):
+            raise TypeError('coords must be a Numpy array')
+        if coords.ndim != 2 or coords.shape[-1] != 3:
+            raise ValueError('coords.shape must be (N,3)')
+        coords = array(coords, float)
+
+        cellsize = float(cellsize)
+        if cellsize <= 0:
+            raise ValueError('cellsize must be a positive number')
+        self._cellsize = cellsize
+
+        if unitcell is None:
+            self._unitcell = None
+            if len(coords):
+                self._origin = coords.min(0)
+                extent = coords.max(0) - self._origin
+            else:
+                self._origin = extent = zeros(3)
+            self._shape = (extent // cellsize).astype(int) + 1
+            self._cellsizes = array([cellsize] * 3)
+        else:
+            if not isinstance(unitcell, ndarray):
+                raise TypeError('unitcell must be a Numpy array')
+            if unitcell.shape != (3,):
+                raise ValueError('unitcell.shape must be (3,)')
+            if (unitcell <= 0).any():
+                raise ValueError('unitcell dimensions must be positive')
+            self._unitcell = unitcell = array(unitcell, float)
+            coords = coords % unitcell
+            self._origin = zeros(3)
+            self._shape = maximum((unitcell // cellsize).astype(int), 1)
+            self._cellsizes = unitcell / self._shape
+
+        keys = self._getKeys(self._getCells(coords))
+        order = keys.argsort(kind='mergesort')
+        self._keys, self._starts = unique(keys[order], return_index=True)
+        self._stops = concatenate((self._starts[1:], [len(keys)]))
+        self._order = order
+        self._coords = coords[order]
+
+    def __repr__(self):
+
+        return '<CellGrid: {0} atoms in {1} cells of {2} A>'.format(
+            len(self._coords), len(self._keys), self._cellsize)
+
+    def __len__(self):
+
+        return len(self._coords)
+
+    def getCellsize(self):
+        """Returns cell size the grid was built for."""
+
+        return self._cellsize
+
+    def getUnitcell(self):
+        """Returns unitcell array, or **None** if one was not provided."""
+
+        if self._unitcell is not None:
+            return self._unitcell.copy()
+
+    def _getCells(self, points):
+        """Returns cell indices of *points* along each dimension."""
+
+        cells = floor((points - self._origin) / self._cellsizes).astype(int)
+        if self._unitcell is not None:
+            cells %= self._shape
+        return cells
+
+    def _getKeys(self, cells):
+        """Returns keys of *cells*, which must be in the grid."""
+
+        shape = self._shape
+        return (cells[:, 0] * shape[1] + cells[:, 1]) * shape[2] + cells[:, 2]
+
+    def _getOffsets(self, radius):
+        """Returns offsets of cells that may contain atoms within *radius* of
+        a point in a cell."""
+
+        reach = ceil(radius / self._cellsizes).astype(int)
+        if self._unitcell is None:
+            offsets = [arange(-r, r + 1) for r in reach]
+        else:
+            # cells are not visited twice when offsets wrap around
+            offsets = [arange(-min(r, (n - 1) // 2), min(r, n // 2) + 1)
+                       for r, n in zip(reach, self._shape)]
+        return array(list(product(*offsets)))
+
+    def _getHalfOffsets(self, radius):
+        """Returns one of each pair of opposite offsets, and a boolean array
+        that is **True** for offsets that are their own opposites, for which
+        pairs of atoms are visited in both orders."""
+
+        offsets = self._getOffsets(radius)
+        opposites = -offsets
+        if self._unitcell is not None:
+            low = (self._shape - 1) // 2
+            opposites = (opposites + low) % self._shape - low
+        base = 2 * abs(offsets).max() + 1
+        keys = (offsets[:, 0] * base + offsets[:, 1]) * base + offsets[:, 2]
+        opkeys = ((opposites[:, 0] * base + opposites[:, 1]) * base +
+                  opposites[:, 2])
+        ahead = keys >= opkeys
+        return offsets[ahead], (keys == opkeys)[ahead]
+
+    def _checkPoints(self, points):
+
+        if not isinstance(points, ndarray):
+            raise TypeError('points must be a Numpy array')
+        if points.ndim == 1 and points.shape[0] == 3:
+            points = points.reshape((1, 3))
+        if points.ndim != 2 or points.shape[-1] != 3:
+            raise ValueError('points.shape must be (M,3) or (3,)')
+        points = array(points, float)
+        if self._unitcell is not None:
+            points %= self._unitcell
+        return points
+
+    def iterPairs(self, radius, points=None, blocksize=BLOCKSIZE):
+        """Yield arrays of indices of *points*, indices of atoms, and
+        distances between them for pairs within *radius*.  Pairs are yielded
+        in blocks and a pair appears only once, but pairs are not sorted.
+        When *points* is not given, pairs of atoms are yielded, with the
+        smaller atom index first."""
+
+        radius = float(radius)
+        if radius < 0:
+            raise ValueError('radius must be a non-negative number')
+        among = points is None
+        if among:
+            points = self._coords
+            offsets, mirrors = self._getHalfOffsets(radius)
+        else:
+            points = self._checkPoints(points)
+            offsets = self._getOffsets(radius)
+            mirrors = zeros(len(offsets), bool)
+        if not len(points) or not len(self._coords):
+            return
+
+        shape = self._shape
+        unitcell = self._unitcell
+        sqradius = radius * radius
+        cells = self._getCells(points)
+        queries = arange(len(points))
+        for offset, mirror in zip(offsets, mirrors):
+            neighbors = cells + offset
+            if unitcell is None:
+                inside = ((neighbors >= 0) & (neighbors < shape)).all(1)
+                which, neighbors = queries[inside], neighbors[inside]
+            else:
+                neighbors %= shape
+                which = queries
+            keys = self._getKeys(neighbors)
+            found = searchsorted(self._keys, keys)
+            found[found == len(self._keys)] = 0
+            occupied = self._keys[found] == keys
+            which, found = which[occupied], found[occupied]
+            if not len(which):
+                continue
+
+            starts = self._starts[found]
+            counts = self._stops[found] - starts
+            cumcounts = counts.cumsum()
+            edges = concatenate(([0], searchsorted(cumcounts,
+                arange(blocksize, cumcounts[-1], blocksize), 'right'),
+                [len(counts)]))
+            for first, last in zip(edges[:-1], edges[1:]):
+                if first == last:
+                    continue
+                blockcounts = counts[first:last]
+                total = blockcounts.sum()
+                ahead = blockcounts.cumsum() - blockcounts - starts[first:last]
+                qi = repeat(which[first:last], blockcounts)
+                aj = arange(total) - repeat(ahead, blockcounts)
+                if mirror:
+                    # both orders of a pair are visited, one is kept
+                    half = qi < aj
+                    qi, aj = qi[half], aj[half]
+                diff = self._coords[aj] - points[qi]
+                if unitcell is not None:
+                    diff -= unitcell * around(diff / unitcell)
+                dist = (diff ** 2).sum(1)
+                keep = dist <= sqradius
+                if not keep.any():
+                    continue
+                if among:
+                    qi = self._order[qi[keep]]
+                    aj = self._order[aj[keep]]
+                    yield minimum(qi, aj), maximum(qi, aj), sqrt(dist[keep])
+                else:
+                    yield qi[keep], self._order[aj[keep]], sqrt(dist[keep])
+
+    def getPairs(self, radius, points=None):
+        """Returns arrays of indices of *points*, indices of atoms, and
+        distances between them for pairs within *radius*, sorted by point
+        and atom indices.  When *points* is not given, pairs of atoms are
+        returned, see :meth:`iterPairs`."""
+
+        blocks = list(self.iterPairs(radius, points))
+        if not blocks:
+            return (array([], int), array([], int), array([], float))
+        qi, aj, dist = [concatenate(block) for block in zip(*blocks)]
+        order = (qi * len(self._coords) + aj).argsort()
+        return qi[order], aj[order], dist[order]
+
+    def getWithin(self, radius, points):
+        """Returns a boolean array with **True** values for atoms within
+        *radius* of any of *points*."""
+
+        torf = zeros(len(self._coords), bool)
+        for qi, aj, dist in self.iterPairs(radius, points):
+            torf[aj] = True
+        return torf
+
+    def getNear(self, radius, points):
+        """Returns a boolean array with **True** values for *points* within
+        *radius* of any atom."""
+
+        torf = zeros(len(self._checkPoints(points)), bool)
+        for qi, aj, dist in self.iterPairs(radius, points):
+            torf[qi] = True
+        return torf
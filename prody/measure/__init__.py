@@ -11,6 +11,8 @@ Following class and functions are for contact identifications:
   * :class:`.Contacts` - identify intermolecular contacts
   * :func:`.findNeighbors` - identify interacting atom pairs
   * :func:`.iterNeighbors` - identify interacting atom pairs
+  * :func:`.findNeighborPairs` - identify interacting atom pairs as arrays
+  * :func:`.calcContactFrequency` - calculate contact frequencies in frames
 
 Measure quantities
 ==================
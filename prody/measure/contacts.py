@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
 """ This module defines a class and function for identifying contacts."""
 
-from numpy import array, ndarray
+from numpy import array, ndarray, zeros, arange, concatenate
 
 from prody.atomic import Atomic, Atom, AtomGroup, AtomSubset, Selection
-from prody.kdtree import KDTree
+from prody.kdtree import CellGrid
 from prody.utilities import rangeString
 
-__all__ = ['Contacts', 'iterNeighbors', 'findNeighbors']
+__all__ = ['Contacts', 'iterNeighbors', 'findNeighbors', 'findNeighborPairs',
+           'calcContactFrequency']
+
+NEIGHBOR_DTYPE = [('i', int), ('j', int), ('d', float)]
 
 class Contacts(object):
 
@@ -24,7 +27,8 @@ class Contacts(object):
         except AttributeError:
             try:
                 self._ag = atoms.getAtoms()
-                unitcell = unitcell or atoms.getUnitcell()[:3]
+                if unitcell is None:
+                    unitcell = atoms.getUnitcell()[:3]
                 self._indices = atoms.getSelection()
             except AttributeError:
                 try:
@@ -38,7 +42,7 @@ class Contacts(object):
                                          '(3,).')
                     self._ag = None
                     self._indices = None
-                    self._kdtree = KDTree(atoms, unitcell=unitcell)
+                    coords = atoms
             else:
                 if self._ag is not None:
                     self._acsi = self._ag.getACSIndex()
@@ -46,18 +50,18 @@ class Contacts(object):
                         self._indices = self._indices.getIndices()
                 else:
                     self._acsi = None
-                self._kdtree = KDTree(self._atoms._getCoords(),
-                                      unitcell=unitcell)
+                coords = atoms._getCoords()
         else:
             try:
                 self._ag = atoms.getAtomGroup()
             except AttributeError:
                 self._ag = atoms
                 self._indices = None
-                self._kdtree = KDTree(atoms._getCoords(), unitcell=unitcell)
             else:
                 self._indices = atoms._getIndices()
-                self._kdtree = KDTree(atoms._getCoords(), unitcell=unitcell)
+            coords = atoms._getCoords()
+        self._coords = array(coords, float)
+        self._grid = None
         self._unitcell = unitcell
         self._atoms = atoms
 
@@ -84,34 +88,26 @@ class Contacts(object):
                 raise TypeError('center must be an Atomic instance or a'
                                 'coordinate array')
             else:
-                if shape == (3,):
-                    center = [center]
-                elif not ndim == 2 and shape[1] == 3:
+                if not (shape == (3,) or ndim == 2 and shape[1] == 3):
                     raise ValueError('center.shape must be (n_atoms, 3) or'
                                      '(3,)')
         else:
             if center is None:
                 raise ValueError('center does not have coordinate data')
 
-        search = self._kdtree.search
-        get_indices = self._kdtree.getIndices
-        get_count = self._kdtree.getCount
-        indices = set()
-        update = indices.update
         radius = float(radius)
-        for xyz in center:
-            search(radius, xyz)
-            if get_count():
-                update(get_indices())
-        indices = list(indices)
-        if indices:
-            indices.sort()
+        grid = self._grid
+        if grid is None or grid.getCellsize() != max(radius, 1.):
+            grid = self._grid = CellGrid(self._coords, max(radius, 1.),
+                                         self._unitcell)
+        indices = grid.getWithin(radius, center).nonzero()[0]
+        if len(indices):
             if self._ag is None:
-                return array(indices)
+                return indices
             else:
                 if self._indices is not None:
                     indices = self._indices[indices]
-                return Selection(self._ag, array(indices), 'index ' +
+                return Selection(self._ag, indices, 'index ' +
                                  rangeString(indices), acsi=self._acsi,
                                  unique=True)
 
@@ -128,21 +124,11 @@ class Contacts(object):
         return self._unitcell.copy()
 
 
-def iterNeighbors(atoms, radius, atoms2=None, unitcell=None):
-    """Yield pairs of *atoms* that are within *radius* of each other and the
-    distance between them.  If *atoms2* is also provided, one atom from *atoms*
-    and another from *atoms2* will be yielded.  If one of *atoms* or *atoms2*
-    is a coordinate array, pairs of indices and distances will be yielded.
-    When orthorhombic *unitcell* dimensions are provided, periodic boundary
-    conditions will be taken into account (see :class:`.KDTree` and also
-    :func:`wrapAtoms` for details).  If *atoms* is a :class:`.Frame` instance
-    and *unitcell* is not provided, unitcell information from frame will be
-    if available."""
-
-    radius = float(radius)
-    if radius <= 0:
-        raise ValueError('radius must be a positive number')
+def _getNeighborAtoms(atoms, label='atoms'):
+    """Returns coordinates, atom group, atom indices, active coordset index,
+    and unitcell of *atoms* for neighbor search."""
 
+    ag = indices = acsi = unitcell = None
     try:
         acsi = atoms.getACSIndex()
     except AttributeError:
@@ -150,128 +136,144 @@ def iterNeighbors(atoms, radius, atoms2=None, unitcell=None):
             ndim, shape = atoms.ndim, atoms.shape
         except AttributeError:
             try:
-                uc = atoms.getUnitcell()[:3]
+                unitcell = atoms.getUnitcell()
             except AttributeError:
-                raise TypeError('atoms must be an Atomic or Frame instance or '
-                                'a coordinate array')
+                raise TypeError('{0} must be an Atomic or Frame instance or '
+                                'a coordinate array'.format(label))
             else:
+                if unitcell is not None:
+                    unitcell = unitcell[:3]
                 coords = atoms._getCoords()
                 ag = atoms.getAtoms()
-                if unitcell is None:
-                    unitcell = uc
                 if ag is not None:
                     acsi = ag.getACSIndex()
-                    _ = atoms.getSelection()
-                    if _:
-                        indices = _._getIndices()
-                        index = lambda i: indices[i]
-                    else:
-                        index = lambda i: i
+                    sel = atoms.getSelection()
+                    if sel:
+                        indices = sel._getIndices()
         else:
             if ndim > 2:
-                raise ValueError('number of dimensions of coordinate array '
-                                 'must be 1 or 2')
+                raise ValueError('number of dimensions of {0} coordinate '
+                                 'array must be 1 or 2'.format(label))
             coords = atoms
-            ag = None
-            acsi = None
     else:
         coords = atoms._getCoords()
         try:
             ag = atoms.getAtomGroup()
-            indices = atoms.getIndices()
-            index = lambda i: indices[i]
         except AttributeError:
             ag = atoms
-            index = lambda i: i
+        else:
+            indices = atoms.getIndices()
 
+    if coords is None:
+        raise ValueError('coordinates of {0} are not set'.format(label))
     if coords.ndim == 1:
         coords = array([coords])
+    return coords, ag, indices, acsi, unitcell
+
+
+def _iterNeighborPairs(coords, radius, coords2=None, unitcell=None):
+    """Yield blocks of indices and distances of pairs within *radius* found
+    using a single cell grid search."""
+
+    if coords2 is None:
+        return CellGrid(coords, radius, unitcell).iterPairs(radius)
+    # grid is built for the larger set and queried with the smaller one
+    if len(coords2) > len(coords):
+        return CellGrid(coords2, radius, unitcell).iterPairs(radius, coords)
+    return ((i, j, d) for j, i, d in
+            CellGrid(coords, radius, unitcell).iterPairs(radius, coords2))
+
 
+def _sortNeighborPairs(blocks):
+
+    blocks = [concatenate(block) for block in zip(*blocks)]
+    if not blocks:
+        return zeros(0, NEIGHBOR_DTYPE)
+    i, j, d = blocks
+    order = (i * (j.max() + 1) + j).argsort()
+    pairs = zeros(len(order), NEIGHBOR_DTYPE)
+    pairs['i'], pairs['j'], pairs['d'] = i[order], j[order], d[order]
+    return pairs
+
+
+def findNeighborPairs(atoms, radius, atoms2=None, unitcell=None):
+    """Returns a structured array of pairs of *atoms* that are within *radius*
+    of each other.  Array has fields ``'i'`` and ``'j'`` for indices of atoms,
+    and ``'d'`` for the distance between them, and is sorted by indices.
+    Indices refer to positions of atoms in *atoms* and *atoms2*.  If *atoms2*
+    is not provided, pairs of *atoms* are returned with the smaller index
+    first.  All pairs are found in a single search over a :class:`.CellGrid`,
+    and when orthorhombic *unitcell* dimensions are provided, periodic
+    boundary conditions are taken into account without replicating atoms.
+    If *atoms* is a :class:`.Frame` instance and *unitcell* is not provided,
+    unitcell information from frame will be used if available."""
+
+    radius = float(radius)
+    if radius <= 0:
+        raise ValueError('radius must be a positive number')
+
+    coords, _, _, _, uc = _getNeighborAtoms(atoms)
+    if unitcell is None:
+        unitcell = uc
     if atoms2 is None:
         if len(coords) <= 1:
             raise ValueError('atoms must be more than 1')
+        coords2 = None
+    else:
+        coords2 = _getNeighborAtoms(atoms2, 'atoms2')[0]
+    return _sortNeighborPairs(_iterNeighborPairs(coords, radius, coords2,
+                                                 unitcell))
 
-        kdtree = KDTree(coords, unitcell=unitcell, none=list)
 
-        _dict = {}
-        if ag is None:
-            for (i, j), r in zip(*kdtree(radius)):
-                yield (i, j, r)
-        else:
-            for (i, j), r in zip(*kdtree(radius)):
-                a1 = _dict.get(i)
-                if a1 is None:
-                    a1 = Atom(ag, index(i), acsi)
-                    _dict[i] = a1
-                a2 = _dict.get(j)
-                if a2 is None:
-                    a2 = Atom(ag, index(j), acsi)
-                    _dict[j] = a2
-                yield (a1, a2, r)
+def iterNeighbors(atoms, radius, atoms2=None, unitcell=None):
+    """Yield pairs of *atoms* that are within *radius* of each other and the
+    distance between them.  If *atoms2* is also provided, one atom from *atoms*
+    and another from *atoms2* will be yielded.  If one of *atoms* or *atoms2*
+    is a coordinate array, pairs of indices and distances will be yielded.
+    When orthorhombic *unitcell* dimensions are provided, periodic boundary
+    conditions will be taken into account (see :class:`.CellGrid` and also
+    :func:`wrapAtoms` for details).  If *atoms* is a :class:`.Frame` instance
+    and *unitcell* is not provided, unitcell information from frame will be
+    if available.  Pairs are found using :func:`findNeighborPairs`, which
+    should be preferred for large numbers of atoms."""
+
+    radius = float(radius)
+    if radius <= 0:
+        raise ValueError('radius must be a positive number')
+
+    coords, ag, indices, acsi, uc = _getNeighborAtoms(atoms)
+    if unitcell is None:
+        unitcell = uc
+
+    if atoms2 is None:
+        if len(coords) <= 1:
+            raise ValueError('atoms must be more than 1')
+        coords2, ag2, indices2, acsi2 = coords, ag, indices, acsi
+        pairs = _sortNeighborPairs(_iterNeighborPairs(coords, radius,
+                                                      unitcell=unitcell))
     else:
-        try:
-            coords2 = atoms2._getCoords()
-        except AttributeError:
-            try:
-                ndim, shape = atoms2.ndim, atoms2.shape
-            except AttributeError:
-                raise TypeError('atoms2 must be an Atomic or Frame instance or '
-                                'a coordinate array')
-            else:
-                if ndim > 2:
-                    raise ValueError('number of dimensions of second '
-                                     'coordinate array must be 1 or 2')
-                coords2 = atoms2
-                ag2 = None
-                acsi2 = None
-        else:
-            try:
-                acsi2 = atoms2.getACSIndex()
-            except AttributeError:
-                acsi2 = None
-                ag2 = None
-                index2 = None
-            else:
-                try:
-                    ag2 = atoms2.getAtomGroup()
-                    indices2 = atoms2.getIndices()
-                    index2 = lambda i: indices2[i]
-                except AttributeError:
-                    ag2 = atoms2
-                    index2 = lambda i: i
-
-        if coords2.ndim == 1:
-            coords2 = array([coords2])
-        if len(coords) >= len(coords2):
-            kdtree = KDTree(coords, unitcell=unitcell, none=list)
-            _dict = {}
-            if ag is None or ag2 is None:
-                for j, xyz in enumerate(coords2):
-                    for i, r in zip(*kdtree(radius, xyz)):
-                        yield (i, j, r)
-            else:
-                for a2 in atoms2.iterAtoms():
-                    for i, r in zip(*kdtree(radius, a2._getCoords())):
-                        a1 = _dict.get(i)
-                        if a1 is None:
-                            a1 = Atom(ag, index(i), acsi)
-                            _dict[i] = a1
-                        yield (a1, a2, r)
-        else:
-            kdtree = KDTree(coords2, unitcell=unitcell, none=list)
-            _dict = {}
-            if ag is None or ag2 is None:
-                for i, xyz in enumerate(coords):
-                    for j, r in zip(*kdtree(radius, xyz)):
-                        yield (i, j, r)
-            else:
-                for a1 in atoms.iterAtoms():
-                    for i, r in zip(*kdtree(radius, a1._getCoords())):
-                        a2 = _dict.get(i)
-                        if a2 is None:
-                            a2 = Atom(ag2, index2(i), acsi2)
-                            _dict[i] = a2
-                        yield (a1, a2, r)
+        coords2, ag2, indices2, acsi2, _ = _getNeighborAtoms(atoms2, 'atoms2')
+        pairs = _sortNeighborPairs(_iterNeighborPairs(coords, radius,
+                                                      coords2, unitcell))
+
+    if ag is None or ag2 is None:
+        for pair in pairs.tolist():
+            yield pair
+        return
+
+    _dict, _dict2 = {}, {}
+    if atoms2 is None:
+        _dict2 = _dict
+    for i, j, r in pairs.tolist():
+        a1 = _dict.get(i)
+        if a1 is None:
+            a1 = Atom(ag, i if indices is None else indices[i], acsi)
+            _dict[i] = a1
+        a2 = _dict2.get(j)
+        if a2 is None:
+            a2 = Atom(ag2, j if indices2 is None else indices2[j], acsi2)
+            _dict2[j] = a2
+        yield (a1, a2, r)
 
 
 def findNeighbors(atoms, radius, atoms2=None, unitcell=None):
@@ -279,3 +281,83 @@ def findNeighbors(atoms, radius, atoms2=None, unitcell=None):
     distance between them.  See :func:`iterNeighbors` for more details."""
 
     return list(iterNeighbors(atoms, radius, atoms2, unitcell))
+
+
+def calcContactFrequency(ensemble, radius, indices=None, indices2=None,
+                         unitcell=None):
+    """Returns a matrix of the fraction of frames in which pairs of atoms are
+    within *radius* of each other.  *ensemble* may be an :class:`.Ensemble`,
+    a :class:`.Trajectory`, an :class:`.Atomic` instance with multiple
+    coordinate sets, or a coordinate set array with shape
+    ``(n_csets, n_atoms, 3)``.  Contacts in each frame are found using a
+    single pair search (see :func:`findNeighborPairs`) and counted without
+    building lists of pairs.
+
+    :arg indices: indices of atoms in a frame that correspond to rows of the
+        matrix, by default all atoms
+    :type indices: :class:`numpy.ndarray`
+
+    :arg indices2: indices of atoms in a frame that correspond to columns of
+        the matrix, by default contacts among atoms in *indices* are counted
+        and a symmetric matrix is returned
+    :type indices2: :class:`numpy.ndarray`
+
+    :arg unitcell: orthorhombic unitcell dimensions for periodic boundary
+        conditions, or **True** to use unitcell of each trajectory frame
+    :type unitcell: :class:`numpy.ndarray`, bool"""
+
+    radius = float(radius)
+    if radius <= 0:
+        raise ValueError('radius must be a positive number')
+
+    traj = None
+    try:
+        nfi = ensemble.nextIndex()
+    except AttributeError:
+        try:
+            coordsets = ensemble._getCoordsets()
+        except AttributeError:
+            coordsets = ensemble
+        try:
+            ndim, shape = coordsets.ndim, coordsets.shape
+        except AttributeError:
+            raise TypeError('ensemble must be an Ensemble, Trajectory, '
+                            'Atomic instance or a coordinate set array')
+        if not (ndim == 3 and shape[2] == 3):
+            raise ValueError('coordsets.shape must be (n_csets, n_atoms, 3)')
+        if unitcell is True:
+            raise ValueError('unitcell of frames is available only for '
+                             'trajectories')
+        frames = ((xyz, unitcell) for xyz in coordsets)
+        n_atoms = shape[1]
+    else:
+        traj = ensemble
+        traj.reset()
+        frames = ((frame._getCoords(), frame._getUnitcell()
+                   if unitcell is True else unitcell) for frame in traj)
+        n_atoms = traj.numSelected()
+
+    if indices is None:
+        indices = arange(n_atoms)
+    if indices2 is None:
+        counts = zeros((len(indices), len(indices)))
+    else:
+        counts = zeros((len(indices), len(indices2)))
+
+    n_frames = 0
+    for xyz, uc in frames:
+        if uc is not None:
+            uc = uc[:3]
+        coords2 = None if indices2 is None else xyz[indices2]
+        for i, j, d in _iterNeighborPairs(xyz[indices], radius, coords2, uc):
+            counts[i, j] += 1
+        n_frames += 1
+
+    if traj is not None:
+        traj.goto(nfi)
+
+    if indices2 is None:
+        counts += counts.T
+    if n_frames:
+        counts /= n_frames
+    return counts
@@ -11,8 +11,11 @@ from .measure import calcCenter
 
 linalg = importLA()
 
+BATCHSIZE = 1000
+
 __all__ = ['Transformation', 'applyTransformation', 'alignCoordsets',
-           'calcRMSD', 'calcTransformation', 'superpose',
+           'calcRMSD', 'calcRMSDMatrix', 'calcTransformation', 'superpose',
+           'superposeCoordsets',
            'moveAtoms', 'wrapAtoms',
            'printRMSD']
 
@@ -157,6 +160,32 @@ def getTransformation(mob, tar, weights=None):
     return rotation, tar_com - np.dot(mob_com, rotation)
 
 
+def getTransformations(mobs, tar, weights=None):
+    """Returns rotation matrices and translation vectors that superpose each
+    coordinate set in *mobs* onto *tar*, same as :func:`getTransformation`,
+    but for a stack of coordinate sets.  Correlation matrices are calculated
+    using a single :func:`~numpy.einsum` call and are decomposed using
+    stacked SVD.  *weights* may have shape (n_atoms, 1), or (n_csets,
+    n_atoms, 1) for weighting each coordinate set differently."""
+
+    if weights is None:
+        mob_com = mobs.mean(1)
+        tar_com = tar.mean(0)
+        mob = mobs - mob_com[:, np.newaxis]
+        tar = tar - tar_com
+    else:
+        weights_sum = weights.sum(-2)
+        mob_com = (mobs * weights).sum(1) / weights_sum
+        tar_com = (tar * weights).sum(-2) / weights_sum
+        mob = (mobs - mob_com[:, np.newaxis]) * weights
+        tar = (tar - tar_com[..., np.newaxis, :]) * weights
+    matrix = np.einsum('...ai,...aj->...ij', mob, tar)
+    U, s, Vh = np.linalg.svd(matrix)
+    Vh[:, 2] *= np.sign(np.linalg.det(matrix))[:, np.newaxis]
+    rotations = np.einsum('kij,kjl->kli', U, Vh)
+    return rotations, tar_com - np.einsum('kj,kij->ki', mob_com, rotations)
+
+
 def applyTransformation(transformation, atoms):
     """Returns *atoms* after applying *transformation*.  If *atoms*
     is a :class:`.Atomic` instance, it will be returned after
@@ -209,6 +238,55 @@ def superpose(mobile, target, weights=None):
     return (result, t)
 
 
+def superposeCoordsets(coordsets, target, weights=None, indices=None):
+    """Returns *coordsets* after superposing each coordinate set onto
+    *target* in place, and transformation matrices with shape (n_csets, 4,
+    4).  Transformations are calculated in batches for all coordinate sets
+    at once, see :func:`superpose` for superposing a single coordinate set.
+
+    :arg coordsets: coordinate sets with shape (n_csets, n_atoms, 3)
+    :type coordsets: :class:`numpy.ndarray`
+
+    :arg target: target coordinate set with shape (n_atoms, 3)
+    :type target: :class:`numpy.ndarray`
+
+    :arg weights: atomic weights with shape (n_atoms, 1), or (n_csets,
+        n_atoms, 1) for weighting each coordinate set differently
+    :type weights: :class:`numpy.ndarray`
+
+    :arg indices: indices of atoms for which transformations are calculated,
+        transformations are applied to all atoms
+    :type indices: :class:`numpy.ndarray`"""
+
+    if not isinstance(coordsets, np.ndarray) or coordsets.ndim != 3:
+        raise TypeError('coordsets must be a 3-dimensional numpy array')
+    if coordsets.shape[1:] != target.shape:
+        raise ValueError('coordsets and target must have same number of '
+                         'atoms')
+    if indices is not None:
+        target = target[indices]
+        if weights is not None:
+            weights = weights[..., indices, :]
+    matrices = np.zeros((len(coordsets), 4, 4))
+    matrices[:, 3, 3] = 1
+    for first in range(0, len(coordsets), BATCHSIZE):
+        last = first + BATCHSIZE
+        mobs = coordsets[first:last]
+        if indices is not None:
+            mobs = mobs[:, indices]
+        batch_weights = weights
+        if weights is not None and weights.ndim == 3:
+            batch_weights = weights[first:last]
+        rotations, translations = getTransformations(mobs, target,
+                                                     batch_weights)
+        coordsets[first:last] = (np.einsum('kai,kji->kaj',
+                                           coordsets[first:last], rotations) +
+                                 translations[:, np.newaxis])
+        matrices[first:last, :3, :3] = rotations
+        matrices[first:last, :3, 3] = translations
+    return coordsets, matrices
+
+
 def moveAtoms(atoms, **kwargs):
     """Move *atoms* *to* a new location or *by* an offset.  This method will
     change the active coordinate set of the *atoms*.  Note that only one of
@@ -432,6 +510,180 @@ def getRMSD(ref, tar, weights=None):
                 return np.sqrt(rmsd / weights.sum(1).flatten())
 
 
+def calcRMSDMatrix(coordsets, weights=None, superpose=False, **kwargs):
+    """Returns pairwise root-mean-square deviations (RMSDs) between
+    coordinate sets, calculated in blocks of coordinate sets using matrix
+    products and symmetry of the matrix.
+
+    :arg coordsets: coordinate sets with shape (n_csets, n_atoms, 3), or an
+        object with :meth:`getCoordsets` method
+    :type coordsets: :class:`numpy.ndarray`
+
+    :arg weights: atomic weights with shape (n_atoms, 1), or (n_csets,
+        n_atoms, 1) when each coordinate set has different weights, e.g.
+        zero for missing atoms, in which case a pair is weighted by the
+        product of their weights
+    :type weights: :class:`numpy.ndarray`
+
+    :arg superpose: calculate RMSDs after optimal superposition of each
+        pair, instead of using coordinates as they are, default is **False**
+    :type superpose: bool
+
+    :arg condensed: return upper triangle of the matrix as a vector, in the
+        same order as :func:`scipy.spatial.distance.pdist`, default is
+        **False**
+    :type condensed: bool
+
+    :arg out: array to write RMSDs into, or name of a file that will be
+        memory mapped for matrices that do not fit in memory
+    :type out: :class:`numpy.ndarray`, str
+
+    :arg blocksize: number of coordinate sets in a block, default is 500
+    :type blocksize: int
+
+    :arg n_cpu: number of processes that calculate blocks, default is 1
+    :type n_cpu: int"""
+
+    if not isinstance(coordsets, np.ndarray):
+        try:
+            coordsets = coordsets._getCoordsets()
+        except AttributeError:
+            raise TypeError('coordsets must be a numpy array or an object '
+                            'with getCoordsets method')
+    if coordsets.ndim != 3 or coordsets.shape[2] != 3:
+        raise ValueError('coordsets must have shape (n_csets, n_atoms, 3)')
+    n_csets, n_atoms = coordsets.shape[:2]
+    if weights is not None:
+        if weights.shape not in ((n_atoms, 1), (n_csets, n_atoms, 1)):
+            raise ValueError('weights must have shape (n_atoms, 1) or '
+                             '(n_csets, n_atoms, 1)')
+        if superpose and weights.ndim == 3:
+            raise ValueError('superposition is not supported with weights '
+                             'specific to coordinate sets')
+
+    condensed = kwargs.get('condensed', False)
+    blocksize = int(kwargs.get('blocksize', 500))
+    n_cpu = kwargs.get('n_cpu', 1)
+    if not isinstance(n_cpu, int):
+        raise TypeError('n_cpu must be an integer')
+    elif n_cpu < 1:
+        raise ValueError('n_cpu must be equal to or greater than 1')
+
+    shape = (n_csets * (n_csets - 1) // 2,) if condensed else (n_csets,
+                                                               n_csets)
+    out = kwargs.get('out')
+    if out is None:
+        out = np.zeros(shape)
+    elif isinstance(out, str):
+        out = np.memmap(out, float, 'w+', shape=shape)
+    elif out.shape != shape:
+        raise ValueError('out must have shape {0}'.format(shape))
+
+    data = _prepareRMSDs(coordsets, weights, superpose)
+    tiles = [(first, second) for first in range(0, n_csets, blocksize)
+             for second in range(first, n_csets, blocksize)]
+    tiles = [(slice(first, first + blocksize),
+              slice(second, second + blocksize)) for first, second in tiles]
+    if n_cpu == 1:
+        _initRMSDs(*data)
+        results = (_calcRMSDTile(tile) for tile in tiles)
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(min(multiprocessing.cpu_count(), n_cpu),
+                                    _initRMSDs, data)
+        results = pool.imap_unordered(_calcRMSDTile, tiles)
+
+    for (rows, cols), rmsds in results:
+        rows = np.arange(n_csets)[rows]
+        cols = np.arange(n_csets)[cols]
+        if condensed:
+            for i, row in enumerate(rows):
+                which = cols > row
+                if which.any():
+                    start = n_csets * row - row * (row + 1) // 2 - row - 1
+                    first = cols[which][0]
+                    out[start + first:start + cols[-1] + 1] = rmsds[i, which]
+        else:
+            out[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1] = rmsds
+            out[cols[0]:cols[-1] + 1, rows[0]:rows[-1] + 1] = rmsds.T
+    if n_cpu > 1:
+        pool.close()
+        pool.join()
+    _initRMSDs()
+    if not condensed:
+        out[np.arange(n_csets), np.arange(n_csets)] = 0
+    return out
+
+
+def _prepareRMSDs(coordsets, weights, superpose):
+    """Returns arrays used for calculating blocks of RMSD matrix."""
+
+    coordsets = np.asarray(coordsets, float)
+    n_csets, n_atoms = coordsets.shape[:2]
+    if weights is not None and weights.ndim == 3:
+        weights = weights[:, :, 0].astype(float)
+        coordsets = coordsets - coordsets.mean(0)
+        sqnorms = (coordsets ** 2).sum(2) * weights
+        coordsets = (coordsets * weights[:, :, np.newaxis]).reshape(
+            (n_csets, n_atoms * 3))
+        return 'pairweights', coordsets, sqnorms, weights
+    if weights is None:
+        weights = np.ones((n_atoms, 1))
+    weights = weights.astype(float)
+    if superpose:
+        centers = (coordsets * weights).sum(1) / weights.sum()
+        coordsets = coordsets - centers[:, np.newaxis]
+        sqnorms = ((coordsets ** 2) * weights).sum(2).sum(1)
+        weighted = (coordsets * weights).transpose(0, 2, 1).copy()
+        coordsets = coordsets.transpose(0, 2, 1).copy()
+        return 'superpose', weighted, coordsets, sqnorms, weights.sum()
+    coordsets = ((coordsets - coordsets.mean(0)) * weights ** 0.5).reshape(
+        (n_csets, n_atoms * 3))
+    sqnorms = (coordsets ** 2).sum(1)
+    return 'weights', coordsets, sqnorms, weights.sum()
+
+
+_RMSDS = ()
+
+
+def _initRMSDs(*data):
+
+    global _RMSDS
+    _RMSDS = data
+
+
+def _calcRMSDTile(tile):
+    """Returns *tile* and RMSDs between coordinate sets in *tile*, a pair of
+    slices for rows and columns."""
+
+    rows, cols = tile
+    kind = _RMSDS[0]
+    if kind == 'weights':
+        coordsets, sqnorms, total = _RMSDS[1:]
+        msds = (sqnorms[rows, np.newaxis] + sqnorms[cols] -
+                2 * np.dot(coordsets[rows], coordsets[cols].T)) / total
+    elif kind == 'pairweights':
+        coordsets, sqnorms, weights = _RMSDS[1:]
+        total = np.dot(weights[rows], weights[cols].T)
+        msds = (np.dot(sqnorms[rows], weights[cols].T) +
+                np.dot(weights[rows], sqnorms[cols].T) -
+                2 * np.dot(coordsets[rows], coordsets[cols].T))
+        msds = np.divide(msds, total, np.zeros_like(msds), where=total > 0)
+    else:
+        weighted, coordsets, sqnorms, total = _RMSDS[1:]
+        n_rows, n_cols = len(weighted[rows]), len(coordsets[cols])
+        n_atoms = coordsets.shape[2]
+        # correlation matrices of all pairs using a single matrix product
+        matrix = np.dot(weighted[rows].reshape((n_rows * 3, n_atoms)),
+                        coordsets[cols].reshape((n_cols * 3, n_atoms)).T)
+        matrix = matrix.reshape((n_rows, 3, n_cols, 3)).transpose(0, 2, 1, 3)
+        values = np.linalg.svd(matrix, compute_uv=False)
+        values[:, :, 2] *= np.sign(np.linalg.det(matrix))
+        msds = (sqnorms[rows, np.newaxis] + sqnorms[cols] -
+                2 * values.sum(2)) / total
+    return tile, np.sqrt(np.clip(msds, 0, None))
+
+
 def printRMSD(reference, target=None, weights=None, log=True, msg=None):
     """Print RMSD to the screen.  If *target* has multiple coordinate sets,
     minimum, maximum and mean RMSD values are printed.  If *log* is **True**
@@ -477,17 +729,21 @@ def alignCoordsets(atoms, weights=None):
         ag = atoms.getAtomGroup()
     except AttributeError:
         ag = atoms
-    agacsi = ag.getACSIndex()
 
     tar = atoms._getCoords()
-    for i in range(n_csets):
-        if i == acsi:
-            continue
-        atoms.setACSIndex(i)
-        ag.setACSIndex(i)
-        calcTransformation(atoms, tar, weights).apply(ag)
-    atoms.setACSIndex(acsi)
-    ag.setACSIndex(agacsi)
+    mobs = atoms._getCoordsets()
+    if weights is not None and weights.ndim == 1:
+        weights = weights.reshape((len(weights), 1))
+    which = np.arange(n_csets) != acsi
+    coordsets = ag._getCoordsets()
+    for first in range(0, n_csets, BATCHSIZE):
+        batch = which[first:first + BATCHSIZE].nonzero()[0] + first
+        rotations, translations = getTransformations(mobs[batch], tar,
+                                                     weights)
+        coordsets[batch] = (np.einsum('kai,kji->kaj', coordsets[batch],
+                                      rotations) +
+                            translations[:, np.newaxis])
+    ag._setTimeStamp()
     return atoms
 
 
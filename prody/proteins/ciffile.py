@@ -6,6 +6,7 @@
 
 from collections import defaultdict
 import os.path
+import re
 
 
 import numpy as np
@@ -167,6 +168,74 @@ def parseCIFStream(stream, **kwargs):
 
 parseCIFStream.__doc__ += _parseCIFdoc
 
+_CIFTOKEN = re.compile(r"""'(?:[^']|'(?!\s))*'(?!\S)|"(?:[^"]|"(?!\s))*"(?!\S)|\S+""")
+
+CHUNKSIZE = 2 ** 14
+"""Number of lines of a loop that are split into values at once."""
+
+_ATOMSITE = ['group_PDB', 'id', 'type_symbol', 'label_alt_id', 'Cartn_x',
+             'Cartn_y', 'Cartn_z', 'occupancy', 'B_iso_or_equiv',
+             'auth_seq_id', 'auth_comp_id', 'auth_asym_id', 'auth_atom_id',
+             'pdbx_PDB_ins_code', 'pdbx_PDB_model_num']
+
+_ATOMSITE_NUMBERS = {'id': int, 'Cartn_x': float, 'Cartn_y': float,
+                     'Cartn_z': float, 'occupancy': float,
+                     'B_iso_or_equiv': float, 'auth_seq_id': int}
+
+
+def _splitCIFValues(lines):
+    """Returns values in *lines*.  Quotes are removed from quoted values, such
+    as ``"O5'"``, which may contain spaces and quotes that are not followed by
+    a space.  Only lines with quotes are split using a regular expression."""
+
+    values = []
+    first = 0
+    for i, line in enumerate(lines):
+        if "'" in line or '"' in line:
+            values.extend('\n'.join(lines[first:i]).split())
+            values.extend(value[1:-1] if value[0] in '\'"' and len(value) > 1
+                          else value for value in _CIFTOKEN.findall(line))
+            first = i + 1
+    values.extend('\n'.join(lines[first:]).split())
+    return values
+
+
+def _iterCIFLoop(lines, n_fields, columns, chunksize=CHUNKSIZE):
+    """Yield lists of values in *columns* of a loop with *n_fields* whose rows
+    are in *lines*, for chunks of *chunksize* lines.  Rows may span lines."""
+
+    leftover = []
+    for i in range(0, len(lines), chunksize):
+        values = leftover + _splitCIFValues(lines[i:i+chunksize])
+        stop = len(values) - len(values) % n_fields
+        leftover = values[stop:]
+        if stop:
+            yield [values[column:stop:n_fields] for column in columns]
+    if leftover:
+        raise CIFParseError('number of values in loop is not a multiple of '
+                            'number of fields')
+
+
+def _getCIFNumbers(values, dtype=float):
+    """Returns an array of numbers in *values*, a list of strings, which are
+    converted at once when all of them are valid."""
+
+    if not values:
+        return np.zeros(0, dtype)
+    array = np.fromstring(' '.join(values), dtype, sep=' ')
+    if len(array) != len(values):
+        array = np.array(values).astype(dtype)
+    return array
+
+
+def _isIn(values, container):
+    """Returns a boolean array that is **True** for *values* that are in
+    *container*, which is checked once for each distinct value."""
+
+    unique, inverse = np.unique(values, return_inverse=True)
+    return np.array([value in container for value in unique], bool)[inverse]
+
+
 def _parseCIFLines(atomgroup, lines, model, chain, subset,
                    altloc_torf):
     """Returns an AtomGroup. See also :func:`.parsePDBStream()`.
@@ -181,50 +250,6 @@ def _parseCIFLines(atomgroup, lines, model, chain, subset,
             subset = flags.BACKBONE
         protein_resnames = flags.AMINOACIDS
 
-    asize = 0
-    i = 0
-    models = []
-    nModels = 0
-    fields = {}
-    fieldCounter = -1
-    foundModelNumFieldID = False
-    foundAtomBlock = False
-    doneAtomBlock = False
-    while not doneAtomBlock:
-        line = lines[i]
-        if line[:11] == '_atom_site.':
-            fieldCounter += 1
-            fields[line.split('.')[1].strip()] = fieldCounter
-
-        if line.startswith('ATOM') or line.startswith('HETATM'):
-            if not foundAtomBlock:
-                foundAtomBlock = True
-                start = i
-            models.append(line.split()[fields['pdbx_PDB_model_num']])
-            if models[asize] != models[asize-1]:
-                nModels += 1
-            asize += 1
-        else:
-            if foundAtomBlock:
-                doneAtomBlock = True
-        i += 1
-    stop = i-1
-    if nModels == 0: nModels = 1
-
-    if model is not None and model != 1:
-        for i in range(start, stop):
-            if str(models[i]) != model and str(models[i+1]) == model:
-                start = i+1
-            if str(models[i]) == model and str(models[i+1]) != model:
-                stop = i+1
-                break
-        if not str(model) in models:
-            raise CIFParseError('model {0} is not found'.format(model))
-
-    addcoords = False
-    if atomgroup.numCoordsets() > 0:
-        addcoords = True
- 
     if isinstance(altloc_torf, str):
         if altloc_torf.strip() != 'A':
             LOGGER.info('Parsing alternate locations {0}.'
@@ -237,98 +262,125 @@ def _parseCIFLines(atomgroup, lines, model, chain, subset,
         which_altlocs = '.A'
         altloc_torf = True
 
-    coordinates = np.zeros((asize, 3), dtype=float)
-    atomnames = np.zeros(asize, dtype=ATOMIC_FIELDS['name'].dtype)
-    resnames = np.zeros(asize, dtype=ATOMIC_FIELDS['resname'].dtype)
-    resnums = np.zeros(asize, dtype=ATOMIC_FIELDS['resnum'].dtype)
-    chainids = np.zeros(asize, dtype=ATOMIC_FIELDS['chain'].dtype)
-    hetero = np.zeros(asize, dtype=bool)
-    termini = np.zeros(asize, dtype=bool)
-    altlocs = np.zeros(asize, dtype=ATOMIC_FIELDS['altloc'].dtype)
-    icodes = np.zeros(asize, dtype=ATOMIC_FIELDS['icode'].dtype)
-    serials = np.zeros(asize, dtype=ATOMIC_FIELDS['serial'].dtype)
-    elements = np.zeros(asize, dtype=ATOMIC_FIELDS['element'].dtype)
-    bfactors = np.zeros(asize, dtype=ATOMIC_FIELDS['beta'].dtype)
-    occupancies = np.zeros(asize, dtype=ATOMIC_FIELDS['occupancy'].dtype)
-
-    n_atoms = atomgroup.numAtoms()
-    if n_atoms > 0:
-        asize = n_atoms
-
-    acount = 0
-    for line in lines[start:stop]:
-        startswith = line.split()[fields['group_PDB']]
-
-        atomname = line.split()[fields['auth_atom_id']]
-        resname = line.split()[fields['auth_comp_id']]
-
-        if subset is not None:
-            if not (atomname in subset and resname in protein_resnames):
-                continue
-
-        chID = line.split()[fields['auth_asym_id']]
-        if chain is not None:
-            if not chID in chain:
-                continue
-
-        alt = line.split()[fields['label_alt_id']]
-        if alt not in which_altlocs:
-            continue
-
+    # atom_site loop contains one row for each atom in each model
+    fields = {}
+    i = 0
+    n_lines = len(lines)
+    while i < n_lines and lines[i][:11] != '_atom_site.':
+        i += 1
+    while i < n_lines and lines[i][:11] == '_atom_site.':
+        fields[lines[i].split('.')[1].strip()] = len(fields)
+        i += 1
+    start = i
+    while i < n_lines and not lines[i].startswith(('#', '_', 'loop_',
+                                                   'data_')):
+        i += 1
+    if not fields:
+        return atomgroup
+    labels = [label for label in _ATOMSITE if label in fields]
+    for label in _ATOMSITE[:-1]:
+        if label not in fields:
+            raise CIFParseError('_atom_site.{0} is not found'.format(label))
+
+    masks = []
+    if subset is not None:
+        masks.append(('auth_atom_id', subset))
+        masks.append(('auth_comp_id', protein_resnames))
+    if chain is not None:
+        masks.append(('auth_asym_id', chain))
+    masks.append(('label_alt_id', which_altlocs))
+    data = defaultdict(list)
+    for values in _iterCIFLoop(lines[start:i], len(fields),
+                               [fields[label] for label in labels]):
+        values = dict(zip(labels, values))
+        if 'pdbx_PDB_model_num' in values:
+            models = _getCIFNumbers(values.pop('pdbx_PDB_model_num'), int)
+        else:
+            models = np.ones(len(values['id']), int)
+        which = np.ones(len(models), bool)
         if model is not None:
-            if int(models[acount]) < model:
-                continue
-            elif int(models[acount]) > model:
-                break
-
-        coordinates[acount] = [line.split()[fields['Cartn_x']], \
-                              line.split()[fields['Cartn_y']], \
-                              line.split()[fields['Cartn_z']]]
-        atomnames[acount] = atomname
-        resnames[acount] = resname
-        resnums[acount] = line.split()[fields['auth_seq_id']]
-        chainids[acount] = chID
-        hetero[acount] = startswith == 'HETATM' # True or False
-        if chainids[acount] != chainids[acount-1]: termini[acount] = True
-        altlocs[acount] = alt
-        icodes[acount] = line.split()[fields['pdbx_PDB_ins_code']]
-        if icodes[acount] == '?': icodes[acount] = ''
-        serials[acount] = line.split()[fields['id']]
-        elements[acount] = line.split()[fields['type_symbol']]
-        bfactors[acount] = line.split()[fields['B_iso_or_equiv']]
-        occupancies[acount] = line.split()[fields['occupancy']]
-        
-        acount += 1
-
-    if model is not None:
-        nModels = 1
-
-    modelSize = acount//nModels
-
-    if addcoords:
-        atomgroup.addCoordset(coordinates[:modelSize])
+            which &= models == model
+            # models follow each other, so reading can stop after this one
+            beyond = models[-1] > model
+        arrays = {}
+        for label, container in masks:
+            arrays[label] = np.array(values.pop(label))
+            which &= _isIn(arrays[label], container)
+        if not which.all():
+            # values of atoms that are not parsed are not converted
+            index = which.nonzero()[0]
+            models = models[index]
+            for label in arrays:
+                arrays[label] = arrays[label][index]
+            for label in values:
+                column = values[label]
+                values[label] = [column[k] for k in index]
+
+        data['model'].append(models)
+        for label in _ATOMSITE[:-1]:
+            if label in arrays:
+                data[label].append(arrays[label])
+            elif label in _ATOMSITE_NUMBERS:
+                data[label].append(_getCIFNumbers(values[label],
+                                                  _ATOMSITE_NUMBERS[label]))
+            else:
+                data[label].append(np.array(values[label]))
+        if model is not None and beyond and sum(map(len, data['model'])):
+            break
+
+    data = dict((label, np.concatenate(arrays))
+                for label, arrays in data.items())
+    models = data['model']
+    if model is not None and not len(models):
+        raise CIFParseError('model {0} is not found'.format(model))
+    if not len(models):
+        return atomgroup
+
+    bounds = np.concatenate(([0], (models[1:] != models[:-1]).nonzero()[0] + 1,
+                             [len(models)]))
+    coordinates = np.array([data['Cartn_x'], data['Cartn_y'],
+                            data['Cartn_z']]).T
+    n_atoms = bounds[1]
+    coordsets = []
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        if last - first == n_atoms:
+            coordsets.append(coordinates[first:last])
+        else:
+            LOGGER.warn('Discarding model {0}, which contains {1} atoms '
+                        'while the first model contains {2}.'
+                        .format(models[first], last - first, n_atoms))
+    coordsets = np.array(coordsets)
+    if atomgroup.numCoordsets() > 0:
+        atomgroup.addCoordset(coordsets)
     else:
-        atomgroup._setCoords(coordinates[:modelSize])
-
-    atomgroup.setNames(atomnames[:modelSize])
-    atomgroup.setResnames(resnames[:modelSize])
-    atomgroup.setResnums(resnums[:modelSize])
-    atomgroup.setChids(chainids[:modelSize])
-    atomgroup.setFlags('hetatm', hetero[:modelSize])
-    atomgroup.setFlags('pdbter', termini[:modelSize])
-    atomgroup.setAltlocs(altlocs[:modelSize])
-    atomgroup.setIcodes(icodes[:modelSize])
-    atomgroup.setSerials(serials[:modelSize])
-
-    atomgroup.setElements(elements[:modelSize])
+        atomgroup._setCoords(coordsets)
+
+    chainids = data['auth_asym_id'][:n_atoms]
+    termini = np.zeros(n_atoms, bool)
+    termini[0] = chainids[0] != ''
+    termini[1:] = chainids[1:] != chainids[:-1]
+    icodes = data['pdbx_PDB_ins_code'][:n_atoms]
+    icodes[icodes == '?'] = ''
+    elements, inverse = np.unique(data['type_symbol'][:n_atoms].astype(
+        ATOMIC_FIELDS['element'].dtype), return_inverse=True)
+
+    atomgroup.setNames(data['auth_atom_id'][:n_atoms].astype(
+        ATOMIC_FIELDS['name'].dtype))
+    atomgroup.setResnames(data['auth_comp_id'][:n_atoms].astype(
+        ATOMIC_FIELDS['resname'].dtype))
+    atomgroup.setResnums(data['auth_seq_id'][:n_atoms])
+    atomgroup.setChids(chainids.astype(ATOMIC_FIELDS['chain'].dtype))
+    atomgroup.setFlags('hetatm', data['group_PDB'][:n_atoms] == 'HETATM')
+    atomgroup.setFlags('pdbter', termini)
+    atomgroup.setAltlocs(data['label_alt_id'][:n_atoms].astype(
+        ATOMIC_FIELDS['altloc'].dtype))
+    atomgroup.setIcodes(icodes.astype(ATOMIC_FIELDS['icode'].dtype))
+    atomgroup.setSerials(data['id'][:n_atoms])
+
+    atomgroup.setElements(elements[inverse])
     from prody.utilities.misctools import getMasses
-    atomgroup.setMasses(getMasses(elements[:modelSize]))
-    atomgroup.setBetas(bfactors[:modelSize])
-    atomgroup.setOccupancies(occupancies[:modelSize])
-
-    for n in range(1,nModels):
-        atomgroup.addCoordset(coordinates[n*modelSize:(n+1)*modelSize])
+    atomgroup.setMasses(getMasses(elements)[inverse])
+    atomgroup.setBetas(data['B_iso_or_equiv'][:n_atoms])
+    atomgroup.setOccupancies(data['occupancy'][:n_atoms])
 
     return atomgroup
-
-
@@ -8,6 +8,7 @@ import os.path
 
 
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 
 from prody.atomic import AtomGroup
 from prody.atomic import flags
@@ -378,8 +379,28 @@ def _parsePDBLines(atomgroup, lines, split, model, chain, subset,
         only_chains = False
     else:
         only_chains = True
+    if isinstance(altloc_torf, str):
+        if altloc_torf.strip() != 'A':
+            LOGGER.info('Parsing alternate locations {0}.'
+                        .format(altloc_torf))
+            which_altlocs = ' ' + ''.join(altloc_torf.split())
+        else:
+            which_altlocs = ' A'
+        altloc_torf = False
+    else:
+        which_altlocs = ' A'
+        altloc_torf = True
+
     onlycoords = False
     n_atoms = atomgroup.numAtoms()
+    if n_atoms == 0:
+        # regular files are parsed using vectorized operations, and lines are
+        # evaluated one at a time below only when this is not possible
+        ag = _parsePDBLinesFast(atomgroup, lines, split, model, chain,
+                                subset, which_altlocs, altloc_torf, isPDB)
+        if ag is not None:
+            return ag
+
     if n_atoms > 0:
         asize = n_atoms
     else:
@@ -426,18 +447,6 @@ def _parsePDBLines(atomgroup, lines, split, model, chain, subset,
                     break
         if nmodel != model:
             raise PDBParseError('model {0} is not found'.format(model))
-    if isinstance(altloc_torf, str):
-        if altloc_torf.strip() != 'A':
-            LOGGER.info('Parsing alternate locations {0}.'
-                        .format(altloc_torf))
-            which_altlocs = ' ' + ''.join(altloc_torf.split())
-        else:
-            which_altlocs = ' A'
-        altloc_torf = False
-    else:
-        which_altlocs = ' A'
-        altloc_torf = True
-
     acount = 0
     altloc = defaultdict(list)
     i = start
@@ -770,6 +779,285 @@ def _parsePDBLines(atomgroup, lines, split, model, chain, subset,
 
     return atomgroup
 
+def _getLines(buf, starts, lengths, width):
+    """Returns a 2-D ``|S1`` array of the first *width* columns of lines that
+    start at *starts* in *buf* and have *lengths*, padded with spaces.  *buf*
+    must end with at least *width* spaces."""
+
+    windows = as_strided(buf, (len(buf) - width + 1, width), (1, 1))
+    block = windows[starts]
+    short = lengths < width
+    if short.any():
+        rows = block[short]
+        rows[np.arange(width) >= lengths[short, np.newaxis]] = b' '
+        block[short] = rows
+    return block
+
+
+def _getField(block, first, last):
+    """Returns columns *first* to *last* of *block* as a string array."""
+
+    return np.ascontiguousarray(block[:, first:last]).view(
+        '|S{0}'.format(last - first)).ravel()
+
+
+def _getStrings(block, first, last, dtype, strip=True):
+    """Returns columns *first* to *last* of *block* as an array of *dtype*,
+    which is converted and stripped once for each distinct value."""
+
+    unique, inverse = np.unique(_getField(block, first, last),
+                                return_inverse=True)
+    unique = unique.astype(dtype)
+    if strip:
+        unique = np.char.strip(unique)
+    return unique[inverse]
+
+
+def _getNumbers(fields, dtype=float):
+    """Returns numbers in rows of *fields*, a 2-D ``|S1`` array.  Numbers in
+    fixed-point notation, e.g. ``' -12.345'``, are evaluated using array
+    operations, and others are converted one at a time, which raises
+    :exc:`ValueError` for invalid ones."""
+
+    codes = np.ascontiguousarray(fields.view(np.uint8).T)
+    digits = codes - 48
+    isdigit = digits < 10
+    blank = codes == 32
+    point = codes == 46
+    minus = codes == 45
+    begun = np.logical_or.accumulate(~blank, 0)
+    valid = ((isdigit | blank | point | minus).all(0) & isdigit.any(0) &
+             ~(begun[:-1] & (blank[1:] | minus[1:])).any(0))
+    if dtype is float:
+        valid &= point.sum(0) <= 1
+    else:
+        valid &= ~point.any(0)
+
+    values = np.zeros(codes.shape[1], int)
+    for digit, torf in zip(digits, isdigit):
+        values = np.where(torf, values * 10 + digit, values)
+    if dtype is float:
+        # integer mantissas and powers of ten are exact, so divisions are
+        # rounded as parsing the text would be
+        values = values / 10. ** (isdigit &
+                                 np.logical_or.accumulate(point, 0)).sum(0)
+    values[minus.any(0)] *= -1
+    if not valid.all():
+        other = ~valid
+        values[other] = np.ascontiguousarray(fields[other]).view(
+            '|S{0}'.format(fields.shape[1])).ravel().astype(dtype)
+    return values
+
+
+def _getFloats(block, first, last, linenos, message):
+    """Returns floats in columns *first* to *last* of *block*.  Values that
+    cannot be converted are set to zero with a warning *message* formatted
+    with the line number."""
+
+    try:
+        return _getNumbers(block[:, first:last])
+    except ValueError:
+        values = np.zeros(len(block))
+        for k, value in enumerate(_getField(block, first, last)):
+            try:
+                values[k] = value
+            except ValueError:
+                LOGGER.warn(message.format(linenos[k]))
+        return values
+
+
+def _parsePDBLinesFast(atomgroup, lines, split, model, chain, subset,
+                       which_altlocs, altloc_torf, isPDB):
+    """Returns *atomgroup* with data parsed from *lines*, or **None** without
+    changing it when lines need to be evaluated one at a time by
+    :func:`_parsePDBLines`, e.g. when models differ in size or fields cannot
+    be converted.  Columns of all atom records are gathered into a 2-D
+    ``|S1`` array and fields are converted in bulk."""
+
+    if len(lines) <= split or not isinstance(lines[split], str):
+        return None
+    sep = '' if lines[split].endswith('\n') else '\n'
+    text = sep.join(lines[split:])
+    if sep or not text.endswith('\n'):
+        text += '\n'
+    try:
+        buf = np.frombuffer(text.encode('ascii') + b' ' * 80, '|S1')
+    except UnicodeEncodeError:
+        return None
+    ends = (buf.view(np.uint8) == 10).nonzero()[0]
+    n_lines = len(ends)
+    if n_lines != len(lines) - split:
+        return None
+    starts = np.append(0, ends[:-1] + 1)
+    lengths = ends - starts
+    lengths[buf.view(np.uint8)[ends - 1] == 13] -= 1
+
+    heads = _getLines(buf, starts, lengths, 6)
+    records = _getField(heads, 0, 6)
+    first = 0
+    if isPDB and model is not None and model != 1:
+        models = (_getField(heads, 0, 5) == b'MODEL').nonzero()[0]
+        if len(models) < model:
+            return None
+        first = models[model - 1] + 1
+    isatom = (records == b'ATOM  ') | (records == b'HETATM')
+    isatom[:first] = False
+    atomlines = isatom.nonzero()[0]
+    if not len(atomlines):
+        return None
+    block = _getLines(buf, starts[atomlines], lengths[atomlines], 80)
+
+    keep = np.ones(len(atomlines), bool)
+    if subset:
+        names = np.char.strip(_getField(block, 12, 16))
+        resnames = np.char.strip(_getField(block, 17, 21))
+        keep &= np.in1d(names, [name.encode() for name in subset])
+        keep &= np.in1d(resnames, [name.encode() for name in
+                                   flags.AMINOACIDS])
+    if chain is not None:
+        keep &= np.in1d(_getField(block, 21, 22),
+                        [chid.encode() for chid in chain])
+    which = np.in1d(_getField(block, 16, 17),
+                    [alt.encode() for alt in which_altlocs])
+    if altloc_torf and (keep & ~which).any():
+        return None
+    keep &= which
+    rows = keep.nonzero()[0]
+    if not len(rows):
+        return None
+    klines = atomlines[rows]
+
+    # number of atoms is set by the first end record that follows atoms,
+    # and each following end record that follows atoms closes a model
+    endlines = (_getField(heads, 0, 3) == b'END').nonzero()[0]
+    endlines = endlines[endlines >= first]
+    counts = np.diff(np.append(0, klines.searchsorted(endlines)))
+    endlines, counts = endlines[counts > 0], counts[counts > 0]
+    if not len(endlines):
+        n_atoms = len(rows)
+        stop = n_lines
+        models = [rows]
+    else:
+        n_atoms = counts[0]
+        stop = endlines[0]
+        models = [rows[:n_atoms]]
+        if model is None and n_lines - endlines[0] - 1 >= n_atoms:
+            offset = n_atoms
+            for i, (line, count) in enumerate(zip(endlines[1:], counts[1:])):
+                if (count > n_atoms or n_lines - line - 1 < count and
+                        i + 2 < len(endlines)):
+                    return None
+                if count < n_atoms:
+                    LOGGER.warn('Discarding model {0}, which contains '
+                                '{1} fewer atoms than the first model '
+                                'does.'.format(len(models) + 1,
+                                               n_atoms - count))
+                else:
+                    models.append(rows[offset:offset + count])
+                offset += count
+            trailing = len(rows) - offset
+            if trailing > n_atoms or (trailing and
+                    n_lines - endlines[-1] - 1 < counts[-1]):
+                return None
+            elif trailing == n_atoms:
+                models.append(rows[offset:])
+            tail = records[stop:]
+            if len(models) > 1 and ((tail == b'ANISOU') |
+                                    (tail == b'SIGUIJ')).any():
+                return None
+
+    coordinates = np.zeros((len(models) * n_atoms, 3))
+    try:
+        coords = block[np.concatenate(models)]
+        for i, column in enumerate((30, 38, 46)):
+            coordinates[:, i] = _getNumbers(coords[:, column:column + 8])
+        block = block[models[0]]
+        resnums = _getNumbers(block[:, 22:26], int)
+    except ValueError:
+        return None
+    if len(models) > 1:
+        coordinates = coordinates.reshape((len(models), n_atoms, 3))
+
+    klines = klines[:n_atoms]
+    linenos = split + klines
+    try:
+        serials = _getNumbers(block[:, 6:11], int)
+    except ValueError:
+        serials = np.zeros(n_atoms, int)
+        for k, value in enumerate(_getField(block, 6, 11)):
+            try:
+                serials[k] = value
+            except ValueError:
+                try:
+                    serials[k] = int(value, 16)
+                except ValueError:
+                    LOGGER.warn('Failed to parse serial number in line {0}.'
+                                .format(linenos[k]))
+                    serials[k] = serials[k-1] + 1
+
+    termini = np.zeros(n_atoms, bool)
+    terlines = (np.char.strip(records[first:stop]) == b'TER').nonzero()[0]
+    index = klines.searchsorted(terlines + first) - 1
+    termini[index[index >= 0]] = True
+
+    anisous = {}
+    for record in (b'ANISOU', b'SIGUIJ') if isPDB else ():
+        found = (records[first:stop] == record).nonzero()[0] + first
+        index = klines.searchsorted(found) - 1
+        found, index = found[index >= 0], index[index >= 0]
+        if not len(found):
+            continue
+        label = record.decode().lower()
+        values = np.zeros((n_atoms, 6), ATOMIC_FIELDS[label].dtype)
+        columns = _getLines(buf, starts[found], lengths[found], 70)
+        try:
+            for i, (start, end) in enumerate(((28, 35), (35, 42), (43, 49),
+                                              (49, 56), (56, 63), (63, 70))):
+                values[index, i] = _getNumbers(columns[:, start:end])
+        except ValueError:
+            return None
+        anisous[label] = values / 10000
+
+    atomgroup._setCoords(coordinates)
+    atomgroup.setNames(_getStrings(block, 12, 16,
+                                   ATOMIC_FIELDS['name'].dtype))
+    atomgroup.setResnames(_getStrings(block, 17, 21,
+                                      ATOMIC_FIELDS['resname'].dtype))
+    atomgroup.setResnums(resnums)
+    atomgroup.setChids(_getStrings(block, 21, 22,
+                                   ATOMIC_FIELDS['chain'].dtype, False))
+    atomgroup.setFlags('hetatm', (block[:, 0] == b'H') if isPDB else
+                       np.zeros(n_atoms, bool))
+    atomgroup.setFlags('pdbter', termini)
+    atomgroup.setAltlocs(_getStrings(block, 16, 17,
+                                     ATOMIC_FIELDS['altloc'].dtype, False))
+    atomgroup.setIcodes(_getStrings(block, 26, 27,
+                                    ATOMIC_FIELDS['icode'].dtype))
+    atomgroup.setSerials(serials)
+    if isPDB:
+        atomgroup.setBetas(_getFloats(block, 60, 66, linenos,
+            'failed to parse beta-factor at line {0}'))
+        atomgroup.setOccupancies(_getFloats(block, 54, 60, linenos,
+            'failed to parse occupancy at line {0}'))
+        atomgroup.setSegnames(_getStrings(block, 72, 76,
+                                          ATOMIC_FIELDS['segment'].dtype))
+        elements, inverse = np.unique(_getStrings(block, 76, 78,
+            ATOMIC_FIELDS['element'].dtype), return_inverse=True)
+        atomgroup.setElements(elements[inverse])
+        from prody.utilities.misctools import getMasses
+        atomgroup.setMasses(getMasses(elements)[inverse])
+        if 'anisou' in anisous:
+            atomgroup.setAnisous(anisous['anisou'])
+        if 'siguij' in anisous:
+            atomgroup.setAnistds(anisous['siguij'])
+    else:
+        atomgroup.setCharges(_getFloats(block, 54, 62, linenos,
+            'failed to parse charge at line {0}'))
+        atomgroup.setRadii(_getFloats(block, 62, 69, linenos,
+            'failed to parse radius at line {0}'))
+    return atomgroup
+
+
 def _evalAltlocs(atomgroup, altloc, chainids, resnums, resnames, atomnames):
     altloc_keys = list(altloc)
     altloc_keys.sort()
@@ -844,13 +1132,76 @@ SHEETLINE = ('SHEET  {strand:3d} {sheetID:>3s}{numStrands:2d} '
              '{initResName:3s} {initChainID:1s}{initSeqNum:4d}{initICode:1s} '
              '{endResName:3s} {endChainID:1s}{endSeqNum:4d}{endICode:1s}{sense:2d} \n')
 
-PDBLINE_LT100K = ('%-6s%5d %-4s%1s%-4s%1s%4d%1s   '
-                  '%8.3f%8.3f%8.3f%6.2f%6.2f      '
-                  '%4s%2s\n')
+PDBLINE_PREFIX = '%-6s%5d %-4s%1s%-4s%1s%4d%1s   '
+
+PDBLINE_PREFIX_HEX = '%-6s%5x %-4s%1s%-4s%1s%4d%1s   '
+
+PDBLINE_SUFFIX = '%6.2f%6.2f      %4s%2s\n'
+
+PDBLINE_LT100K = PDBLINE_PREFIX + '%8.3f%8.3f%8.3f' + PDBLINE_SUFFIX
+
+PDBLINE_GE100K = PDBLINE_PREFIX_HEX + '%8.3f%8.3f%8.3f' + PDBLINE_SUFFIX
+
+
+def _getPDBTemplate(prefixes, suffixes):
+    """Returns a 2-D :class:`numpy.uint8` array of atom lines with *prefixes*
+    and *suffixes* and 24 columns for coordinates in between, which start at
+    the length of prefixes.  **None** is returned if lines differ in length
+    or are not ASCII."""
+
+    if len(set(map(len, prefixes))) > 1 or len(set(map(len, suffixes))) > 1:
+        return None
+    n_atoms = len(prefixes)
+    if not n_atoms:
+        return None
+    try:
+        prefixes = np.frombuffer(''.join(prefixes).encode('ascii'),
+                                 np.uint8).reshape((n_atoms, -1))
+        suffixes = np.frombuffer(''.join(suffixes).encode('ascii'),
+                                 np.uint8).reshape((n_atoms, -1))
+    except UnicodeEncodeError:
+        return None
+    start = prefixes.shape[1]
+    template = np.zeros((n_atoms, start + 24 + suffixes.shape[1]), np.uint8)
+    template[:, :start] = prefixes
+    template[:, start + 24:] = suffixes
+    return template
+
+
+def _formatCoords(coords):
+    """Returns a 2-D :class:`numpy.uint8` array with coordinates of each atom
+    formatted as ``'%8.3f%8.3f%8.3f'`` in a row, or **None** if some do not
+    fit in 8 columns."""
+
+    coords = np.asarray(coords, float).ravel()
+    with np.errstate(invalid='ignore'):
+        scaled = coords * 1000
+        values = np.rint(scaled)
+        # values close to halfway between two numbers are rounded the way
+        # text formatting rounds them, based on their exact binary value
+        close = abs(scaled - np.floor(scaled) - .5) < 1e-6
+    for i in close.nonzero()[0]:
+        values[i] = float(('%.3f' % coords[i]).replace('.', ''))
+    if not np.isfinite(values).all():
+        return None
+    negative = np.signbit(coords)
+    values = abs(values).astype(np.int64)
+    if (values >= np.where(negative, 10 ** 6, 10 ** 7)).any():
+        return None
 
-PDBLINE_GE100K = ('%-6s%5x %-4s%1s%-4s%1s%4d%1s   '
-                  '%8.3f%8.3f%8.3f%6.2f%6.2f      '
-                  '%4s%2s\n')
+    text = np.zeros((len(values), 8), np.uint8)
+    text[:] = ord(' ')
+    text[:, 4] = ord('.')
+    for column in (7, 6, 5):
+        text[:, column] = ord('0') + values % 10
+        values //= 10
+    n_digits = (1 + (values >= 10) + (values >= 100) + (values >= 1000))
+    for column in (3, 2, 1, 0):
+        shown = n_digits > 3 - column
+        text[shown, column] = ord('0') + values[shown] % 10
+        values //= 10
+    text[negative, 3 - n_digits[negative]] = ord('-')
+    return text.reshape((-1, 24))
 
 
 _writePDBdoc = """
@@ -863,6 +1214,9 @@ _writePDBdoc = """
 
     :arg occupancy: a list or array of number to be outputted in occupancy
         column
+
+    :arg n_threads: number of threads that format models in parallel,
+        default is 1
     """
 
 def writeChainsList(chains, filename):
@@ -1096,26 +1450,62 @@ def writePDBStream(stream, atoms, csets=None, **kwargs):
                             sense=strand_secclasses[0]))
         pass
 
-    # write atoms
+    # write atoms, fields other than coordinates are formatted only once
     multi = len(coordsets) > 1
+    def formatPrefixes(altlocs):
+        return [(PDBLINE_PREFIX if i < 99999 else PDBLINE_PREFIX_HEX)
+                % (hetero[i], i+1, atomnames[i], altlocs[i], resnames[i],
+                   chainids[i], resnums[i], icodes[i])
+                for i in range(n_atoms)]
+
+    prefixes = formatPrefixes(altlocs)
+    # alternate locations are written only for the first model
+    if multi and any(altloc.strip() for altloc in altlocs):
+        others = formatPrefixes([''] * n_atoms)
+    else:
+        others = prefixes
+    suffixes = [PDBLINE_SUFFIX % (occupancies[i], bfactors[i], segments[i],
+                                  elements[i]) for i in range(n_atoms)]
+    templates = [_getPDBTemplate(prefixes, suffixes)]
+    if others is not prefixes:
+        templates.append(_getPDBTemplate(others, suffixes))
+
+    def formatModel(item):
+        m, coords = item
+        template = templates[min(m, len(templates) - 1)]
+        block = _formatCoords(coords)
+        if template is not None and block is not None:
+            start = len((others if m else prefixes)[0])
+            template = template.copy()
+            template[:, start:start + 24] = block
+            return template.tobytes().decode('ascii')
+        if block is None:
+            block = ['%8.3f%8.3f%8.3f' % tuple(xyz) for xyz in coords]
+        else:
+            block = block.tobytes().decode('ascii')
+            block = [block[k:k+24] for k in range(0, len(block), 24)]
+        return ''.join([prefix + xyz + suffix for prefix, xyz, suffix in
+                        zip(others if m else prefixes, block, suffixes)])
+
+    n_threads = kwargs.get('n_threads', 1)
+    pool = None
+    if n_threads == 1 or not multi:
+        models = map(formatModel, enumerate(coordsets))
+    else:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(n_threads)
+        models = pool.imap(formatModel, enumerate(coordsets))
     write = stream.write
-    for m, coords in enumerate(coordsets):
-        pdbline = PDBLINE_LT100K
-        if multi:
-            write('MODEL{0:9d}\n'.format(m+1))
-        for i, xyz in enumerate(coords):
-            if i == 99999:
-                pdbline = PDBLINE_GE100K
-            write(pdbline % (hetero[i], i+1,
-                         atomnames[i], altlocs[i],
-                         resnames[i], chainids[i], resnums[i],
-                         icodes[i],
-                         xyz[0], xyz[1], xyz[2],
-                         occupancies[i], bfactors[i],
-                         segments[i], elements[i]))
-        if multi:
-            write('ENDMDL\n')
-            altlocs = np.zeros(n_atoms, s_or_u + '1')
+    try:
+        for m, text in enumerate(models):
+            if multi:
+                write('MODEL{0:9d}\n'.format(m+1))
+            write(text)
+            if multi:
+                write('ENDMDL\n')
+    finally:
+        if pool is not None:
+            pool.terminate()
 
 writePDBStream.__doc__ += _writePDBdoc
 
@@ -14,12 +14,15 @@ MSA IO
   * :class:`.MSAFile` - read/write MSA files in FASTA/SELEX/Stockholm formats
   * :func:`.parseMSA` - parse MSA files
   * :func:`.writeMSA` - parse MSA files
+  * :func:`.saveMSA` - save MSA in binary format
+  * :func:`.loadMSA` - load memory-mapped MSA from binary file
 
 Editing
 ========
 
   * :func:`.mergeMSA` - merge MSA data for multi-domain proteins
   * :func:`.refineMSA` - refine MSA by removing gapped columns and/or sequences
+  * :func:`.encodeMSA` - encode MSA characters as integers
 
 Analysis
 ========
@@ -6,9 +6,12 @@ __author__ = 'Anindita Dutta, Ahmet Bakan, Wenzhi Mao'
 import os
 from numpy import dtype, zeros, empty, ones, where, ceil, shape
 from numpy import indices, tril_indices, array, ndarray, isscalar
+from numpy import arange, float32, uint8, errstate, cumsum, concatenate
+from numpy import bincount, exp, log, einsum, maximum, tril, shares_memory
+from numpy import memmap, ascontiguousarray, eye, triu
 from prody import LOGGER
 from prody.utilities import which
-from prody.sequence.msa import MSA, refineMSA
+from prody.sequence.msa import MSA, refineMSA, encodeMSA, ENCODED
 from prody.sequence.msafile import parseMSA, writeMSA
 from prody.sequence.sequence import Sequence
 from prody.atomic import Atomic
@@ -30,6 +33,63 @@ doc_turbo = """
     allocation fails, the implementation will fall back to slower and
     memory efficient mode."""
 
+doc_threads = """
+
+    Calculations can be split over multiple threads by passing *n_threads*
+    greater than 1.  Results do not depend on the number of threads."""
+
+
+doc_blocks = """
+
+    By default, *turbo* mode compares blocks of sequences at once using
+    matrix products of their one-hot encodings (see :func:`.encodeMSA`).
+    Memory usage is bounded by the number of sequences in a block, which is
+    set based on the number of distinct residues in MSA columns, unless
+    *blocksize* is given.  When *turbo* is **False**, pairs of sequences are
+    compared one at a time.  Both modes give identical results."""
+
+doc_chunks = """
+
+    Memory-mapped MSAs, e.g. those loaded using :func:`.loadMSA`, are
+    processed in blocks of *chunksize* sequences and counts are accumulated
+    over blocks, so that the MSA is never read into memory at once.  Blocks
+    are also used for MSAs in memory when *chunksize* is given."""
+
+SEQID_CODES = zeros(ENCODED, uint8)
+SEQID_CODES[1:27] = SEQID_CODES[27:53] = arange(1, 27)
+"""Maps :func:`.encodeMSA` codes to case insensitive codes used for sequence
+identity calculations, where 0 is a gap."""
+
+MEFF_CODES = zeros(ENCODED, uint8)
+MEFF_CODES[1:27] = [1, 0, 2, 3, 4, 5, 6, 7, 8, 0, 9, 10, 11, 12,
+                    0, 13, 14, 15, 16, 17, 0, 18, 19, 0, 20, 0]
+"""Maps :func:`.encodeMSA` codes to codes used for Meff calculations, where
+ambiguous, non-standard and lower case residues share code 0 with gaps."""
+
+PAIR_CODES = zeros(256, uint8)
+PAIR_CODES[65:91] = PAIR_CODES[97:123] = arange(1, 27)
+"""Maps characters to case insensitive codes used for mutual information and
+OMES calculations, where 0 is a gap."""
+
+AMBIGUITY = eye(27)
+AMBIGUITY[2] = AMBIGUITY[10] = AMBIGUITY[24] = AMBIGUITY[26] = 0
+AMBIGUITY[2, [4, 14]] = AMBIGUITY[10, [9, 12]] = AMBIGUITY[26, [5, 17]] = .5
+AMBIGUITY[24, [1, 3, 4, 5, 6, 7, 8, 9, 11, 12, 13, 14, 16, 17, 18, 19, 20,
+               22, 23, 25]] = .05
+"""Fractions of ambiguous amino acid codes **B**, **J**, **Z** and **X** that
+are allocated to the amino acids they may stand for."""
+
+
+def checkThreads(n_threads):
+    """Returns *n_threads* after checking its type and value."""
+
+    if not isinstance(n_threads, int):
+        raise TypeError('n_threads must be an integer')
+    elif n_threads < 1:
+        raise ValueError('n_threads must be equal to or greater than 1')
+    return n_threads
+
+
 def calcPercentIdentities(msa):
     percent_ids = []
     aas = ['A','C','D','E','F','G','H','I','J','K','L', \
@@ -64,6 +124,291 @@ def getMSA(msa):
     return msa
 
 
+def _indexOneHot(codes, gaps):
+    """Returns an index for compact one-hot encoding of *codes*, which has a
+    column only for (column, code) pairs that occur in *codes*.  Code 0 is
+    not encoded when *gaps* is **True**."""
+
+    n_seqs, length = codes.shape
+    n_codes = int(codes.max()) + 1 if codes.size else 1
+    offsets = arange(length) * n_codes
+    present = zeros(length * n_codes, bool)
+    for start in range(0, n_seqs, 10000):
+        present[codes[start:start + 10000] + offsets] = True
+    if gaps:
+        present[offsets] = False
+    return present.cumsum() - 1, n_codes, int(present.sum()), gaps
+
+
+def _getBlocksize(index, blocksize=None):
+    """Returns number of sequences in a block, so that one-hot encoding of a
+    block takes about 64 MB, unless *blocksize* is given."""
+
+    if blocksize is None:
+        return min(4096, max(1, 2**24 // max(index[2], 1)))
+    blocksize = int(blocksize)
+    if blocksize < 1:
+        raise ValueError('blocksize must be a positive integer')
+    return blocksize
+
+
+def _encodeOneHot(codes, index):
+    """Returns one-hot encoding of *codes* as described by *index*."""
+
+    positions, n_codes, width, gaps = index
+    n_seqs, length = codes.shape
+    flat = codes + arange(length) * n_codes
+    onehot = zeros((n_seqs, width), float32)
+    if gaps:
+        rows, cols = codes.nonzero()
+        onehot[rows, positions[flat[rows, cols]]] = 1
+    else:
+        onehot[arange(n_seqs).reshape((n_seqs, 1)), positions[flat]] = 1
+    return onehot
+
+
+def _iterMatches(codes, index, pairs, n_threads=1):
+    """Yields number of columns in which two blocks of sequences in *codes*
+    have the same code for each pair of row indices or slices in *pairs*.
+    When *index* excludes gaps, matching gaps are not counted and number of
+    columns in which both sequences have a gap is yielded too.  Products are
+    calculated in single precision, which is exact for up to 2**24 columns.
+    Pairs are distributed to *n_threads* threads, which run in parallel as
+    NumPy releases the GIL during matrix products."""
+
+    gaps = index[3]
+
+    def count(pair):
+
+        rows, cols = pair
+        left = codes[rows]
+        onehot = _encodeOneHot(left, index)
+        if cols is rows:
+            right, other = left, onehot
+        else:
+            right = codes[cols]
+            other = _encodeOneHot(right, index)
+        matches = onehot.dot(other.T)
+        if gaps:
+            left = (left == 0).astype(float32)
+            right = (right == 0).astype(float32)
+            return matches, left.dot(right.T)
+        return matches, None
+
+    if n_threads == 1:
+        for pair in pairs:
+            yield count(pair)
+    else:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(n_threads)
+        try:
+            for result in pool.imap(count, pairs):
+                yield result
+        finally:
+            pool.terminate()
+
+
+def _iterBlockPairs(n_seqs, blocksize):
+    """Yields pairs of row slices that cover the upper triangle of a square
+    matrix with *n_seqs* rows.  Slices in diagonal blocks are identical."""
+
+    blocks = [slice(start, min(start + blocksize, n_seqs))
+              for start in range(0, n_seqs, blocksize)]
+    for i, rows in enumerate(blocks):
+        for cols in blocks[i:]:
+            yield rows, cols
+
+
+def _calcIdentity(matches, gaps, length):
+    """Returns sequence identities from counts of matching residues and
+    gaps.  Identity of two sequences without residues is 0."""
+
+    with errstate(divide='ignore', invalid='ignore'):
+        identity = matches.astype(float) / (length - gaps.astype(float))
+    identity[gaps == length] = 0
+    return identity
+
+
+def _getChunksize(msa, kwargs, width=1):
+    """Returns number of sequences in a block of *msa*, so that a block
+    with *width* values per residue takes about 8 million values, unless
+    *chunksize* is given in *kwargs*.  **None** is returned for MSAs in
+    memory when *chunksize* is not given."""
+
+    chunksize = kwargs.get('chunksize')
+    if chunksize is None:
+        if not isinstance(msa, memmap):
+            return None
+        return max(1, 2**23 // max(msa.shape[1] * width, 1))
+    chunksize = int(chunksize)
+    if chunksize < 1:
+        raise ValueError('chunksize must be a positive integer')
+    return chunksize
+
+
+def _iterChunks(msa, chunksize, rows=None, cols=None):
+    """Yields blocks of *chunksize* sequences of *msa* as contiguous arrays.
+    Only *rows* and *cols*, index arrays of sequences and residues, are
+    included when they are given."""
+
+    number = len(msa) if rows is None else len(rows)
+    for start in range(0, number, chunksize):
+        if rows is None:
+            chunk = msa[start:start + chunksize]
+        else:
+            chunk = msa[rows[start:start + chunksize]]
+        if cols is not None:
+            chunk = chunk.take(cols, 1)
+        yield ascontiguousarray(chunk)
+
+
+def _takeChunks(msa, chunksize, rows=None, cols=None):
+    """Returns *rows* and *cols* of *msa* in memory after reading them in
+    blocks of *chunksize* sequences."""
+
+    number = len(msa) if rows is None else len(rows)
+    length = msa.shape[1] if cols is None else len(cols)
+    arr = empty((number, length), '|S1')
+    start = 0
+    for chunk in _iterChunks(msa, chunksize, rows, cols):
+        arr[start:start + len(chunk)] = chunk
+        start += len(chunk)
+    return arr
+
+
+def _calcEntropy(counts, number, ambiguity=True, omitgaps=True):
+    """Returns Shannon entropy of columns from *counts* of characters, an
+    array with a row of 256 counts for each column of an MSA with *number*
+    sequences.  Ambiguous amino acids and gaps are handled as described in
+    :func:`.calcShannonEntropy`."""
+
+    letters = counts[:, 65:91] + counts[:, 97:123]
+    if ambiguity:
+        # B -> D, N; Z -> E, Q; J -> I, L; X -> 20 amino acids
+        for code, (one, two) in ((1, (3, 13)), (25, (4, 16)), (9, (8, 11))):
+            half = letters[:, code] / 2.
+            letters[:, code] = 0
+            letters[:, one] += half
+            letters[:, two] += half
+        twenty = AMBIGUITY[24, 1:] > 0
+        letters[:, twenty] += letters[:, 23:24] / 20.
+        letters[:, 23] = 0
+
+    numgap = number - letters.sum(1)
+    if omitgaps:
+        denom = (number - numgap).reshape((len(letters), 1))
+    else:
+        denom = number
+    with errstate(divide='ignore', invalid='ignore'):
+        probs = letters / denom
+        shannon = where(letters > 0, probs * log(probs), 0).sum(1)
+        if not omitgaps:
+            probs = numgap / number
+            shannon += where(numgap > 0, probs * log(probs), 0)
+    return -shannon
+
+
+def _calcOccupancy(msa, dim, count, chunksize, rows=None, cols=None):
+    """Returns occupancy of columns (*dim* is 1) or rows (*dim* is 0) of
+    *msa* calculated for blocks of *chunksize* sequences.  Only *rows* and
+    *cols* are considered when they are given."""
+
+    from .msatools import msaocc
+
+    if dim:
+        length = msa.shape[1] if cols is None else len(cols)
+        occ = zeros(length, float)
+        for chunk in _iterChunks(msa, chunksize, rows, cols):
+            occ += msaocc(chunk, zeros(length, float), 1, count=True)
+        if not count:
+            occ /= len(msa) if rows is None else len(rows)
+        return occ
+    else:
+        occ = [zeros(0, float)]
+        for chunk in _iterChunks(msa, chunksize, rows, cols):
+            occ.append(msaocc(chunk, zeros(len(chunk), float), 0,
+                              count=bool(count)))
+        return concatenate(occ)
+
+
+def _getPairWidth(length):
+    """Returns number of columns in a block for which joint probabilities
+    with all *length* columns of an MSA take about a million values."""
+
+    return max(1, 2**20 // (27 * 27 * max(length, 1)))
+
+
+def _calcPairMatrix(msa, chunksize, ambiguity=True, omes=False, norm=False):
+    """Returns mutual information, or OMES when *omes* is **True**, matrix
+    of *msa* from joint probabilities of residue pairs counted over blocks
+    of *chunksize* sequences.  Counts of ambiguous amino acids are allocated
+    to the amino acids they may stand for using :data:`AMBIGUITY`, which
+    handles pairs of ambiguous amino acids as described in
+    :func:`.buildMutinfoMatrix`."""
+
+    number, length = msa.shape
+    probs = zeros((length, 27))
+    offsets = arange(length) * 27
+    for chunk in _iterChunks(msa, chunksize):
+        codes = PAIR_CODES[chunk.view(uint8)] + offsets
+        probs += bincount(codes.ravel(), minlength=probs.size).reshape(
+            probs.shape)
+    if ambiguity:
+        probs = probs.dot(AMBIGUITY)
+    probs /= number
+    with errstate(divide='ignore', invalid='ignore'):
+        entropy = -where(probs > 0, probs * log(probs), 0).sum(1)
+
+    # joint probabilities are counted for a block of columns at a time and
+    # columns that follow them, as the matrix is symmetric
+    width = _getPairWidth(length)
+    matrix = zeros((length, length))
+    for start in range(0, length, width):
+        stop = min(start + width, length)
+        size, other = stop - start, length - start
+        offsets = (arange(size).reshape((size, 1)) * other +
+                   arange(other)) * 27 * 27
+        joint = zeros((size, other, 27, 27))
+        for chunk in _iterChunks(msa, chunksize):
+            codes = PAIR_CODES[chunk.view(uint8)[:, start:]]
+            left = codes[:, :size].astype(int) * 27
+            pairs = (left.reshape((len(chunk), size, 1)) +
+                     codes.reshape((len(chunk), 1, other)) + offsets)
+            joint += bincount(pairs.ravel(), minlength=joint.size).reshape(
+                joint.shape)
+        if ambiguity:
+            joint = joint.dot(AMBIGUITY).transpose(0, 1, 3, 2)
+            joint = joint.dot(AMBIGUITY).transpose(0, 1, 3, 2)
+        joint /= number
+
+        # sums are taken over observed pairs only, mutual information from
+        # entropies and OMES as sum of squared over expected probabilities
+        # minus one, since joint and expected probabilities both sum to one
+        which = joint.nonzero()
+        observed = joint[which]
+        pairs = which[0] * other + which[1]
+        if omes:
+            terms = observed ** 2 / (probs[start + which[0], which[2]] *
+                                     probs[start + which[1], which[3]])
+            values = number * (bincount(pairs, terms, size * other) - 1)
+        else:
+            jointent = -bincount(pairs, observed * log(observed),
+                                 size * other).reshape((size, other))
+            values = (entropy[start:stop].reshape((size, 1)) +
+                      entropy[start:] - jointent)
+            # mutual information and joint entropy of a pair of conserved
+            # columns are both zero, their ratio is set to 1 as in msamutinfo
+            if norm:
+                conserved = jointent == 0
+                jointent[conserved] = 1
+                values /= jointent
+                values[conserved] = 1
+        matrix[start:stop, start:] = values.reshape((size, other))
+    matrix = triu(matrix, 1)
+    matrix += matrix.T
+    return matrix
+
+
 def calcShannonEntropy(msa, ambiguity=True, omitgaps=True, **kwargs):
     """Returns Shannon entropy array calculated for *msa*, which may be
     an :class:`.MSA` instance or a 2D Numpy character array.  Implementation
@@ -87,14 +432,26 @@ def calcShannonEntropy(msa, ambiguity=True, omitgaps=True, **kwargs):
         **False**"""
 
     msa = getMSA(msa)
+    chunksize = _getChunksize(msa, kwargs, 8)
+    if chunksize is not None:
+        counts = zeros((msa.shape[1], 256))
+        offsets = arange(msa.shape[1]) * 256
+        for chunk in _iterChunks(msa, chunksize):
+            counts += bincount((chunk.view(uint8) + offsets).ravel(),
+                               minlength=counts.size).reshape(counts.shape)
+        return _calcEntropy(counts, len(msa), ambiguity, omitgaps)
+
     length = msa.shape[1]
     entropy = empty(length, float)
     from .msatools import msaentropy
     return msaentropy(msa, entropy,
                       ambiguity=bool(ambiguity), omitgaps=bool(omitgaps))
 
+calcShannonEntropy.__doc__ += doc_chunks
+
 
-def buildMutinfoMatrix(msa, ambiguity=True, turbo=True, **kwargs):
+def buildMutinfoMatrix(msa, ambiguity=True, turbo=True, n_threads=1,
+                       **kwargs):
     """Returns mutual information matrix calculated for *msa*, which may be an
     :class:`.MSA` instance or a 2D Numpy character array.  Implementation
     is case insensitive and handles ambiguous amino acids as follows:
@@ -120,24 +477,31 @@ def buildMutinfoMatrix(msa, ambiguity=True, turbo=True, **kwargs):
     function with *norm* option set **True**."""
 
     msa = getMSA(msa)
+    n_threads = checkThreads(n_threads)
 
     from .msatools import msamutinfo
     LOGGER.timeit('_mutinfo')
-    length = msa.shape[1]
-    mutinfo = empty((length, length), float)
-    mutinfo = msamutinfo(msa, mutinfo,
-                         ambiguity=bool(ambiguity), turbo=bool(turbo),
-                         norm=bool(kwargs.get('norm', False)),
-                         debug=bool(kwargs.get('debug', False)))
+    chunksize = _getChunksize(msa, kwargs, _getPairWidth(msa.shape[1]))
+    if chunksize is not None:
+        mutinfo = _calcPairMatrix(msa, chunksize, bool(ambiguity),
+                                  norm=bool(kwargs.get('norm', False)))
+    else:
+        length = msa.shape[1]
+        mutinfo = empty((length, length), float)
+        mutinfo = msamutinfo(msa, mutinfo,
+                             ambiguity=bool(ambiguity), turbo=bool(turbo),
+                             norm=bool(kwargs.get('norm', False)),
+                             debug=bool(kwargs.get('debug', False)),
+                             n_threads=n_threads)
     LOGGER.report('Mutual information matrix was calculated in %.2fs.',
                   '_mutinfo')
 
     return mutinfo
 
-buildMutinfoMatrix.__doc__ += doc_turbo
+buildMutinfoMatrix.__doc__ += doc_turbo + doc_threads + doc_chunks
 
 
-def calcMSAOccupancy(msa, occ='res', count=False):
+def calcMSAOccupancy(msa, occ='res', count=False, **kwargs):
     """Returns occupancy array calculated for residue positions (default,
     ``'res'`` or ``'col'`` for *occ*) or sequences (``'seq'`` or ``'row'``
     for *occ*) of *msa*, which may be an :class:`.MSA` instance or a 2D
@@ -153,9 +517,14 @@ def calcMSAOccupancy(msa, occ='res', count=False):
         dim = occ.startswith('res') or occ.startswith('col')
     except AttributeError:
         raise TypeError('occ must be a string')
+    chunksize = _getChunksize(msa, kwargs)
+    if chunksize is not None:
+        return _calcOccupancy(msa, dim, count, chunksize)
     occ = zeros(msa.shape[int(dim)], float)
     return msaocc(msa, occ, dim, count=bool(count))
 
+calcMSAOccupancy.__doc__ += doc_chunks
+
 
 def applyMutinfoNorm(mutinfo, entropy, norm='sument'):
     """Apply one of the normalizations discussed in [MLC05]_ to *mutinfo*
@@ -362,40 +731,87 @@ def filterRankedPairs(indices, msa_indices, rank_row, rank_col, zscore_sort, \
     
     return pairList
 
-def buildSeqidMatrix(msa, turbo=True):
-    """Returns sequence identity matrix for *msa*."""
-
-    msa = getMSA(msa)
+def buildSeqidMatrix(msa, turbo=True, n_threads=1, **kwargs):
+    """Returns sequence identity matrix for *msa*.  Identity of a pair of
+    sequences is the fraction of matching residues in columns that are not
+    gaps in both sequences."""
 
+    n_threads = checkThreads(n_threads)
     LOGGER.timeit('_seqid')
-    from .seqtools import msaeye
-
-    dim = msa.shape[0]
-    seqid = msaeye(msa, ones((dim, dim), float), turbo=bool(turbo))
+    if turbo:
+        codes = SEQID_CODES[encodeMSA(msa)]
+        n_seqs, length = codes.shape
+        index = _indexOneHot(codes, True)
+        blocksize = _getBlocksize(index, kwargs.get('blocksize'))
+        pairs = list(_iterBlockPairs(n_seqs, blocksize))
+        seqid = zeros((n_seqs, n_seqs), float)
+        for (rows, cols), (matches, gaps) in zip(
+                pairs, _iterMatches(codes, index, pairs, n_threads)):
+            block = _calcIdentity(matches, gaps, length)
+            seqid[rows, cols] = block
+            seqid[cols, rows] = block.T
+        seqid.flat[::n_seqs + 1] = 1
+    else:
+        from .seqtools import msaeye
+        msa = getMSA(msa)
+        dim = msa.shape[0]
+        seqid = msaeye(msa, ones((dim, dim), float), turbo=False,
+                       n_threads=n_threads)
 
     LOGGER.report('Sequence identity matrix was calculated in %.2fs.',
                   '_seqid')
     return seqid
 
-buildSeqidMatrix.__doc__ += doc_turbo
+buildSeqidMatrix.__doc__ += doc_blocks + doc_threads
 
 
-def uniqueSequences(msa, seqid=0.98, turbo=True):
+def uniqueSequences(msa, seqid=0.98, turbo=True, n_threads=1, **kwargs):
     """Returns a boolean array marking unique sequences in *msa*.  A sequence
     sharing sequence identity of *seqid* or more with another sequence coming
     before itself in *msa* will have a ``False`` value in the array."""
 
-    msa = getMSA(msa)
-
-    from .seqtools import msaeye
-
     if not (0 < seqid <= 1):
         raise ValueError('seqid must satisfy 0 < seqid <= 1')
-
-    return msaeye(msa, zeros(msa.shape[0], bool),
-                  unique=seqid, turbo=bool(turbo))
-
-uniqueSequences.__doc__ += doc_turbo
+    n_threads = checkThreads(n_threads)
+
+    if not turbo:
+        from .seqtools import msaeye
+        msa = getMSA(msa)
+        return msaeye(msa, zeros(msa.shape[0], bool),
+                      unique=seqid, turbo=False)
+
+    codes = SEQID_CODES[encodeMSA(msa)]
+    n_seqs, length = codes.shape
+    index = _indexOneHot(codes, True)
+    blocksize = _getBlocksize(index, kwargs.get('blocksize'))
+    unique = zeros(n_seqs, bool)
+    kept = arange(0)
+    for start in range(0, n_seqs, blocksize):
+        rows = arange(start, min(start + blocksize, n_seqs))
+
+        # drop sequences similar to unique ones in preceding blocks
+        pairs = [(rows, kept[i:i + blocksize])
+                 for i in range(0, len(kept), blocksize)]
+        similar = zeros(len(rows), bool)
+        for matches, gaps in _iterMatches(codes, index, pairs, n_threads):
+            similar |= (_calcIdentity(matches, gaps, length) >= seqid).any(1)
+        rows = rows[~similar]
+
+        # compare remaining ones in order of their appearance
+        if len(rows):
+            for matches, gaps in _iterMatches(codes, index, [(rows, rows)]):
+                similar = _calcIdentity(matches, gaps, length) >= seqid
+            keep = ones(len(rows), bool)
+            for i in range(len(rows) - 1):
+                if keep[i]:
+                    keep[i+1:] &= ~similar[i, i+1:]
+            rows = rows[keep]
+        unique[rows] = True
+        kept = concatenate([kept, rows])
+
+    return unique
+
+uniqueSequences.__doc__ += doc_blocks + doc_threads
 
 
 def calcRankorder(matrix, zscore=False, **kwargs):
@@ -452,7 +868,7 @@ def calcRankorder(matrix, zscore=False, **kwargs):
     return (row, column, matrix[row, column])
 
 
-def buildOMESMatrix(msa, ambiguity=True, turbo=True, **kwargs):
+def buildOMESMatrix(msa, ambiguity=True, turbo=True, n_threads=1, **kwargs):
     """Returns OMES (Observed Minus Expected Squared) covariance matrix
     calculated for *msa*, which may be an :class:`.MSA` instance or a 2D
     NumPy character array. OMES is defined as::
@@ -480,22 +896,29 @@ def buildOMESMatrix(msa, ambiguity=True, turbo=True, **kwargs):
     are considered as gaps."""
 
     msa = getMSA(msa)
+    n_threads = checkThreads(n_threads)
 
     from .msatools import msaomes
     LOGGER.timeit('_omes')
-    length = msa.shape[1]
-    omes = empty((length, length), float)
-    omes = msaomes(msa, omes, ambiguity=bool(ambiguity), turbo=bool(turbo),
-                   debug=bool(kwargs.get('debug', False)))
+    chunksize = _getChunksize(msa, kwargs, _getPairWidth(msa.shape[1]))
+    if chunksize is not None:
+        omes = _calcPairMatrix(msa, chunksize, bool(ambiguity), omes=True)
+    else:
+        length = msa.shape[1]
+        omes = empty((length, length), float)
+        omes = msaomes(msa, omes, ambiguity=bool(ambiguity),
+                       turbo=bool(turbo),
+                       debug=bool(kwargs.get('debug', False)),
+                       n_threads=n_threads)
     LOGGER.report('OMES matrix was calculated in %.2fs.',
                   '_omes')
 
     return omes
 
-buildOMESMatrix.__doc__ += doc_turbo
+buildOMESMatrix.__doc__ += doc_turbo + doc_threads + doc_chunks
 
 
-def buildSCAMatrix(msa, turbo=True, **kwargs):
+def buildSCAMatrix(msa, turbo=True, n_threads=1, **kwargs):
     """Returns SCA matrix calculated for *msa*, which may be an :class:`.MSA`
     instance or a 2D Numpy character array.
 
@@ -518,6 +941,7 @@ def buildSCAMatrix(msa, turbo=True, **kwargs):
     are considered as gaps."""
 
     msa = getMSA(msa)
+    n_threads = checkThreads(n_threads)
     if msa.shape[0]<100:
         LOGGER.warning('SCA performs the best with higher number of sequences, and '
                        'minimal number of sequences is recommended as 100.')
@@ -526,11 +950,11 @@ def buildSCAMatrix(msa, turbo=True, **kwargs):
     LOGGER.timeit('_sca')
     length = msa.shape[1]
     sca = zeros((length, length), float)
-    sca = msasca(msa, sca, turbo=bool(turbo))
+    sca = msasca(msa, sca, turbo=bool(turbo), n_threads=n_threads)
     LOGGER.report('SCA matrix was calculated in %.2fs.', '_sca')
     return sca
 
-buildSCAMatrix.__doc__ += doc_turbo
+buildSCAMatrix.__doc__ += doc_turbo + doc_threads
 
 def buildPCMatrix(msa, turbo=False, **kwargs):
     """Returns PC matrix calculated for *msa*, which may be an :class:`.MSA`
@@ -565,7 +989,7 @@ def buildPCMatrix(msa, turbo=False, **kwargs):
     return pc
 
 def buildDirectInfoMatrix(msa, seqid=.8, pseudo_weight=.5, refine=False,
-                          **kwargs):
+                          method='mf', **kwargs):
     """Returns direct information matrix calculated for *msa*, which may be an
     :class:`.MSA` instance or a 2D Numpy character array.
 
@@ -578,38 +1002,299 @@ def buildDirectInfoMatrix(msa, seqid=.8, pseudo_weight=.5, refine=False,
     Sequences are not refined by default. When *refine* is set **True**,
     the MSA will be refined by the first sequence and the shape of direct
     information matrix will be smaller.
-    """
-
-    msa = getMSA(msa)
-    from .msatools import msadipretest, msadirectinfo1, msadirectinfo2
-    from numpy import matrix
 
+    Direct couplings are inferred using one of the following *method* names:
+
+      * ``'mf'`` - mean field approximation [FM11]_, couplings are negative
+        of the inverse of the correlation matrix, which is calculated in
+        place using Cholesky decomposition
+      * ``'plm'`` - pseudo-likelihood maximization [ME13]_, couplings are
+        fitted for one column at a time, which is slower but more accurate
+        for long alignments with few sequences
+
+    In mean field approximation, correlation matrix can be shrunk towards its
+    diagonal by passing *shrinkage* between 0 and 1, which regularizes
+    alignments with few sequences.  Correlation matrix has ``(L * (q - 1))**2``
+    elements for *L* columns and *q* residue types, and may be calculated in
+    single precision by passing ``dtype='float32'`` to halve memory usage.
+    For ``'plm'`` method, *lambda_h* and *lambda_J* set weights of L2
+    regularization of fields and couplings, and default to 0.01.  Peak
+    memory used by arrays is reported.
+
+    .. [FM11] Morcos F, Pagnani A, Lunt B, Bertolino A, Marks DS, Sander C,
+       Zecchina R, Onuchic JN, Hwa T, Weigt M. Direct-coupling analysis of
+       residue coevolution captures native contacts across many protein
+       families. *Proc Natl Acad Sci U S A* **2011** 108:E1293-1301.
+
+    .. [ME13] Ekeberg M, Lovkvist C, Lan Y, Weigt M, Aurell E. Improved
+       contact prediction in proteins: using pseudolikelihoods to infer Potts
+       models. *Phys Rev E* **2013** 87:012707."""
+
+    if method not in ('mf', 'plm'):
+        raise ValueError("method must be 'mf' or 'plm'")
+    shrinkage = kwargs.get('shrinkage', 0.)
+    if not 0 <= shrinkage <= 1:
+        raise ValueError('shrinkage must be between 0 and 1')
     LOGGER.timeit('_di')
-    if msa.shape[0]<250:
+    codes = _getMeffCodes(msa, refine)
+    if codes.shape[0] < 250:
         LOGGER.warning('DI performs the best with higher number of sequences, and '
                        'minimal number of sequences is recommended as 250.')
-    refine = 1 if refine else 0
-    # msadipretest get some parameter from msa to set matrix size
-    length, q = msadipretest(msa, refine=refine)
-    c = matrix.dot(matrix(zeros((length*q, 1), float)),
-                   matrix(zeros((1, length*q), float)))
-    prob = zeros((length, q+1), float)
-    # msadirectinfo1 return c to be inversed and prob to be used
-    meff, n, length, c, prob = msadirectinfo1(msa, c, prob, theta=1.-seqid,
-                                              pseudocount_weight=pseudo_weight,
-                                              refine=refine, q=q+1)
-
-    c = c.I
-
-    di = zeros((length, length), float)
-    # get final DI
-    di = msadirectinfo2(n, length, c, prob, di, q+1)
-    del prob, c
-    LOGGER.report('DI matrix was calculated in %.2fs.', '_di')
+    w = _calcMeffWeights(codes, 1. - seqid, kwargs.get('blocksize'))
+    w /= cumsum(w)[-1]
+    n_seqs, length = codes.shape
+    q = int(codes.max()) + 1
+
+    # single site frequencies with pseudo counts
+    prob = zeros((length, q))
+    for i in range(length):
+        prob[i] = bincount(codes[:, i], w, q)
+    prob *= 1. - pseudo_weight
+    prob += pseudo_weight / q
+
+    if method == 'mf':
+        couplings, memory = _calcMeanFieldCouplings(
+            codes, w, prob, pseudo_weight, shrinkage,
+            kwargs.get('dtype', float))
+    else:
+        couplings, memory = _calcPseudoLikelihoodCouplings(
+            codes, w, q, kwargs.get('lambda_h', 0.01),
+            kwargs.get('lambda_J', 0.01))
+
+    di = _calcDirectInfo(couplings, prob)
+    LOGGER.report('DI matrix was calculated in %.2fs, peak memory used by '
+                  'arrays was {0:.1f} MB.'.format(memory / 2.**20), '_di')
+    return di
+
+
+def _encodeStates(codes, q, weights=None):
+    """Returns one-hot encoding of states 0 to *q* - 2 in *codes*, optionally
+    multiplied by *weights* of sequences."""
+
+    n_seqs, length = codes.shape
+    onehot = zeros((n_seqs, length, q), float)
+    onehot[arange(n_seqs).reshape((n_seqs, 1)), arange(length), codes] = 1
+    onehot = onehot[:, :, :q-1].reshape((n_seqs, length * (q - 1)))
+    if weights is not None:
+        onehot *= weights.reshape((n_seqs, 1))
+    return onehot
+
+
+def _calcMeanFieldCouplings(codes, w, prob, pseudo_weight, shrinkage=0.,
+                            dtype=float):
+    """Returns negative of mean field couplings, i.e. inverse of correlation
+    matrix, and peak memory used by arrays in bytes."""
+
+    n_seqs, length = codes.shape
+    q = prob.shape[1]
+    size = length * (q - 1)
+    corr = empty((size, size), dtype)
+
+    # pair frequencies are accumulated for blocks of sequences
+    blocksize = max(1, min(n_seqs, 2**24 // max(size, 1)))
+    corr.fill(0)
+    for start in range(0, n_seqs, blocksize):
+        block = slice(start, start + blocksize)
+        onehot = _encodeStates(codes[block], q, w[block] ** .5)
+        corr += onehot.T.dot(onehot)
+    memory = corr.nbytes + onehot.nbytes * 2
+    del onehot
+
+    # pair frequencies with pseudo counts less product of single site
+    # frequencies, diagonal blocks are those of single site frequencies
+    single = prob[:, :q-1].reshape(size)
+    step = q - 1
+    for i in range(length):
+        rows = slice(i * step, (i + 1) * step)
+        corr[rows] *= 1. - pseudo_weight
+        corr[rows] += pseudo_weight / q / q
+        corr[rows] -= single[rows].reshape((step, 1)) * single
+        corr[rows, rows] = -single[rows].reshape((step, 1)) * single[rows]
+        corr[rows, rows].flat[::step + 1] += single[rows]
+        if shrinkage:
+            diagonal = corr[rows, rows].diagonal().copy()
+            corr[rows] *= 1. - shrinkage
+            corr[rows, rows].flat[::step + 1] += shrinkage * diagonal
+
+    _invertInPlace(corr)
+    return corr, memory
+
+
+def _invertInPlace(matrix):
+    """Invert symmetric positive definite *matrix* in place using Cholesky
+    decomposition."""
+
+    try:
+        from scipy.linalg import lapack
+    except ImportError:
+        from numpy.linalg import inv
+        matrix[:] = inv(matrix)
+        return
+
+    # a C contiguous symmetric matrix is its own Fortran contiguous transpose
+    potrf, potri = lapack.get_lapack_funcs(('potrf', 'potri'), (matrix,))
+    factor, info = potrf(matrix.T, lower=0, clean=0, overwrite_a=1)
+    if info == 0:
+        factor, info = potri(factor, lower=0, overwrite_c=1)
+    if info != 0:
+        raise ValueError('correlation matrix is not positive definite, '
+                         'increase pseudo_weight or shrinkage')
+    if not shares_memory(factor, matrix):
+        matrix[:] = factor.T
+
+    # only the lower triangle is calculated, copy it to upper triangle
+    size = matrix.shape[0]
+    step = 1024
+    for start in range(0, size, step):
+        stop = min(start + step, size)
+        block = matrix[start:stop, start:stop]
+        block[:] = tril(block) + tril(block, -1).T
+        matrix[start:stop, stop:] = matrix[stop:, start:stop].T
+
+
+def _calcPseudoLikelihoodCouplings(codes, w, q, lambda_h=0.01,
+                                   lambda_J=0.01):
+    """Returns negative of couplings inferred by asymmetric pseudo-likelihood
+    maximization in the same layout as inverse of correlation matrix in mean
+    field approximation, and peak memory used by arrays in bytes."""
+
+    try:
+        from scipy import sparse
+        from scipy.optimize import minimize
+    except ImportError:
+        raise ImportError('scipy is required for pseudo-likelihood '
+                          'maximization')
+
+    n_seqs, length = codes.shape
+    width = length * q
+    columns = (codes + arange(length) * q).ravel()
+    features = sparse.csr_matrix((ones(n_seqs * length), columns,
+                                  arange(0, n_seqs * length + 1, length)),
+                                 shape=(n_seqs, width))
+    step = q - 1
+    couplings = zeros((length * step, length * step))
+    memory = couplings.nbytes + features.data.nbytes * 3
+
+    for r in range(length):
+        observed = zeros((n_seqs, q))
+        observed[arange(n_seqs), codes[:, r]] = 1
+        mask = ones((width, 1))
+        mask[r * q:(r + 1) * q] = 0
+
+        def objective(params):
+
+            fields = params[:q]
+            coupling = params[q:].reshape((width, q)) * mask
+            energy = features.dot(coupling) + fields
+            energy -= energy.max(1).reshape((n_seqs, 1))
+            pexp = exp(energy)
+            norm = pexp.sum(1)
+            value = -(w * ((energy * observed).sum(1) - log(norm))).sum()
+            value += lambda_h * (fields ** 2).sum()
+            value += lambda_J * (coupling ** 2).sum()
+            residual = (pexp / norm.reshape((n_seqs, 1)) - observed)
+            residual *= w.reshape((n_seqs, 1))
+            gradient = empty(params.shape)
+            gradient[:q] = residual.sum(0) + 2 * lambda_h * fields
+            gradient[q:] = ((features.T.dot(residual) +
+                             2 * lambda_J * coupling) * mask).ravel()
+            return value, gradient
+
+        result = minimize(objective, zeros(q + width * q), jac=True,
+                          method='L-BFGS-B')
+        coupling = result.x[q:].reshape((length, q, q))
+        # gauge couplings so that those of the last state are zero, then
+        # rows of site r hold couplings (state of r, state of other site)
+        coupling = (coupling - coupling[:, -1:, :] - coupling[:, :, -1:] +
+                    coupling[:, -1:, -1:])
+        couplings[r * step:(r + 1) * step] = \
+            -coupling[:, :step, :step].transpose(2, 0, 1).reshape(
+                (step, length * step))
+
+    # average estimates from both sites of a pair
+    for i in range(length):
+        rows = slice(i * step, (i + 1) * step)
+        cols = slice((i + 1) * step, None)
+        couplings[rows, cols] += couplings[cols, rows].T
+        couplings[rows, cols] /= 2
+        couplings[cols, rows] = couplings[rows, cols].T
+    return couplings, memory
+
+
+def _calcDirectInfo(couplings, prob, epsilon=1e-4):
+    """Returns direct information matrix for negative of *couplings* and
+    single site frequencies *prob*.  Two site models are fitted to single
+    site frequencies for all pairs of a column at once."""
+
+    length, q = prob.shape
+    step = q - 1
+    tiny = 1.0e-100
+    di = zeros((length, length))
+    for i in range(length - 1):
+        m = length - i - 1
+        weights = ones((m, q, q))
+        block = couplings[i * step:(i + 1) * step, (i + 1) * step:]
+        weights[:, :step, :step] = exp(-block.reshape((step, m, step))
+                                       .transpose(1, 0, 2))
+        iprob, jprob = prob[i], prob[i+1:]
+        mu1 = ones((m, q)) / q
+        mu2 = ones((m, q)) / q
+        active = arange(m)
+        while len(active):
+            weight = weights[active]
+            scra1 = iprob / einsum('kab,kb->ka', weight, mu2[active])
+            scra2 = jprob[active] / einsum('kab,ka->kb', weight, mu1[active])
+            scra1 /= scra1.sum(1).reshape((len(active), 1))
+            scra2 /= scra2.sum(1).reshape((len(active), 1))
+            diff = maximum(abs(mu1[active] - scra1).max(1),
+                           abs(mu2[active] - scra2).max(1))
+            mu1[active] = scra1
+            mu2[active] = scra2
+            active = active[diff > epsilon]
+
+        pdir = weights * mu1.reshape((m, q, 1)) * mu2.reshape((m, 1, q))
+        pdir /= pdir.sum(2).sum(1).reshape((m, 1, 1))
+        pind = iprob.reshape((1, q, 1)) * jprob.reshape((m, 1, q))
+        di[i, i+1:] = (pdir * log((pdir + tiny) / (pind + tiny))).sum(2).sum(1)
+    di += di.T
     return di
 
 
-def calcMeff(msa, seqid=.8, refine=False, weight=False, **kwargs):
+def _getMeffCodes(msa, refine=False):
+    """Returns *msa* encoded with :data:`MEFF_CODES`.  When *refine* is
+    **True**, only columns with upper case residues in the first sequence are
+    kept."""
+
+    encoded = encodeMSA(msa)
+    codes = MEFF_CODES[encoded]
+    if refine:
+        codes = codes[:, (encoded[0] > 0) & (encoded[0] < 27)]
+    return codes
+
+
+def _calcMeffWeights(codes, theta, blocksize=None, n_threads=1):
+    """Returns weights of sequences in *codes*, i.e. inverse of the number of
+    sequences that differ at fewer than *theta* fraction of columns."""
+
+    n_seqs, length = codes.shape
+    index = _indexOneHot(codes, False)
+    blocksize = _getBlocksize(index, blocksize)
+    pairs = list(_iterBlockPairs(n_seqs, blocksize))
+    counts = zeros(n_seqs)
+    for (rows, cols), (matches, _) in zip(
+            pairs, _iterMatches(codes, index, pairs, n_threads)):
+        with errstate(divide='ignore', invalid='ignore'):
+            similar = (length - matches.astype(float)) / length < theta
+        if cols is rows:
+            counts[rows] += similar.sum(1) - similar.diagonal()
+        else:
+            counts[rows] += similar.sum(1)
+            counts[cols] += similar.sum(0)
+    return 1. / (counts + 1.)
+
+
+def calcMeff(msa, seqid=.8, refine=False, weight=False, n_threads=1,
+             turbo=True, **kwargs):
     """Returns the Meff for *msa*, which may be an :class:`.MSA`
     instance or a 2D Numpy character array.
 
@@ -629,71 +1314,33 @@ def calcMeff(msa, seqid=.8, refine=False, weight=False, **kwargs):
 
     The weight for each sequence are returned when *weight* is **True**."""
 
+    n_threads = checkThreads(n_threads)
+    LOGGER.timeit('_meff')
+    if turbo:
+        w = _calcMeffWeights(_getMeffCodes(msa, refine), 1. - seqid,
+                             kwargs.get('blocksize'), n_threads)
+        # sum weights in order, as they are summed in C
+        meff = float(cumsum(w)[-1]) if len(w) else 0.
+        LOGGER.report('Meff was calculated in %.2fs.', '_meff')
+        if weight:
+            return meff, w
+        return meff
+
     msa = getMSA(msa)
     from .msatools import msameff
-    LOGGER.timeit('_meff')
     refine = 1 if refine else 0
     weight = 0 if weight else 1  # A Mark for return weighted array.
     if (not weight):
         w = zeros((msa.shape[0]), float)
         meff = msameff(msa, theta=1.-seqid, meff_only=weight,
-                       refine=refine, w=w)
+                       refine=refine, w=w, n_threads=n_threads)
     else:
-        meff = msameff(msa, theta=1.-seqid, meff_only=weight, refine=refine)
+        meff = msameff(msa, theta=1.-seqid, meff_only=weight, refine=refine,
+                       n_threads=n_threads)
     LOGGER.report('Meff was calculated in %.2fs.', '_meff')
     return meff
 
-def msaeye(msa, unique, turbo):
-    tic1 = timeit.default_timer()
-    length = msa.shape[1]
-    number = msa.shape[0]
-    # number = 5
-    array = eye(int(number))
-
-    seqs = []
-    for i in xrange(number):
-        seqs.append(msa[i,:])
-    iseq = zeros((number, length), dtype=int)
-
-    for i in xrange(0,number-1):
-        if i == 0:
-            for k in xrange(length):
-                if ord(seqs[i][k])>90:
-                    iseq[i,k]=ord(seqs[i][k])-96 if ord(seqs[i][k])-96 > 0 and ord(seqs[i][k])-96 < 26 else 0
-                else:
-                    iseq[i,k]=ord(seqs[i][k])-64 if ord(seqs[i][k])-64 > 0 and ord(seqs[i][k])-64 < 26 else 0
-            for j in xrange(i+1,number):
-                score=0.
-                ncols=0.
-                for k in xrange(length):
-                    if ord(seqs[j][k])>90:
-                        iseq[j,k]=ord(seqs[j][k])-96 if ord(seqs[j][k])-96 > 0 and ord(seqs[j][k])-96 < 26 else 0
-                    else:
-                        iseq[j,k]=ord(seqs[j][k])-64 if ord(seqs[j][k])-64 > 0 and ord(seqs[j][k])-64 < 26 else 0
-                    if iseq[i,k] or iseq[j,k]:
-                        ncols += 1
-                        if iseq[i,k]==iseq[j,k]:
-                            score+=1
-                array[i,j]=float(score)/ncols
-                array[j,i]=array[i,j]
-            # print iseq[0]
-            # print seqs[0]
-            # raw_input()
-        else:
-            for j in xrange(i+1,number):
-                score=0.
-                ncols=0.
-                for k in xrange(length):
-                    if iseq[i,k] or iseq[j,k]:
-                        ncols += 1
-                        if iseq[i,k]==iseq[j,k]:
-                            score+=1
-                array[i,j]= float(score)/ncols#float(sum((iseq[i] == iseq[j])*(iseq[i]*iseq[j]!=0))) / sum(iseq[i]*iseq[j]!=0)
-                array[j,i]=array[i,j]
-
-    toc1 = timeit.default_timer()
-    elapsed1 = toc1 - tic1
-    print(elapsed1)
+calcMeff.__doc__ += doc_blocks + doc_threads
 
 def alignSequencesByChain(PDBs, **kwargs):
     """
@@ -3,6 +3,7 @@
 
 from numpy import all, zeros, dtype, array, char, cumsum, ceil, reshape
 from numpy import where, sort, concatenate, vstack, isscalar, chararray
+from numpy import arange, uint8, ascontiguousarray, memmap
 
 from Bio import AlignIO
 from Bio import pairwise2
@@ -15,26 +16,58 @@ from .sequence import Sequence, splitSeqLabel
 
 import sys
 
-__all__ = ['MSA', 'refineMSA', 'mergeMSA', 'specMergeMSA',]
+__all__ = ['MSA', 'refineMSA', 'mergeMSA', 'specMergeMSA', 'encodeMSA']
 
 try:
     range = xrange
 except NameError:
     pass
 
+ENCODING = zeros(256, uint8)
+ENCODING[65:91] = arange(1, 27)
+ENCODING[97:123] = arange(27, 53)
+
+ENCODED = 53
+"""Number of codes used by :func:`.encodeMSA`."""
+
+
+def encodeMSA(msa):
+    """Returns *msa*, which may be an :class:`.MSA` instance or a 2D Numpy
+    character array, as a :class:`numpy.uint8` array of alphabet indices.
+    Upper case letters **A** to **Z** are encoded as 1 to 26, lower case
+    letters **a** to **z** as 27 to 52, and all other characters, i.e. gaps,
+    as 0.  Encoding of an :class:`.MSA` instance is calculated once and
+    reused until sequences are changed."""
+
+    try:
+        return msa._getEncoded()
+    except AttributeError:
+        pass
+    try:
+        dtype_, ndim = msa.dtype, msa.ndim
+    except AttributeError:
+        raise TypeError('msa must be an MSA instance or a 2D character array')
+    if dtype_ != dtype('|S1') or ndim != 2:
+        raise TypeError('msa must be an MSA instance or a 2D character array')
+    return ENCODING[ascontiguousarray(msa).view(uint8)]
+
 
 class MSA(object):
 
     """Store and manipulate multiple sequence alignments."""
 
     def __init__(self, msa, title='Unknown', labels=None, **kwargs):
-        """*msa* must be a 2D Numpy character array. *labels* is a list of
-        sequence labels (or titles).  *mapping* should map label or part of
-        label to sequence index in *msa* array. If *mapping* is not given,
-        one will be build from *labels*."""
+        """*msa* must be a 2D Numpy character array, which may be memory-mapped
+        as returned by :func:`.loadMSA`. *labels* is a list of sequence labels
+        (or titles).  *mapping* should map label or part of label to sequence
+        index in *msa* array. If *mapping* is not given, one will be build
+        from *labels*."""
 
         self._aligned = aligned = kwargs.get('aligned', True)
-        msa = toChararray(msa, aligned)
+        # memory-mapped arrays, e.g. from loadMSA, are not read into memory
+        if not (isinstance(msa, memmap) and msa.dtype == dtype('|S1') and
+                msa.ndim == 2):
+            msa = toChararray(msa, aligned)
         numseq = msa.shape[0]
 
         if labels and len(labels) != numseq:
@@ -48,6 +81,7 @@ class MSA(object):
         mapping = kwargs.get('mapping')
         self._map(mapping)
         self._msa = msa
+        self._encoded = None
         self._title = str(title) or 'Unknown'
         self._split = bool(kwargs.get('split', True))
 
@@ -336,6 +370,15 @@ class MSA(object):
 
         return self._msa
 
+    def _getEncoded(self):
+        """Returns MSA encoded using :func:`.encodeMSA`.  Encoding is cached
+        for the character array, so changes to the array in place are not
+        reflected."""
+
+        if self._encoded is None or self._encoded[0] is not self._msa:
+            self._encoded = (self._msa, encodeMSA(self._msa))
+        return self._encoded[1]
+
     def getIndex(self, label):
         """Returns index of the sequence that *label* maps onto.  If *label*
         maps onto multiple sequences or *label* is a list of labels, a list
@@ -428,6 +471,10 @@ def refineMSA(msa, index=None, label=None, rowocc=None, seqid=None, colocc=None,
         identifier
     :arg type: bool
 
+    Memory-mapped MSAs, e.g. those loaded using :func:`.loadMSA`, are refined
+    by selecting sequences and residues in blocks of *chunksize* sequences,
+    and only the refined MSA is read into memory.
+
     For Pfam MSA data, *label* is UniProt entry name for the protein.  You may
     also use PDB structure and chain identifiers, e.g. ``'1p38'`` or
     ``'1p38A'``, for *label* argument and UniProt entry names will be parsed
@@ -456,17 +503,26 @@ def refineMSA(msa, index=None, label=None, rowocc=None, seqid=None, colocc=None,
     if ndim != 2:
         raise ValueError('msa must be a 2D array or an MSA instance')
 
+    from .analysis import _getChunksize, _calcOccupancy, _takeChunks
+
+    # memory-mapped arrays are refined by selecting rows and columns, which
+    # are read into memory in chunks only after refinements are applied
+    chunksize = _getChunksize(arr, kwargs)
+    chunked = chunksize is not None
     title = []
-    cols = None
+    cols = columns = None
 
     if index is not None:
         before = arr.shape[1]
         LOGGER.timeit('_refine')
         cols = char.isalpha(arr[index]).nonzero()[0]
-        arr = arr.take(cols, 1)
+        if chunked:
+            columns = cols
+        else:
+            arr = arr.take(cols, 1)
         title.append('index=' + str(index))
         LOGGER.report('Index refinement reduced number of columns from {0} to '
-                      '{1} in %.2fs.'.format(before, arr.shape[1]), '_refine')
+                      '{1} in %.2fs.'.format(before, len(cols)), '_refine')
 
     if label is not None:
         if index is not None:
@@ -535,19 +591,23 @@ def refineMSA(msa, index=None, label=None, rowocc=None, seqid=None, colocc=None,
 
             title.append('label=' + label)
             cols = char.isalpha(arr[index]).nonzero()[0]
-            arr = arr.take(cols, 1)
+            if chunked:
+                columns = cols
+            else:
+                arr = arr.take(cols, 1)
             LOGGER.report('Label refinement reduced number of columns from {0} to '
-                          '{1} in %.2fs.'.format(before, arr.shape[1]), '_refine')
+                          '{1} in %.2fs.'.format(before, len(cols)), '_refine')
 
             if chain is not None and not kwargs.get('keep', False):
-                before = arr.shape[1]
+                before = len(cols)
                 LOGGER.timeit('_refine')
                 from prody.proteins.compare import importBioPairwise2
                 from prody.proteins.compare import MATCH_SCORE, MISMATCH_SCORE
                 from prody.proteins.compare import GAP_PENALTY, GAP_EXT_PENALTY
                 pw2 = importBioPairwise2()
                 chseq = chain.getSequence()
-                algn = pw2.align.localms(arr[index].tostring().upper(), chseq,
+                sequence = arr[index] if columns is None else arr[index][columns]
+                algn = pw2.align.localms(sequence.tostring().upper(), chseq,
                                          MATCH_SCORE, MISMATCH_SCORE,
                                          GAP_PENALTY, GAP_EXT_PENALTY,
                                          one_alignment_only=1)
@@ -563,10 +623,13 @@ def refineMSA(msa, index=None, label=None, rowocc=None, seqid=None, colocc=None,
                 tsum = torf.sum()
                 assert tsum <= before, 'problem in mapping sequence to structure'
                 if tsum < before:
-                    arr = arr.take(torf.nonzero()[0], 1)
+                    if chunked:
+                        columns = columns[torf.nonzero()[0]]
+                    else:
+                        arr = arr.take(torf.nonzero()[0], 1)
                     LOGGER.report('Structure refinement reduced number of '
                                   'columns from {0} to {1} in %.2fs.'
-                                  .format(before, arr.shape[1]), '_refine')
+                                  .format(before, tsum), '_refine')
                 else:
                     LOGGER.debug('All residues in the sequence are contained in '
                                  'PDB structure {0}.'.format(label))
@@ -583,17 +646,25 @@ def refineMSA(msa, index=None, label=None, rowocc=None, seqid=None, colocc=None,
             raise TypeError('rowocc must be a float ({0})'.format(str(err)))
         assert 0. <= rowocc <= 1., 'rowocc must be between 0 and 1'
 
-        rows = calcMSAOccupancy(arr, 'row') >= rowocc
+        if chunked:
+            rows = _calcOccupancy(arr, 0, False, chunksize,
+                                  cols=columns) >= rowocc
+        else:
+            rows = calcMSAOccupancy(arr, 'row') >= rowocc
         if index is not None:
             index = rows[:index].sum()
         rows = (rows).nonzero()[0]
-        arr = arr[rows]
+        if not chunked:
+            arr = arr[rows]
         title.append('rowocc>=' + str(rowocc))
         LOGGER.report('Row occupancy refinement reduced number of rows from '
-                      '{0} to {1} in %.2fs.'.format(before, arr.shape[0]),
+                      '{0} to {1} in %.2fs.'.format(before, len(rows)),
                       '_refine')
 
     if seqid is not None:
+        if chunked:
+            arr = _takeChunks(arr, chunksize, rows, columns)
+            chunked = False
         before = arr.shape[0]
         LOGGER.timeit('_refine')
         unique = uniqueSequences(arr, seqid)
@@ -611,7 +682,7 @@ def refineMSA(msa, index=None, label=None, rowocc=None, seqid=None, colocc=None,
                       '_refine')
 
     if colocc is not None:
-        before = arr.shape[1]
+        before = arr.shape[1] if columns is None else len(columns)
         LOGGER.timeit('_refine')
         try:
             colocc = float(colocc)
@@ -619,16 +690,24 @@ def refineMSA(msa, index=None, label=None, rowocc=None, seqid=None, colocc=None,
             raise TypeError('colocc must be a float ({0})'.format(str(err)))
         assert 0. <= colocc <= 1., 'colocc must be between 0 and 1'
 
-        cols = (calcMSAOccupancy(arr, 'col') >= colocc).nonzero()[0]
-        arr = arr.take(cols, 1)
+        if chunked:
+            cols = (_calcOccupancy(arr, 1, False, chunksize, rows,
+                                   columns) >= colocc).nonzero()[0]
+            columns = cols if columns is None else columns[cols]
+        else:
+            cols = (calcMSAOccupancy(arr, 'col') >= colocc).nonzero()[0]
+            arr = arr.take(cols, 1)
         title.append('colocc>=' + str(colocc))
         LOGGER.report('Column occupancy refinement reduced number of columns '
-                      'from {0} to {1} in %.2fs.'.format(before, arr.shape[1]),
+                      'from {0} to {1} in %.2fs.'.format(before, len(cols)),
                       '_refine')
 
     if not title:
         raise ValueError('label, index, seqid, rowocc, colocc all cannot be None')
 
+    if chunked:
+        arr = _takeChunks(arr, chunksize, rows, columns)
+
     # depending on slicing of rows, arr may not have it's own memory
     if arr.base is not None:
         arr = arr.copy()
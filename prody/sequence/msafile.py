@@ -4,16 +4,19 @@ analyzing multiple sequence alignments."""
 
 __author__ = 'Anindita Dutta, Ahmet Bakan'
 
+import re
+from struct import Struct
 from os.path import isfile, splitext, split, getsize
 
-from numpy import array, fromstring, empty
+from numpy import array, fromstring, empty, arange, intp, uint8, uint64
 
 from .sequence import splitSeqLabel, Sequence
 
 from prody import LOGGER
 from prody.utilities import openFile
 
-__all__ = ['MSAFile', 'splitSeqLabel', 'parseMSA', 'writeMSA']
+__all__ = ['MSAFile', 'splitSeqLabel', 'parseMSA', 'writeMSA', 'saveMSA',
+           'loadMSA']
 
 FASTA = 'FASTA'
 SELEX = 'SELEX'
@@ -51,6 +54,16 @@ ESJOIN = ''.join
 NUMLINES = 1000
 LEN_FASTA_LINE = 60
 LEN_SELEX_LABEL = 31
+CHUNKSIZE = 2 ** 24
+
+SELEXSEQ = re.compile(br'^[^#/%\s].*$', re.M).search
+MSABINARY = '.msa'
+MSAMAGIC = b'PRODYMSA'
+MSAVERSION = 1
+MSAHEADER = Struct('<8sIIQQ')
+MSAALIGN = 64
+
+STOCKHOLMSQ = re.compile(br'^#=GF SQ\s+(\d+)', re.M).search
 
 try:
     range = xrange
@@ -389,26 +402,7 @@ class MSAFile(object):
         filter will be applied to the full label.  """
 
         self._filter_full = bool(filter_full)
-
-        if filter is None:
-            self._filter = None
-            return
-
-        if not callable(filter):
-            raise TypeError('filter must be callable')
-
-        try:
-            result = filter('TEST_TITLE', 'SEQUENCE-WITH-GAPS')
-        except Exception as err:
-            raise TypeError('filter function must not raise exceptions, '
-                            'e.g. ' + str(err))
-        else:
-            try:
-                result = result or not result
-            except Exception as err:
-                raise ValueError('filter function must return a boolean, '
-                                 'e.g. ' + str(err))
-        self._filter = filter
+        self._filter = checkFilter(filter)
 
     def getSlice(self):
         """Returns object used to slice sequences."""
@@ -476,12 +470,162 @@ class MSAFile(object):
             write(self._selex_line.format(label, sequence))
 
 
+def checkFilter(filter):
+    """Returns *filter* after checking that it is a function that returns a
+    boolean for a sequence label and sequence."""
+
+    if filter is None:
+        return None
+
+    if not callable(filter):
+        raise TypeError('filter must be callable')
+
+    try:
+        result = filter('TEST_TITLE', 'SEQUENCE-WITH-GAPS')
+    except Exception as err:
+        raise TypeError('filter function must not raise exceptions, '
+                        'e.g. ' + str(err))
+    else:
+        try:
+            result = result or not result
+        except Exception as err:
+            raise ValueError('filter function must return a boolean, '
+                             'e.g. ' + str(err))
+    return filter
+
+
+def iterChunks(stream, format, chunksize=CHUNKSIZE):
+    """Yield chunks of *stream* that contain complete records of MSA
+    *format*.  Chunks are read in a separate thread, so that decompression
+    of the next chunk overlaps parsing of the current one."""
+
+    from threading import Thread
+    try:
+        from queue import Queue
+    except ImportError:
+        from Queue import Queue
+
+    queue = Queue(2)
+
+    def read():
+        try:
+            while True:
+                chunk = stream.read(chunksize)
+                queue.put(chunk)
+                if not chunk:
+                    break
+        except Exception as err:
+            queue.put(err)
+
+    reader = Thread(target=read)
+    reader.daemon = True
+    reader.start()
+
+    sep = b'\n>' if format == FASTA else b'\n'
+    rest = b''
+    while True:
+        chunk = queue.get()
+        if isinstance(chunk, Exception):
+            raise chunk
+        if not chunk:
+            break
+        chunk = rest + chunk
+        end = chunk.rfind(sep) + 1
+        if end:
+            rest = chunk[end:]
+            yield chunk[:end]
+        else:
+            rest = chunk
+    if rest:
+        yield rest
+    reader.join()
+
+
+def getSequenceLength(chunk, format):
+    """Returns length of the first sequence in *chunk* of MSA *format*, or
+    **None** if *chunk* does not contain a sequence."""
+
+    if format == FASTA:
+        beg = chunk.find(b'>')
+        if beg < 0:
+            return None
+        beg = chunk.find(b'\n', beg) + 1
+        end = chunk.find(b'\n>', beg)
+        return len(b''.join(chunk[beg:end if end >= 0 else None].split()))
+    else:
+        match = SELEXSEQ(chunk)
+        if match is None:
+            return None
+        return len(match.group().split()[-1])
+
+
+def parseMSAChunks(filename, format, **kwargs):
+    """Returns MSA character array, labels, mapping, number of parsed labels
+    and number of bytes parsed from FASTA, SELEX, or Stockholm format
+    *filename*, which may be a compressed file.  File is decompressed in
+    chunks of *chunksize* bytes that are parsed using C code, which also
+    applies *filter* and *slice*, see :class:`.MSAFile` for details."""
+
+    if format == FASTA:
+        from .msaio import parseFastaChunk as parser
+        sep = b'>'
+    else:
+        from .msaio import parseSelexChunk as parser
+        sep = b'\n'
+
+    filter = checkFilter(kwargs.get('filter', None))
+    filter_full = bool(kwargs.get('filter_full', False))
+    slice = kwargs.get('slice', None)
+
+    msaarr = columns = None
+    labels = []
+    mapping = {}
+    numseq = lcount = nbytes = total = 0
+    stream = openFile(filename, 'rb')
+    try:
+        for chunk in iterChunks(stream, format,
+                                kwargs.get('chunksize', CHUNKSIZE)):
+            nbytes += len(chunk)
+            needed = numseq + chunk.count(sep) + 1
+            if msaarr is None:
+                # Stockholm files from Pfam tell number of sequences
+                match = STOCKHOLMSQ(chunk) if format == STOCKHOLM else None
+                if match is not None:
+                    total = int(match.group(1))
+                seqlen = getSequenceLength(chunk, format)
+                if seqlen is None:
+                    continue
+                width = seqlen
+                if slice is not None:
+                    try:
+                        columns = array(arange(seqlen, dtype=intp)[slice],
+                                        intp, ndmin=1)
+                    except Exception:
+                        raise TypeError('invalid slice: ' + repr(slice))
+                    width = len(columns)
+                msaarr = empty((max(needed, total), width), '|S1')
+            elif needed > len(msaarr):
+                msaarr.resize((max(needed, 2 * len(msaarr)), width),
+                              refcheck=False)
+            numseq, count = parser(chunk, msaarr, numseq, labels, mapping,
+                                   seqlen, columns, filter, filter_full)
+            lcount += count
+    finally:
+        stream.close()
+
+    if msaarr is not None:
+        msaarr.resize((numseq, width), refcheck=False)
+    return msaarr, labels, mapping, lcount, nbytes
+
+
 def parseMSA(filename, **kwargs):
     """Returns an :class:`.MSA` instance that stores multiple sequence alignment
     and sequence labels parsed from Stockholm, SELEX, CLUSTAL, PIR, or FASTA format
-    *filename* file, which may be a compressed file. Uncompressed MSA files
-    are parsed using C code at a fraction of the time it would take to parse
-    compressed files in Python."""
+    *filename* file, which may be a compressed file.  FASTA, SELEX and
+    Stockholm files are parsed using C code.  Compressed files, or files
+    parsed with *filter* or *slice* arguments, are decompressed in chunks
+    in a separate thread and filtering and slicing is done while parsing,
+    see :class:`.MSAFile` for details of these arguments."""
 
     from .msa import MSA
 
@@ -494,18 +638,20 @@ def parseMSA(filename, **kwargs):
             raise IOError('[Errno 2] No such file or directory: ' +
                           repr(filename))
 
-    # if MSA is a compressed file or filter/slice is passed, use
-    #   Python parsers
+    # if MSA is a compressed file or filter/slice is passed, decompress and
+    #   parse it in chunks using C code, unless sequences are not aligned
 
     LOGGER.timeit('_parsemsa')
 
     title, ext = splitext(filename)
     title = split(title)[1]
     aligned = kwargs.get('aligned', True)
-    if (ext.lower() == '.gz' or 'filter' in kwargs or 'slice' in kwargs or
-            not aligned):
-        if ext.lower() == '.gz':
-            title = splitext(title)[0]
+    compressed = ext.lower() == '.gz'
+    if compressed:
+        title, ext = splitext(title)
+    format = MSAEXTMAP.get(ext.lower())
+    nbytes = None
+    if not aligned:
         msa = MSAFile(filename, split=False, **kwargs)
         seqlist = []
         sappend = seqlist.append
@@ -516,12 +662,9 @@ def parseMSA(filename, **kwargs):
         for i, seq in enumerate(msa):
             label = seq.getLabel(True)
             lappend(label)
-            if aligned:
-                sappend(seq._array)
-            else:
-                if len(seq) > maxlen:
-                    maxlen = len(seq)
-                sappend(seq)
+            if len(seq) > maxlen:
+                maxlen = len(seq)
+            sappend(seq)
             key = splitSeqLabel(label)[0]
             if key in mapping:
                 try:
@@ -533,20 +676,28 @@ def parseMSA(filename, **kwargs):
         if not seqlist:
             LOGGER.warn('No sequences were parsed from {0}.'.format(filename))
             return
-        if aligned:
-            msaarr = array(seqlist, '|S1')
-        else:
-            msaarr = array(seqlist, '|S' + str(maxlen))
+        msaarr = array(seqlist, '|S' + str(maxlen))
+    elif (format in (FASTA, SELEX, STOCKHOLM) and
+            (compressed or 'filter' in kwargs or 'slice' in kwargs)):
+        msaarr, labels, mapping, lcount, nbytes = parseMSAChunks(
+            filename, format, **kwargs)
+        if msaarr is None or not len(msaarr):
+            LOGGER.warn('No sequences were parsed from {0}.'.format(filename))
+            return
+        if lcount != len(msaarr):
+            LOGGER.warn('Failed to parse {0} sequence labels.'
+                        .format(len(msaarr) - lcount))
+    elif compressed:
+        raise IOError('compressed {0} files are not supported'.format(format))
     else:
-        filesize = getsize(filename)
-        format = MSAEXTMAP.get(splitext(filename)[1])
+        nbytes = getsize(filename)
 
         if format == FASTA:
             from .msaio import parseFasta as parser
-            msaarr = empty(filesize, '|S1')
+            msaarr = empty(nbytes, '|S1')
         elif format == SELEX or format == STOCKHOLM:
             from .msaio import parseSelex as parser
-            msaarr = empty(filesize, '|S1')
+            msaarr = empty(nbytes, '|S1')
         elif format == CLUSTAL:
             parser = parseClustal
             msaarr = []
@@ -565,8 +716,13 @@ def parseMSA(filename, **kwargs):
               aligned=aligned)
 
     if aligned:
-        LOGGER.report('{0} sequence(s) with {1} residues were parsed in '
-                      '%.2fs.'.format(*msaarr.shape), '_parsemsa')
+        msg = '{0} sequence(s) with {1} residues were parsed in %.2fs'.format(
+            *msaarr.shape)
+        if nbytes:
+            msg += ' ({0:.1f} MB/s)'.format(nbytes / 2. ** 20 /
+                                           max(LOGGER.timing('_parsemsa'),
+                                               1e-6))
+        LOGGER.report(msg + '.', '_parsemsa')
     else:
         LOGGER.report('{0} sequence(s) were parsed in %.2fs.'
                       .format(*msaarr.shape), '_parsemsa')
@@ -902,3 +1058,113 @@ def writeMSA(filename, msa, **kwargs):
                        label_length=kwargs.get('label_length',
                                                LEN_SELEX_LABEL))
     return filename
+
+
+def saveMSA(msa, filename=None, **kwargs):
+    """Returns *filename* after saving *msa*, an :class:`.MSA` or
+    :class:`.MSAFile` instance, in ProDy binary MSA format (:file:`.msa`).
+    File starts with a header, which is followed by the MSA title, residue
+    characters in a matrix of bytes with a row for each sequence, and an
+    index of sequence labels.  Sequences are written in blocks, so that an
+    :class:`.MSAFile` is converted without loading it into memory.  If
+    *filename* is **None**, title of *msa* will be used after white spaces
+    are replaced with underscores.  Saved files can be opened memory-mapped
+    using :func:`.loadMSA`."""
+
+    from prody.utilities import backupFile
+
+    try:
+        title = msa.getTitle()
+    except AttributeError:
+        raise TypeError('msa must be an MSA or MSAFile instance')
+    try:
+        arr = msa._getArray()
+    except AttributeError:
+        arr = None
+    else:
+        if not msa.isAligned():
+            raise ValueError('msa must be aligned')
+
+    if filename is None:
+        filename = title.replace(' ', '_')
+    if not filename.lower().endswith(MSABINARY):
+        filename += MSABINARY
+    backupFile(filename)
+
+    title = title.encode('utf-8')
+    offset = MSAHEADER.size + len(title)
+    offset += -offset % MSAALIGN
+    offsets = [0]
+    labels = []
+    numseq = numres = 0
+    with open(filename, 'wb') as out:
+        out.write(empty(offset, uint8).tostring())
+        if arr is not None:
+            numseq, numres = arr.shape
+            rows = max(1, CHUNKSIZE // max(numres, 1))
+            for start in range(0, numseq, rows):
+                out.write(arr[start:start + rows].tostring())
+            labels = [label.encode('utf-8') for label in msa._labels]
+        else:
+            for seq in msa:
+                residues = str(seq).encode('ascii')
+                if numseq and len(residues) != numres:
+                    raise ValueError('msa must be aligned')
+                numres = len(residues)
+                out.write(residues)
+                labels.append(seq.getLabel(True).encode('utf-8'))
+                numseq += 1
+        for label in labels:
+            offsets.append(offsets[-1] + len(label))
+        out.write(array(offsets, uint64).tostring())
+        out.write(b''.join(labels))
+        out.seek(0)
+        out.write(MSAHEADER.pack(MSAMAGIC, MSAVERSION, len(title), numseq,
+                                 numres))
+        out.write(title)
+    return filename
+
+
+def loadMSA(filename, mmap=True):
+    """Returns an :class:`.MSA` instance after loading *filename* saved using
+    :func:`.saveMSA`.  By default, residue characters are memory-mapped and
+    read from disk on demand, so that MSAs larger than memory can be
+    analyzed.  Functions such as :func:`.calcShannonEntropy`,
+    :func:`.calcMSAOccupancy`, :func:`.buildMutinfoMatrix`,
+    :func:`.buildOMESMatrix`, and :func:`.refineMSA` process memory-mapped
+    MSAs in blocks of sequences.  When *mmap* is **False**, residues are read
+    into memory."""
+
+    from numpy import memmap, fromfile
+    from .msa import MSA
+
+    with open(filename, 'rb') as inp:
+        header = inp.read(MSAHEADER.size)
+        if len(header) < MSAHEADER.size:
+            raise IOError('{0} is not a ProDy binary MSA file'
+                          .format(filename))
+        magic, version, lentitle, numseq, numres = MSAHEADER.unpack(header)
+        if magic != MSAMAGIC:
+            raise IOError('{0} is not a ProDy binary MSA file'
+                          .format(filename))
+        if version > MSAVERSION:
+            raise IOError('{0} was saved by a newer version of ProDy'
+                          .format(filename))
+        title = inp.read(lentitle).decode('utf-8')
+        offset = MSAHEADER.size + lentitle
+        offset += -offset % MSAALIGN
+        size = numseq * numres
+        if mmap:
+            msaarr = memmap(filename, '|S1', 'r', offset, (numseq, numres))
+        else:
+            inp.seek(offset)
+            msaarr = fromfile(inp, '|S1', size).reshape((numseq, numres))
+        inp.seek(offset + size)
+        offsets = fromfile(inp, uint64, numseq + 1).tolist()
+        labels = inp.read(offsets[-1])
+
+    labels = [labels[beg:end].decode('utf-8')
+              for beg, end in zip(offsets[:-1], offsets[1:])]
+    LOGGER.info('{0} sequence(s) with {1} residues were loaded from {2}.'
+                .format(numseq, numres, filename))
+    return MSA(msa=msaarr, title=title, labels=labels)
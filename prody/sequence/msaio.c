@@ -1,3 +1,4 @@
+#define PY_SSIZE_T_CLEAN
 #include "Python.h"
 #define NPY_NO_DEPRECATED_API NPY_1_7_API_VERSION
 #include "numpy/arrayobject.h"
@@ -393,6 +394,263 @@ static PyObject *writeSelex(PyObject *self, PyObject *args, PyObject *kwargs) {
 }
 
 
+static long labelKeyLength(const char *label, long length) {
+
+    /* Return length of the part of *label* that precedes residue range,
+       e.g. `/1-120`, as keys are determined by :func:`parseLabel`. */
+
+    long i, slash = 0, dash = 0;
+    for (i = 0; i < length; i++) {
+        if (label[i] == '/' && slash == 0 && dash == 0)
+            slash = i;
+        else if (label[i] == '-' && slash > 0 && dash == 0)
+            dash = i;
+    }
+    return (slash > 0 && dash > slash) ? slash : length;
+}
+
+
+static int storeSequence(PyArrayObject *msa, long row, const char *label,
+                         long lablen, const char *seq, long seqlen,
+                         long curlen, npy_intp *columns, long ncols,
+                         PyObject *filter, int filter_full) {
+
+    /* Copy *columns* of *seq* into *row* of *msa* if it passes *filter*.
+       Return 1 when sequence is stored, 0 when it is filtered out, and -1
+       with an exception set on failure. */
+
+    if (curlen != seqlen) {
+        char name[LENLABEL];
+        snprintf(name, LENLABEL, "%.*s", (int) lablen, label);
+        PyErr_Format(PyExc_IOError,
+                     "sequence for %s does not have expected length %ld",
+                     name, seqlen);
+        return -1;
+    }
+
+    if (filter != Py_None) {
+        long keylen = filter_full ? lablen : labelKeyLength(label, lablen);
+        PyObject *result = PyObject_CallFunction(filter, "s#s#", label,
+                                                 (Py_ssize_t) keylen, seq,
+                                                 (Py_ssize_t) seqlen);
+        if (!result)
+            return -1;
+        int keep = PyObject_IsTrue(result);
+        Py_DECREF(result);
+        if (keep < 1)
+            return keep;
+    }
+
+    if (row >= PyArray_DIMS(msa)[0]) {
+        PyErr_SetString(PyExc_IndexError, "msa array is too small");
+        return -1;
+    }
+
+    long i, width = PyArray_DIMS(msa)[1];
+    char *data = (char *) PyArray_DATA(msa) + row * width;
+    if (columns)
+        for (i = 0; i < ncols; i++)
+            data[i] = seq[columns[i]];
+    else
+        memcpy(data, seq, seqlen);
+    return 1;
+}
+
+
+static int parseChunkArgs(PyObject *args, PyObject *kwargs,
+                          const char **chunk, Py_ssize_t *size,
+                          PyArrayObject **msa, long *row, PyObject **labels,
+                          PyObject **mapping, long *seqlen,
+                          PyArrayObject **columns, PyObject **filter,
+                          int *filter_full) {
+
+    /* Parse arguments of chunk parsers and check *msa* and *columns*.
+       Return 1 when successful, 0 on failure. */
+
+    PyObject *cols = Py_None;
+    static char *kwlist[] = {"chunk", "msa", "row", "labels", "mapping",
+                             "seqlen", "columns", "filter", "filter_full",
+                             NULL};
+
+    *filter = Py_None;
+    *filter_full = 0;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "s#OlOOl|OOi", kwlist,
+                                     chunk, size, msa, row, labels, mapping,
+                                     seqlen, &cols, filter, filter_full))
+        return 0;
+
+    if (!PyArray_Check(*msa) || PyArray_NDIM(*msa) != 2 ||
+        PyArray_ITEMSIZE(*msa) != 1 || !PyArray_IS_C_CONTIGUOUS(*msa) ||
+        !PyArray_ISWRITEABLE(*msa)) {
+        PyErr_SetString(PyExc_TypeError, "msa must be a writeable, C "
+                        "contiguous 2D character array");
+        return 0;
+    }
+
+    *columns = NULL;
+    long width = *seqlen;
+    if (cols != Py_None) {
+        *columns = (PyArrayObject *) PyArray_FROMANY(cols, NPY_INTP, 1, 1,
+                                                     NPY_ARRAY_IN_ARRAY);
+        if (!*columns)
+            return 0;
+        width = PyArray_DIMS(*columns)[0];
+        npy_intp i, *index = (npy_intp *) PyArray_DATA(*columns);
+        for (i = 0; i < width; i++)
+            if (index[i] < 0 || index[i] >= *seqlen) {
+                Py_DECREF(*columns);
+                PyErr_SetString(PyExc_IndexError,
+                                "columns must be less than seqlen");
+                return 0;
+            }
+    }
+
+    if (PyArray_DIMS(*msa)[1] != width) {
+        Py_XDECREF(*columns);
+        PyErr_SetString(PyExc_ValueError,
+                        "msa array does not have expected width");
+        return 0;
+    }
+    return 1;
+}
+
+
+static PyObject *parseFastaChunk(PyObject *self, PyObject *args,
+                                 PyObject *kwargs) {
+
+    /* Parse complete FASTA records in *chunk* into rows of *msa* starting
+       from *row*.  Sequences rejected by *filter* are skipped, and only
+       *columns* of the remaining ones are stored.  Return index of the next
+       row and number of parsed labels. */
+
+    const char *chunk;
+    Py_ssize_t size;
+    PyArrayObject *msa, *columns;
+    PyObject *labels, *mapping, *filter;
+    long row, seqlen;
+    int filter_full;
+
+    if (!parseChunkArgs(args, kwargs, &chunk, &size, &msa, &row, &labels,
+                        &mapping, &seqlen, &columns, &filter, &filter_full))
+        return NULL;
+
+    npy_intp *index = columns ? (npy_intp *) PyArray_DATA(columns) : NULL;
+    long ncols = columns ? PyArray_DIMS(columns)[0] : seqlen;
+    char *seq = malloc((seqlen + 1) * sizeof(char));
+    if (!seq) {
+        Py_XDECREF(columns);
+        return PyErr_NoMemory();
+    }
+
+    const char *label;
+    long i = 0, lablen, curlen, count = 0;
+    int stored;
+    char ch;
+    while (i < size) {
+        if (chunk[i] != '>') {
+            while (i < size && chunk[i] != '\n')
+                i++;
+            i++;
+            continue;
+        }
+        label = chunk + i + 1;
+        while (i < size && chunk[i] != '\n')
+            i++;
+        lablen = chunk + i - label;
+        while (lablen > 0 && label[lablen - 1] <= 32)
+            lablen--;
+
+        curlen = 0;
+        while (i < size && chunk[i] != '>') {
+            ch = chunk[i++];
+            if (ch > 32) {
+                if (curlen < seqlen)
+                    seq[curlen] = ch;
+                curlen++;
+            }
+        }
+
+        stored = storeSequence(msa, row, label, lablen, seq, seqlen, curlen,
+                               index, ncols, filter, filter_full);
+        if (stored < 0) {
+            free(seq);
+            Py_XDECREF(columns);
+            return NULL;
+        } else if (stored) {
+            count += parseLabel(labels, mapping, (char *) label, lablen);
+            row++;
+        }
+    }
+
+    free(seq);
+    Py_XDECREF(columns);
+    return Py_BuildValue("(ll)", row, count);
+}
+
+
+static PyObject *parseSelexChunk(PyObject *self, PyObject *args,
+                                 PyObject *kwargs) {
+
+    /* Parse complete SELEX/Stockholm lines in *chunk* into rows of *msa*
+       starting from *row*.  Sequences rejected by *filter* are skipped, and
+       only *columns* of the remaining ones are stored.  Return index of the
+       next row and number of parsed labels. */
+
+    const char *chunk;
+    Py_ssize_t size;
+    PyArrayObject *msa, *columns;
+    PyObject *labels, *mapping, *filter;
+    long row, seqlen;
+    int filter_full;
+
+    if (!parseChunkArgs(args, kwargs, &chunk, &size, &msa, &row, &labels,
+                        &mapping, &seqlen, &columns, &filter, &filter_full))
+        return NULL;
+
+    npy_intp *index = columns ? (npy_intp *) PyArray_DATA(columns) : NULL;
+    long ncols = columns ? PyArray_DIMS(columns)[0] : seqlen;
+
+    const char *line, *seq;
+    long i = 0, end, beg, lablen, count = 0;
+    int stored;
+    while (i < size) {
+        line = chunk + i;
+        while (i < size && chunk[i] != '\n')
+            i++;
+        end = chunk + i - line;
+        i++;
+        if (line[0] == '#' || line[0] == '/' || line[0] == '%')
+            continue;
+
+        /* sequence is the last word, label is what precedes it */
+        while (end > 0 && line[end - 1] <= 32)
+            end--;
+        beg = end;
+        while (beg > 0 && line[beg - 1] > 32)
+            beg--;
+        if (beg == end)
+            continue;
+        lablen = beg;
+        while (lablen > 0 && line[lablen - 1] <= 32)
+            lablen--;
+        seq = line + beg;
+
+        stored = storeSequence(msa, row, line, lablen, seq, seqlen,
+                               end - beg, index, ncols, filter, filter_full);
+        if (stored < 0) {
+            Py_XDECREF(columns);
+            return NULL;
+        } else if (stored) {
+            count += parseLabel(labels, mapping, (char *) line, lablen);
+            row++;
+        }
+    }
+
+    Py_XDECREF(columns);
+    return Py_BuildValue("(ll)", row, count);
+}
+
+
 static PyMethodDef msaio_methods[] = {
 
     {"parseFasta",  (PyCFunction)parseFasta, METH_VARARGS,
@@ -409,6 +667,17 @@ static PyMethodDef msaio_methods[] = {
     {"writeSelex",  (PyCFunction)writeSelex, METH_VARARGS | METH_KEYWORDS,
     "Return filename after writing MSA in SELEX or Stockholm format."},
 
+    {"parseFastaChunk",  (PyCFunction)parseFastaChunk,
+     METH_VARARGS | METH_KEYWORDS,
+     "Return index of the next row and number of parsed labels after \n"
+     "parsing FASTA records in a chunk into rows of numpy character array."},
+
+    {"parseSelexChunk",  (PyCFunction)parseSelexChunk,
+     METH_VARARGS | METH_KEYWORDS,
+     "Return index of the next row and number of parsed labels after \n"
+     "parsing SELEX/Stockholm lines in a chunk into rows of numpy \n"
+     "character array."},
+
     {NULL, NULL, 0, NULL}
 };
 
@@ -0,0 +1,64 @@
+/* Worker thread helpers shared by msatools and seqtools.
+ *
+ * Kernels split their outer loops into n_threads interleaved tasks, i.e.
+ * task t handles rows t, t + n_threads, t + 2 * n_threads, ...  Every matrix
+ * element is calculated by exactly one task in the same order as in a single
+ * threaded run, so results do not depend on the number of threads.  Where
+ * POSIX threads are not available, tasks are run one after another. */
+
+#ifndef MSATHREADS_H
+#define MSATHREADS_H
+
+#ifndef _WIN32
+#include <pthread.h>
+#define MSATHREADS 1
+#endif
+
+#define MAXTHREADS 256
+
+typedef void *(*msaworker)(void *);
+
+
+static int checkThreads(int n_threads, long n_tasks) {
+
+    /* Return number of threads that is worth starting for n_tasks. */
+
+    if (n_threads < 1)
+        n_threads = 1;
+    if (n_threads > MAXTHREADS)
+        n_threads = MAXTHREADS;
+    if (n_threads > n_tasks)
+        n_threads = n_tasks > 0 ? (int) n_tasks : 1;
+    return n_threads;
+}
+
+
+static void runThreads(msaworker worker, void *tasks, size_t size,
+                       int n_threads) {
+
+    /* Call worker for each of n_threads tasks, each of given size in bytes,
+       that are stored in tasks array.  Task 0 is run in the calling thread.
+       Call this function after releasing the GIL. */
+
+    char *task = (char *) tasks;
+    int t;
+#ifdef MSATHREADS
+    pthread_t threads[MAXTHREADS];
+    int started[MAXTHREADS];
+    for (t = 1; t < n_threads; t++)
+        started[t] = !pthread_create(threads + t, NULL, worker,
+                                     task + t * size);
+    worker(task);
+    for (t = 1; t < n_threads; t++) {
+        if (started[t])
+            pthread_join(threads[t], NULL);
+        else
+            worker(task + t * size);
+    }
+#else
+    for (t = 0; t < n_threads; t++)
+        worker(task + t * size);
+#endif
+}
+
+#endif
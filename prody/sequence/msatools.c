@@ -3,6 +3,7 @@
 #include "Python.h"
 #define NPY_NO_DEPRECATED_API NPY_1_7_API_VERSION
 #include "numpy/arrayobject.h"
+#include "msathreads.h"
 #define NUMCHARS 27
 
 /*defined variables for psicov*/
@@ -777,17 +778,141 @@ static void printProbs(double **probs, long length) {
 }
 
 
+static double calcOMES(double **joint, double **probs, long i, long j, int n);
+
+
+typedef struct {
+
+    /* A task for calculating rows start, start + step, ... of a mutual
+       information or OMES matrix, except for the first row. */
+
+    long start, step, number, length;
+    int ambiguity, turbo, norm, omes, debug;
+    char *seq;
+    unsigned char **trans; /* refined columns, in turbo mode */
+    unsigned char *iseq; /* buffer for a refined column, otherwise */
+    double **probs;
+    double *data;
+} PairTask;
+
+
+static void *calcPairRows(void *arg) {
+
+    /* Calculate mutual information or OMES for pairs of columns in MSA. */
+
+    PairTask *task = (PairTask *) arg;
+    long number = task->number, length = task->length;
+    int turbo = task->turbo, debug = task->debug;
+    char *seq = task->seq;
+    unsigned char *iseq = task->iseq, *jseq, a, b;
+    double **probs = task->probs, *data = task->data;
+    double p_incr = 1. / number;
+    double jointbuf[NUMCHARS * NUMCHARS], *joint[NUMCHARS];
+    long i, j, k, diff, offset, ioffset;
+
+    for (k = 0; k < NUMCHARS; k++)
+        joint[k] = jointbuf + k * NUMCHARS;
+
+    for (i = task->start; i < length; i += task->step) {
+        ioffset = i * length;
+        if (turbo)
+            iseq = task->trans[i];
+
+        for (j = i + 1; j < length; j++) {
+            zeroJoint(joint);
+
+            if (turbo) {
+                jseq = task->trans[j];
+                for (k = 0; k < number; k++)
+                    joint[iseq[k]][jseq[k]] += p_incr;
+
+            } else {
+                diff = j - i - 1;
+                for (k = 0; k < number; k++) {
+                    offset = k * length;
+                    if (diff) {
+                        a = iseq[k];
+                    } else {
+                        a = (unsigned char) seq[offset + i];
+                        if (a > 90)
+                            a -= 96;
+                        else
+                            a -= 64;
+                        if (a < 1 || a > 26)
+                            a = 0; /* gap character */
+                        iseq[k] = a;
+                    }
+
+                    b = (unsigned char) seq[offset + j];
+                    if (b > 90)
+                        b -= 96;
+                    else
+                        b -= 64;
+                    if (b < 1 || b > 26)
+                        b = 0; /* gap character */
+                    joint[a][b] += p_incr;
+                }
+            }
+            if (task->ambiguity)
+                sortJoint(joint);
+            if (task->omes)
+                data[ioffset + j] = data[i + length * j] =
+                    calcOMES(joint, probs, i, j, number);
+            else if (task->norm)
+                data[ioffset + j] = data[i + length * j] =
+                    calcMI(joint, probs, i, j, debug) / jointEntropy(joint);
+            else
+                data[ioffset + j] = data[i + length * j] =
+                    calcMI(joint, probs, i, j, debug);
+        }
+    }
+    return NULL;
+}
+
+
+static void runPairTasks(PairTask *base, int n_threads) {
+
+    /* Calculate all but the first row of the matrix using n_threads, with
+       the GIL released. */
+
+    long t, number = base->number;
+    unsigned char *buffer = NULL;
+    PairTask tasks[MAXTHREADS];
+
+    n_threads = checkThreads(n_threads, base->length - 1);
+    if (!base->turbo && n_threads > 1) {
+        buffer = malloc(n_threads * number * sizeof(unsigned char));
+        if (!buffer)
+            n_threads = 1;
+    }
+
+    for (t = 0; t < n_threads; t++) {
+        tasks[t] = *base;
+        tasks[t].start = t + 1;
+        tasks[t].step = n_threads;
+        if (buffer)
+            tasks[t].iseq = buffer + t * number;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    runThreads(calcPairRows, tasks, sizeof(PairTask), n_threads);
+    Py_END_ALLOW_THREADS
+
+    free(buffer);
+}
+
+
 static PyObject *msamutinfo(PyObject *self, PyObject *args, PyObject *kwargs) {
 
     PyArrayObject *msa, *mutinfo;
-    int ambiguity = 1, turbo = 1, debug = 0, norm = 0;
+    int ambiguity = 1, turbo = 1, debug = 0, norm = 0, n_threads = 1;
 
-    static char *kwlist[] = {"msa", "mutinfo",
-                             "ambiguity", "turbo", "norm", "debug", NULL};
+    static char *kwlist[] = {"msa", "mutinfo", "ambiguity", "turbo", "norm",
+                             "debug", "n_threads", NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|iiii", kwlist,
-                                     &msa, &mutinfo,
-                                     &ambiguity, &turbo, &norm, &debug))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|iiiii", kwlist,
+                                     &msa, &mutinfo, &ambiguity, &turbo,
+                                     &norm, &debug, &n_threads))
         return NULL;
 
     /* make sure to have a contiguous and well-behaved array */
@@ -997,57 +1122,9 @@ static PyObject *msamutinfo(PyObject *self, PyObject *args, PyObject *kwargs) {
 
 
     /* calculate rest of MI matrix */
-    long ioffset;
-    for (i = 1; i < length; i++) {
-        ioffset = i * length;
-        if (turbo)
-            iseq = trans[i];
-
-        for (j = i + 1; j < length; j++) {
-            zeroJoint(joint);
-
-            if (turbo) {
-                jseq = trans[j];
-                for (k = 0; k < number; k++)
-                    joint[iseq[k]][jseq[k]] += p_incr;
-
-            } else {
-                diff = j - i - 1;
-                for (k = 0; k < number; k++) {
-                    offset = k * length;
-                    if (diff) {
-                        a = iseq[k];
-                    } else {
-                        a = (unsigned char) seq[offset + i];
-                        if (a > 90)
-                            a -= 96;
-                        else
-                            a -= 64;
-                        if (a < 1 || a > 26)
-                            a = 0; /* gap character */
-                        iseq[k] = a;
-                    }
-
-                    b = (unsigned char) seq[offset + j];
-                    if (b > 90)
-                        b -= 96;
-                    else
-                        b -= 64;
-                    if (b < 1 || b > 26)
-                        b = 0; /* gap character */
-                    joint[a][b] += p_incr;
-                }
-            }
-            if (ambiguity)
-                sortJoint(joint);
-        if (norm)
-            mut[ioffset + j] = mut[i + length * j] =
-                calcMI(joint, probs, i, j, debug) / jointEntropy(joint);
-        else
-            mut[ioffset + j] = mut[i + length * j] =
-                calcMI(joint, probs, i, j, debug);
-        }
-    }
+    PairTask task = {1, 1, number, length, ambiguity, turbo, norm, 0, debug,
+                     seq, trans, iseq, probs, mut};
+    runPairTasks(&task, n_threads);
 
     /* free memory */
     for (i = 0; i < length; i++){
@@ -1133,14 +1210,14 @@ static double calcOMES(double **joint, double **probs, long i, long j, int n) {
 static PyObject *msaomes(PyObject *self, PyObject *args, PyObject *kwargs) {
 
     PyArrayObject *msa, *omes;
-    int ambiguity = 1, turbo = 1, debug = 0;
+    int ambiguity = 1, turbo = 1, debug = 0, n_threads = 1;
 
-    static char *kwlist[] = {"msa", "omes",
-                             "ambiguity", "turbo", "debug", NULL};
+    static char *kwlist[] = {"msa", "omes", "ambiguity", "turbo", "debug",
+                             "n_threads", NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|iii", kwlist,
-                                     &msa, &omes,
-                                     &ambiguity, &turbo, &debug))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|iiii", kwlist,
+                                     &msa, &omes, &ambiguity, &turbo,
+                                     &debug, &n_threads))
         return NULL;
 
     /* make sure to have a contiguous and well-behaved array */
@@ -1344,53 +1421,9 @@ static PyObject *msaomes(PyObject *self, PyObject *args, PyObject *kwargs) {
         free(iseq);
 
     /* calculate rest of OMES matrix */
-    long ioffset;
-    for (i = 1; i < length; i++) {
-        ioffset = i * length;
-        if (turbo)
-            iseq = trans[i];
-
-        for (j = i + 1; j < length; j++) {
-            zeroJoint(joint);
-
-            if (turbo) {
-                jseq = trans[j];
-                for (k = 0; k < number; k++)
-                    joint[iseq[k]][jseq[k]] += p_incr;
-
-            } else {
-                diff = j - i - 1;
-                for (k = 0; k < number; k++) {
-                    offset = k * length;
-                    if (diff) {
-                        a = iseq[k];
-                    } else {
-                        a = (unsigned char) seq[offset + i];
-                        if (a > 90)
-                            a -= 96;
-                        else
-                            a -= 64;
-                        if (a < 1 || a > 26)
-                            a = 0; /* gap character */
-                        iseq[k] = a;
-                    }
-
-                    b = (unsigned char) seq[offset + j];
-                    if (b > 90)
-                        b -= 96;
-                    else
-                        b -= 64;
-                    if (b < 1 || b > 26)
-                        b = 0; /* gap character */
-                    joint[a][b] += p_incr;
-                }
-            }
-            if (ambiguity)
-                sortJoint(joint);
-        data[ioffset + j] = data[i + length * j] =
-        calcOMES(joint, probs, i, j, number);
-        }
-    }
+    PairTask task = {1, 1, number, length, ambiguity, turbo, 0, 1, debug,
+                     seq, trans, iseq, probs, data};
+    runPairTasks(&task, n_threads);
 
     /* free memory */
     for (i = 0; i < length; i++){
@@ -1410,13 +1443,72 @@ static PyObject *msaomes(PyObject *self, PyObject *args, PyObject *kwargs) {
 }
 
 
+typedef struct {
+
+    /* A task for calculating rows start, start + step, ... of SCA matrix. */
+
+    long start, step, number, length;
+    int turbo;
+    char *seq;
+    double **wx, **wprob, *sca;
+} SCATask;
+
+
+static void *calcSCARows(void *arg) {
+
+    SCATask *task = (SCATask *) arg;
+    long number = task->number, length = task->length, i, j, k;
+    int turbo = task->turbo;
+    char *seq = task->seq;
+    double **wx = task->wx, **wprob = task->wprob, *sca = task->sca;
+
+    for (i = task->start; i < length; i += task->step){
+        for (j = i;j<length;j++){
+            double *icol, *jcol, sumi=0.0, sumj=0.0, sum=0.0;
+            if (turbo){
+                icol=wx[i];
+                jcol=wx[j];
+                for (k=0; k< number; k++){
+                    sumi += icol[k];
+                    sumj += jcol[k];
+                    sum += icol[k]*jcol[k];
+                }
+            }
+            else{
+                for (k = 0; k < number; k++){
+                    int tempi = (seq[k*length + i] > 96) ?
+                    seq[k * length + i] - 97 : seq[k * length + i] - 65;
+                    double xi = (tempi >= 0 && tempi <= 25) ?
+                        wprob[i][tempi + 1] : wprob[i][0];
+                    int tempj = (seq[k * length + j] > 96) ?
+                        seq[k * length + j] - 97 : seq[k * length + j] - 65;
+                    double xj = (tempj >= 0 && tempj <= 25) ?
+                        wprob[j][tempj + 1] : wprob[j][0];
+                    sumi += xi;
+                    sumj += xj;
+                    sum += xi * xj;
+                }
+            }
+            sum /= number;
+            sumj /= number;
+            sumi /= number;
+            sum = sum - sumi * sumj;
+            sum = sum >= 0 ? sum : -sum ;
+            sca[i * length + j] = sca[j * length + i] = sum;
+        }
+    }
+
+    return NULL;
+}
+
+
 static PyObject *msasca(PyObject *self, PyObject *args, PyObject *kwargs) {
 
     PyArrayObject *msa, *scainfo;
-    int turbo = 1;
-    static char *kwlist[] = {"msa", "sca", "turbo", NULL};
-    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|i", kwlist,
-                                     &msa, &scainfo, &turbo))
+    int turbo = 1, n_threads = 1;
+    static char *kwlist[] = {"msa", "sca", "turbo", "n_threads", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|ii", kwlist,
+                                     &msa, &scainfo, &turbo, &n_threads))
         return NULL;
     /* make sure to have a contiguous and well-behaved array */
     msa = PyArray_GETCONTIGUOUS(msa);
@@ -1552,41 +1644,16 @@ static PyObject *msasca(PyObject *self, PyObject *args, PyObject *kwargs) {
     }
 
     /* Calculate SCA Matrix*/
-    for (i=0;i<length;i++){
-        for (j = i;j<length;j++){
-            double *icol, *jcol, sumi=0.0, sumj=0.0, sum=0.0;
-            if (turbo){
-                icol=wx[i];
-                jcol=wx[j];
-                for (k=0; k< number; k++){
-                    sumi += icol[k];
-                    sumj += jcol[k];
-                    sum += icol[k]*jcol[k];
-                }
-            }
-            else{
-                for (k = 0; k < number; k++){
-                    int tempi = (seq[k*length + i] > 96) ?
-                    seq[k * length + i] - 97 : seq[k * length + i] - 65;
-                    double xi = (tempi >= 0 && tempi <= 25) ?
-                        wprob[i][tempi + 1] : wprob[i][0];
-                    int tempj = (seq[k * length + j] > 96) ?
-                        seq[k * length + j] - 97 : seq[k * length + j] - 65;
-                    double xj = (tempj >= 0 && tempj <= 25) ?
-                        wprob[j][tempj + 1] : wprob[j][0];
-                    sumi += xi;
-                    sumj += xj;
-                    sum += xi * xj;
-                }
-            }
-            sum /= number;
-            sumj /= number;
-            sumi /= number;
-            sum = sum - sumi * sumj;
-            sum = sum >= 0 ? sum : -sum ;
-            sca[i * length + j] = sca[j * length + i] = sum;
-        }
+    SCATask tasks[MAXTHREADS];
+    n_threads = checkThreads(n_threads, length);
+    for (i = 0; i < n_threads; i++) {
+        SCATask task = {i, n_threads, number, length, turbo, seq, wx, wprob,
+                        sca};
+        tasks[i] = task;
     }
+    Py_BEGIN_ALLOW_THREADS
+    runThreads(calcSCARows, tasks, sizeof(SCATask), n_threads);
+    Py_END_ALLOW_THREADS
 
     /* free memory */
     for (j = 1; j < length; j++)
@@ -1602,17 +1669,58 @@ static PyObject *msasca(PyObject *self, PyObject *args, PyObject *kwargs) {
 }
 
 
+typedef struct {
+
+    /* A task for counting similar sequences for rows start, start + step,
+       ... of the sequence pair matrix. */
+
+    long start, step, number, l;
+    double theta;
+    int *align;
+    double *w;
+} MeffTask;
+
+
+static void *calcMeffRows(void *arg) {
+
+    MeffTask *task = (MeffTask *) arg;
+    long number = task->number, l = task->l, i, j, k;
+    double theta = task->theta, *w = task->w;
+    int *align = task->align;
+
+    #define align(x,y) align[(x)*l+(y)]
+
+    for (i = task->start; i < number; i += task->step)
+        for (j = i+1; j < number; j++){
+            double temp = 0.;
+            for (k = 0; k < l; k++){
+                if (align(i,k) != align(j,k))
+                    temp += 1.;
+            }
+            temp /= l;
+            if (temp < theta){
+                w[i] += 1.;
+                w[j] += 1.;
+            }
+        }
+
+    #undef align
+    return NULL;
+}
+
+
 static PyObject *msameff(PyObject *self, PyObject *args, PyObject *kwargs) {
 
     PyArrayObject *msa,*pythonw;
     double theta = 0.0;
-    int meff_only = 1, refine = 0;
+    int meff_only = 1, refine = 0, n_threads = 1;
     int alignlist[26] = {1, 0, 2, 3, 4, 5, 6, 7, 8, 0, 9, 10, 11, 12,
              0, 13, 14, 15, 16, 17, 0, 18, 19, 0, 20, 0};
-    static char *kwlist[] = {"msa", "theta", "meff_only", "refine", "w", NULL};
-    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "Odii|O", kwlist,
+    static char *kwlist[] = {"msa", "theta", "meff_only", "refine", "w",
+                             "n_threads", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "Odii|Oi", kwlist,
                                      &msa, &theta, &meff_only, &refine,
-                                     &pythonw))
+                                     &pythonw, &n_threads))
         return NULL;
     /* make sure to have a contiguous and well-behaved array */
     msa = PyArray_GETCONTIGUOUS(msa);
@@ -1678,19 +1786,30 @@ static PyObject *msameff(PyObject *self, PyObject *args, PyObject *kwargs) {
     /*Calculate weight(w) for each sequence, sum of w is Meff*/
     for (i = 0; i < number; i++)
         w[i] = 1.;
-    for (i = 0; i < number; i++)
-        for (j = i+1; j < number; j++){
-            double temp = 0.;
-            for (k = 0; k < l; k++){
-                if (align(i,k) != align(j,k))
-                    temp += 1.;
-            }
-            temp /= l;
-            if (temp < theta){
-                w[i] += 1.;
-                w[j] += 1.;
-            }
-        }
+
+    /*Each thread counts similar sequences in its own array, counts are
+      whole numbers so their sum does not depend on the number of threads.*/
+    MeffTask tasks[MAXTHREADS];
+    n_threads = checkThreads(n_threads, number);
+    double *counts = NULL;
+    if (n_threads > 1) {
+        counts = calloc((n_threads - 1) * number, sizeof(double));
+        if (!counts)
+            n_threads = 1;
+    }
+    for (i = 0; i < n_threads; i++) {
+        MeffTask task = {i, n_threads, number, l, theta, align,
+                         i ? counts + (i - 1) * number : w};
+        tasks[i] = task;
+    }
+    Py_BEGIN_ALLOW_THREADS
+    runThreads(calcMeffRows, tasks, sizeof(MeffTask), n_threads);
+    Py_END_ALLOW_THREADS
+    for (k = 1; k < n_threads; k++)
+        for (i = 0; i < number; i++)
+            w[i] += counts[(k - 1) * number + i];
+    free(counts);
+
     double meff = 0.0;
     for (i = 0; i < number; i++){
         w[i] = 1./ w[i];
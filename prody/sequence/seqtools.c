@@ -1,6 +1,7 @@
 #include "Python.h"
 #define NPY_NO_DEPRECATED_API NPY_1_7_API_VERSION
 #include "numpy/arrayobject.h"
+#include "msathreads.h"
 #define NUMCHARS 27
 #include <stdio.h>
 
@@ -9,17 +10,105 @@ const int twenty[20] = {1, 3, 4, 5, 6, 7, 8, 9, 11, 12, 13,
 const int unambiguous[23] = {0, 1, 3, 4, 5, 6, 7, 8, 9, 11, 12, 13, 14,
                              15, 16, 17, 18, 19, 20, 21, 22, 23, 25};
 
+typedef struct {
+
+    /* A task for calculating rows start, start + step, ... of sequence
+       identity matrix, except for the first row. */
+
+    long start, step, number, length;
+    int turbo;
+    char *raw;
+    unsigned char **seq; /* refined sequences, in turbo mode */
+    unsigned char *iseq; /* buffer for a refined sequence, otherwise */
+    double *sim;
+} EyeTask;
+
+
+static void *calcSeqidRows(void *arg) {
+
+    EyeTask *task = (EyeTask *) arg;
+    long number = task->number, length = task->length, i, j, k, diff;
+    int turbo = task->turbo;
+    char *iraw = task->raw, *jraw, *raw = task->raw;
+    unsigned char *iseq = task->iseq, *jseq, **seq = task->seq, a, b;
+    double *sim = task->sim, ncols, score, seqid;
+
+    for (i = task->start; i < number; i += task->step) {
+
+        if (turbo)
+            iseq = seq[i];
+        else
+            iraw = raw + length * i;
+
+        for (j = i + 1; j < number; j++) {
+            ncols = score = 0.;
+
+            if (turbo) {
+                jseq = seq[j];
+                for (k = 0; k < length; k++) {
+                    a = iseq[k];
+                    b = jseq[k];
+                    if (a || b) {
+                        ncols++;
+                        if (a == b)
+                            score++;
+                    }
+                }
+            } else {
+                jraw = raw + length * j;
+                diff = j - i - 1;
+                for (k = 0; k < length; k++) {
+                    if (diff) {
+                        a = iseq[k];
+                    } else {
+                        a = (unsigned char) iraw[k];
+                        if (a > 90)
+                            a -= 96;
+                        else
+                            a -= 64;
+                        if (a < 1 || a > 26)
+                            a = 0; /* gap character */
+                        iseq[k] = a;
+                    }
+
+                    b = (unsigned char) jraw[k];
+                    if (b > 90)
+                        b -= 96;
+                    else
+                        b -= 64;
+                    if (b < 1 || b > 26)
+                        b = 0; /* gap character */
+
+                    if (a || b) {
+                        ncols++;
+                        if (a == b)
+                            score++;
+                    }
+                }
+            }
+
+            seqid = score / ncols;
+            if (ncols)
+                sim[i * number + j] = sim[i + number * j] = seqid;
+        }
+    }
+    return NULL;
+}
+
+
 static PyObject *msaeye(PyObject *self, PyObject *args,
                                    PyObject *kwargs) {
 
     PyArrayObject *msa, *array;
     double unique = 0;
-    int turbo = 1;
+    int turbo = 1, n_threads = 1;
 
-    static char *kwlist[] = {"msa", "array", "unique", "turbo", NULL};
+    static char *kwlist[] = {"msa", "array", "unique", "turbo", "n_threads",
+                             NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|di", kwlist,
-                                     &msa, &array, &unique, &turbo))
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|dii", kwlist,
+                                     &msa, &array, &unique, &turbo,
+                                     &n_threads))
         return NULL;
 
     /* make sure to have a contiguous and well-behaved array */
@@ -139,71 +228,89 @@ static PyObject *msaeye(PyObject *self, PyObject *args,
         free(iseq);
 
     /* calculate rest of identities */
-    for (i = 1; i < number; i++) {
+    if (unique) {
+        /* a sequence is compared to those that are found to be unique
+           before itself, so rows are calculated in order */
+        for (i = 1; i < number; i++) {
 
-        if (unique && !unq[i])
-            continue;
+            if (!unq[i])
+                continue;
 
-        if (turbo)
-            iseq = seq[i];
-        else
-            iraw = raw + length * i;
+            if (turbo)
+                iseq = seq[i];
+            else
+                iraw = raw + length * i;
 
-        for (j = i + 1; j < number; j++) {
-            ncols = score = 0.;
-        
-            if (turbo) {
-                jseq = seq[j];
-                for (k = 0; k < length; k++) {
-                    a = iseq[k];
-                    b = jseq[k];
-                    if (a || b) {
-                        ncols++;
-                        if (a == b)
-                            score++;
-                    }
-                }
-            } else {
-                jraw = raw + length * j;
-                diff = j - i - 1;
-                for (k = 0; k < length; k++) {
-                    if (diff) {
+            for (j = i + 1; j < number; j++) {
+                ncols = score = 0.;
+
+                if (turbo) {
+                    jseq = seq[j];
+                    for (k = 0; k < length; k++) {
                         a = iseq[k];
-                    } else {
-                        a = (unsigned char) iraw[k];
-                        if (a > 90)
-                            a -= 96;
-                        else
-                            a -= 64;
-                        if (a < 1 || a > 26)
-                            a = 0; /* gap character */
-                        iseq[k] = a;
+                        b = jseq[k];
+                        if (a || b) {
+                            ncols++;
+                            if (a == b)
+                                score++;
+                        }
                     }
-
-                    b = (unsigned char) jraw[k];
-                    if (b > 90)
-                        b -= 96;
-                    else
-                        b -= 64;
-                    if (b < 1 || b > 26)
-                        b = 0; /* gap character */
-
-                    if (a || b) {
-                        ncols++;
-                        if (a == b)
-                            score++;
+                } else {
+                    jraw = raw + length * j;
+                    diff = j - i - 1;
+                    for (k = 0; k < length; k++) {
+                        if (diff) {
+                            a = iseq[k];
+                        } else {
+                            a = (unsigned char) iraw[k];
+                            if (a > 90)
+                                a -= 96;
+                            else
+                                a -= 64;
+                            if (a < 1 || a > 26)
+                                a = 0; /* gap character */
+                            iseq[k] = a;
+                        }
+
+                        b = (unsigned char) jraw[k];
+                        if (b > 90)
+                            b -= 96;
+                        else
+                            b -= 64;
+                        if (b < 1 || b > 26)
+                            b = 0; /* gap character */
+
+                        if (a || b) {
+                            ncols++;
+                            if (a == b)
+                                score++;
+                        }
                     }
                 }
-            }
 
-            seqid = score / ncols;
-            if (unique) {
+                seqid = score / ncols;
                 if (seqid >= unique)
                     unq[j] = 0;
-            } else
-                if (ncols)
-                    sim[i * number + j] = sim[i + number * j] = seqid;
-         }
+            }
+        }
+    } else {
+        n_threads = checkThreads(n_threads, number - 1);
+        unsigned char *buffer = NULL;
+        if (!turbo && n_threads > 1) {
+            buffer = malloc(n_threads * length * sizeof(unsigned char));
+            if (!buffer)
+                n_threads = 1;
+        }
+        EyeTask tasks[MAXTHREADS];
+        for (i = 0; i < n_threads; i++) {
+            EyeTask task = {i + 1, n_threads, number, length, turbo, raw,
+                            seq, buffer ? buffer + i * length : iseq, sim};
+            tasks[i] = task;
+        }
+        Py_BEGIN_ALLOW_THREADS
+        runThreads(calcSeqidRows, tasks, sizeof(EyeTask), n_threads);
+        Py_END_ALLOW_THREADS
+        free(buffer);
     }
 
     /* free memory */
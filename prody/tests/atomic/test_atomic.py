@@ -68,6 +68,22 @@ class TestCopying(unittest.TestCase):
             assert_equal(selection.getData(label), SELECTION.getData(label),
                          'failed to copy ' + label)
 
+    def testCopyAngles(self):
+
+        atoms = ATOMS.copy()
+        atoms.setAngles([[0, 1, 2], [1, 2, 3], [2, 4, 6]])
+        atoms.setImpropers([[0, 1, 2, 3]])
+        assert_equal(atoms.copy().getAngles(), atoms.getAngles())
+        selection = atoms[1:5].copy()
+        assert_equal(selection.getAngles(), [[0, 1, 2]])
+        self.assertIsNone(selection.getImpropers())
+        self.assertIsNone(selection.getDihedrals())
+        added = atoms + atoms
+        self.assertEqual(added.numAngles(), 6)
+        assert_equal(added.getAngles()[3:], atoms.getAngles() + len(atoms))
+        self.assertRaises(ValueError, atoms.setAngles, [[0, 1, len(atoms)]])
+        self.assertRaises(ValueError, atoms.setDihedrals, [[0, 1, 2]])
+
 class TestSaveLoad(unittest.TestCase):
 
     def testSaveLoad(self):
@@ -2,7 +2,8 @@
 
 from prody.tests import TestCase
 
-from numpy import arange
+from numpy import arange, zeros
+from numpy.testing import assert_array_equal
 from numpy.random import shuffle
 
 from prody import *
@@ -45,4 +46,34 @@ class TestTerRecord(TestCase):
 
     def testSelectionResidueIndexing2(self):
 
-        self.assertEqual(len(RTER[20:].getHierView()['A', 866]), 3)
\ No newline at end of file
+        self.assertEqual(len(RTER[20:].getHierView()['A', 866]), 3)
+
+class TestNonContiguous(TestCase):
+
+    def setUp(self):
+
+        self.ag = AtomGroup('noncontiguous')
+        self.ag.setCoords(zeros((8, 3)))
+        self.ag.setChids(list('AABBAABB'))
+        self.ag.setResnums([1, 2, 1, 1, 2, 3, 1, 2])
+
+    def testIndices(self):
+
+        hv = self.ag.getHierView()
+        self.assertEqual(hv.numChains(), 2)
+        self.assertEqual(hv.numResidues(), 5)
+        assert_array_equal(self.ag._getChindices(), [0, 0, 1, 1, 0, 0, 1, 1])
+        assert_array_equal(self.ag._getResindices(), [0, 1, 2, 2, 1, 3, 2, 4])
+
+    def testResidues(self):
+
+        hv = self.ag.getHierView()
+        assert_array_equal(hv['A', 2].getIndices(), [1, 4])
+        assert_array_equal(hv['B', 1].getIndices(), [2, 3, 6])
+        assert_array_equal(hv.getChain('B').getIndices(), [2, 3, 6, 7])
+
+    def testSelection(self):
+
+        hv = self.ag[1:7].getHierView()
+        self.assertEqual(hv.numResidues(), 3)
+        assert_array_equal(hv['B', 1].getIndices(), [2, 3, 6])
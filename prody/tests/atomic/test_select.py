@@ -390,7 +390,9 @@ SELECTION_TESTS['imatinib'] = {
         ('fragment 1', 0),
         ('fragment 0 1 2', len(ligand)),
         ('fragindex 0 1 2', len(ligand)),
-        ('fragindex 0:2', len(ligand)),],
+        ('fragindex 0:2', len(ligand)),
+        ('same fragment as bonded to index 0', len(ligand)),
+        ('same residue as exbonded 2 to index 0', len(ligand)),],
 }
 
 
@@ -547,3 +549,51 @@ def testGetBoolArray():
     ca = pdb3mht.ca
     assert_equal(len(ca), len(SELECT.getBoolArray(ca, 'index 510')))
 
+
+def testWithinSubset():
+
+    protein = pdb3mht.select('protein')
+    for selstr in ['within 5 of resname ALA', 'within 5 of not resname ALA',
+                   'exwithin 5 of not resname ALA']:
+        assert_equal(protein.select(selstr).getIndices(),
+                     pdb3mht.select('protein and ' + selstr.replace('of ',
+                                    'of (protein and ') + ')').getIndices())
+
+
+class TestPlanCache(unittest.TestCase):
+
+    def testHitsMisses(self):
+
+        select = prody.Select()
+        selstr = 'protein and within 5 of water'
+        first = select.getBoolArray(pdb3mht, selstr)
+        info = select.getCacheInfo()
+        self.assertEqual((info['hits'], info['misses'], info['size']),
+                         (0, 1, 1))
+        assert_equal(select.getBoolArray(pdb3mht, selstr), first)
+        info = select.getCacheInfo()
+        self.assertEqual((info['hits'], info['misses']), (1, 1))
+        select.clearCache()
+        info = select.getCacheInfo()
+        self.assertEqual((info['hits'], info['misses'], info['size']),
+                         (0, 0, 0))
+
+    def testAtomGroups(self):
+
+        select = prody.Select()
+        selstr = 'name CA and resnum 10 to 50'
+        ca = pdb3mht.ca.copy()
+        select.getBoolArray(pdb3mht, selstr)
+        assert_equal(select.getBoolArray(ca, selstr),
+                     SELECT.getBoolArray(ca, selstr))
+        self.assertEqual(select.getCacheInfo()['hits'], 1)
+
+    def testEvaluationError(self):
+
+        select = prody.Select()
+        atoms = AtomMap(pdb3mht, range(10), mapping=range(10),
+                        dummies=[10, 11])
+        selstr = 'within 5 of resnum 3'
+        for i in range(2):
+            self.assertRaises(prody.select.SelectionError,
+                              select.getBoolArray, atoms, selstr)
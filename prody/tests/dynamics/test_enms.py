@@ -8,6 +8,7 @@ from prody import *
 from prody import LOGGER
 from prody.tests import unittest
 from prody.tests.datafiles import *
+from prody.dynamics.entropy import calcAllEntropyTransfer
 
 LOGGER.verbosity = 'none'
 
@@ -287,7 +288,121 @@ class TestANM(TestGNM):
                         err_msg='slow method does not reproduce same Hessian')
         assert_equal(slow._getKirchhoff(), anm._getKirchhoff(),
                      'slow method does not reproduce same Kirchhoff')
-    
+
+    def testBuildHessianLoopEngine(self):
+        loop = ANM()
+        loop.buildHessian(ATOMS, engine='loop')
+        assert_allclose(loop._getHessian(), anm._getHessian(),
+                        rtol=0, atol=ATOL,
+                        err_msg='loop engine does not reproduce same Hessian')
+        assert_equal(loop._getKirchhoff(), anm._getKirchhoff(),
+                     'loop engine does not reproduce same Kirchhoff')
+
+    def testBuildHessianSparse(self):
+        sparse = ANM()
+        sparse.buildHessian(ATOMS, sparse=True)
+        assert_allclose(sparse._getHessian().toarray(), anm._getHessian(),
+                        rtol=0, atol=ATOL,
+                        err_msg='failed to get correct sparse Hessian matrix')
+        assert_equal(sparse._getKirchhoff().toarray(), anm._getKirchhoff(),
+                     'failed to get correct sparse Kirchhoff matrix')
+
+    def testBuildHessianWrongEngine(self):
+        self.assertRaises(ValueError, self.model.buildHessian, COORDS,
+                          engine='none')
+
+
+class TestGamma(unittest.TestCase):
+
+    def testVariableCutoffArray(self):
+        gamma = GammaVariableCutoff(ATOMS.getResnames(), default_radius=5.,
+                                    LYS=7.5)
+        index = np.arange(len(COORDS))
+        i, j = [k.flatten() for k in np.meshgrid(index, index)]
+        dist2 = ((COORDS[i] - COORDS[j]) ** 2).sum(1)
+        assert_equal(gamma.gammaArray(dist2, i, j),
+                     [gamma.gamma(d2, i_, j_)
+                      for d2, i_, j_ in zip(dist2, i, j)],
+                     'gammaArray does not reproduce gamma')
+
+    def testStructureBasedArray(self):
+        atoms = parseDatafile('1ubi', subset='ca', secondary=True)
+        secstrs = atoms.getSecstrs()
+        secstrs[34:39] = 'I'
+        atoms.setSecstrs(secstrs)
+        gamma = GammaStructureBased(atoms)
+        coords = atoms.getCoords()
+        index = np.arange(len(coords))
+        i, j = [k.flatten() for k in np.meshgrid(index, index)]
+        dist2 = ((coords[i] - coords[j]) ** 2).sum(1)
+        assert_equal(gamma.gammaArray(dist2, i, j),
+                     [gamma.gamma(d2, i_, j_)
+                      for d2, i_, j_ in zip(dist2, i, j)],
+                     'gammaArray does not reproduce gamma')
+        fast = GNM()
+        fast.buildKirchhoff(atoms, gamma=gamma)
+        slow = GNM()
+        slow.buildKirchhoff(atoms, gamma=gamma, kdtree=False)
+        assert_equal(fast._getKirchhoff(), slow._getKirchhoff(),
+                     'structure based gamma does not reproduce same '
+                     'Kirchhoff')
+
+    def testFunctionGamma(self):
+        gamma = lambda dist2, i, j: 2.0 if abs(i - j) == 1 else 1.0
+        fast = GNM()
+        fast.buildKirchhoff(ATOMS, gamma=gamma)
+        slow = GNM()
+        slow.buildKirchhoff(ATOMS, gamma=gamma, kdtree=False)
+        assert_equal(fast._getKirchhoff(), slow._getKirchhoff(),
+                     'function gamma does not reproduce same Kirchhoff')
+
+    def testSparseKirchhoff(self):
+        sparse = GNM()
+        sparse.buildKirchhoff(ATOMS, sparse=True)
+        assert_equal(sparse._getKirchhoff().toarray(), gnm._getKirchhoff(),
+                     'failed to get correct sparse Kirchhoff matrix')
+
+
+class TestSolvers(unittest.TestCase):
+
+    def _testSolver(self, model, expected, solver):
+
+        model.calcModes(10, solver=solver)
+        assert_allclose(model.getEigvals(), expected.getEigvals(),
+                        rtol=0, atol=ATOL,
+                        err_msg=solver + ' failed to get correct eigenvalues')
+        _temp = np.abs((model.getEigvecs() * expected.getEigvecs()).sum(0))
+        assert_allclose(_temp, np.ones(10), rtol=0, atol=ATOL,
+                        err_msg=solver + ' failed to get correct eigenvectors')
+
+    def testANMSolvers(self):
+
+        model = ANM()
+        model.buildHessian(ATOMS, sparse=True)
+        for solver in ('dense', 'shiftinvert', 'lobpcg'):
+            self._testSolver(model, anm[6:16], solver)
+
+    def testGNMSolvers(self):
+
+        model = GNM()
+        model.buildKirchhoff(ATOMS, sparse=True)
+        for solver in ('dense', 'shiftinvert', 'lobpcg'):
+            self._testSolver(model, gnm[1:11], solver)
+
+    def testDeflatedZeros(self):
+
+        model = ANM()
+        model.buildHessian(ATOMS, sparse=True)
+        model.calcModes(10, zeros=True, solver='shiftinvert')
+        assert_allclose(model.getEigvals()[:6], np.zeros(6), rtol=0,
+                        atol=ATOL, err_msg='failed to get zero modes')
+
+    def testWrongSolver(self):
+
+        model = ANM()
+        model.buildHessian(ATOMS)
+        self.assertRaises(ValueError, model.calcModes, solver='none')
+
 
 class TestGNMCalcModes(unittest.TestCase):
 
@@ -313,5 +428,58 @@ class TestRTB(unittest.TestCase):
 
         rtb.calcModes()
 
+class TestEntropyTransfer(unittest.TestCase):
+
+    def setUp(self):
+
+        self.gnm = GNM()
+        self.gnm.buildKirchhoff(ATOMS[:30])
+        self.gnm.calcModes(n_modes=None)
+
+    def testAllEntropyTransfer(self):
+
+        transfer = calcAllEntropyTransfer(self.gnm, 0.5)
+        for i, j in [(0, 5), (5, 0), (12, 29)]:
+            assert_allclose(transfer[i, j],
+                            calcEntropyTransfer(self.gnm, i, j, 0.5))
+        assert_equal(transfer.diagonal(), 0)
+
+    def testOverallNetEntropyTransfer(self):
+
+        taus = np.insert(np.arange(0.1, 5.0 + 1e-6, 0.1), 0, 1e-6)
+        expected = np.trapz(calcAllEntropyTransfer(self.gnm, taus), taus,
+                            axis=0)
+        assert_allclose(calcOverallNetEntropyTransfer(self.gnm, chunk=7),
+                        expected, rtol=1e-10, atol=1e-12)
+
+
+class TestPerturbResponse(unittest.TestCase):
+
+    def _expected(self, model):
+
+        n_atoms = model.numAtoms()
+        dim = 3 if model.is3d() else 1
+        cov = calcCovariance(model) ** 2
+        prs = cov.reshape((n_atoms, dim, n_atoms, dim)).sum(3).sum(1)
+        return prs / prs.diagonal()[:, np.newaxis]
+
+    def testBlocks(self):
+
+        for model in (anm[6:26], gnm[1:21]):
+            assert_allclose(calcPerturbResponse(model, blocksize=7),
+                            self._expected(model), rtol=1e-10)
+
+    def testProcesses(self):
+
+        model = anm[6:26]
+        assert_allclose(calcPerturbResponse(model, blocksize=10, n_cpu=2),
+                        self._expected(model), rtol=1e-10)
+
+    def testAtoms(self):
+
+        atoms, prs = calcPerturbResponse(anm[6:26], atoms=ATOMS.copy())
+        assert_equal(atoms.getData('prs_matrix'), prs)
+
+
 if __name__ == '__main__':
     unittest.main()
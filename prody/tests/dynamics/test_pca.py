@@ -0,0 +1,159 @@
+"""This module contains unit tests for :mod:`~prody.dynamics.pca`."""
+
+import numpy as np
+from numpy.testing import *
+
+from prody import *
+from prody import LOGGER
+from prody.tests import unittest
+from prody.tests.datafiles import *
+
+LOGGER.verbosity = 'none'
+
+ATOL = 1e-5
+RTOL = 0
+
+DCD_FILE = pathDatafile('dcd2k39_truncated.dcd')
+COORDSETS = parseDatafile('dcd')._getCoordsets()
+
+
+class TestCovarianceAccumulator(unittest.TestCase):
+
+    def setUp(self):
+
+        random = np.random.RandomState(0)
+        self.coordsets = random.rand(50, 10, 3)
+        deviations = self.coordsets.reshape((50, 30))
+        self.covariance = np.cov(deviations.T, bias=1)
+
+    def testUpdate(self):
+
+        accumulator = CovarianceAccumulator()
+        for i in range(0, 50, 7):
+            accumulator.update(self.coordsets[i:i + 7])
+        self.assertEqual(accumulator.numCoordsets(), 50)
+        assert_allclose(accumulator.getCovariance(), self.covariance,
+                        rtol=1e-10, atol=1e-12)
+        assert_allclose(accumulator.getMean(), self.coordsets.mean(0))
+
+    def testMerge(self):
+
+        first = CovarianceAccumulator()
+        first.update(self.coordsets[:20])
+        second = CovarianceAccumulator()
+        second.update(self.coordsets[20:])
+        first.merge(second)
+        assert_allclose(first.getCovariance(), self.covariance,
+                        rtol=1e-10, atol=1e-12)
+
+    def testWrongShape(self):
+
+        accumulator = CovarianceAccumulator()
+        accumulator.update(self.coordsets[:5])
+        self.assertRaises(ValueError, accumulator.update,
+                          self.coordsets[:5, :5])
+
+
+class TestBuildCovariance(unittest.TestCase):
+
+    def testTrajectory(self):
+
+        ensemble = Ensemble()
+        ensemble.setCoords(COORDSETS[0])
+        ensemble.addCoordset(COORDSETS)
+        ensemble.superpose()
+        expected = PCA()
+        expected.buildCovariance(ensemble)
+
+        dcd = DCDFile(DCD_FILE)
+        pca = PCA()
+        pca.buildCovariance(dcd, blocksize=2)
+        assert_allclose(pca.getCovariance(), expected.getCovariance(),
+                        rtol=RTOL, atol=ATOL)
+        dcd.close()
+
+    def testFloat32(self):
+
+        coordsets = COORDSETS.astype(np.float32)
+        pca = PCA()
+        pca.buildCovariance(coordsets, blocksize=2)
+        expected = PCA()
+        expected.buildCovariance(coordsets.astype(float))
+        assert_allclose(pca.getCovariance(), expected.getCovariance(),
+                        rtol=RTOL, atol=ATOL)
+
+
+class TestStreamedPCA(unittest.TestCase):
+
+    def setUp(self):
+
+        random = np.random.RandomState(1)
+        basis = random.normal(size=(5, 90))
+        amplitudes = random.normal(size=(300, 5)) * [10, 6, 4, 2, 1]
+        self.coordsets = (np.dot(amplitudes, basis) +
+                          0.05 * random.normal(size=(300, 90))
+                          ).reshape((300, 30, 3))
+        self.pca = PCA()
+        self.pca.performSVD(self.coordsets)
+
+    def _compare(self, pca):
+
+        assert_allclose(pca.getEigvals(), self.pca.getEigvals()[:5],
+                        rtol=1e-6)
+        overlap = np.abs((pca.getArray() *
+                          self.pca.getArray()[:, :5]).sum(0))
+        assert_allclose(overlap, np.ones(5), rtol=1e-6)
+        assert_allclose(calcFractVariance(pca[0]),
+                        calcFractVariance(self.pca[0]))
+
+    def testRandomizedSVD(self):
+
+        pca = PCA()
+        pca.performRandomizedSVD(self.coordsets, n_modes=5, blocksize=37)
+        self._compare(pca)
+
+    def testIncrementalPCA(self):
+
+        pca = PCA()
+        pca.performIncrementalPCA(self.coordsets, n_modes=5, blocksize=37)
+        self._compare(pca)
+
+    def testCovariance(self):
+
+        pca = PCA()
+        pca.buildCovariance(COORDSETS)
+        pca.performIncrementalPCA(self.coordsets, n_modes=5, blocksize=37)
+        array = pca.getArray()
+        assert_allclose(pca.getCovariance(),
+                        np.dot(array * pca.getVariances(), array.T))
+
+    def testTrajectory(self):
+
+        dcd = DCDFile(DCD_FILE)
+        expected = PCA()
+        expected.buildCovariance(dcd)
+        expected.calcModes(2)
+        for method in ('performRandomizedSVD', 'performIncrementalPCA'):
+            pca = PCA()
+            getattr(pca, method)(dcd, n_modes=2)
+            assert_allclose(pca.getEigvals(), expected.getEigvals(),
+                            rtol=1e-6)
+        dcd.close()
+
+    def testEnsembleSelection(self):
+
+        atoms = AtomGroup()
+        atoms.setCoords(self.coordsets[0])
+        ensemble = Ensemble()
+        ensemble.setAtoms(atoms)
+        ensemble.setCoords(atoms)
+        ensemble.addCoordset(self.coordsets)
+        ensemble.setAtoms(atoms[::2])
+        expected = PCA()
+        expected.performSVD(ensemble.getCoordsets())
+        for method in ('performRandomizedSVD', 'performIncrementalPCA'):
+            pca = PCA()
+            getattr(pca, method)(ensemble, n_modes=5, blocksize=37)
+            self.assertEqual(pca.numAtoms(), 15)
+            assert_allclose(pca.getEigvals(), expected.getEigvals()[:5],
+                            rtol=1e-6)
@@ -0,0 +1,104 @@
+"""This module contains unit tests for :mod:`~prody.kdtree.cellgrid` module."""
+
+from numpy import array, around, zeros
+from numpy.random import RandomState
+from numpy.testing import assert_allclose, assert_equal
+
+from prody.tests import unittest
+from prody.kdtree import CellGrid
+ATOL = 1e-5
+RTOL = 0
+
+RANDOM = RandomState(0)
+COORDS = RANDOM.uniform(-10, 30, (500, 3))
+POINTS = RANDOM.uniform(-20, 40, (200, 3))
+UNITCELL = array([20., 25., 30.])
+
+
+def bruteForce(points, coords, radius, unitcell=None):
+
+    diff = coords[None, :, :] - points[:, None, :]
+    if unitcell is not None:
+        diff -= unitcell * around(diff / unitcell)
+    dist = ((diff ** 2).sum(2)) ** 0.5
+    qi, aj = (dist <= radius).nonzero()
+    return qi, aj, dist[qi, aj]
+
+
+class TestCellGrid(unittest.TestCase):
+
+    def testGetPairs(self):
+
+        for radius in (0.5, 3., 7.5):
+            grid = CellGrid(COORDS, radius)
+            qi, aj, dist = grid.getPairs(radius, POINTS)
+            bqi, baj, bdist = bruteForce(POINTS, COORDS, radius)
+            assert_equal(qi, bqi)
+            assert_equal(aj, baj)
+            assert_allclose(dist, bdist, rtol=RTOL, atol=ATOL)
+
+    def testLargerRadius(self):
+
+        grid = CellGrid(COORDS, 2.)
+        qi, aj, dist = grid.getPairs(5., POINTS)
+        bqi, baj, bdist = bruteForce(POINTS, COORDS, 5.)
+        assert_equal(qi, bqi)
+        assert_equal(aj, baj)
+
+    def testGetWithinNear(self):
+
+        radius = 4.
+        grid = CellGrid(COORDS, radius)
+        qi, aj, dist = bruteForce(POINTS, COORDS, radius)
+        within = zeros(len(COORDS), bool)
+        within[aj] = True
+        near = zeros(len(POINTS), bool)
+        near[qi] = True
+        assert_equal(grid.getWithin(radius, POINTS), within)
+        assert_equal(grid.getNear(radius, POINTS), near)
+
+    def testSinglePoint(self):
+
+        grid = CellGrid(COORDS, 5.)
+        qi, aj, dist = grid.getPairs(5., POINTS[0])
+        bqi, baj, bdist = bruteForce(POINTS[:1], COORDS, 5.)
+        assert_equal(aj, baj)
+
+    def testBlocks(self):
+
+        grid = CellGrid(COORDS, 6.)
+        pairs = set()
+        for qi, aj, dist in grid.iterPairs(6., POINTS, blocksize=100):
+            pairs.update(zip(qi, aj))
+        bqi, baj, bdist = bruteForce(POINTS, COORDS, 6.)
+        self.assertEqual(pairs, set(zip(bqi, baj)))
+
+
+class TestCellGridPBC(unittest.TestCase):
+
+    def testGetPairs(self):
+
+        for radius in (1., 4., 9.):
+            grid = CellGrid(COORDS, radius, UNITCELL)
+            qi, aj, dist = grid.getPairs(radius, POINTS)
+            bqi, baj, bdist = bruteForce(POINTS, COORDS, radius, UNITCELL)
+            assert_equal(qi, bqi)
+            assert_equal(aj, baj)
+            assert_allclose(dist, bdist, rtol=RTOL, atol=ATOL)
+
+    def testImage(self):
+
+        grid = CellGrid(array([[1., 1., 1.]]), 2., array([10., 10., 10.]))
+        qi, aj, dist = grid.getPairs(2., array([[9.5, 1., 41.]]))
+        assert_equal(aj, [0])
+        assert_allclose(dist, [1.5], rtol=RTOL, atol=ATOL)
+
+    def testAmongAtoms(self):
+
+        grid = CellGrid(COORDS, 4., UNITCELL)
+        qi, aj, dist = grid.getPairs(4.)
+        bqi, baj, bdist = bruteForce(COORDS, COORDS, 4., UNITCELL)
+        ahead = bqi < baj
+        assert_equal(qi, bqi[ahead])
+        assert_equal(aj, baj[ahead])
+        assert_allclose(dist, bdist[ahead], rtol=RTOL, atol=ATOL)
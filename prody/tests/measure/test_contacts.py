@@ -1,10 +1,12 @@
-from numpy import array, concatenate, unique
-from numpy.testing import assert_array_equal, assert_equal
+from numpy import array, concatenate, unique, arange, triu_indices
+from numpy import fill_diagonal
+from numpy.testing import assert_array_equal, assert_equal, assert_allclose
 
 from prody.tests import unittest
 from prody.tests.datafiles import parseDatafile, pathDatafile
 
 from prody.measure import Contacts, findNeighbors, iterNeighbors
+from prody.measure import findNeighborPairs, calcContactFrequency
 from prody.measure import buildDistMatrix, calcDistance
 
 
@@ -118,3 +120,37 @@ class TestNeighbors(unittest.TestCase):
         neighbors1.sort()
         neighbors2.sort()
         self.assertEqual(neighbors1, neighbors2)
+
+
+class TestNeighborPairs(unittest.TestCase):
+
+    def testPairs(self):
+
+        for unitcell in (None, UCA_UC):
+            pairs = findNeighborPairs(UCA_XYZ, UCA_RADIUS, unitcell=unitcell)
+            dist = buildDistMatrix(UCA_XYZ, unitcell=unitcell)
+            i, j = triu_indices(len(UCA_XYZ), 1)
+            which = dist[i, j] <= UCA_RADIUS
+            assert_equal(pairs['i'], i[which])
+            assert_equal(pairs['j'], j[which])
+            assert_allclose(pairs['d'], dist[i, j][which], atol=1e-5)
+
+    def testTwoSets(self):
+
+        pairs = findNeighborPairs(UCA_XYZ[:10], UCA_RADIUS, UCA_XYZ)
+        dist = buildDistMatrix(UCA_XYZ[:10], UCA_XYZ)
+        i, j = (dist <= UCA_RADIUS).nonzero()
+        assert_equal(pairs['i'], i)
+        assert_equal(pairs['j'], j)
+        pairs = findNeighborPairs(UCA_XYZ, UCA_RADIUS, UCA_XYZ[:10])
+        assert_equal(pairs['i'], sorted(j))
+
+    def testContactFrequency(self):
+
+        coordsets = array([UCA_XYZ, UCA_XYZ * 1.1, UCA_XYZ * 0.9])
+        freq = calcContactFrequency(coordsets, 8.)
+        expected = sum((buildDistMatrix(xyz) <= 8.) for xyz in coordsets)
+        fill_diagonal(expected, 0)
+        assert_allclose(freq, expected / 3.)
+        freq = calcContactFrequency(coordsets, 8., arange(5), arange(5, 20))
+        assert_allclose(freq, expected[:5, 5:20] / 3.)
@@ -1,13 +1,16 @@
 """This module contains unit tests for :mod:`prody.measure.transform` module.
 """
 
-from numpy import zeros, ones, eye, all
-from numpy.testing import assert_equal
+from numpy import zeros, ones, eye, all, arange
+from numpy.random import RandomState
+from numpy.testing import assert_equal, assert_allclose
 
 from prody.tests import unittest
 from prody.tests.datafiles import parseDatafile
 
-from prody.measure import moveAtoms, wrapAtoms
+from prody.measure import moveAtoms, wrapAtoms, superposeCoordsets
+from prody.measure import calcTransformation, applyTransformation
+from prody.measure import calcRMSDMatrix, calcRMSD
 
 UBI = parseDatafile('1ubi')
 
@@ -52,3 +55,92 @@ class TestWrapAtoms(unittest.TestCase):
         diff = xyz - UBI.getCoords()
         self.assertTrue(all(diff == unitcell))
 
+
+
+class TestSuperposeCoordsets(unittest.TestCase):
+
+    def setUp(self):
+
+        random = RandomState(0)
+        self.target = random.rand(20, 3)
+        self.coordsets = random.rand(5, 20, 3) * 10
+        self.weights = random.rand(5, 20, 1)
+
+    def _expected(self, weights=None, indices=arange(20)):
+
+        expected = self.coordsets.copy()
+        for i, mob in enumerate(expected):
+            if weights is not None and weights.ndim == 3:
+                weight = weights[i, indices]
+            elif weights is not None:
+                weight = weights[indices]
+            else:
+                weight = None
+            trans = calcTransformation(mob[indices], self.target[indices],
+                                       weight)
+            expected[i] = applyTransformation(trans, mob)
+        return expected
+
+    def testSuperpose(self):
+
+        expected = self._expected()
+        result, matrices = superposeCoordsets(self.coordsets, self.target)
+        assert_allclose(result, expected, rtol=0, atol=1e-10)
+        self.assertEqual(matrices.shape, (5, 4, 4))
+
+    def testWeightsAndIndices(self):
+
+        indices = arange(3, 15)
+        for weights in (self.weights, self.weights[0]):
+            expected = self._expected(weights, indices)
+            result = superposeCoordsets(self.coordsets.copy(), self.target,
+                                        weights, indices)[0]
+            assert_allclose(result, expected, rtol=0, atol=1e-10)
+
+
+class TestCalcRMSDMatrix(unittest.TestCase):
+
+    def setUp(self):
+
+        random = RandomState(0)
+        self.coordsets = random.rand(11, 20, 3) * 10
+        self.weights = random.rand(20, 1)
+
+    def _expected(self, weights=None, superpose=False):
+
+        n_csets = len(self.coordsets)
+        expected = zeros((n_csets, n_csets))
+        for i, mob in enumerate(self.coordsets):
+            for j, tar in enumerate(self.coordsets):
+                if superpose:
+                    mob = superposeCoordsets(self.coordsets[i:i + 1].copy(),
+                                             tar)[0][0]
+                expected[i, j] = calcRMSD(mob, tar, weights)
+        return expected
+
+    def testRMSDs(self):
+
+        assert_allclose(calcRMSDMatrix(self.coordsets, blocksize=4),
+                        self._expected(), rtol=0, atol=1e-10)
+        assert_allclose(calcRMSDMatrix(self.coordsets, self.weights,
+                                       blocksize=4),
+                        self._expected(self.weights), rtol=0, atol=1e-10)
+
+    def testSuperposed(self):
+
+        assert_allclose(calcRMSDMatrix(self.coordsets, superpose=True,
+                                       blocksize=3),
+                        self._expected(superpose=True), rtol=0, atol=1e-10)
+
+    def testCondensed(self):
+
+        rmsds = calcRMSDMatrix(self.coordsets, blocksize=4)
+        condensed = calcRMSDMatrix(self.coordsets, condensed=True,
+                                   blocksize=4)
+        rows, cols = (arange(11)[:, None] < arange(11)).nonzero()
+        assert_allclose(condensed, rmsds[rows, cols])
+
+    def testProcesses(self):
+
+        assert_allclose(calcRMSDMatrix(self.coordsets, blocksize=4, n_cpu=2),
+                        self._expected(), rtol=0, atol=1e-10)
@@ -0,0 +1,78 @@
+"""This module contains unit tests for :mod:`~prody.proteins.ciffile`."""
+
+from io import StringIO
+
+from numpy.testing import assert_equal
+
+from prody import parseCIFStream, LOGGER
+from prody.tests import unittest
+
+LOGGER.verbosity = 'none'
+
+CIFLINES = """\
+data_TEST
+#
+loop_
+_atom_site.group_PDB
+_atom_site.id
+_atom_site.type_symbol
+_atom_site.label_atom_id
+_atom_site.label_alt_id
+_atom_site.label_comp_id
+_atom_site.Cartn_x
+_atom_site.Cartn_y
+_atom_site.Cartn_z
+_atom_site.occupancy
+_atom_site.B_iso_or_equiv
+_atom_site.auth_seq_id
+_atom_site.auth_comp_id
+_atom_site.auth_asym_id
+_atom_site.auth_atom_id
+_atom_site.pdbx_PDB_ins_code
+_atom_site.pdbx_PDB_model_num
+ATOM   1 N N    . ALA 1.000 2.000 3.000 1.00 10.00 1 ALA A N    ? 1
+ATOM   2 C CA   A ALA 2.000 3.000 4.000 0.50 11.00 1 ALA A CA   ? 1
+ATOM   3 C CA   B ALA 2.500 3.500 4.500 0.50 11.00 1 ALA A CA   ? 1
+ATOM   4 O "O5'" . DA  -1.500 0.000 0.000 1.00 12.00 2 DA  B "O5'" A 1
+HETATM 5 O 'O 1' . HOH 0.000 0.000 1.250 1.00 13.00 3 HOH B 'O 1' ?
+1
+ATOM   6 N N    . ALA 1.100 2.000 3.000 1.00 10.00 1 ALA A N    ? 2
+ATOM   7 C CA   A ALA 2.100 3.000 4.000 0.50 11.00 1 ALA A CA   ? 2
+ATOM   8 C CA   B ALA 2.600 3.500 4.500 0.50 11.00 1 ALA A CA   ? 2
+ATOM   9 O "O5'" . DA  -1.400 0.000 0.000 1.00 12.00 2 DA  B "O5'" A 2
+HETATM 10 O 'O 1' . HOH 0.100 0.000 1.250 1.00 13.00 3 HOH B 'O 1' ? 2
+#
+"""
+
+
+class TestParseCIFStream(unittest.TestCase):
+
+    def testFields(self):
+
+        ag = parseCIFStream(StringIO(CIFLINES))
+        self.assertEqual(ag.numAtoms(), 4)
+        self.assertEqual(ag.numCoordsets(), 2)
+        assert_equal(ag.getNames(), ['N', 'CA', "O5'", 'O 1'])
+        assert_equal(ag.getResnames(), ['ALA', 'ALA', 'DA', 'HOH'])
+        assert_equal(ag.getResnums(), [1, 1, 2, 3])
+        assert_equal(ag.getChids(), ['A', 'A', 'B', 'B'])
+        assert_equal(ag.getIcodes(), ['', '', 'A', ''])
+        assert_equal(ag.getSerials(), [1, 2, 4, 5])
+        assert_equal(ag.getOccupancies(), [1., .5, 1., 1.])
+        assert_equal(ag.getBetas(), [10., 11., 12., 13.])
+        assert_equal(ag.getFlags('hetatm'), [False, False, False, True])
+        assert_equal(ag.getFlags('pdbter'), [True, False, True, False])
+        assert_equal(ag.getCoordsets(0)[:, 0], [1., 2., -1.5, 0.])
+        assert_equal(ag.getCoordsets(1)[:, 0], [1.1, 2.1, -1.4, .1])
+
+    def testArguments(self):
+
+        ag = parseCIFStream(StringIO(CIFLINES), model=2)
+        self.assertEqual(ag.numCoordsets(), 1)
+        assert_equal(ag.getCoords()[:, 0], [1.1, 2.1, -1.4, .1])
+        ag = parseCIFStream(StringIO(CIFLINES), chain='B')
+        assert_equal(ag.getSerials(), [4, 5])
+        ag = parseCIFStream(StringIO(CIFLINES), subset='ca')
+        assert_equal(ag.getSerials(), [2])
+        ag = parseCIFStream(StringIO(CIFLINES), altloc='B')
+        assert_equal(ag.getSerials(), [1, 3, 4, 5])
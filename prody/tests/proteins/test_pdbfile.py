@@ -3,6 +3,7 @@
 import os
 
 import numpy as np
+from io import StringIO
 from numpy.testing import *
 
 from prody import *
@@ -188,6 +189,26 @@ class TestWritePDB(unittest.TestCase):
             assert_equal(out.getCoords(), self.ag.getCoordsets(i),
                  'failed to write model {0} coordinates correctly'.format(i+1))
 
+    @dec.slow
+    def testCoordinateFormat(self):
+        """Test that coordinates are formatted as they are by % operator."""
+
+        ag = self.ag.copy()
+        coords = np.random.RandomState(0).uniform(-2000, 12000,
+                                                  (2, ag.numAtoms(), 3))
+        coords[0, :3] = [[-0., -.0004, .0625], [1.0005, 999.9995, -999.9995],
+                         [-1000., 9999.9996, np.nan]]
+        ag.setCoords(coords)
+        for n_threads in (1, 2):
+            stream = StringIO()
+            writePDBStream(stream, ag, n_threads=n_threads)
+            lines = [line for line in stream.getvalue().split('\n')
+                     if line.startswith('ATOM')]
+            self.assertEqual(len(lines), coords.shape[0] * coords.shape[1])
+            for line, xyz in zip(lines, coords.reshape((-1, 3))):
+                xyz = '%8.3f%8.3f%8.3f' % tuple(xyz)
+                self.assertEqual(line[30:30 + len(xyz)], xyz)
+
     @dec.slow
     def tearDown(self):
         """Remove test file."""
@@ -246,3 +267,44 @@ class TestParsePDBAltloc(unittest.TestCase):
 
         self.assertEqual(len(parsePDB(self.pdbfile, altloc='C')), 496,
             'failed to parse alternate locations C correctly')
+
+
+PDBLINES = """\
+ATOM      1  N   MET A   1      27.340  24.430   2.614  1.00  9.67           N
+ATOM    A1F  CA  MET A   1      -0.000 -24.430    2.61  1.00  9.67      PRO  C
+HETATM    3  O   HOH B   2B      1.5e1   0.000     -.5       10.00           O
+TER
+ANISOU    3  O   HOH B   2B    1000   2000   3000   -100    200   -300       O
+END
+"""
+
+
+class TestParsePDBLines(unittest.TestCase):
+
+    def testFields(self):
+
+        ag = parsePDBStream(StringIO(PDBLINES))
+        assert_equal(ag.getSerials(), [1, 0xA1F, 3])
+        assert_equal(ag.getCoords(), [[27.34, 24.43, 2.614],
+                                      [-0., -24.43, 2.61],
+                                      [15., 0., -.5]])
+        assert_equal(ag.getOccupancies(), [1., 1., 0.])
+        assert_equal(ag.getBetas(), [9.67, 9.67, 10.])
+        assert_equal(ag.getNames(), ['N', 'CA', 'O'])
+        assert_equal(ag.getChids(), ['A', 'A', 'B'])
+        assert_equal(ag.getResnums(), [1, 1, 2])
+        assert_equal(ag.getIcodes(), ['', '', 'B'])
+        assert_equal(ag.getSegnames(), ['', 'PRO', ''])
+        assert_equal(ag.getElements(), ['N', 'C', 'O'])
+        assert_equal(ag.getFlags('hetatm'), [False, False, True])
+        assert_equal(ag.getFlags('pdbter'), [False, False, True])
+        assert_equal(ag.getAnisous()[2], [.1, .2, .3, -.01, .02, -.03])
+        assert_equal(ag.getAnisous()[:2], 0)
+
+    def testLineBreaks(self):
+
+        ag = parsePDBStream(StringIO(PDBLINES))
+        for text in (PDBLINES.replace('\n', '\r\n'), PDBLINES.rstrip()):
+            other = parsePDBStream(StringIO(text))
+            assert_equal(other.getCoords(), ag.getCoords())
+            assert_equal(other.getElements(), ag.getElements())
@@ -89,6 +89,14 @@ class TestCalcShannonEntropy(TestCase):
         result = calcShannonEntropy(msa, omitgaps=True)
         assert_array_almost_equal(expect, result)
 
+    def testChunks(self):
+
+        msa = FASTA._getArray()
+        for omitgaps in (True, False):
+            expect = calcShannonEntropy(msa, omitgaps=omitgaps)
+            result = calcShannonEntropy(msa, omitgaps=omitgaps, chunksize=7)
+            assert_array_almost_equal(expect, result)
+
 """
     def testSixSequences3(self):
 
@@ -279,6 +287,14 @@ class TestCalcMutualInfo(TestCase):
         result = buildMutinfoMatrix(msa, norm=True)
         assert_array_almost_equal(expect, result, err_msg='norm failed')
 
+    def testChunks(self):
+
+        msa = FASTA._getArray()
+        for kwargs in [{}, {'ambiguity': False}, {'norm': True}]:
+            expect = buildMutinfoMatrix(msa, **kwargs)
+            result = buildMutinfoMatrix(msa, chunksize=7, **kwargs)
+            assert_array_almost_equal(expect, result, err_msg='chunks failed')
+
 
 class TestCalcMSAOccupancy(TestCase):
 
@@ -302,6 +318,13 @@ class TestCalcMSAOccupancy(TestCase):
         assert_array_equal(calcMSAOccupancy(FASTA, 'sequence'),
                            FASTA_ALPHA.sum(1) / (FASTA.numResidues() * 1.0))
 
+    def testChunks(self):
+
+        for occ in ('residue', 'sequence'):
+            assert_array_equal(calcMSAOccupancy(FASTA, occ, count=1,
+                                                chunksize=7),
+                               calcMSAOccupancy(FASTA, occ, count=1))
+
 
 class TestIdentity(TestCase):
 
@@ -504,6 +527,14 @@ class TestCalcOMES(TestCase):
         result = buildOMESMatrix(msa, turbo=False)
         assert_array_almost_equal(expect, result, err_msg='w/out turbo failed')
 
+    def testChunks(self):
+
+        msa = FASTA._getArray()
+        for ambiguity in (True, False):
+            expect = buildOMESMatrix(msa, ambiguity=ambiguity)
+            result = buildOMESMatrix(msa, ambiguity=ambiguity, chunksize=7)
+            assert_array_almost_equal(expect, result, err_msg='chunks failed')
+
 
 class TestCalcSCA(TestCase):
 
@@ -1196,3 +1227,125 @@ class TestDirectInfo(TestCase):
         fasta = FASTA[:, :10]
         result = buildDirectInfoMatrix(fasta, refine=True)
         assert_array_almost_equal(expect, result, err_msg='refine failed')
+
+    def testFloat32(self):
+
+        expect = buildDirectInfoMatrix(FASTA)
+        result = buildDirectInfoMatrix(FASTA, dtype='float32')
+        assert_array_almost_equal(expect, result, decimal=4)
+
+    def testShrinkage(self):
+
+        fasta = FASTA[:, :8]
+        expect = buildDirectInfoMatrix(fasta)
+        result = buildDirectInfoMatrix(fasta, shrinkage=0)
+        assert_array_almost_equal(expect, result)
+        result = buildDirectInfoMatrix(fasta, shrinkage=0.5)
+        assert_array_equal(result, result.T)
+        self.assertTrue((result <= expect + 1e-10).all())
+        self.assertRaises(ValueError, buildDirectInfoMatrix, fasta,
+                          shrinkage=2)
+
+    def testPseudoLikelihood(self):
+
+        fasta = FASTA[:, :8]
+        result = buildDirectInfoMatrix(fasta, method='plm')
+        self.assertEqual(result.shape, (8, 8))
+        assert_array_equal(result, result.T)
+        assert_array_equal(result.diagonal(), 0)
+        self.assertTrue((result >= 0).all())
+        self.assertRaises(ValueError, buildDirectInfoMatrix, fasta,
+                          method='ace')
+
+
+class TestThreads(TestCase):
+
+    def testMutinfo(self):
+
+        expect = buildMutinfoMatrix(FASTA)
+        for turbo in (True, False):
+            result = buildMutinfoMatrix(FASTA, turbo=turbo, n_threads=3)
+            assert_array_equal(expect, result)
+        expect = buildMutinfoMatrix(FASTA, norm=True)
+        result = buildMutinfoMatrix(FASTA, norm=True, n_threads=4)
+        assert_array_equal(expect, result)
+
+    def testOMES(self):
+
+        expect = buildOMESMatrix(FASTA)
+        for turbo in (True, False):
+            result = buildOMESMatrix(FASTA, turbo=turbo, n_threads=3)
+            assert_array_equal(expect, result)
+
+    def testSCA(self):
+
+        expect = buildSCAMatrix(FASTA)
+        for turbo in (True, False):
+            result = buildSCAMatrix(FASTA, turbo=turbo, n_threads=3)
+            assert_array_equal(expect, result)
+
+    def testSeqid(self):
+
+        for turbo in (True, False):
+            result = buildSeqidMatrix(FASTA, turbo=turbo, n_threads=3)
+            assert_array_almost_equal(FASTA_EYE, result)
+            assert_array_equal(buildSeqidMatrix(FASTA, turbo=turbo), result)
+
+    def testMeff(self):
+
+        for turbo in (True, False):
+            expect = calcMeff(FASTA, weight=True, turbo=turbo)
+            result = calcMeff(FASTA, weight=True, turbo=turbo, n_threads=4)
+            assert_array_equal(expect[0], result[0])
+            assert_array_equal(expect[1], result[1])
+
+    def testMoreThreadsThanRows(self):
+
+        msa = FASTA[:2, :3]
+        assert_array_equal(buildMutinfoMatrix(msa),
+                           buildMutinfoMatrix(msa, n_threads=8))
+        assert_array_equal(buildSeqidMatrix(msa),
+                           buildSeqidMatrix(msa, n_threads=8))
+
+    def testInvalid(self):
+
+        self.assertRaises(ValueError, buildMutinfoMatrix, FASTA, n_threads=0)
+        self.assertRaises(TypeError, calcMeff, FASTA, n_threads=1.5)
+
+
+class TestBlocks(TestCase):
+
+    def testSeqid(self):
+
+        expect = buildSeqidMatrix(FASTA, turbo=False)
+        for blocksize in (None, 1, 7):
+            result = buildSeqidMatrix(FASTA, blocksize=blocksize)
+            assert_array_equal(expect, result)
+
+    def testSeqidGaps(self):
+
+        msa = array([list('AC-'),
+                     list('---'),
+                     list('aCD')], dtype='|S1')
+        assert_array_equal(buildSeqidMatrix(msa, turbo=False),
+                           buildSeqidMatrix(msa, blocksize=2))
+
+    def testUnique(self):
+
+        for seqid in (0.3, 0.5, 0.98):
+            expect = uniqueSequences(FASTA, seqid, turbo=False)
+            for blocksize in (None, 1, 4):
+                result = uniqueSequences(FASTA, seqid, blocksize=blocksize)
+                assert_array_equal(expect, result)
+
+    def testMeff(self):
+
+        for refine in (False, True):
+            for seqid in (0.4, 0.8, 1.):
+                expect = calcMeff(FASTA, seqid, refine, weight=True,
+                                  turbo=False)
+                for blocksize in (None, 1, 6):
+                    result = calcMeff(FASTA, seqid, refine, weight=True,
+                                      blocksize=blocksize)
+                    assert_array_equal(expect[0], result[0])
+                    assert_array_equal(expect[1], result[1])
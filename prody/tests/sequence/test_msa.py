@@ -6,7 +6,7 @@ from numpy.testing import assert_equal, assert_array_equal, assert_array_almost_
 from prody.tests.datafiles import *
 
 from prody import LOGGER, refineMSA, parseMSA, calcMSAOccupancy, mergeMSA
-from prody import uniqueSequences
+from prody import uniqueSequences, encodeMSA
 
 LOGGER.verbosity = None
 
@@ -96,6 +96,17 @@ class TestRefinement(TestCase):
 
         assert_array_equal(refined._getArray(), expected)
 
+    def testChunks(self):
+
+        label = 'FSHB_BOVIN'
+        for kwargs in [dict(label=label, rowocc=0.9, colocc=0.9),
+                       dict(label=label, rowocc=0.9, seqid=0.98, colocc=0.9),
+                       dict(colocc=0.9)]:
+            expected = refineMSA(FASTA, **kwargs)
+            refined = refineMSA(FASTA, chunksize=7, **kwargs)
+            assert_array_equal(refined._getArray(), expected._getArray())
+            self.assertListEqual(list(refined), list(expected))
+
     def testAddition(self):
         numSeq = FASTA.numSequences()
         msa = FASTA + FASTA
@@ -120,3 +131,22 @@ class TestMerging(TestCase):
         merged = mergeMSA(FASTA, FASTA)
         length = FASTA.numResidues()
         self.assertEqual(merged[:, :length], merged[:, length:])
+
+
+class TestEncoding(TestCase):
+
+    def testCodes(self):
+
+        msa = array([list('AZaz'),
+                     list('-.X*')], dtype='|S1')
+        assert_array_equal(encodeMSA(msa), [[1, 26, 27, 52],
+                                            [0, 0, 24, 0]])
+
+    def testCache(self):
+
+        msa = FASTA[:]
+        encoded = encodeMSA(msa)
+        assert_array_equal(encoded, encodeMSA(FASTA._getArray()))
+        self.assertTrue(encodeMSA(msa) is encoded)
+        msa.extend(FASTA)
+        self.assertEqual(len(encodeMSA(msa)), 2 * len(encoded))
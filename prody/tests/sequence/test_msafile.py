@@ -14,6 +14,8 @@ from numpy.testing import assert_array_equal, dec
 from prody.tests.datafiles import *
 from prody.tests import TEMPDIR
 from prody import MSA, MSAFile, parseMSA, LOGGER, writeMSA
+from prody import saveMSA, loadMSA
+from prody.utilities import openFile
 
 LOGGER.verbosity = None
 
@@ -78,6 +80,43 @@ class TestParseMSA(TestCase):
         self.assertDictEqual(FASTA._mapping, SELEX._mapping)
         self.assertDictEqual(FASTA._mapping, STOCK._mapping)
 
+    def testCompressed(self):
+
+        for msa, name in [(FASTA, 'msa_Cys_knot.fasta'),
+                          (STOCK, 'msa_Cys_knot.sth')]:
+            filename = join(TEMPDIR, name + '.gz')
+            with open(pathDatafile(name), 'rb') as inp:
+                with openFile(filename, 'wb') as out:
+                    out.write(inp.read())
+            parsed = parseMSA(filename)
+            assert_array_equal(msa._getArray(), parsed._getArray())
+            self.assertDictEqual(msa._mapping, parsed._mapping)
+            self.assertListEqual(list(msa), list(parsed))
+            if os.path.isfile(filename):
+                os.remove(filename)
+
+    def testFilterSlice(self):
+
+        kwargs = {'filter': lambda label, seq: 'HUMAN' in label,
+                  'slice': slice(5, 30)}
+        for name in ['msa_Cys_knot.fasta', 'msa_Cys_knot.slx',
+                     'msa_Cys_knot.sth']:
+            expect = list(MSAFile(pathDatafile(name), **kwargs))
+            result = parseMSA(pathDatafile(name), **kwargs)
+            self.assertEqual(result.numResidues(), 25)
+            self.assertListEqual([str(seq) for seq in expect],
+                                 [str(seq) for seq in result])
+
+    def testChunks(self):
+
+        for msa, name in [(FASTA, 'msa_Cys_knot.fasta'),
+                          (SELEX, 'msa_Cys_knot.slx'),
+                          (STOCK, 'msa_Cys_knot.sth')]:
+            parsed = parseMSA(pathDatafile(name), chunksize=100,
+                              slice=[0, 10, 20])
+            assert_array_equal(msa._getArray()[:, [0, 10, 20]],
+                               parsed._getArray())
+
 class TestWriteMSA(TestCase):
 
     def testSelex(self):
@@ -93,3 +132,30 @@ class TestWriteMSA(TestCase):
         self.assertListEqual(list(FASTA), list(fasta))
         if os.path.isfile(filename):
             os.remove(filename)
+
+class TestSaveMSA(TestCase):
+
+    def testSaveLoad(self):
+        filename = saveMSA(FASTA, join(TEMPDIR, 'test'))
+        self.assertTrue(filename.endswith('.msa'))
+        msa = loadMSA(filename)
+        assert_array_equal(FASTA._getArray(), msa._getArray())
+        self.assertListEqual(list(FASTA), list(msa))
+        self.assertEqual(FASTA.getTitle(), msa.getTitle())
+        del msa
+        msa = loadMSA(filename, mmap=False)
+        assert_array_equal(FASTA._getArray(), msa._getArray())
+        del msa
+        if os.path.isfile(filename):
+            os.remove(filename)
+
+    def testNonASCIILabels(self):
+        labels = [u'seq\xe9/1-5', u'seq2/1-5', u'\xe9\xe8/2-6']
+        msa = MSA(msa=array([list('ACDEF'), list('GHIKL'), list('MNPQR')],
+                            '|S1'), title='test', labels=labels)
+        filename = saveMSA(msa, join(TEMPDIR, 'labels'))
+        msa = loadMSA(filename)
+        self.assertListEqual([seq.getLabel(True) for seq in msa], labels)
+        del msa
+        if os.path.isfile(filename):
+            os.remove(filename)
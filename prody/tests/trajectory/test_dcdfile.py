@@ -1,8 +1,11 @@
 """This module contains unit tests for :mod:`~prody.ensemble`."""
 
 from os.path import join
+from struct import pack
 from prody.tests import TestCase
 
+import numpy as np
+
 from numpy.testing import assert_equal, assert_allclose
 
 from prody import DCDFile, writeDCD, parseDCD
@@ -46,3 +49,115 @@ class TestDCDFile(TestCase):
         assert_allclose(coordsets[:n_csets], ENSEMBLE._getCoordsets(),
                         rtol=RTOL, atol=ATOL,
                         err_msg='failed to parse DCD file correctly')
+
+    def testMemoryMapped(self):
+        dcd = DCDFile(writeDCD(self.dcd, ALLATOMS), mmap=True)
+        assert_equal(dcd.getCoordsets(), DCD._getCoordsets(),
+                     err_msg='failed to parse memory mapped DCD file')
+        assert_equal(dcd.getCoordsets([2, 0]), DCD._getCoordsets()[[0, 2]],
+                     err_msg='failed to parse memory mapped DCD file')
+        for i, frame in enumerate(dcd):
+            assert_equal(frame._getCoords(), DCD._getCoordsets()[i],
+                         err_msg='failed to iterate memory mapped DCD file')
+        dcd.close()
+
+    def testUnitcellMemoryMapped(self):
+        dcd = DCDFile(self.dcd, 'w')
+        unitcell = np.array([10., 20., 30., 90., 90., 120.])
+        for coords in ENSEMBLE.getCoordsets():
+            dcd.write(coords, unitcell.copy())
+        dcd.close()
+        dcd = DCDFile(self.dcd)
+        mapped = DCDFile(self.dcd, mmap=True)
+        for frame, other in zip(dcd, mapped):
+            assert_allclose(other._getUnitcell(), frame._getUnitcell())
+            assert_equal(other._getCoords(), frame._getCoords())
+        assert_equal(mapped.getCoordsets(), dcd.getCoordsets())
+        dcd.close()
+        mapped.close()
+
+    def testIterChunks(self):
+        writeDCD(self.dcd, ALLATOMS)
+        coordsets = DCD._getCoordsets()
+        indices = ALLATOMS.ca.getIndices()
+        for mmap in (False, True):
+            dcd = DCDFile(self.dcd, mmap=mmap)
+            chunks = list(dcd.iterChunks(2))
+            self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+            assert_equal(np.concatenate(chunks), coordsets)
+            dcd.reset()
+            dcd.setAtoms(ALLATOMS.ca)
+            assert_equal(np.concatenate(list(dcd.iterChunks(5))),
+                         coordsets[:, indices])
+            dcd.close()
+
+    def testGetCoordsets(self):
+        dcd = DCDFile(writeDCD(self.dcd, ALLATOMS))
+        coordsets = DCD._getCoordsets()
+        assert_equal(dcd.getCoordsets([2, 0]), coordsets[[0, 2]])
+        assert_equal(dcd.getCoordsets(slice(1, None)), coordsets[1:])
+        self.assertRaises(IndexError, dcd.getCoordsets, [1, 3])
+        self.assertRaises(IndexError, dcd.getCoordsets, [2, 500])
+        self.assertRaises(IndexError, dcd.getCoordsets, -1)
+        dcd.close()
+
+    def test64bitUnitcell(self):
+        dcd = DCDFile(self.dcd, 'w')
+        unitcell = np.array([10., 20., 30., 90., 90., 120.])
+        dcd.write(ENSEMBLE.getCoordsets()[0], unitcell.copy())
+        dcd.close()
+        dcd = DCDFile(self.dcd)
+        first_byte = dcd._first_byte
+        dcd.close()
+        coordsets = ENSEMBLE.getCoordsets()
+        n_csets, n_atoms = coordsets.shape[:2]
+        with open(self.dcd, 'r+b') as out:
+            out.seek(first_byte)
+            out.truncate()
+            for xyz in coordsets:
+                out.write(pack('=i6di', 48, *(list(unitcell) + [48])))
+                for axis in xyz.T:
+                    np.concatenate([[0], axis, [0]]).tofile(out)
+        for mmap in (False, True):
+            dcd = DCDFile(self.dcd)
+            # 64 bit files are rejected when the header is parsed, so
+            # attributes set for them are assigned here
+            dcd._dtype, dcd._itemsize = np.float64, 8
+            dcd._bytes_per_frame = 56 + dcd._n_floats * 8
+            dcd._n_csets = n_csets
+            if mmap:
+                dcd._mapFrames()
+            assert_allclose(dcd.getCoordsets(), coordsets)
+            assert_allclose(np.concatenate(list(dcd.iterChunks(2))),
+                            coordsets)
+            dcd.close()
+
+    def testFixedAtoms(self):
+        coordsets = ENSEMBLE.getCoordsets().astype(np.float32)
+        n_csets, n_atoms = coordsets.shape[:2]
+        free = np.arange(0, n_atoms, 3)
+        coordsets[1:, np.setdiff1d(np.arange(n_atoms), free)] = coordsets[0,
+            np.setdiff1d(np.arange(n_atoms), free)]
+        with open(self.dcd, 'wb') as out:
+            out.write(pack('i4s9if10i', 84, b'CORD', n_csets, 0, 1, 0, 0, 0,
+                           0, 0, n_atoms - len(free), 1., *([0] * 9 + [24])))
+            out.write(pack('3i', 84, 164, 2))
+            out.write(b'Created by ProDy'.ljust(80) + b'REMARKS'.ljust(80))
+            out.write(pack('5i', 164, 4, n_atoms, 4, len(free) * 4))
+            (free + 1).astype(np.int32).tofile(out)
+            out.write(pack('i', len(free) * 4))
+            for i, xyz in enumerate(coordsets):
+                if i:
+                    xyz = xyz[free]
+                marker = pack('i', len(xyz) * 4)
+                for axis in xyz.T:
+                    out.write(marker)
+                    axis.tofile(out)
+                    out.write(marker)
+        self.assertRaises(IOError, DCDFile, self.dcd)
+        dcd = DCDFile(self.dcd, mmap=True)
+        self.assertEqual(dcd.numFrames(), n_csets)
+        self.assertEqual(dcd.numFixed(), n_atoms - len(free))
+        assert_equal(dcd.getCoordsets(), coordsets)
+        assert_equal(np.concatenate(list(dcd.iterChunks(2))), coordsets)
+        dcd.close()
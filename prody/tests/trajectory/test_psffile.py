@@ -0,0 +1,127 @@
+"""This module contains unit tests for :mod:`~prody.trajectory.psffile`."""
+
+from os.path import join
+
+from numpy.testing import assert_equal
+
+from prody import parsePSF, writePSF, LOGGER
+from prody.tests import unittest, TEMPDIR
+
+LOGGER.verbosity = 'none'
+
+PSFLINES = """\
+PSF
+
+       1 !NTITLE
+ REMARKS test
+
+       5 !NATOM
+       1 PROA 1    ALA  N    NH3   -0.300000       14.0070           0
+       2 PROA 1    ALA  CA   CT1    0.210000       12.0110           0
+       3 PROA 1    ALA  C    C      0.510000       12.0110           0
+       4 PROA 12   ALA  O    O     -0.510000       15.9990           0
+       5 SOLV 1003 TIP3 OH2  OT    -0.834000       15.9994           0
+
+       4 !NBOND: bonds
+       1       2       1       3       2       3       3       4
+
+       3 !NTHETA: angles
+       1       2       3       2       3       4       1       3       4
+
+       2 !NPHI: dihedrals
+       1       2       3       4       4       3       2       1
+
+       1 !NIMPHI: impropers
+       3       2       4       1
+
+       0 !NDON: donors
+
+"""
+
+
+def writeLines(lines, name):
+
+    filename = join(TEMPDIR, name)
+    with open(filename, 'w') as out:
+        out.write(lines)
+    return filename
+
+
+class TestParsePSF(unittest.TestCase):
+
+    def testFields(self):
+
+        ag = parsePSF(writeLines(PSFLINES, 'test.psf'))
+        self.assertEqual(ag.getTitle(), 'test')
+        assert_equal(ag.getSerials(), [1, 2, 3, 4, 5])
+        assert_equal(ag.getSegnames(), ['PROA'] * 4 + ['SOLV'])
+        assert_equal(ag.getResnums(), [1, 1, 1, 12, 1003])
+        assert_equal(ag.getResnames(), ['ALA'] * 4 + ['TIP3'])
+        assert_equal(ag.getNames(), ['N', 'CA', 'C', 'O', 'OH2'])
+        assert_equal(ag.getTypes(), ['NH3', 'CT1', 'C', 'O', 'OT'])
+        assert_equal(ag.getCharges(), [-.3, .21, .51, -.51, -.834])
+        assert_equal(ag.getMasses(), [14.007, 12.011, 12.011, 15.999,
+                                      15.9994])
+        assert_equal(ag._bonds, [[0, 1], [0, 2], [1, 2], [2, 3]])
+        self.assertIsNone(ag.getAngles())
+
+    def testTopology(self):
+
+        ag = parsePSF(writeLines(PSFLINES, 'test.psf'), topology=True)
+        assert_equal(ag.getAngles(), [[0, 1, 2], [1, 2, 3], [0, 2, 3]])
+        assert_equal(ag.getDihedrals(), [[0, 1, 2, 3], [3, 2, 1, 0]])
+        assert_equal(ag.getImpropers(), [[2, 1, 3, 0]])
+
+    def testBlankFields(self):
+
+        lines = PSFLINES.replace('SOLV', '    ')
+        ag = parsePSF(writeLines(lines, 'blank.psf'))
+        assert_equal(ag.getSegnames(), ['PROA'] * 4 + [''])
+        assert_equal(ag.getResnums(), [1, 1, 1, 12, 1003])
+        assert_equal(ag.getCharges(), [-.3, .21, .51, -.51, -.834])
+
+    def testMissingAtoms(self):
+
+        lines = PSFLINES.replace('       5 !NATOM', '       6 !NATOM')
+        self.assertRaises(IOError, parsePSF, writeLines(lines, 'short.psf'))
+
+
+class TestWritePSF(unittest.TestCase):
+
+    def testWriteParse(self):
+
+        ag = parsePSF(writeLines(PSFLINES, 'test.psf'), topology=True)
+        filename = writePSF(join(TEMPDIR, 'written.psf'), ag)
+        text = open(filename).read()
+        self.assertEqual(text[text.index('!NATOM'):],
+                         PSFLINES[PSFLINES.index('!NATOM'):
+                                  PSFLINES.index('\n       0 !NDON')])
+        written = parsePSF(filename, topology=True)
+        for label in ('Names', 'Types', 'Charges', 'Masses', 'Resnums',
+                      'Angles', 'Dihedrals', 'Impropers'):
+            assert_equal(getattr(written, 'get' + label)(),
+                         getattr(ag, 'get' + label)())
+
+    def testWriteSelection(self):
+
+        ag = parsePSF(writeLines(PSFLINES, 'test.psf'), topology=True)
+        written = parsePSF(writePSF(join(TEMPDIR, 'written.psf'), ag[1:]),
+                           topology=True)
+        assert_equal(written.getNames(), ['CA', 'C', 'O', 'OH2'])
+        assert_equal(written._bonds, [[0, 1], [1, 2]])
+        assert_equal(written.getAngles(), [[0, 1, 2]])
+        self.assertIsNone(written.getDihedrals())
+
+    def testLongFields(self):
+
+        ag = parsePSF(writeLines(PSFLINES, 'test.psf'))
+        ag.setResnums([1, 1, 1, 12, 10003])
+        ag.setTypes(['NH3', 'CT1', 'C', 'O', 'OT123'])
+        filename = writePSF(join(TEMPDIR, 'written.psf'), ag)
+        lines = open(filename).readlines()
+        self.assertEqual(lines[0], 'PSF NAMD\n')
+        self.assertEqual(lines[10], '       5 SOLV 10003 TIP3 OH2  OT123 '
+                         ' -0.834000       15.9994           0\n')
+        written = parsePSF(filename)
+        assert_equal(written.getResnums(), ag.getResnums())
+        assert_equal(written.getTypes(), ag.getTypes())
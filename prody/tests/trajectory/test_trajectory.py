@@ -0,0 +1,72 @@
+"""This module contains unit tests for :mod:`~prody.trajectory`."""
+
+from os.path import join
+from prody.tests import TestCase
+
+import numpy as np
+
+from numpy.testing import assert_equal
+
+from prody import Trajectory, writeDCD
+
+from prody.tests import TEMPDIR
+from prody.tests.ensemble import ALLATOMS, DCD
+
+
+class TestTrajectory(TestCase):
+
+    def setUp(self):
+
+        self.files = []
+        for i in range(3):
+            filename = join(TEMPDIR, 'temp{0}.dcd'.format(i))
+            self.files.append(writeDCD(filename, ALLATOMS))
+        self.coordsets = np.concatenate([DCD._getCoordsets()] * 3)
+
+    def getTrajectory(self, **kwargs):
+
+        traj = Trajectory(self.files[0], **kwargs)
+        for filename in self.files[1:]:
+            traj.addFile(filename, **kwargs)
+        return traj
+
+    def testLocateFrames(self):
+
+        traj = self.getTrajectory()
+        files, frames = traj.locateFrames(np.arange(9))
+        assert_equal(files, np.repeat(np.arange(3), 3))
+        assert_equal(frames, np.tile(np.arange(3), 3))
+        self.assertRaises(IndexError, traj.locateFrames, 9)
+        traj.close()
+
+    def testGetCoordsets(self):
+
+        indices = [7, 0, 5, 4, 1]
+        for mmap in (False, True):
+            traj = self.getTrajectory(mmap=mmap)
+            assert_equal(traj.getCoordsets(), self.coordsets)
+            assert_equal(traj.getCoordsets(indices),
+                         self.coordsets[np.unique(indices)])
+            assert_equal(traj.getCoordsets(indices, n_threads=2),
+                         self.coordsets[np.unique(indices)])
+            traj.setAtoms(ALLATOMS.ca)
+            assert_equal(traj.getCoordsets(slice(1, None, 3)),
+                         self.coordsets[1::3][:, ALLATOMS.ca.getIndices()])
+            traj.close()
+
+    def testGotoSkip(self):
+
+        traj = self.getTrajectory()
+        for index in [4, 8, 0, 3, 6]:
+            assert_equal(traj.getFrame(index)._getCoords(),
+                         self.coordsets[index])
+        traj.reset()
+        traj.skip(5)
+        self.assertEqual(traj.nextIndex(), 5)
+        assert_equal(traj.nextCoordset(), self.coordsets[5])
+        traj.skip(10)
+        self.assertEqual(traj.nextIndex(), 9)
+        traj.goto(3)
+        assert_equal(np.array([frame._getCoords() for frame in traj]),
+                     self.coordsets[3:])
+        traj.close()
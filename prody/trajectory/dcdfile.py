@@ -42,12 +42,23 @@ class DCDFile(TrajFile):
     the reference coordinate set.  This class has been tested for 32-bit DCD
     files.  32-bit floating-point coordinate array can be casted automatically
     to a specified type, such as 64-bit float, using *astype* keyword argument,
-    i.e. ``astype=float``, using :meth:`ndarray.astype` method."""
+    i.e. ``astype=float``, using :meth:`ndarray.astype` method.
+
+    When *mmap* keyword argument is **True**, the file is memory mapped
+    instead of being read frame by frame.  Frames are then accessed randomly
+    without seeking, :meth:`getCoordsets` gathers requested frames with a
+    single copy, and :meth:`iterChunks` yields views of the mapped data.
+    DCD files with fixed atoms can be read only in this mode."""
 
     def __init__(self, filename, mode='rb', **kwargs):
 
         TrajFile.__init__(self, filename, mode)
         self._astype = kwargs.get('astype', None)
+        self._mmap = bool(kwargs.get('mmap', False))
+        self._xyzmap = None
+        self._ucmap = None
+        self._free = None
+        self._first = None
         if not self._mode.startswith('w'):
             self._parseHeader()
 
@@ -144,8 +155,9 @@ class DCDFile(TrajFile):
         # Store NAMNF, the number of fixed atoms
         self._n_fixed = temp[8]
 
-        if self._n_fixed > 0:
-            raise IOError('DCD files with fixed atoms is not yet supported.')
+        if self._n_fixed > 0 and not self._mmap:
+            raise IOError('DCD files with fixed atoms can be read only in '
+                          'memory mapped mode, use mmap=True')
 
         # Read in the timestep, DELTA
         # Note: DELTA is stored as double with X-PLOR but as float with CHARMm
@@ -188,6 +200,18 @@ class DCDFile(TrajFile):
         if unpack(endian + b'i', dcd.read(rec_scale * calcsize('i')))[0] != 4:
             raise IOError('Bad DCD format.')
 
+        # Read in indices of free atoms, which are the only atoms written
+        # after the first frame
+        byteorder = endian if endian in ('>', '<') else '='
+        n_free = self._n_atoms - self._n_fixed
+        if self._n_fixed > 0:
+            if unpack(endian + b'i', dcd.read(4))[0] != n_free * 4:
+                raise IOError('Bad DCD format.')
+            self._free = np.frombuffer(dcd.read(n_free * 4),
+                                       byteorder + 'i4') - 1
+            if unpack(endian + b'i', dcd.read(4))[0] != n_free * 4:
+                raise IOError('Bad DCD format.')
+
         self._is64bit = rec_scale == RECSCALE64BIT
         self._endian = endian
         self._n_floats = (self._n_atoms + 2) * 3
@@ -210,18 +234,80 @@ class DCDFile(TrajFile):
             self._itemsize = 4
 
         self._first_byte = self._file.tell()
-        n_csets = (getsize(self._filename) - self._first_byte
-                                                    ) / self._bytes_per_frame
+        if self._free is None:
+            n_csets = ((getsize(self._filename) - self._first_byte)
+                       // self._bytes_per_frame)
+        else:
+            first_frame = self._bytes_per_frame
+            self._n_floats = (n_free + 2) * 3
+            self._bytes_per_frame -= self._n_fixed * 3 * self._itemsize
+            n_csets = 1 + ((getsize(self._filename) - self._first_byte -
+                            first_frame) // self._bytes_per_frame)
         if n_csets != self._n_csets:
             LOGGER.warning('DCD header claims {0} frames, file size '
                            'indicates there are actually {1} frames.'
                            .format(self._n_csets, n_csets))
             self._n_csets = n_csets
 
+        if self._mmap:
+            self._mapFrames()
         self._coords = self.nextCoordset()
         self._file.seek(self._first_byte)
         self._nfi = 0
 
+    def _mapFrames(self):
+        """Map the file to memory and set views of coordinate and unitcell
+        data of frames."""
+
+        byteorder = self._endian if self._endian in ('>', '<') else '='
+        real = '{0}f{1}'.format(byteorder, self._itemsize)
+
+        def frameType(n_atoms):
+            fields = []
+            if self._unitcell:
+                fields.extend([('head', byteorder + 'i4'),
+                               ('unitcell', byteorder + 'f8', 6),
+                               ('tail', byteorder + 'i4')])
+            fields.append(('xyz', real, (3, n_atoms + 2)))
+            return np.dtype(fields)
+
+        offset = self._first_byte
+        n_csets = self._n_csets
+        if self._free is not None:
+            first = np.memmap(self._filename, frameType(self._n_atoms), 'r',
+                              offset, (1,))
+            self._first = first['xyz'][0, :, 1:-1].T.copy()
+            if self._unitcell:
+                self._first_uc = first['unitcell'][0].copy()
+            offset += first.itemsize
+            n_csets -= 1
+            n_atoms = len(self._free)
+        else:
+            n_atoms = self._n_atoms
+        frames = np.memmap(self._filename, frameType(n_atoms), 'r', offset,
+                           (n_csets,))
+        self._xyzmap = frames['xyz'][:, :, 1:-1].transpose(0, 2, 1)
+        if self._unitcell:
+            self._ucmap = frames['unitcell']
+
+    def _getMapped(self, indices):
+        """Returns coordinates of all atoms in frames at *indices*, which may
+        be an integer, a slice, or an array of integers.  Unless the file has
+        fixed atoms, a view of mapped data is returned for an integer or a
+        slice."""
+
+        if self._free is None:
+            return self._xyzmap[indices]
+        frames = np.arange(self._n_csets)[indices]
+        single = np.ndim(frames) == 0
+        frames = np.atleast_1d(frames)
+        coords = np.repeat(self._first[np.newaxis], len(frames), 0)
+        later = (frames > 0).nonzero()[0]
+        coords[np.ix_(later, self._free)] = self._xyzmap[frames[later] - 1]
+        if single:
+            return coords[0]
+        return coords
+
     def hasUnitcell(self):
 
         return self._unitcell
@@ -259,7 +345,7 @@ class DCDFile(TrajFile):
             raise ValueError('I/O operation on closed file')
         if self._nfi < self._n_csets:
             #Skip extended system coordinates (unit cell data)
-            if self._unitcell:
+            if self._unitcell and self._xyzmap is None:
                 self._file.seek(56, 1)
             if self._indices is None:
                 return self._nextCoordset()
@@ -270,12 +356,15 @@ class DCDFile(TrajFile):
 
         n_floats = self._n_floats
         n_atoms = self._n_atoms
-        xyz = fromstring(self._file.read(self._itemsize * n_floats),
-                            self._dtype)
-        if len(xyz) != n_floats:
-            return None
-        xyz = xyz.reshape((3, n_atoms+2)).T[1:-1,:]
-        xyz = xyz.reshape((n_atoms, 3))
+        if self._xyzmap is None:
+            xyz = fromstring(self._file.read(self._itemsize * n_floats),
+                                self._dtype)
+            if len(xyz) != n_floats:
+                return None
+            xyz = xyz.reshape((3, n_atoms+2)).T[1:-1,:]
+            xyz = xyz.reshape((n_atoms, 3))
+        else:
+            xyz = np.array(self._getMapped(self._nfi), self._dtype)
         if self._ag is not None:
             self._ag._setCoords(xyz, self._title + ' frame ' + str(self._nfi),
                                 overwrite=True)
@@ -287,19 +376,42 @@ class DCDFile(TrajFile):
 
     nextCoordset.__doc__ = TrajBase.nextCoordset.__doc__
 
+    def _readCoordsets(self, n_csets):
+        """Returns coordinates of all atoms in next *n_csets* frames, which
+        are read from the file at once.  Fewer frames are returned when the
+        file ends early.  Next frame index is not updated."""
+
+        n_atoms = self._n_atoms
+        # unitcell record (i4, 6 f8, i4) is 56 bytes for 32 and 64 bit files
+        n_skip = self._unitcell * 56 // self._itemsize
+        n_floats = self._bytes_per_frame // self._itemsize
+        data = fromstring(self._file.read(self._bytes_per_frame * n_csets),
+                          self._dtype)
+        n_csets = len(data) // n_floats
+        data = data[:n_csets * n_floats].reshape((n_csets, n_floats))
+        if self._unitcell:
+            data = data[:, n_skip:]
+        data = data.reshape((n_csets, 3, n_atoms+2))[:, :, 1:-1]
+        return data.transpose(0, 2, 1)
+
     def _nextUnitcell(self):
 
         if self._unitcell:
-            self._file.read(4)
-            unitcell = fromstring(self._file.read(48), dtype=np.float64)
-            unitcell = unitcell[[0,2,5,1,3,4]]
+            if self._xyzmap is None:
+                self._file.read(4)
+                unitcell = fromstring(self._file.read(48), dtype=np.float64)
+                self._file.read(4)
+            elif self._free is not None and self._nfi == 0:
+                unitcell = self._first_uc
+            else:
+                unitcell = self._ucmap[self._nfi - (self._free is not None)]
+            unitcell = np.array(unitcell[[0,2,5,1,3,4]], np.float64)
             if np.all(abs(unitcell[3:]) <= 1):
                 # This file was generated by CHARMM, or by NAMD > 2.5, with the angle */
                 # cosines of the periodic cell angles written to the DCD file.        */
                 # This formulation improves rounding behavior for orthogonal cells    */
                 # so that the angles end up at precisely 90 degrees, unlike acos().   */
                 unitcell[3:] = 90. - np.arcsin(unitcell[3:]) * 90 / PISQUARE
-            self._file.read(4)
             return unitcell
 
     def getCoordsets(self, indices=None):
@@ -309,35 +421,112 @@ class DCDFile(TrajFile):
 
         if self._closed:
             raise ValueError('I/O operation on closed file')
-        if (self._indices is None and
-            (indices is None or indices == slice(None))):
-            nfi = self._nfi
-            self.reset()
-            n_floats = self._n_floats + self._unitcell * 14
-            n_atoms = self._n_atoms
-            n_csets = self._n_csets
-            data = self._file.read(self._itemsize * n_floats * n_csets)
-            data = fromstring(data, self._dtype)
-            if len(data) > n_floats * n_csets:
-                n_csets = len(data)/n_floats
-                data = data[:n_csets]
-                LOGGER.warning('DCD is corrupt, {0} out of {1} frames '
-                               'were parsed.'.format(n_csets, self._n_csets))
-            data = data.reshape((n_csets, n_floats))
-            if self._unitcell:
-                data = data[:, 14:]
-            data = data.reshape((n_csets, 3, n_atoms+2))
-            data = data[:, :, 1:-1]
-            data = data.transpose(0, 2, 1)
-            self.goto(nfi)
-            if self._astype is not None and self._astype != data.dtype:
-                data = data.astype(self._astype)
-            return data
+        if self._xyzmap is not None:
+            if indices is None:
+                indices = slice(None)
+            elif isinstance(indices, int):
+                indices = [indices]
+            elif isinstance(indices, (list, np.ndarray)):
+                indices = np.unique(indices)
+            elif not isinstance(indices, slice):
+                raise TypeError('indices must be an integer or a list of '
+                                'integers')
+            coords = self._getMapped(indices)
+            if self._indices is not None:
+                coords = coords[:, self._indices]
+            return np.array(coords, self._astype or self._dtype)
+        if indices is None:
+            indices = np.arange(self._n_csets)
+        elif isinstance(indices, int):
+            indices = np.array([indices])
+        elif isinstance(indices, slice):
+            indices = np.arange(*indices.indices(self._n_csets))
+            indices.sort()
+        elif isinstance(indices, (list, np.ndarray)):
+            indices = np.unique(indices)
         else:
-            return TrajFile.getCoordsets(self, indices)
+            raise TypeError('indices must be an integer or a list of '
+                            'integers')
+        if (indices < 0).any() or (indices >= self._n_csets).any():
+            raise IndexError('indices must be greater or equal to 0 and less '
+                             'than number of frames')
+
+        # runs of consecutive frames are read at once after a single seek
+        nfi = self._nfi
+        breaks = (np.diff(indices) != 1).nonzero()[0] + 1
+        starts = np.concatenate(([0], breaks))
+        stops = np.concatenate((breaks, [len(indices)]))
+        coords = None
+        for start, stop in zip(starts, stops):
+            if start == stop:
+                continue
+            self.goto(int(indices[start]))
+            xyz = self._readCoordsets(stop - start)
+            if self._indices is not None:
+                xyz = xyz[:, self._indices]
+            if len(starts) == 1:
+                coords = xyz
+            else:
+                if coords is None:
+                    coords = np.zeros((len(indices), self.numSelected(), 3),
+                                      self._dtype)
+                # copying one axis at a time is much faster than copying
+                # transposed data at once
+                for i in range(3):
+                    coords[start:start + len(xyz), :, i] = xyz[:, :, i]
+            if len(xyz) < stop - start:
+                LOGGER.warning('DCD is corrupt, {0} out of {1} frames '
+                               'were parsed.'.format(start + len(xyz),
+                                                     len(indices)))
+                coords = coords[:start + len(xyz)]
+                break
+        self.goto(nfi)
+
+        if coords is None:
+            coords = np.zeros((0, self.numSelected(), 3), self._dtype)
+        if self._astype is not None and self._astype != coords.dtype:
+            coords = coords.astype(self._astype)
+        return coords
 
     getCoordsets.__doc__ = TrajBase.getCoordsets.__doc__
 
+    def iterChunks(self, n_frames):
+
+        if self._closed:
+            raise ValueError('I/O operation on closed file')
+        n_frames = int(n_frames)
+        if n_frames < 1:
+            raise ValueError('n_frames must be a positive integer')
+        while self._nfi < self._n_csets:
+            nfi = self._nfi
+            n = min(n_frames, self._n_csets - nfi)
+            if self._xyzmap is None:
+                coords = self._readCoordsets(n)
+                n = len(coords)
+                if n == 0:
+                    break
+            else:
+                coords = self._getMapped(slice(nfi, nfi + n))
+            self._nfi = nfi + n
+            if self._ag is not None:
+                self._ag._setCoords(np.array(coords[-1], self._dtype),
+                                    self._title + ' frame ' +
+                                    str(self._nfi - 1), overwrite=True)
+            if self._indices is not None:
+                coords = coords[:, self._indices]
+            if self._astype is not None and self._astype != coords.dtype:
+                coords = coords.astype(self._astype)
+            yield coords
+
+    iterChunks.__doc__ = TrajBase.iterChunks.__doc__
+
+    def close(self):
+
+        self._xyzmap = self._ucmap = None
+        TrajFile.close(self)
+
+    close.__doc__ = TrajBase.close.__doc__
+
     def write(self, coords, unitcell=None, **kwargs):
         """Write *coords* to a file open in 'a' or 'w' mode.  *coords* may be
         a NUmpy array or a ProDy object that stores or points to coordinate
@@ -8,10 +8,12 @@
 
 import os.path
 
-from numpy import fromstring, zeros, ones, array, add
+import numpy as np
+from numpy import fromstring, zeros, ones, array, asarray, arange, add
 
 from prody import PY2K
 from prody.atomic import ATOMIC_FIELDS, AtomGroup
+from prody.atomic.bond import trimBonds
 from prody.utilities import openFile
 
 if PY2K:
@@ -19,7 +21,24 @@ if PY2K:
 
 __all__ = ['parsePSF', 'writePSF']
 
-def parsePSF(filename, title=None, ag=None):
+CHUNKSIZE = 2 ** 20
+"""Approximate number of bytes of atom lines that are parsed or formatted at
+once."""
+
+PSFATOMS = [('serial', int), ('segment', None), ('resnum', int),
+            ('resname', None), ('name', None), ('type', None),
+            ('charge', float), ('mass', float)]
+"""Atom fields in PSF atom lines and types of numeric ones."""
+
+PSFSECTIONS = [('_bonds', b'NBOND', 'bonds', 2, 4),
+               ('_angles', b'NTHETA', 'angles', 3, 3),
+               ('_dihedrals', b'NPHI', 'dihedrals', 4, 2),
+               ('_impropers', b'NIMPHI', 'impropers', 4, 2)]
+"""Attribute names, section names and titles, number of atoms in each item,
+and items per line for PSF sections that follow atom lines."""
+
+
+def parsePSF(filename, title=None, ag=None, topology=False):
     """Returns an :class:`.AtomGroup` instance storing data parsed from X-PLOR
     format PSF file *filename*.  Atom and bond information is parsed from the
     file.  If *title* is not given, *filename* will be set as the title of the
@@ -27,23 +46,22 @@ def parsePSF(filename, title=None, ag=None):
     provided as *ag* argument.  When provided, *ag* must have the same number
     of atoms in the same order as the file.  Data from PSF file will be added
     to the *ag*.  This may overwrite present data if it overlaps with PSF file
-    content.  Note that this function does not evaluate angles, dihedrals, and
-    impropers sections."""
+    content.  Angles, dihedrals, and impropers sections are evaluated only
+    when *topology* is **True**, see :meth:`.AtomGroup.setAngles`,
+    :meth:`.AtomGroup.setDihedrals`, and :meth:`.AtomGroup.setImpropers`."""
 
     if ag is not None:
         if not isinstance(ag, AtomGroup):
             raise TypeError('ag must be an AtomGroup instance')
 
     psf = openFile(filename, 'rb')
-    line = psf.readline()
-    i_line = 1
-    while line:
-        line = line.strip()
-        if line.endswith(b'!NATOM'):
-            n_atoms = int(line.split(b'!')[0])
-            break
-        line = psf.readline()
-        i_line += 1
+    buf = psf.read()
+    psf.close()
+
+    section = _findSection(buf, b'NATOM')
+    if section is None:
+        raise IOError('NATOM section is not found in PSF file')
+    n_atoms, start, stop = section
     if title is None:
         title = os.path.splitext(os.path.split(filename)[1])[0]
     else:
@@ -54,6 +72,151 @@ def parsePSF(filename, title=None, ag=None):
         if n_atoms != ag.numAtoms():
             raise ValueError('ag and PSF file must have same number of atoms')
 
+    fields = _parseAtoms(buf, start, n_atoms)
+    if fields is None:
+        fields = _parseAtomLines(buf[start:stop].splitlines(True), n_atoms)
+    (serials, segnames, resnums, resnames, atomnames, atomtypes,
+     charges, masses) = fields
+
+    sections = PSFSECTIONS if topology else PSFSECTIONS[:1]
+    arrays = {}
+    for label, name, items, width, per_line in sections:
+        section = _findSection(buf, name, stop)
+        if section is None:
+            continue
+        count, start, stop = section
+        if count:
+            indices = fromstring(buf[start:stop], dtype=int, sep=' ')
+        else:
+            indices = zeros(0, int)
+        if len(indices) != count * width:
+            raise IOError('number of {0} expected and parsed do not match'
+                          .format(items))
+        if count:
+            arrays[label] = add(indices, -1, indices).reshape((count, width))
+
+    ag.setSerials(serials)
+    ag.setSegnames(segnames)
+    ag.setResnums(resnums)
+    ag.setResnames(resnames)
+    ag.setNames(atomnames)
+    ag.setTypes(atomtypes)
+    ag.setCharges(charges)
+    ag.setMasses(masses)
+
+    if '_bonds' in arrays:
+        ag.setBonds(arrays['_bonds'])
+    if '_angles' in arrays:
+        ag.setAngles(arrays['_angles'])
+    if '_dihedrals' in arrays:
+        ag.setDihedrals(arrays['_dihedrals'])
+    if '_impropers' in arrays:
+        ag.setImpropers(arrays['_impropers'])
+
+    return ag
+
+
+def _findSection(buf, name, start=0):
+    """Returns number of items in section *name* that is found after *start*
+    in *buf*, and positions where lines of the section start and stop, or
+    **None** if there is no such section."""
+
+    pos = buf.find(b'!' + name, start)
+    if pos < 0:
+        return None
+    count = int(buf[buf.rfind(b'\n', 0, pos) + 1:pos])
+    start = buf.find(b'\n', pos) + 1 or len(buf)
+    stop = buf.find(b'!', start)
+    if stop < 0:
+        stop = len(buf)
+    else:
+        stop = buf.rfind(b'\n', 0, stop) + 1
+    return count, start, stop
+
+
+def _parseAtoms(buf, start, n_atoms):
+    """Returns arrays of atom fields parsed from *n_atoms* lines that follow
+    *start* in *buf* using array operations, or **None** if lines differ in
+    length, fields are not separated by blank columns in all lines, or a field
+    cannot be converted."""
+
+    length = buf.find(b'\n', start) + 1 - start
+    if not n_atoms or length < 2 or start + n_atoms * length > len(buf):
+        return None
+    lines = np.frombuffer(buf, np.uint8, n_atoms * length,
+                          start).reshape((n_atoms, length))
+    size = max(CHUNKSIZE // length, 1)
+    fields = [zeros(n_atoms, ATOMIC_FIELDS[field].dtype)
+              for field, dtype in PSFATOMS]
+    for i in range(0, n_atoms, size):
+        block = lines[i:i + size]
+        if (block[:, -1] != 10).any():
+            return None
+        blank = block <= 32
+        # fields are columns between those that are blank in all lines
+        seps = blank.all(0)
+        filled = ~seps
+        firsts = (filled & np.concatenate(([True], seps[:-1]))).nonzero()[0]
+        lasts = (filled & np.concatenate((seps[1:], [True]))).nonzero()[0]
+        if len(firsts) < len(PSFATOMS):
+            return None
+        # each field must have a single non-blank value in all lines
+        words = ~blank
+        words[:, 1:] &= blank[:, :-1]
+        if (np.count_nonzero(words) != len(firsts) * len(block) or
+            not np.logical_or.reduceat(words, firsts, 1).all()):
+            return None
+
+        for (field, dtype), first, last, values in zip(PSFATOMS, firsts,
+                                                       lasts + 1, fields):
+            if dtype is None:
+                strings = _getStrings(block[:, first:last], values.dtype)
+                if strings is None:
+                    return None
+                values[i:i + size] = strings
+            else:
+                # numbers are followed by a blank column that separates them
+                numbers = fromstring(np.ascontiguousarray(
+                    block[:, first:last + 1]).tobytes(), dtype, sep=' ')
+                if len(numbers) != len(block):
+                    return None
+                values[i:i + size] = numbers
+    return fields
+
+
+def _getStrings(fields, dtype):
+    """Returns strings in rows of *fields*, a 2-D :class:`numpy.uint8` array,
+    as an array of *dtype*, or **None** if they are not ASCII.  Strings are
+    stripped, and are not decoded one at a time."""
+
+    dtype = np.dtype(dtype)
+    n_rows, width = fields.shape
+    blank = fields <= 32
+    lead = blank.argmin(1)
+    columns = arange(width)
+    if lead.any():
+        fields = fields[arange(n_rows)[:, np.newaxis],
+                        np.minimum(columns + lead[:, np.newaxis], width - 1)]
+        blank = (fields <= 32) | (columns >= width - lead[:, np.newaxis])
+    else:
+        fields = fields.copy()
+    fields[blank] = 0
+    if dtype.char == 'U':
+        if fields.max() > 127:
+            return None
+        size, fields = dtype.itemsize // 4, fields.astype(np.uint32)
+    else:
+        size = dtype.itemsize
+    strings = zeros((n_rows, size), fields.dtype)
+    strings[:, :min(size, width)] = fields[:, :size]
+    return strings.view(dtype).ravel()
+
+
+def _parseAtomLines(lines, n_atoms):
+    """Returns arrays of atom fields parsed from *lines* one at a time.  Lines
+    up to 71 characters long are split at fixed columns, and longer ones at
+    whitespace."""
+
     serials = zeros(n_atoms, ATOMIC_FIELDS['serial'].dtype)
     segnames = zeros(n_atoms, ATOMIC_FIELDS['segment'].dtype)
     resnums = zeros(n_atoms, ATOMIC_FIELDS['resnum'].dtype)
@@ -62,19 +225,13 @@ def parsePSF(filename, title=None, ag=None):
     atomtypes = zeros(n_atoms, ATOMIC_FIELDS['type'].dtype)
     charges = zeros(n_atoms, ATOMIC_FIELDS['charge'].dtype)
     masses = zeros(n_atoms, ATOMIC_FIELDS['mass'].dtype)
-    
-    #lines = psf.readlines(71 * (n_atoms + 5))
+
     n = 0
-    n_bonds = 0
-    for i, line in enumerate(psf):
+    for line in lines:
         if line.strip() == b'':
             continue
-        if b'!NBOND:' in line.upper():
-            items = line.split()
-            n_bonds = int(items[0])
-            break
         if n + 1 > n_atoms:
-            continue
+            break
 
         if len(line) <= 71:
             serials[n] = line[:8]
@@ -96,53 +253,19 @@ def parsePSF(filename, title=None, ag=None):
             charges[n] = items[6]
             masses[n] = items[7]
         n += 1
-    
+
     if n < n_atoms:
         raise IOError('number of lines in PSF is less than the number of '
                       'atoms')
-                      
-#    i = n_atoms
-#    while 1:
-#        line = lines[i].split()
-#        if len(line) >= 2 and line[1] == '!NBOND:':
-#             n_bonds = int(line[0])
-#             break
-#        i += 1
-#    lines = ''.join(lines[i+1:]) + psf.read(n_bonds/4 * 71)
-    lines = []
-    for i, line in enumerate(psf):
-        if line.strip() == b'':
-            continue
-        if b'!' in line:
-            break
-        lines.append(line.decode(encoding='UTF-8'))
-    
-    lines = ''.join(lines)
-    array = fromstring(lines, count=n_bonds*2, dtype=int, sep=' ')
-    if len(array) != n_bonds*2:
-        raise IOError('number of bonds expected and parsed do not match')
-
-    psf.close()
-    ag.setSerials(serials)
-    ag.setSegnames(segnames)
-    ag.setResnums(resnums)
-    ag.setResnames(resnames)
-    ag.setNames(atomnames)
-    ag.setTypes(atomtypes)
-    ag.setCharges(charges)
-    ag.setMasses(masses)
-
-    array = add(array, -1, array)
-    ag.setBonds(array.reshape((n_bonds, 2)))
-
-    return ag
+    return (serials, segnames, resnums, resnames, atomnames, atomtypes,
+            charges, masses)
 
 PSFLINE = ('%8d %-4s %-4d %-4s %-4s %-4s %10.6f %13.4f %11d\n')
 
 def writePSF(filename, atoms):
     """Write atoms in X-PLOR format PSF file with name *filename* and return
-    *filename*.  This function will write available atom and bond information
-    only."""
+    *filename*.  This function will write available atom, bond, angle,
+    dihedral, and improper information only."""
 
     try:
         n_atoms, segments, rnums, rnames, names, types, charges, masses = (
@@ -168,9 +291,25 @@ def writePSF(filename, atoms):
         raise ValueError('atom names are not set')
 
     if types is None:
-        atomtypes = zeros(n_atoms, array(['a']).dtype.char + '1')
+        types = zeros(n_atoms, array(['a']).dtype.char + '1')
 
-    long_fields = array([len(tp) for tp in types]).max() > 4
+    long_fields = any(len(tp) > 4 for tp in set(types))
+
+    try:
+        ag = atoms.getAtomGroup()
+    except AttributeError:
+        ag = atoms
+        indices = None
+    else:
+        indices = atoms.getIndices()
+    sections = []
+    for label, name, items, width, per_line in PSFSECTIONS:
+        values = getattr(ag, label)
+        if values is not None and indices is not None:
+            values = trimBonds(values, indices)
+        sections.append((values, name.decode(), items, width, per_line))
+    while sections and sections[-1][0] is None:
+        sections.pop()
 
     out = openFile(filename, 'w')
     write = out.write
@@ -181,19 +320,145 @@ def writePSF(filename, atoms):
     write('\n')
     write('{0:8d} !NATOM\n'.format(n_atoms))
 
-    for i in range(n_atoms):
-        write(PSFLINE % (i + 1, segments[i], rnums[i], rnames[i], names[i],
-                        types[i], charges[i], masses[i], 0))
-    bonds = list(atoms._iterBonds())
-    if bonds:
-        bonds = array(bonds, int) + 1
+    columns = [arange(1, n_atoms + 1), asarray(segments), asarray(rnums),
+               asarray(rnames), names, asarray(types), charges, masses]
+    size = CHUNKSIZE // len(PSFLINE)
+    for i in range(0, n_atoms, size):
+        write(_formatAtoms([column[i:i + size] for column in columns]))
+
+    for values, name, items, width, per_line in sections:
         write('\n')
-        write('{0:8d} !NBOND: bonds\n'.format(len(bonds)))
-        for i, bond in enumerate(bonds):
-            write('%8s%8s' % (bond[0], bond[1]))
-            if i % 4 == 3:
-                write('\n')
-        if i % 4 != 3:
-            write('\n')
+        if values is None:
+            write('{0:8d} !{1}: {2}\n'.format(0, name, items))
+            continue
+        write('{0:8d} !{1}: {2}\n'.format(len(values), name, items))
+        size = per_line * (CHUNKSIZE // (8 * width * per_line))
+        for i in range(0, len(values), size):
+            write(_formatIndices(values[i:i + size] + 1, per_line))
     out.close()
     return filename
+
+def _formatAtoms(columns):
+    """Returns atom lines with values in *columns* formatted as
+    :data:`PSFLINE`.  Lines are put together from columns of text formatted
+    using array operations, unless some values do not fit in their columns
+    or are not ASCII, when lines are formatted one at a time."""
+
+    serials, segments, rnums, rnames, names, types, charges, masses = columns
+    fields = [_formatNumbers(serials, 8), _formatStrings(segments, 4),
+              _formatNumbers(rnums, 4, left=True), _formatStrings(rnames, 4),
+              _formatStrings(names, 4), _formatStrings(types, 4),
+              _formatNumbers(charges, 10, 6), _formatNumbers(masses, 13, 4)]
+    if any(field is None for field in fields):
+        columns = [column.tolist() for column in columns]
+        return ''.join([PSFLINE % (values + (0,))
+                        for values in zip(*columns)])
+
+    n_atoms = len(serials)
+    space = zeros((n_atoms, 1), np.uint8) + 32
+    end = np.frombuffer(' {0:11d}\n'.format(0).encode(), np.uint8)
+    blocks = []
+    for field in fields:
+        blocks.extend([field, space])
+    blocks[-1] = zeros((n_atoms, len(end)), np.uint8) + end
+    return np.concatenate(blocks, 1).tobytes().decode()
+
+
+def _formatIndices(indices, per_line):
+    """Returns lines of atom *indices* with *per_line* rows of them in each,
+    formatted in 8 columns using array operations, unless some do not fit."""
+
+    n_fields = indices.shape[1] * per_line
+    indices = indices.ravel()
+    full = len(indices) - len(indices) % n_fields
+    text = _formatNumbers(indices, 8)
+    if text is None:
+        indices = indices.tolist()
+        line = '%8d' * n_fields + '\n'
+        lines = [line % values for values in
+                 zip(*[iter(indices[:full])] * n_fields)]
+        if full < len(indices):
+            lines.append('%8d' * (len(indices) - full) %
+                         tuple(indices[full:]) + '\n')
+        return ''.join(lines)
+
+    lines = np.concatenate((text[:full].reshape((-1, 8 * n_fields)),
+                            zeros((full // n_fields, 1), np.uint8) + 10), 1)
+    lines = lines.tobytes()
+    if full < len(indices):
+        lines += text[full:].tobytes() + b'\n'
+    return lines.decode()
+
+
+def _formatNumbers(values, width, decimals=0, left=False):
+    """Returns a 2-D :class:`numpy.uint8` array with *values* formatted as
+    ``'%{width}.{decimals}f'``, or as ``'%{width}d'`` when *decimals* is 0,
+    in rows, and left-justified when *left* is **True**.  **None** is returned
+    if some do not fit in *width* columns."""
+
+    if decimals:
+        values = np.asarray(values, float)
+        with np.errstate(invalid='ignore'):
+            scaled = values * 10 ** decimals
+            digits = np.rint(scaled)
+            # values close to halfway between two numbers are rounded the
+            # way text formatting rounds them, based on their exact value
+            close = abs(scaled - np.floor(scaled) - .5) < 1e-6
+        for i in close.nonzero()[0]:
+            digits[i] = float(('%.*f' % (decimals, values[i]))
+                              .replace('.', ''))
+        if not np.isfinite(digits).all() or (abs(digits) >= 1e18).any():
+            return None
+        negative = np.signbit(values)
+    else:
+        digits = np.asarray(values)
+        if digits.dtype.kind not in 'iu':
+            return None
+        negative = digits < 0
+    digits = abs(digits).astype(np.int64)
+
+    n_digits = np.ones(len(digits), int)
+    for power in range(1, width + 1):
+        n_digits += digits >= 10 ** power
+    n_digits = np.maximum(n_digits, decimals + 1)
+    lengths = n_digits + negative + (decimals > 0)
+    if (lengths > width).any():
+        return None
+
+    # digits are filled in columns of the transposed text, from the right
+    text = np.zeros((width, len(digits)), np.uint8) + 32
+    for power in range(n_digits.max() if len(digits) else 0):
+        column = text[width - 1 - power - (0 < decimals <= power)]
+        digits, column[:] = np.divmod(digits, 10)
+        column += 48
+        column[n_digits <= power] = 32
+    if decimals:
+        text[width - 1 - decimals] = 46
+    text = text.T
+    text[negative, width - lengths[negative]] = 45
+    if left:
+        columns = np.arange(width) + (width - lengths)[:, np.newaxis]
+        text = np.where(columns < width, text[np.arange(len(text))[:, None],
+                        np.minimum(columns, width - 1)], 32).astype(np.uint8)
+    return text
+
+
+def _formatStrings(values, width):
+    """Returns a 2-D :class:`numpy.uint8` array with *values* left-justified
+    in *width* columns in rows, or **None** if some are longer or are not
+    ASCII."""
+
+    values = np.asarray(values)
+    if values.dtype.char == 'U':
+        codes = values.view(np.uint32)
+    elif values.dtype.char == 'S':
+        codes = values.view(np.uint8)
+    else:
+        return None
+    codes = codes.reshape((len(values), -1))
+    if codes[:, width:].any() or (len(codes) and codes.max() > 127):
+        return None
+    text = np.zeros((len(values), width), np.uint8)
+    text[:, :codes.shape[1]] = codes[:, :width]
+    text[text == 0] = 32
+    return text
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """This module defines base class for trajectory handling."""
 
-from numpy import ndarray, unique
+from numpy import array, ndarray, unique
 
 from prody.ensemble import Ensemble
 from prody.utilities import checkCoords, checkWeights
@@ -305,6 +305,22 @@ class TrajBase(object):
         while self._nfi < self._n_csets:
             yield self.nextCoordset()
 
+    def iterChunks(self, n_frames):
+        """Yield coordinate sets for (selected) atoms in blocks of *n_frames*
+        frames, i.e. arrays with shape (n_frames, n_atoms, 3).  The last block
+        may be shorter.  Iteration starts from the next frame in line.  Blocks
+        may be read-only views of trajectory data, and will not be valid after
+        the trajectory is closed."""
+
+        if self._closed:
+            raise ValueError('I/O operation on closed file')
+        n_frames = int(n_frames)
+        if n_frames < 1:
+            raise ValueError('n_frames must be a positive integer')
+        while self._nfi < self._n_csets:
+            n = min(n_frames, self._n_csets - self._nfi)
+            yield array([self.nextCoordset() for i in range(n)])
+
     def getCoordsets(self, indices=None):
         """Returns coordinate sets at given *indices*. *indices* may be an
         integer, a list of ordered integers or ``None``. ``None`` returns all
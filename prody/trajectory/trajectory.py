@@ -14,7 +14,10 @@ __all__ = ['Trajectory']
 
 class Trajectory(TrajBase):
 
-    """A class for handling trajectories in multiple files."""
+    """A class for handling trajectories in multiple files.  Index of the
+    first frame of each file is kept, so that frames are located without
+    walking through files, and :meth:`getCoordsets` reads requested frames
+    from each file at once, optionally from several files in parallel."""
 
     def __init__(self, name, **kwargs):
         """Trajectory can be instantiated with a *name* or a filename. When
@@ -27,6 +30,7 @@ class Trajectory(TrajBase):
         self._filenames = set()
         self._n_files = 0
         self._cfi = 0 # current file index
+        self._firsts = np.zeros(0, int) # index of first frame of each file
         assert 'mode' not in kwargs, 'mode is an invalid keyword argument'
         self._kwargs = kwargs
         if os.path.isfile(name):
@@ -114,6 +118,7 @@ class Trajectory(TrajBase):
             self._n_atoms = traj.numAtoms()
             self._coords = traj._coords
         self._trajectories.append(traj)
+        self._firsts = np.append(self._firsts, self._n_csets)
         self._n_csets += traj.numFrames()
         self._n_files += 1
         if self._ag is not None:
@@ -129,6 +134,18 @@ class Trajectory(TrajBase):
 
         return [traj.getFilename(absolute) for traj in self._trajectories]
 
+    def locateFrames(self, indices):
+        """Returns indices of files that contain frames at *indices* and
+        indices of frames in those files.  *indices* may be an integer or an
+        array of integers less than number of frames."""
+
+        indices = np.asarray(indices)
+        if (indices < 0).any() or (indices >= self._n_csets).any():
+            raise IndexError('indices must be greater or equal to 0 and less '
+                             'than number of frames')
+        files = self._firsts.searchsorted(indices, 'right') - 1
+        return files, indices - self._firsts[files]
+
     def getFrame(self, index):
 
         if self._closed:
@@ -136,7 +153,14 @@ class Trajectory(TrajBase):
         self.goto(index)
         return next(self)
 
-    def getCoordsets(self, indices=None):
+    def getCoordsets(self, indices=None, n_threads=1):
+        """Returns coordinate sets at given *indices*. *indices* may be an
+        integer, a list of ordered integers or ``None``. ``None`` returns all
+        coordinate sets. If a list of indices is given, unique numbers will
+        be selected and sorted. That is, this method will always return unique
+        coordinate sets in the order they appear in the trajectory files.
+        Frames in each file are read at once, and files are read by up to
+        *n_threads* threads in parallel."""
 
         if self._closed:
             raise ValueError('I/O operation on closed file')
@@ -153,23 +177,36 @@ class Trajectory(TrajBase):
             raise TypeError('indices must be an integer or a list of '
                             'integers')
 
-        nfi = self._nfi
-        self.reset()
+        # frames are grouped by file and each file reads its frames at once
+        files, frames = self.locateFrames(indices)
+        which = np.unique(files)
+        bounds = files.searchsorted(np.append(which, self._n_files))
+
+        def read(i):
+
+            traj = self._trajectories[which[i]]
+            return traj.getCoordsets(frames[bounds[i]:bounds[i+1]])
+
         coords = np.zeros((len(indices), self.numSelected(), 3),
                           self._trajectories[0]._dtype)
-        prev = -1
-        next = self.nextCoordset
-        for i, index in enumerate(indices):
-            diff = index - prev
-            if diff > 1:
-                self.skip(diff - 1)
-            coords[i] = next()
-            prev = index
-        self.goto(nfi)
+        if n_threads == 1 or len(which) < 2:
+            blocks = (read(i) for i in range(len(which)))
+            pool = None
+        else:
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(n_threads)
+            blocks = pool.imap(read, range(len(which)))
+        try:
+            # blocks may be transposed views of file data, which are copied
+            # one axis at a time
+            for i, xyz in enumerate(blocks):
+                for j in range(3):
+                    coords[bounds[i]:bounds[i+1], :, j] = xyz[:, :, j]
+        finally:
+            if pool is not None:
+                pool.terminate()
         return coords
 
-    getCoordsets.__doc__ = TrajBase.getCoordsets.__doc__
-
     def __next__(self):
 
         if self._closed:
@@ -231,14 +268,10 @@ class Trajectory(TrajBase):
                 n = 0
             elif n > n_csets:
                 n = n_csets
-            nfi = n
-            for which, traj in enumerate(self._trajectories):
-                if traj._n_csets >= nfi:
-                    break
-                else:
-                    nfi -= traj._n_csets
+            which = min(self._firsts.searchsorted(n, 'right') - 1,
+                        self._n_files - 1)
             self._gotoFile(which)
-            self._trajectory.goto(nfi)
+            self._trajectory.goto(int(n - self._firsts[which]))
             self._nfi = n
 
     goto.__doc__ = TrajBase.goto.__doc__
@@ -249,17 +282,8 @@ class Trajectory(TrajBase):
             raise ValueError('I/O operation on closed file')
         if not isinstance(n, int):
             raise ValueError('n must be an integer')
-        left = self._n_csets - self._nfi
-        if n > left:
-            n = left
-        while self._nfi < self._n_csets and n > 0:
-            traj = self._trajectory
-            skip = min(n, traj.numFrames() - traj.nextIndex())
-            traj.skip(skip)
-            if n > skip:
-                self._nextFile()
-            self._nfi += skip
-            n -= skip
+        if n > 0:
+            self.goto(min(self._nfi + n, self._n_csets))
 
     skip.__doc__ = TrajBase.skip.__doc__
 
@@ -139,10 +139,10 @@ class TrajFile(TrajBase):
         n_atoms = self.numSelected()
         coords = np.zeros((len(indices), n_atoms, 3), self._dtype)
 
-        prev = 0
+        prev = -1
         next = self.nextCoordset
         for i, index in enumerate(indices):
-            diff = index - prev
+            diff = int(index - prev)
             if diff > 1:
                 self.skip(diff-1)
             xyz = next()
@@ -81,6 +81,14 @@ PACKAGE_DIR = {}
 for pkg in PACKAGES:
     PACKAGE_DIR[pkg] = join(*pkg.split('.'))
 from glob import glob
+
+# sequence analysis kernels run on POSIX threads, see msathreads.h
+if os.name == 'nt':
+    THREADS = {}
+else:
+    THREADS = {'extra_compile_args': ['-pthread'],
+               'extra_link_args': ['-pthread']}
+
 EXTENSIONS = [
     Extension('prody.dynamics.rtbtools',
               glob(join('prody', 'dynamics', 'rtbtools.c')),
@@ -93,13 +101,17 @@ EXTENSIONS = [
 #              include_dirs=[numpy.get_include()]),
     Extension('prody.sequence.msatools',
               [join('prody', 'sequence', 'msatools.c'),],
-              include_dirs=[numpy.get_include()]),
+              include_dirs=[numpy.get_include()],
+              depends=[join('prody', 'sequence', 'msathreads.h')],
+              **THREADS),
     Extension('prody.sequence.msaio',
               [join('prody', 'sequence', 'msaio.c'),],
               include_dirs=[numpy.get_include()]),
     Extension('prody.sequence.seqtools',
               [join('prody', 'sequence', 'seqtools.c'),],
-              include_dirs=[numpy.get_include()]),
+              include_dirs=[numpy.get_include()],
+              depends=[join('prody', 'sequence', 'msathreads.h')],
+              **THREADS),
 ]
 
 CONTRIBUTED = [